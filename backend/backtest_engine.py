@@ -40,7 +40,7 @@ class BacktestEngine:
                         "win_rate": best_strat['win_rate'],
                         "trades_count": best_strat['total_trades'],
                         "best_strategy": f"{best_strat['strategy']} ({best_strat['direction']})",
-                        "curve": [p['value'] for p in best_strat['equity_curve']]
+                        "curve": best_strat['equity_curve'].value.tolist()
                     }
             except Exception as e:
                 print(f"[SCANNER] Error processing {symbol}: {e}")
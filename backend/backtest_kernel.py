@@ -0,0 +1,437 @@
+# backend/backtest_kernel.py
+"""
+Vectorized backtest kernel for TradingEngine.run_backtest(engine="vector").
+
+The bar-by-bar loop in strategy_core walks the DataFrame with df.iloc[i],
+which costs a Series construction per bar. This kernel pulls the OHLCV and
+indicator columns out once as contiguous float64 arrays, evaluates the
+signals of every strategy as boolean masks, and only runs the position /
+drawdown state machine as a loop — jumping from one executable signal to
+the next and filling the equity curve between them with NumPy.
+
+Output (markers, trades, equity curve, final capital/position) is identical
+to the loop implementation, including its quirks (warmup guard, MAX_DD
+circuit breaker, cost model).
+"""
+
+import numpy as np
+
+from backtest_result import EquityCurve, TradeLog
+
+# Trading Cost Model — must stay in sync with strategy_core
+TAKER_FEE      = 0.001
+SLIPPAGE       = 0.0005
+ROUND_TRIP_COST = TAKER_FEE + SLIPPAGE
+
+# Signal codes
+SIGNAL_HOLD  = 0
+SIGNAL_OPEN  = 1    # BUY (LONG) / ENTRY_SHORT (SHORT)
+SIGNAL_CLOSE = -1   # SELL (LONG) / EXIT_SHORT (SHORT)
+
+# Market regime codes (see market_regimes)
+REGIME_UNKNOWN   = 0
+REGIME_UPTREND   = 1
+REGIME_DOWNTREND = 2
+REGIME_RANGING   = 3
+REGIME_LABELS = {
+    REGIME_UNKNOWN: "UNKNOWN",
+    REGIME_UPTREND: "UPTREND",
+    REGIME_DOWNTREND: "DOWNTREND",
+    REGIME_RANGING: "RANGING",
+}
+
+INDICATOR_COLUMNS = (
+    'sma_fast', 'sma_slow', 'ema_200', 'bb_upper', 'bb_lower',
+    'rsi', 'grid_top', 'grid_bottom', 'atr',
+)
+
+# Strategy thresholds hard-coded in run_backtest (param_sweep overrides them)
+DEFAULT_THRESHOLDS = {
+    'rsi_low': 30, 'rsi_high': 70,            # MEAN_REVERSAL / MIX_STRATEGY
+    'mtf_rsi_entry': 40, 'mtf_rsi_exit': 75,  # MULTITIMEFRAME LONG (SHORT: 100 - x)
+    'grid_zone': 0.2,                         # GRID buy/sell zone (fraction of range)
+}
+
+# Columns that must be non-NaN before a bar may trade (warmup guard)
+WARMUP_COLUMNS = ('sma_fast', 'sma_slow', 'rsi', 'bb_upper', 'atr')
+
+MARKER_BUY   = {'position': 'belowBar', 'color': '#00ff41', 'shape': 'arrowUp', 'text': 'BUY'}
+MARKER_SELL  = {'position': 'aboveBar', 'color': '#ff0055', 'shape': 'arrowDown', 'text': 'SELL'}
+MARKER_SHORT = {'position': 'aboveBar', 'color': '#ff0055', 'shape': 'arrowDown', 'text': 'SHORT'}
+MARKER_COVER = {'position': 'belowBar', 'color': '#00ff41', 'shape': 'arrowUp', 'text': 'COVER'}
+MARKER_STOP  = {'position': 'aboveBar', 'color': '#000000', 'shape': 'arrowDown', 'text': 'STOP (Risk)'}
+
+
+# ============================================================
+# 1. ARRAY EXTRACTION
+# ============================================================
+def time_to_epoch_seconds(time_col):
+    """Convert a datetime column to int64 epoch seconds (same as int(ts.timestamp()))."""
+    ns = np.asarray(time_col.to_numpy(dtype='datetime64[ns]')).astype(np.int64)
+    return ns // 1_000_000_000
+
+
+def extract_arrays(df):
+    """
+    Pull close + indicator columns out of a prepared DataFrame once,
+    as contiguous float64 arrays. Missing columns (data too short for
+    prepare_indicators) become all-NaN so the warmup guard skips every bar.
+    """
+    n = len(df)
+    arrays = {}
+    for col in ('close',) + INDICATOR_COLUMNS:
+        if col in df.columns:
+            arrays[col] = np.ascontiguousarray(df[col].to_numpy(dtype=np.float64, na_value=np.nan))
+        else:
+            arrays[col] = np.full(n, np.nan)
+    arrays['time'] = time_to_epoch_seconds(df['time'])
+    arrays['has_trend_cols'] = 'sma_fast' in df.columns and 'sma_slow' in df.columns
+    arrays['has_ema'] = 'ema_200' in df.columns
+    return arrays
+
+
+def _shift(arr):
+    """arr shifted forward by one bar (NaN at index 0)."""
+    out = np.empty_like(arr)
+    out[0] = np.nan
+    out[1:] = arr[:-1]
+    return out
+
+
+# ============================================================
+# 2. MARKET REGIME (MIX_STRATEGY)
+# ============================================================
+def market_regimes(arrays, min_bars=50):
+    """
+    Regime code per bar, equivalent to calling
+    TradingEngine.get_market_condition(df.iloc[:i+1]) for every i.
+    Returns (codes, bull_score, bear_score, rsi_filled).
+    Arrays may also be 2-D (time x symbol); bars run along axis 0.
+    """
+    close = arrays['close']
+    n = len(close)
+    sma20 = arrays['sma_fast']
+    sma50 = arrays['sma_slow']
+    ema200 = arrays['ema_200']
+    rsi = np.where(np.isnan(arrays['rsi']), 50.0, arrays['rsi'])
+
+    with np.errstate(invalid='ignore'):
+        sma_bull = (close > sma50) & (sma20 > sma50)
+        sma_bear = (close < sma50) & (sma20 < sma50)
+        # get_market_condition treats a zero / missing EMA200 as "no confirmation"
+        ema_ok = ~np.isnan(ema200) & (ema200 != 0) if arrays.get('has_ema', True) else np.zeros(close.shape, dtype=bool)
+        ema_bull = ema_ok & (close > ema200)
+        ema_bear = ema_ok & (close < ema200)
+        rsi_bull = rsi > 50
+        rsi_bear = rsi < 50
+
+    bull_score = sma_bull.astype(np.int8) + ema_bull + rsi_bull
+    bear_score = sma_bear.astype(np.int8) + ema_bear + rsi_bear
+
+    codes = np.full(close.shape, REGIME_RANGING, dtype=np.int8)
+    codes[bear_score >= 2] = REGIME_DOWNTREND
+    codes[bull_score >= 2] = REGIME_UPTREND
+
+    unknown = np.isnan(sma20) | np.isnan(sma50)
+    unknown[:min(min_bars - 1, n)] = True
+    if not arrays.get('has_trend_cols', True):
+        unknown[:] = True
+    codes[unknown] = REGIME_UNKNOWN
+    return codes, bull_score, bear_score, rsi
+
+
+# ============================================================
+# 3. SIGNAL MASKS
+# ============================================================
+def compute_signals(arrays, base_strategy, direction, regimes=None, thresholds=None):
+    """
+    Evaluate the strategy rules for every bar at once.
+    Returns an int8 array of SIGNAL_OPEN / SIGNAL_CLOSE / SIGNAL_HOLD.
+    Entry rules take precedence over exit rules, as in the loop's if/elif.
+    thresholds: optional overrides of DEFAULT_THRESHOLDS (extra keys ignored).
+    Works on 2-D (time x symbol) arrays too (portfolio_backtest).
+    """
+    th = DEFAULT_THRESHOLDS if thresholds is None else {**DEFAULT_THRESHOLDS, **thresholds}
+    rsi_low, rsi_high = th['rsi_low'], th['rsi_high']
+    close = arrays['close']
+    open_mask = np.zeros(close.shape, dtype=bool)
+    close_mask = np.zeros(close.shape, dtype=bool)
+
+    cf, cs = arrays['sma_fast'], arrays['sma_slow']
+    pf, ps = _shift(cf), _shift(cs)
+    rsi = arrays['rsi']
+
+    with np.errstate(invalid='ignore'):
+        cross_up = (pf < ps) & (cf > cs)
+        cross_down = (pf > ps) & (cf < cs)
+
+        if base_strategy == "MOMENTUM":
+            if direction == "LONG":
+                open_mask, close_mask = cross_up, cross_down
+            elif direction == "SHORT":
+                open_mask, close_mask = cross_down, cross_up
+
+        elif base_strategy == "MEAN_REVERSAL":
+            oversold = (rsi < rsi_low) & (close < arrays['bb_lower'])
+            overbought = (rsi > rsi_high) & (close > arrays['bb_upper'])
+            if direction == "LONG":
+                open_mask, close_mask = oversold, overbought
+            elif direction == "SHORT":
+                open_mask, close_mask = overbought, oversold
+
+        elif base_strategy == "GRID":
+            top, bottom = arrays['grid_top'], arrays['grid_bottom']
+            buy_zone = bottom + (top - bottom) * th['grid_zone']
+            sell_zone = top - (top - bottom) * th['grid_zone']
+            if direction == "LONG":
+                open_mask, close_mask = close <= buy_zone, close >= sell_zone
+            elif direction == "SHORT":
+                open_mask, close_mask = close >= sell_zone, close <= buy_zone
+
+        elif base_strategy == "MULTITIMEFRAME":
+            ema = arrays['ema_200']
+            entry, exit_ = th['mtf_rsi_entry'], th['mtf_rsi_exit']
+            if direction == "LONG":
+                open_mask, close_mask = (close > ema) & (rsi < entry), rsi > exit_
+            elif direction == "SHORT":
+                open_mask, close_mask = (close < ema) & (rsi > 100 - entry), rsi < 100 - exit_
+
+        elif base_strategy == "MIX_STRATEGY":
+            if regimes is None:
+                regimes = market_regimes(arrays)[0]
+            ranging = regimes == REGIME_RANGING
+            if direction == "LONG":
+                trend = regimes == REGIME_UPTREND
+                open_mask = (trend & cross_up) | (ranging & (rsi < rsi_low))
+                close_mask = (trend & cross_down) | (ranging & (rsi > rsi_high)) | ~(trend | ranging)
+            elif direction == "SHORT":
+                trend = regimes == REGIME_DOWNTREND
+                open_mask = (trend & cross_down) | (ranging & (rsi > rsi_high))
+                close_mask = (trend & cross_up) | (ranging & (rsi < rsi_low)) | ~(trend | ranging)
+
+    signals = np.zeros(close.shape, dtype=np.int8)
+    signals[close_mask] = SIGNAL_CLOSE
+    signals[open_mask] = SIGNAL_OPEN
+    return signals
+
+
+def tradable_mask(arrays):
+    """Bars that pass the warmup guard (all key indicators non-NaN)."""
+    bad = np.zeros(arrays['close'].shape, dtype=bool)
+    for col in WARMUP_COLUMNS:
+        bad |= np.isnan(arrays[col])
+    return ~bad
+
+
+# ============================================================
+# 4. POSITION / DRAWDOWN STATE MACHINE
+# ============================================================
+def simulate(arrays, signals, tradable, direction, initial_capital,
+             use_risk_mm=False, max_porto_dd=1.0, risk_per_trade=1.0, resume=None):
+    """
+    Run the execution state machine over precomputed arrays.
+
+    Only bars where a signal can actually change the position are visited
+    one by one; between them the position is constant, so the equity curve
+    and the drawdown guard are evaluated as array slices.
+
+    resume: optional state returned by an earlier call on a prefix of the
+    same arrays (see resume_state). Bars before resume['bars'] are not
+    re-simulated; their markers and trades are carried over and their
+    equity is rebuilt from the state segments.
+
+    Returns dict with markers, trades (TradeLog), equity_time, equity_value,
+    capital, position_size, entry_price, peak_capital, is_blown_up, bars and
+    segments: [bar, capital, position_size] from every bar where the
+    mark-to-market state changed (one per execution, plus the start).
+    """
+    close = arrays['close']
+    times = arrays['time']
+    n = len(close)
+
+    exec_open = np.flatnonzero(tradable & (signals == SIGNAL_OPEN))
+    exec_close = np.flatnonzero(tradable & (signals == SIGNAL_CLOSE))
+    no_events = exec_open[:0]
+
+    capital = initial_capital
+    peak_capital = capital
+    position_size = 0
+    entry_price = 0
+    is_blown_up = False
+
+    markers = []
+    trade_pnl = []
+    trade_reason = []
+    equity = np.empty(max(n - 1, 0), dtype=np.float64)  # bars 1..n-1
+    segments = [[1, capital, position_size]]
+
+    i = 1
+    if resume is not None:
+        i = int(resume['bars'])
+        capital = resume['capital']
+        peak_capital = resume['peak_capital']
+        position_size = resume['position_size']
+        entry_price = resume['entry_price']
+        is_blown_up = resume['is_blown_up']
+        markers = list(resume['markers'])
+        for t in resume['trades']:
+            trade_pnl.append(t['pnl_pct'])
+            trade_reason.append(t['reason'])
+        segments = [list(seg) for seg in resume['segments']]
+        _rebuild_equity(equity, close, segments, i)
+        if is_blown_up:
+            # Loop lama berhenti total setelah MAX_DD; equity dibekukan
+            equity[i - 1:] = capital
+            i = n
+
+    while i < n:
+        # Next bar where the current state can act on a signal. A position
+        # with the wrong sign (SHORT sized off negative capital) can never exit.
+        if position_size == 0:
+            candidates = exec_open
+        elif (direction == "LONG" and position_size > 0) or (direction == "SHORT" and position_size < 0):
+            candidates = exec_close
+        else:
+            candidates = no_events
+        k = np.searchsorted(candidates, i)
+        j = int(candidates[k]) if k < len(candidates) else n  # n = no more events
+        seg_end = min(j, n - 1)                                # inclusive for DD check
+
+        # --- MAX DRAWDOWN GUARD over [i, seg_end] ---
+        if use_risk_mm:
+            seg = close[i:seg_end + 1]
+            if position_size == 0:
+                mtm = np.full(len(seg), capital, dtype=np.float64)
+            elif position_size > 0:
+                mtm = position_size * seg + capital
+            else:
+                mtm = position_size * seg
+            peaks = np.fmax.accumulate(np.concatenate(([peak_capital], mtm)))[1:]
+            with np.errstate(invalid='ignore', divide='ignore'):
+                dd = np.where(peaks > 0, (peaks - mtm) / np.where(peaks > 0, peaks, 1.0), 0.0)
+            hit = np.flatnonzero(dd >= max_porto_dd)
+            if len(hit):
+                b = i + int(hit[0])
+                peak_capital = float(peaks[hit[0]])
+                _fill_equity(equity, close, i, b, capital, position_size)
+                if position_size > 0:
+                    c = float(close[b])
+                    capital += position_size * c
+                    trade_pnl.append((c - entry_price) / entry_price)
+                    trade_reason.append('MAX_DD_HIT')
+                    position_size = 0
+                    markers.append({'time': int(times[b]), **MARKER_STOP})
+                is_blown_up = True
+                equity[b - 1:] = capital
+                segments.append([b, capital, 0])
+                break
+            peak_capital = float(peaks[-1])
+
+        # --- EQUITY between events ---
+        _fill_equity(equity, close, i, j if j < n else n, capital, position_size)
+        if j >= n:
+            break
+
+        # --- EXECUTION at bar j ---
+        c = float(close[j])
+        ts = int(times[j])
+        if direction == "LONG":
+            if position_size == 0:
+                if use_risk_mm:
+                    position_value = _risk_position_value(capital, risk_per_trade, float(arrays['atr'][j]), c)
+                else:
+                    position_value = capital
+                entry_cost = position_value * ROUND_TRIP_COST
+                actual_invest = position_value - entry_cost
+                position_size = actual_invest / c
+                capital -= position_value
+                entry_price = c
+                markers.append({'time': ts, **MARKER_BUY})
+            else:
+                sell_gross = position_size * c
+                exit_cost = sell_gross * ROUND_TRIP_COST
+                capital += sell_gross - exit_cost
+                trade_pnl.append((c - entry_price) / entry_price)
+                trade_reason.append('SIGNAL')
+                position_size = 0
+                markers.append({'time': ts, **MARKER_SELL})
+        elif direction == "SHORT":
+            if position_size == 0:
+                if use_risk_mm:
+                    position_value = _risk_position_value(capital, risk_per_trade, float(arrays['atr'][j]), c)
+                    size_to_short = position_value / c
+                else:
+                    size_to_short = capital / c
+                position_size = -size_to_short
+                short_proceed = size_to_short * c
+                entry_cost = short_proceed * ROUND_TRIP_COST
+                capital += (short_proceed - entry_cost)
+                entry_price = c
+                markers.append({'time': ts, **MARKER_SHORT})
+            else:
+                size_to_cover = abs(position_size)
+                cost_to_cover = size_to_cover * c
+                exit_cost = cost_to_cover * ROUND_TRIP_COST
+                capital -= (cost_to_cover + exit_cost)
+                trade_pnl.append((entry_price - c) / entry_price)
+                trade_reason.append('SIGNAL')
+                position_size = 0
+                markers.append({'time': ts, **MARKER_COVER})
+
+        equity[j - 1] = capital + (position_size * c)
+        segments.append([j, capital, position_size])
+        i = j + 1
+
+    return {
+        'markers': markers,
+        'trades': TradeLog(trade_pnl, trade_reason),
+        'equity_time': times[1:],
+        'equity_value': equity,
+        'capital': capital,
+        'position_size': position_size,
+        'entry_price': entry_price,
+        'peak_capital': peak_capital,
+        'is_blown_up': is_blown_up,
+        'bars': n,
+        'segments': segments,
+    }
+
+
+def resume_state(sim):
+    """Subset of a simulate() result needed to continue it on appended bars."""
+    state = {k: sim[k] for k in ('bars', 'capital', 'position_size', 'entry_price',
+                                 'peak_capital', 'is_blown_up', 'markers', 'segments')}
+    state['trades'] = sim['trades'].to_records()
+    return state
+
+
+def _risk_position_value(capital, risk_per_trade, atr, price):
+    """ATR-based sizing used by the _PRO strategies."""
+    sl_dist = atr * 1.5
+    risk_amount = capital * risk_per_trade
+    if sl_dist > 0:
+        position_value = risk_amount / (sl_dist / price)
+        return min(position_value, capital)
+    return capital
+
+
+def _fill_equity(equity, close, start, stop, capital, position_size):
+    """Write mark-to-market equity for bars [start, stop) into equity[start-1:stop-1]."""
+    if stop <= start:
+        return
+    if position_size == 0:
+        equity[start - 1:stop - 1] = capital
+    else:
+        equity[start - 1:stop - 1] = capital + position_size * close[start:stop]
+
+
+def _rebuild_equity(equity, close, segments, stop):
+    """Equity of bars [1, stop) from state segments, with the same arithmetic as the simulation."""
+    for k, (start, capital, position_size) in enumerate(segments):
+        end = segments[k + 1][0] if k + 1 < len(segments) else stop
+        _fill_equity(equity, close, start, min(end, stop), capital, position_size)
+
+
+def equity_curve(sim):
+    """Equity curve of a simulate() result as a columnar EquityCurve (no per-bar dicts)."""
+    return EquityCurve(sim['equity_time'], sim['equity_value'])
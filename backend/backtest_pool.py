@@ -0,0 +1,250 @@
+# backend/backtest_pool.py
+"""
+Process-pool executor for TradingEngine.run_backtest_batch.
+
+The scanner runs fetch_data (network + SQLite) on threads, which is fine,
+but the backtests themselves are CPU-bound Python/pandas work; on threads
+they mostly wait for the GIL. This pool moves the batches into worker
+processes:
+
+  - OHLCV is handed over as a shared-memory float64 block (timestamp, open,
+    high, low, close, volume) instead of a pickled DataFrame.
+  - Frames from fetch_data(period="max") carry df.attrs['series_key']: their
+    indicators are prepared here in the parent through indicator_store (only
+    new candles are computed) and shipped as extra columns of the block, so
+    workers do not recompute the full history on every batch.
+  - Each worker keeps one TradingEngine and runs run_backtest_batch on it.
+  - Only compact metrics come back (trades_list is dropped).
+
+Config:
+  BACKTEST_WORKERS  number of worker processes (default: CPU count - 1).
+                    0 runs every batch inline on the caller's engine.
+
+Usage:
+  from backtest_pool import backtest_pool
+  results = backtest_pool.run_batch(engine, df_raw, strategies, periods, ["LONG"])
+  backtest_pool.report()   # throughput in symbols/sec
+"""
+
+import os
+import time
+import threading
+import multiprocessing as mp
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import shared_memory
+
+import numpy as np
+import pandas as pd
+
+from indicator_store import INDICATOR_COLUMNS
+
+OHLCV_COLUMNS = ('timestamp', 'open', 'high', 'low', 'close', 'volume')
+
+
+def default_workers():
+    """Worker count from BACKTEST_WORKERS, else CPU count - 1 (min 1)."""
+    env = os.getenv("BACKTEST_WORKERS")
+    if env not in (None, ""):
+        try:
+            return max(0, int(env))
+        except ValueError:
+            print(f"[WARN] [POOL] Invalid BACKTEST_WORKERS={env!r}, using default")
+    return max(1, (os.cpu_count() or 2) - 1)
+
+
+# ============================================================
+# SHARED MEMORY TRANSPORT
+# ============================================================
+def frame_to_shared(df, columns=OHLCV_COLUMNS):
+    """Copy `columns` (OHLCV first) into a new shared-memory block. Caller must close+unlink."""
+    n = len(df)
+    shm = shared_memory.SharedMemory(create=True, size=max(n * len(columns) * 8, 8))
+    buf = np.ndarray((n, len(columns)), dtype=np.float64, buffer=shm.buf)
+    buf[:, 0] = df['timestamp'].to_numpy(dtype=np.int64)  # ms epoch < 2^53, exact in float64
+    for j, col in enumerate(columns[1:], start=1):
+        buf[:, j] = df[col].to_numpy(dtype=np.float64)
+    del buf  # release the export before the block can be closed
+    return shm
+
+
+def frame_from_shared(shm_name, n_rows, columns=OHLCV_COLUMNS):
+    """
+    Rebuild the fetch_data frame layout (timestamp, OHLCV, time) from a shared
+    block. With indicator columns included the frame is marked
+    attrs['indicators_ready'], so prepare_indicators keeps them.
+    """
+    shm = shared_memory.SharedMemory(name=shm_name)
+    try:
+        buf = np.ndarray((n_rows, len(columns)), dtype=np.float64, buffer=shm.buf)
+        df = pd.DataFrame(buf.copy(), columns=list(columns))
+        del buf
+    finally:
+        shm.close()
+    df['timestamp'] = df['timestamp'].astype(np.int64)
+    df['time'] = pd.to_datetime(df['timestamp'], unit='ms')
+    if len(columns) > len(OHLCV_COLUMNS):
+        df.attrs['indicators_ready'] = True
+    return df
+
+
+def shared_columns(engine, df_raw):
+    """
+    (frame, columns) to ship: frames with a series_key get their indicators
+    from the parent's indicator_store (incremental); others ship OHLCV only
+    and the worker computes indicators itself.
+    """
+    if df_raw.attrs.get('series_key') is None or len(df_raw) < 50:
+        return df_raw, OHLCV_COLUMNS
+    df = engine.prepare_indicators(df_raw.copy(deep=False))
+    return df, OHLCV_COLUMNS + INDICATOR_COLUMNS
+
+
+# ============================================================
+# WORKER SIDE
+# ============================================================
+_worker_engine = None
+
+
+def _get_worker_engine():
+    global _worker_engine
+    if _worker_engine is None:
+        from strategy_core import TradingEngine
+        _worker_engine = TradingEngine()
+    return _worker_engine
+
+
+def compact_metrics(metrics):
+    """Metrics without the per-trade list (not needed by the scanner)."""
+    return {k: v for k, v in metrics.items() if k != 'trades_list'}
+
+
+def _worker_run_batch(shm_name, n_rows, columns, strategies, periods, directions, interval,
+                      start_date, end_date, initial_capital):
+    df = frame_from_shared(shm_name, n_rows, columns)
+    engine = _get_worker_engine()
+    engine.initial_capital = float(initial_capital)
+    results = engine.run_backtest_batch(df, strategies, periods, directions=directions, interval=interval,
+                                        start_date=start_date, end_date=end_date)
+    return {key: compact_metrics(m) for key, m in results.items()}
+
+
+# ============================================================
+# POOL
+# ============================================================
+class BacktestPool:
+    def __init__(self, workers=None):
+        self.workers = default_workers() if workers is None else max(0, int(workers))
+        self._executor = None
+        self._lock = threading.Lock()
+        self.reset_stats()
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                # spawn: the API process runs scheduler/executor threads, fork is not safe there
+                self._executor = ProcessPoolExecutor(max_workers=self.workers,
+                                                     mp_context=mp.get_context("spawn"))
+                print(f"[POOL] Backtest pool started with {self.workers} worker process(es)")
+            return self._executor
+
+    def run_batch(self, engine, df_raw, strategies, periods, directions=("LONG",), interval="1d",
+                  start_date=None, end_date=None):
+        """
+        Same contract as engine.run_backtest_batch (compact metrics), executed in a worker.
+        Falls back to the caller's engine when the pool is disabled or broken.
+        """
+        t0 = time.time()
+        results = None
+        if self.workers > 0 and df_raw is not None and len(df_raw) > 0:
+            df_ship, columns = shared_columns(engine, df_raw)
+            shm = frame_to_shared(df_ship, columns)
+            try:
+                future = self._get_executor().submit(
+                    _worker_run_batch, shm.name, len(df_raw), columns, list(strategies), list(periods),
+                    tuple(directions), interval, start_date, end_date, engine.initial_capital
+                )
+                results = future.result()
+            except BrokenProcessPool as e:
+                print(f"[WARN] [POOL] Worker pool broken ({e}), running inline")
+                with self._lock:
+                    self._executor = None
+            finally:
+                shm.close()
+                shm.unlink()
+
+        if results is None:
+            results = {key: compact_metrics(m) for key, m in engine.run_backtest_batch(
+                df_raw, strategies, periods, directions=directions, interval=interval,
+                start_date=start_date, end_date=end_date).items()}
+
+        with self._lock:
+            self._stats['batches'] += 1
+            self._stats['backtests'] += len(results)
+            self._stats['busy_seconds'] += time.time() - t0
+            if self._stats['started_at'] is None:
+                self._stats['started_at'] = t0
+            self._stats['finished_at'] = time.time()
+        return results
+
+    def record_symbol(self):
+        """Dipanggil scanner setelah satu simbol selesai (semua timeframe)."""
+        with self._lock:
+            self._stats['symbols'] += 1
+            self._stats['finished_at'] = time.time()
+
+    def reset_stats(self):
+        with self._lock:
+            self._stats = {'symbols': 0, 'batches': 0, 'backtests': 0, 'busy_seconds': 0.0,
+                           'started_at': None, 'finished_at': None}
+
+    def report(self):
+        """Throughput since the last reset_stats()."""
+        with self._lock:
+            s = dict(self._stats)
+        elapsed = (s['finished_at'] - s['started_at']) if s['started_at'] else 0.0
+        return {
+            "workers": self.workers,
+            "symbols": s['symbols'],
+            "batches": s['batches'],
+            "backtests": s['backtests'],
+            "elapsed_sec": round(elapsed, 2),
+            "symbols_per_sec": round(s['symbols'] / elapsed, 3) if elapsed > 0 else 0.0,
+            "backtests_per_sec": round(s['backtests'] / elapsed, 2) if elapsed > 0 else 0.0,
+        }
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=True, cancel_futures=True)
+                self._executor = None
+
+
+# Singleton dipakai bersama oleh scanner (main.py)
+backtest_pool = BacktestPool()
+
+
+if __name__ == "__main__":
+    import sys
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    from strategy_core import TradingEngine
+
+    # Demo: synthetic random walk, inline vs pool
+    rng = np.random.default_rng(42)
+    n = 5000
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.01, n)))
+    ts = 1_600_000_000_000 + np.arange(n, dtype=np.int64) * 3_600_000
+    df = pd.DataFrame({
+        'timestamp': ts, 'open': close, 'high': close * 1.005,
+        'low': close * 0.995, 'close': close, 'volume': 1.0,
+    })
+    df['time'] = pd.to_datetime(df['timestamp'], unit='ms')
+
+    engine = TradingEngine()
+    strategies = ["MOMENTUM", "MEAN_REVERSAL", "GRID", "MULTITIMEFRAME", "MIX_STRATEGY"]
+    pool = BacktestPool()
+    for i in range(4):
+        pool.run_batch(engine, df, strategies, ["max"], ["LONG", "SHORT"], interval="1h")
+        pool.record_symbol()
+    print(f"[POOL] {pool.report()}")
+    pool.shutdown()
@@ -0,0 +1,110 @@
+# backend/backtest_result.py
+"""
+Columnar containers for backtest output.
+
+run_backtest used to build one dict per bar for the equity curve and one
+dict per trade, and every consumer (calculate_metrics, the consistency
+score, the scanner) turned them straight back into arrays. These classes
+keep the columns as NumPy arrays instead:
+
+  - EquityCurve: time (int64 epoch seconds) + value (float64)
+  - TradeLog:    pnl_pct (float64) + reason
+
+Both still behave like the old lists (len, indexing, iteration yield the
+same {'time', 'value'} / {'pnl_pct', 'reason'} dicts), so existing callers
+keep working. The list-of-dicts form is only built when an endpoint
+serializes the result — call to_records() or materialize() there.
+"""
+
+from collections.abc import Sequence
+
+import numpy as np
+
+
+class EquityCurve(Sequence):
+    """Equity curve as two aligned arrays."""
+    __slots__ = ('time', 'value')
+
+    def __init__(self, time=(), value=()):
+        self.time = np.asarray(time, dtype=np.int64)
+        self.value = np.asarray(value, dtype=np.float64)
+
+    @classmethod
+    def from_records(cls, records):
+        if isinstance(records, cls):
+            return records
+        return cls([r['time'] for r in records], [r['value'] for r in records])
+
+    def __len__(self):
+        return len(self.value)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return EquityCurve(self.time[i], self.value[i])
+        return {'time': int(self.time[i]), 'value': float(self.value[i])}
+
+    def __iter__(self):
+        return iter(self.to_records())
+
+    def __eq__(self, other):
+        if isinstance(other, EquityCurve):
+            return np.array_equal(self.time, other.time) and np.array_equal(self.value, other.value)
+        if isinstance(other, list):
+            return self.to_records() == other
+        return NotImplemented
+
+    def __repr__(self):
+        return f"EquityCurve(len={len(self)})"
+
+    def to_records(self):
+        return [{'time': t, 'value': v} for t, v in zip(self.time.tolist(), self.value.tolist())]
+
+
+class TradeLog(Sequence):
+    """Closed trades as columns: pnl_pct (fraction) and exit reason."""
+    __slots__ = ('pnl_pct', 'reason')
+
+    def __init__(self, pnl_pct=(), reason=()):
+        self.pnl_pct = np.asarray(pnl_pct, dtype=np.float64)
+        self.reason = list(reason)
+
+    @classmethod
+    def from_records(cls, records):
+        if isinstance(records, cls):
+            return records
+        return cls([r['pnl_pct'] for r in records], [r.get('reason', 'SIGNAL') for r in records])
+
+    def __len__(self):
+        return len(self.pnl_pct)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return TradeLog(self.pnl_pct[i], self.reason[i])
+        return {'pnl_pct': float(self.pnl_pct[i]), 'reason': self.reason[i]}
+
+    def __iter__(self):
+        return iter(self.to_records())
+
+    def __eq__(self, other):
+        if isinstance(other, TradeLog):
+            return np.array_equal(self.pnl_pct, other.pnl_pct) and self.reason == other.reason
+        if isinstance(other, list):
+            return self.to_records() == other
+        return NotImplemented
+
+    def __repr__(self):
+        return f"TradeLog(len={len(self)})"
+
+    def to_records(self):
+        return [{'pnl_pct': p, 'reason': r} for p, r in zip(self.pnl_pct.tolist(), self.reason)]
+
+
+def materialize(obj):
+    """Replace EquityCurve / TradeLog (also nested in dicts/lists) with their JSON list form."""
+    if isinstance(obj, (EquityCurve, TradeLog)):
+        return obj.to_records()
+    if isinstance(obj, dict):
+        return {k: materialize(v) for k, v in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return [materialize(v) for v in obj]
+    return obj
@@ -0,0 +1,17 @@
+# backend/benchmarks/__init__.py
+"""
+Offline performance benchmarks for the backend engines.
+
+  synthetic.py       deterministic OHLCV (GBM + regime switches), trade lists
+                     and a fake exchange for the anomaly detectors
+  run_benchmarks.py  times the engines and writes a JSON report
+  golden.py          reference-vs-candidate equivalence harness (loop vs
+                     vector / checkpoint / batch / pool backtests, full vs
+                     incremental indicators, CRV-BOT backtest) over the
+                     recorded OHLCV fixtures in fixtures/
+
+Run from backend/:
+  python -m benchmarks.run_benchmarks --sizes 1000,10000 --out bench.json
+  python -m benchmarks.run_benchmarks --compare old.json --out new.json
+  python -m benchmarks.golden check --out golden.json
+"""
@@ -0,0 +1,681 @@
+# backend/benchmarks/golden.py
+"""
+Golden-output equivalence harness: reference vs candidate implementations.
+
+Strategy selection depends on exact trade counts and metrics, so a faster
+path (vector kernel, incremental indicators, checkpoint resume, process
+pool) may only replace the original one if it produces the same output on
+the same candles. This harness runs both over a recorded corpus of OHLCV
+fixtures and diffs everything they produce.
+
+Targets:
+  indicators  TradingEngine._compute_indicators (full pandas) vs
+              candidate "incremental" (indicator_store, candles appended
+              in chunks and then one by one)
+  backtest    TradingEngine.run_backtest(engine="loop") vs candidates
+              "vector", "checkpoint" (resume after appended candles),
+              "batch" (run_backtest_batch) and "pool" (BacktestPool),
+              for every strategy x direction x period
+  crv         CRV-BOT backtest.run_backtest (compute_indicators + engine)
+              vs a candidate given with --crv-candidate module:function
+
+Every target also accepts a custom candidate "module:function" (or
+"path/to/file.py:function"); see the *_candidate docstrings for the
+expected signature.
+
+Diffed per case: markers / signals (exact), trades (count, pnl with
+tolerance, exit reason exact), equity per bar and metrics (numeric with
+tolerance, everything else exact). The report gives the first diverging
+bar (index + candle time) and the first few divergences per field.
+
+Fixtures are .npz files (timestamp ms + OHLCV + meta) in
+benchmarks/fixtures/. `record` writes the synthetic corpus and, with
+--from-db, real candles from market_data.db.
+
+Usage (from backend/):
+  python -m benchmarks.golden record
+  python -m benchmarks.golden record --from-db market_data.db --symbols BTC-USDT,ETH-USDT --timeframes 1h,4h
+  python -m benchmarks.golden check
+  python -m benchmarks.golden check --targets backtest --candidates vector,checkpoint,pool --out golden.json
+  python -m benchmarks.golden check --targets crv --crv-candidate my_fast_crv:run_backtest
+"""
+
+import argparse
+import contextlib
+import importlib
+import importlib.util
+import io
+import json
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
+
+from benchmarks.synthetic import generate_ohlcv  # noqa: E402
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+CRV_BACKTEST_PATH = os.path.join(os.path.dirname(BACKEND_DIR), "CRV-BOT", "backtest.py")
+
+STRATEGIES = [
+    "MOMENTUM", "MEAN_REVERSAL", "GRID", "MULTITIMEFRAME",
+    "MOMENTUM_PRO", "MEAN_REVERSAL_PRO", "GRID_PRO", "MULTITIMEFRAME_PRO",
+    "MIX_STRATEGY", "MIX_STRATEGY_PRO"
+]
+DIRECTIONS = ["LONG", "SHORT"]
+OHLCV_COLUMNS = ['timestamp', 'open', 'high', 'low', 'close', 'volume']
+
+# (name, bars, seed, timeframe, variant)
+SYNTHETIC_CORPUS = [
+    ("syn_1h_s1", 3000, 1, "1h", None),
+    ("syn_4h_s7", 2190, 7, "4h", None),
+    ("syn_1d_s42", 1500, 42, "1d", None),
+    ("syn_15m_s3", 4000, 3, "15m", None),
+    ("syn_1h_flat_s5", 2000, 5, "1h", "flat"),  # flat segment: std=0, RSI 0/0
+]
+
+
+# ============================================================
+# 1. FIXTURES
+# ============================================================
+def synthetic_fixture(n_bars, seed, timeframe, variant=None):
+    """Synthetic OHLCV; variant 'flat' freezes price for 120 bars in the middle."""
+    df = generate_ohlcv(n_bars, seed=seed, timeframe=timeframe)
+    if variant == "flat":
+        mid = n_bars // 2
+        price = df.at[mid, 'close']
+        for col in ('open', 'high', 'low', 'close'):
+            df.loc[mid:mid + 119, col] = price
+    return df[OHLCV_COLUMNS]
+
+
+def save_fixture(path, df, meta):
+    np.savez_compressed(
+        path,
+        timestamp=df['timestamp'].to_numpy(dtype=np.int64),
+        ohlcv=df[OHLCV_COLUMNS[1:]].to_numpy(dtype=np.float64),
+        meta=np.array(json.dumps(meta)),
+    )
+
+
+def load_fixture(path):
+    """Returns (name, meta, df) with df in the fetch_data layout (timestamp ms, OHLCV, time)."""
+    with np.load(path) as data:
+        meta = json.loads(str(data['meta']))
+        df = pd.DataFrame(data['ohlcv'], columns=OHLCV_COLUMNS[1:])
+        df.insert(0, 'timestamp', data['timestamp'])
+    df['time'] = pd.to_datetime(df['timestamp'], unit='ms')
+    return os.path.splitext(os.path.basename(path))[0], meta, df
+
+
+def load_corpus(fixtures_dir, names=None):
+    """All fixtures in fixtures_dir (or the in-memory synthetic corpus if none are recorded)."""
+    paths = sorted(
+        os.path.join(fixtures_dir, f) for f in os.listdir(fixtures_dir) if f.endswith(".npz")
+    ) if os.path.isdir(fixtures_dir) else []
+
+    corpus = []
+    if paths:
+        for path in paths:
+            corpus.append(load_fixture(path))
+    else:
+        print(f"[WARN] [GOLDEN] No fixtures in {fixtures_dir}, using the in-memory synthetic corpus "
+              f"(run `python -m benchmarks.golden record` to pin it)")
+        for name, n, seed, tf, variant in SYNTHETIC_CORPUS:
+            df = synthetic_fixture(n, seed, tf, variant)
+            df['time'] = pd.to_datetime(df['timestamp'], unit='ms')
+            corpus.append((name, {"source": "synthetic", "timeframe": tf, "seed": seed, "variant": variant}, df))
+
+    if names:
+        corpus = [c for c in corpus if c[0] in names]
+    return corpus
+
+
+def record(args):
+    os.makedirs(args.fixtures, exist_ok=True)
+    written = 0
+
+    if not args.no_synthetic:
+        for name, n, seed, tf, variant in SYNTHETIC_CORPUS:
+            df = synthetic_fixture(n, seed, tf, variant)
+            save_fixture(os.path.join(args.fixtures, f"{name}.npz"), df,
+                         {"source": "synthetic", "timeframe": tf, "seed": seed, "variant": variant})
+            print(f"[GOLDEN] Recorded {name}: {len(df)} bars ({tf})")
+            written += 1
+
+    if args.from_db:
+        conn = sqlite3.connect(args.from_db)
+        try:
+            for symbol in [s for s in (args.symbols or "").split(",") if s]:
+                for tf in args.timeframes.split(","):
+                    rows = conn.execute(
+                        "SELECT timestamp, open, high, low, close, volume FROM market_data "
+                        "WHERE symbol = ? AND timeframe = ? ORDER BY timestamp DESC LIMIT ?",
+                        (symbol, tf, args.limit)
+                    ).fetchall()
+                    if len(rows) < 250:
+                        print(f"[WARN] [GOLDEN] {symbol} {tf}: only {len(rows)} candles in DB, skipped")
+                        continue
+                    df = pd.DataFrame(rows[::-1], columns=OHLCV_COLUMNS)
+                    name = f"{symbol.replace('/', '-')}_{tf}".lower()
+                    save_fixture(os.path.join(args.fixtures, f"{name}.npz"), df,
+                                 {"source": "db", "symbol": symbol, "timeframe": tf})
+                    print(f"[GOLDEN] Recorded {name}: {len(df)} bars from {args.from_db}")
+                    written += 1
+        finally:
+            conn.close()
+
+    print(f"[GOLDEN] {written} fixture(s) in {args.fixtures}")
+
+
+# ============================================================
+# 2. DIFF HELPERS
+# ============================================================
+class Tolerance:
+    def __init__(self, rtol=1e-9, atol=1e-9, metric_rtol=0.0, metric_atol=1e-9):
+        self.rtol = rtol
+        self.atol = atol
+        self.metric_rtol = metric_rtol
+        self.metric_atol = metric_atol
+
+
+def _is_number(v):
+    return isinstance(v, (int, float, np.integer, np.floating)) and not isinstance(v, (bool, np.bool_))
+
+
+def values_match(a, b, rtol, atol):
+    """Numbers with tolerance (NaN == NaN, inf == inf), everything else exact."""
+    if _is_number(a) and _is_number(b):
+        return bool(np.isclose(float(a), float(b), rtol=rtol, atol=atol, equal_nan=True))
+    if isinstance(a, dict) and isinstance(b, dict):
+        return a.keys() == b.keys() and all(values_match(a[k], b[k], rtol, atol) for k in a)
+    try:
+        return bool(a == b)
+    except (TypeError, ValueError):
+        return False
+
+
+def _plain(v):
+    """JSON-friendly value for the report."""
+    if isinstance(v, (np.integer,)):
+        return int(v)
+    if isinstance(v, (float, np.floating)):
+        v = float(v)
+        return v if np.isfinite(v) else str(v)
+    if isinstance(v, pd.Timestamp):
+        return v.isoformat()
+    if isinstance(v, dict):
+        return {k: _plain(x) for k, x in v.items()}
+    if isinstance(v, (list, tuple)):
+        return [_plain(x) for x in v]
+    return v
+
+
+def first_numeric_divergence(ref, cand, rtol, atol):
+    """(index, ref, cand) of the first element outside tolerance (or length mismatch), else None."""
+    ref = np.asarray(ref, dtype=np.float64)
+    cand = np.asarray(cand, dtype=np.float64)
+    n = min(len(ref), len(cand))
+    ok = np.isclose(ref[:n], cand[:n], rtol=rtol, atol=atol, equal_nan=True)
+    if not ok.all():
+        i = int(np.argmin(ok))
+        return i, float(ref[i]), float(cand[i])
+    if len(ref) != len(cand):
+        return (n, float(ref[n]) if n < len(ref) else None, float(cand[n]) if n < len(cand) else None)
+    return None
+
+
+def first_record_divergence(ref, cand, rtol, atol):
+    """(index, ref, cand) of the first differing record in two lists, else None."""
+    n = min(len(ref), len(cand))
+    for i in range(n):
+        if not values_match(ref[i], cand[i], rtol, atol):
+            return i, ref[i], cand[i]
+    if len(ref) != len(cand):
+        return (n, ref[n] if n < len(ref) else None, cand[n] if n < len(cand) else None)
+    return None
+
+
+class CaseDiff:
+    """Collects divergences of one reference/candidate case."""
+
+    def __init__(self, bar_times):
+        # bar_times: candle open time per bar (datetime64 / Timestamp array) of the reference frame
+        self.bar_times = bar_times
+        self.divergences = []
+
+    def add(self, field, index, ref, cand, bar=None, note=None):
+        entry = {"field": field, "index": int(index), "bar": None if bar is None else int(bar),
+                 "time": None, "ref": _plain(ref), "cand": _plain(cand)}
+        if bar is not None and 0 <= bar < len(self.bar_times):
+            entry["time"] = pd.Timestamp(self.bar_times[bar]).isoformat()
+        if note:
+            entry["note"] = note
+        self.divergences.append(entry)
+
+    def numeric(self, field, ref, cand, rtol, atol, bars=None):
+        """Per-bar numeric series. bars maps series index -> bar index (default identity)."""
+        hit = first_numeric_divergence(ref, cand, rtol, atol)
+        if hit:
+            i, r, c = hit
+            bar = i if bars is None else (int(bars[min(i, len(bars) - 1)]) if len(bars) else None)
+            self.add(field, i, r, c, bar=bar, note=None if r is not None and c is not None else "length")
+
+    def records(self, field, ref, cand, rtol, atol, bar_of=None):
+        """Lists of records (markers, trades). bar_of(record) -> bar index or None."""
+        hit = first_record_divergence(ref, cand, rtol, atol)
+        if hit:
+            i, r, c = hit
+            bar = None
+            if bar_of is not None:
+                bars = [b for b in (bar_of(x) for x in (r, c) if x is not None) if b is not None]
+                bar = min(bars) if bars else None
+            note = f"count {len(ref)} vs {len(cand)}" if len(ref) != len(cand) else None
+            self.add(field, i, r, c, bar=bar, note=note)
+
+    def metrics(self, ref, cand, rtol, atol, skip=('trades_list',)):
+        keys = [k for k in dict.fromkeys(list(ref) + list(cand)) if k not in skip]
+        for i, key in enumerate(keys):
+            if key not in ref or key not in cand or not values_match(ref[key], cand[key], rtol, atol):
+                self.add(f"metrics.{key}", i, ref.get(key, "<missing>"), cand.get(key, "<missing>"))
+
+    def result(self, target, fixture, case, reference, candidate, max_divergences):
+        with_bar = [d for d in self.divergences if d["bar"] is not None]
+        first = min(with_bar, key=lambda d: d["bar"]) if with_bar else None
+        return {
+            "target": target,
+            "fixture": fixture,
+            "case": case,
+            "reference": reference,
+            "candidate": candidate,
+            "ok": not self.divergences,
+            "first_bar": first["bar"] if first else None,
+            "first_time": first["time"] if first else None,
+            "divergences": self.divergences[:max_divergences],
+        }
+
+
+def resolve_callable(spec):
+    """'module:function' or 'path/to/file.py:function' -> callable."""
+    target, _, attr = spec.rpartition(":")
+    if not target or not attr:
+        raise ValueError(f"Candidate spec must be module:function, got {spec!r}")
+    if target.endswith(".py"):
+        mod_name = "golden_candidate_" + os.path.splitext(os.path.basename(target))[0]
+        loader_spec = importlib.util.spec_from_file_location(mod_name, os.path.abspath(target))
+        module = importlib.util.module_from_spec(loader_spec)
+        loader_spec.loader.exec_module(module)
+    else:
+        module = importlib.import_module(target)
+    return getattr(module, attr)
+
+
+@contextlib.contextmanager
+def quiet():
+    with contextlib.redirect_stdout(io.StringIO()):
+        yield
+
+
+# ============================================================
+# 3. TARGET: INDICATORS
+# ============================================================
+def indicators_incremental(engine, df, tail=64):
+    """
+    Candidate: indicator_store fed the way fetch_data feeds it in production -
+    first half of the history, one jump to n - tail, then one candle at a time.
+    """
+    from indicator_store import IndicatorStore
+    store = IndicatorStore()
+    key = ("GOLDEN", "ind")
+    n = len(df)
+    steps = [n // 2, max(n // 2, n - tail)] + list(range(max(n // 2, n - tail) + 1, n + 1))
+    out = None
+    for stop in dict.fromkeys(steps):
+        out = store.apply(key, df.iloc[:stop].copy(), engine._compute_indicators)
+    return out
+
+
+def check_indicators(engine, corpus, args, tol):
+    """
+    Custom candidate (--indicator-candidate): fn(engine, df) -> df with the
+    indicator columns of TradingEngine._compute_indicators.
+    """
+    from indicator_store import INDICATOR_COLUMNS
+    candidates = {"incremental": lambda df: indicators_incremental(engine, df)}
+    if args.indicator_candidate:
+        fn = resolve_callable(args.indicator_candidate)
+        candidates[args.indicator_candidate] = lambda df: fn(engine, df)
+
+    results = []
+    for name, meta, df in corpus:
+        ref = engine._compute_indicators(df.copy())
+        for cand_name, run in candidates.items():
+            with quiet():
+                cand = run(df.copy())
+            diff = CaseDiff(df['time'].to_numpy())
+            for col in INDICATOR_COLUMNS:
+                if col not in cand.columns:
+                    diff.add(col, 0, "<column>", "<missing>")
+                    continue
+                diff.numeric(col, pd.to_numeric(ref[col]).to_numpy(dtype=np.float64),
+                             pd.to_numeric(cand[col]).to_numpy(dtype=np.float64), tol.rtol, tol.atol)
+            results.append(diff.result("indicators", name, {}, "_compute_indicators", cand_name,
+                                       args.max_divergences))
+    return results
+
+
+# ============================================================
+# 4. TARGET: RUN_BACKTEST
+# ============================================================
+def _normalize_backtest(out):
+    """run_backtest tuple or metrics dict -> {'frame', 'markers', 'trades', 'equity', 'metrics'}."""
+    from backtest_result import EquityCurve, TradeLog
+    if isinstance(out, dict):
+        trades = out.get('trades_list')
+        return {"frame": None, "markers": None, "equity": None, "metrics": out,
+                "trades": TradeLog.from_records(trades) if trades is not None else None}
+    df, markers, metrics, equity = out
+    return {"frame": df, "markers": list(markers), "metrics": metrics,
+            "trades": TradeLog.from_records(metrics.get('trades_list', [])),
+            "equity": EquityCurve.from_records(equity)}
+
+
+def _run_single(trading_engine, df, cases, interval, **kwargs):
+    out = {}
+    for strat, direction, period in cases:
+        out[(strat, direction, period)] = _normalize_backtest(trading_engine.run_backtest(
+            df, strat, requested_period=period, direction=direction, interval=interval, **kwargs))
+    return out
+
+
+def backtest_checkpoint(engine, df, cases, interval, fixture, tail=25):
+    """Candidate: vector engine resumed from a checkpoint saved before the last `tail` candles."""
+    key = (f"GOLDEN-{fixture}", interval)
+    prefix = df.iloc[:len(df) - tail].copy()
+    for strat, direction, period in cases:
+        engine.run_backtest(prefix, strat, requested_period=period, direction=direction,
+                            interval=interval, checkpoint_key=key)
+    return _run_single(engine, df, cases, interval, checkpoint_key=key)
+
+
+def backtest_batch(engine, df, cases, interval, runner):
+    strategies = list(dict.fromkeys(c[0] for c in cases))
+    directions = list(dict.fromkeys(c[1] for c in cases))
+    periods = list(dict.fromkeys(c[2] for c in cases))
+    results = runner(engine, df, strategies, periods, directions=directions, interval=interval)
+    return {(s, d, p): _normalize_backtest(results[(p, s, d)]) for s, d, p in cases}
+
+
+def check_backtest(engine, corpus, args, tol):
+    """
+    Custom candidate (--backtest-candidate):
+    fn(engine, df_raw, strategy, period, direction, interval) -> run_backtest
+    tuple (df, markers, metrics, equity_curve) or a metrics dict.
+    """
+    strategies = args.strategies.split(",") if args.strategies else STRATEGIES
+    directions = args.directions.split(",")
+    periods = args.periods.split(",")
+    cases = [(s, d, p) for s in strategies for d in directions for p in periods]
+
+    pool = None
+    runners = {}
+    for cand in args.candidates.split(","):
+        if cand == "vector":
+            runners[cand] = lambda df, name: _run_single(engine, df, cases, name[1], engine="vector")
+        elif cand == "checkpoint":
+            runners[cand] = lambda df, name: backtest_checkpoint(engine, df, cases, name[1], name[0])
+        elif cand == "batch":
+            runners[cand] = lambda df, name: backtest_batch(engine, df, cases, name[1],
+                                                            type(engine).run_backtest_batch)
+        elif cand == "pool":
+            from backtest_pool import BacktestPool
+            pool = BacktestPool(workers=max(1, args.workers))
+            runners[cand] = lambda df, name: backtest_batch(
+                engine, df, cases, name[1], lambda eng, *a, **kw: pool.run_batch(eng, *a, **kw))
+        elif cand:
+            raise ValueError(f"Unknown backtest candidate {cand!r} (vector, checkpoint, batch, pool)")
+    if args.backtest_candidate:
+        fn = resolve_callable(args.backtest_candidate)
+        runners[args.backtest_candidate] = lambda df, name: {
+            (s, d, p): _normalize_backtest(fn(engine, df, s, p, d, name[1])) for s, d, p in cases}
+
+    results = []
+    try:
+        for name, meta, df in corpus:
+            interval = meta.get("timeframe", "1h")
+            with quiet():
+                ref_all = _run_single(engine, df, cases, interval, engine="loop")
+            for cand_name, runner in runners.items():
+                t0 = time.perf_counter()
+                with quiet():
+                    cand_all = runner(df, (name, interval))
+                elapsed = time.perf_counter() - t0
+                for case in cases:
+                    results.append(diff_backtest(ref_all[case], cand_all[case], tol, args, name, case,
+                                                 cand_name))
+                ok = sum(r["ok"] for r in results[-len(cases):])
+                print(f"[GOLDEN] backtest {name:<20} {cand_name:<12} {ok}/{len(cases)} equal ({elapsed:.2f}s)")
+    finally:
+        if pool is not None:
+            pool.shutdown()
+    return results
+
+
+def diff_backtest(ref, cand, tol, args, fixture, case, cand_name):
+    from backtest_kernel import time_to_epoch_seconds
+    frame = ref["frame"]
+    bar_secs = time_to_epoch_seconds(frame['time']) if frame is not None and len(frame) else np.array([], np.int64)
+    diff = CaseDiff(frame['time'].to_numpy() if frame is not None else np.array([]))
+
+    def bar_of_marker(m):
+        if not isinstance(m, dict) or 'time' not in m or not len(bar_secs):
+            return None
+        return int(np.searchsorted(bar_secs, m['time']))
+
+    if cand["markers"] is not None:
+        diff.records("markers", ref["markers"], cand["markers"], tol.rtol, tol.atol, bar_of=bar_of_marker)
+    if cand["trades"] is not None:
+        # Trades carry no time: reported by trade index, the markers locate the bar
+        hit = first_numeric_divergence(ref["trades"].pnl_pct, cand["trades"].pnl_pct, tol.rtol, tol.atol)
+        if hit:
+            diff.add("trades.pnl_pct", *hit, note=f"count {len(ref['trades'])} vs {len(cand['trades'])}")
+        hit = first_record_divergence(ref["trades"].reason, cand["trades"].reason, 0, 0)
+        if hit:
+            diff.add("trades.reason", *hit)
+    if cand["equity"] is not None:
+        eq_bars = np.searchsorted(bar_secs, ref["equity"].time) if len(bar_secs) else []
+        hit = first_numeric_divergence(ref["equity"].time, cand["equity"].time, 0, 0)
+        if hit:
+            i = hit[0]
+            diff.add("equity.time", i, hit[1], hit[2], bar=int(eq_bars[i]) if i < len(eq_bars) else None)
+        diff.numeric("equity.value", ref["equity"].value, cand["equity"].value, tol.rtol, tol.atol, bars=eq_bars)
+    diff.metrics(ref["metrics"], cand["metrics"], tol.metric_rtol, tol.metric_atol)
+
+    strat, direction, period = case
+    return diff.result("backtest", fixture, {"strategy": strat, "direction": direction, "period": period},
+                       "loop", cand_name, args.max_divergences)
+
+
+# ============================================================
+# 5. TARGET: CRV-BOT BACKTEST
+# ============================================================
+def load_crv_backtest(path=CRV_BACKTEST_PATH):
+    """Import CRV-BOT/backtest.py as module 'crv_backtest' (needs its own deps: ccxt, matplotlib)."""
+    crv_dir = os.path.dirname(path)
+    spec = importlib.util.spec_from_file_location("crv_backtest", path)
+    module = importlib.util.module_from_spec(spec)
+    sys.path.insert(0, crv_dir)
+    try:
+        with quiet():
+            spec.loader.exec_module(module)
+    except SystemExit:
+        raise ImportError("CRV-BOT/backtest.py exited on import (missing ccxt/matplotlib?)")
+    finally:
+        sys.path.remove(crv_dir)
+    return module
+
+
+def crv_frame(df):
+    """Fixture -> the frame fetch_ohlcv_1y() returns (UTC datetime timestamp + OHLCV)."""
+    out = df[OHLCV_COLUMNS].copy()
+    out['timestamp'] = pd.to_datetime(out['timestamp'], unit='ms', utc=True)
+    return out
+
+
+def check_crv(corpus, args, tol):
+    """
+    Reference: crv.run_backtest(crv.compute_indicators(df)).
+    Candidate (--crv-candidate): fn(df) -> the run_backtest tuple
+    (df, trades, signals_long, signals_short, signals_sl, signals_cb), where
+    df is the raw frame (UTC datetime 'timestamp' + OHLCV).
+    """
+    if not args.crv_candidate:
+        print("[GOLDEN] crv: no candidate registered, skipped (use --crv-candidate module:function)")
+        return []
+    try:
+        crv = load_crv_backtest()
+    except ImportError as e:
+        print(f"[WARN] [GOLDEN] crv: {e}, skipped")
+        return []
+    cand_fn = resolve_callable(args.crv_candidate)
+
+    results = []
+    for name, meta, df in corpus:
+        raw = crv_frame(df)
+        with quiet():
+            ref = crv.run_backtest(crv.compute_indicators(raw))
+            cand = cand_fn(raw.copy())
+            ref_stats = crv.compute_stats(ref[1], crv.INITIAL_CAPITAL, ref[0]['equity'])
+            cand_stats = crv.compute_stats(cand[1], crv.INITIAL_CAPITAL, cand[0]['equity'])
+
+        ref_df, cand_df = ref[0], cand[0]
+        bar_times = ref_df['timestamp'].to_numpy()
+        diff = CaseDiff(bar_times)
+
+        hit = first_record_divergence(ref_df['signal'].tolist(), cand_df['signal'].tolist(), 0, 0)
+        if hit:
+            diff.add("signal", hit[0], hit[1], hit[2], bar=hit[0])
+        hit = first_record_divergence(ref_df['position'].tolist(), cand_df['position'].tolist(), 0, 0)
+        if hit:
+            diff.add("position", hit[0], hit[1], hit[2], bar=hit[0])
+        diff.numeric("equity", ref_df['equity'].to_numpy(dtype=np.float64),
+                     cand_df['equity'].to_numpy(dtype=np.float64), tol.rtol, tol.atol)
+
+        def bar_of(ts):
+            return int(ref_df['timestamp'].searchsorted(pd.Timestamp(ts)))
+
+        diff.records("trades", ref[1], cand[1], tol.rtol, tol.atol,
+                     bar_of=lambda t: bar_of(t['exit_time']) if isinstance(t, dict) and 'exit_time' in t else None)
+        # signals_*: list of (timestamp, close)
+        for label, idx in (("signals_long", 2), ("signals_short", 3), ("signals_sl", 4), ("signals_cb", 5)):
+            diff.records(label, [list(x) for x in ref[idx]], [list(x) for x in cand[idx]], tol.rtol, tol.atol,
+                         bar_of=lambda x: bar_of(x[0]))
+        diff.metrics(ref_stats, cand_stats, tol.metric_rtol, tol.metric_atol)
+
+        results.append(diff.result("crv", name, {}, "CRV-BOT backtest.run_backtest", args.crv_candidate,
+                                   args.max_divergences))
+    return results
+
+
+# ============================================================
+# 6. CHECK
+# ============================================================
+def check(args):
+    from strategy_core import TradingEngine
+
+    tol = Tolerance(args.rtol, args.atol, args.metric_rtol, args.metric_atol)
+    corpus = load_corpus(args.fixtures, args.only.split(",") if args.only else None)
+    targets = args.targets.split(",")
+    print(f"[GOLDEN] {len(corpus)} fixture(s), targets={targets}")
+
+    results = []
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory(prefix="quant_golden_") as tmp:
+        os.chdir(tmp)  # TradingEngine uses ./market_data.db (checkpoints land here)
+        try:
+            with quiet():
+                engine = TradingEngine(initial_capital=args.capital)
+            if "indicators" in targets:
+                results += check_indicators(engine, corpus, args, tol)
+            if "backtest" in targets:
+                results += check_backtest(engine, corpus, args, tol)
+            if "crv" in targets:
+                results += check_crv(corpus, args, tol)
+        finally:
+            os.chdir(cwd)
+
+    failed = [r for r in results if not r["ok"]]
+    for r in failed:
+        case = "/".join(str(v) for v in r["case"].values())
+        print(f"[GOLDEN] FAIL {r['target']} {r['fixture']} {case} {r['candidate']}: "
+              f"first bar {r['first_bar']} ({r['first_time']})")
+        for d in r["divergences"]:
+            print(f"         {d['field']}[{d['index']}] bar={d['bar']} ref={d['ref']} cand={d['cand']}"
+                  f"{' (' + d['note'] + ')' if d.get('note') else ''}")
+    print(f"[GOLDEN] {len(results) - len(failed)}/{len(results)} cases equal")
+
+    report = {
+        "meta": {"rtol": tol.rtol, "atol": tol.atol, "metric_rtol": tol.metric_rtol,
+                 "metric_atol": tol.metric_atol, "fixtures": [c[0] for c in corpus], "targets": targets},
+        "passed": len(results) - len(failed),
+        "failed": len(failed),
+        "results": results,
+    }
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"[GOLDEN] Report written to {args.out}")
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Reference-vs-candidate equivalence harness for backtest paths")
+    parser.add_argument("--fixtures", default=FIXTURES_DIR, help="fixture directory (default: %(default)s)")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    rec = sub.add_parser("record", help="write the OHLCV fixture corpus")
+    rec.add_argument("--no-synthetic", action="store_true", help="skip the synthetic corpus")
+    rec.add_argument("--from-db", default=None, help="market_data.db to record real candles from")
+    rec.add_argument("--symbols", default=None, help="comma-separated symbols for --from-db")
+    rec.add_argument("--timeframes", default="1h,4h,1d", help="timeframes for --from-db (default: %(default)s)")
+    rec.add_argument("--limit", type=int, default=3000, help="last N candles per series (default: %(default)s)")
+
+    chk = sub.add_parser("check", help="run reference vs candidates over the corpus")
+    chk.add_argument("--targets", default="indicators,backtest,crv")
+    chk.add_argument("--only", default=None, help="comma-separated fixture names")
+    chk.add_argument("--candidates", default="vector,checkpoint,batch",
+                     help="built-in backtest candidates: vector,checkpoint,batch,pool (default: %(default)s)")
+    chk.add_argument("--backtest-candidate", default=None, help="custom run_backtest candidate module:function")
+    chk.add_argument("--indicator-candidate", default=None, help="custom indicator candidate module:function")
+    chk.add_argument("--crv-candidate", default=None, help="CRV-BOT run_backtest candidate module:function")
+    chk.add_argument("--strategies", default=None, help="comma-separated subset of strategies (default: all)")
+    chk.add_argument("--directions", default=",".join(DIRECTIONS))
+    chk.add_argument("--periods", default="max", help="run_backtest periods (default: %(default)s)")
+    chk.add_argument("--capital", type=float, default=1000)
+    chk.add_argument("--workers", type=int, default=2, help="worker processes for the pool candidate")
+    chk.add_argument("--rtol", type=float, default=1e-9, help="relative tolerance for per-bar values")
+    chk.add_argument("--atol", type=float, default=1e-9, help="absolute tolerance for per-bar values")
+    chk.add_argument("--metric-rtol", type=float, default=0.0, help="relative tolerance for metrics")
+    chk.add_argument("--metric-atol", type=float, default=1e-9, help="absolute tolerance for metrics")
+    chk.add_argument("--max-divergences", type=int, default=5, help="divergences kept per case")
+    chk.add_argument("--out", default=None, help="write JSON report to this file")
+
+    args = parser.parse_args(argv)
+    if args.command == "record":
+        record(args)
+        return 0
+    if args.out:
+        args.out = os.path.abspath(args.out)
+    report = check(args)
+    return 1 if report["failed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
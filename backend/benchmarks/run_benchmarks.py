@@ -0,0 +1,306 @@
+# backend/benchmarks/run_benchmarks.py
+"""
+Offline benchmark runner for the backend engines.
+
+Times, on deterministic synthetic data (see synthetic.py):
+  - TradingEngine.prepare_indicators (full + incremental append of 1 candle)
+  - TradingEngine.run_backtest per strategy / direction / engine
+  - TradingEngine.find_best_strategy_for_symbol (DB seeded with synthetic candles)
+  - PortfolioBacktester.run on a book of --portfolio-symbols synthetic symbols
+  - MonteCarloEngine.run_simulation
+  - ValidationEngine.monte_carlo_test
+  - AnomalyScanner detectors (volume spike, order book, whale) on a fake exchange
+
+Each entry reports p50/p95/mean latency, ops/sec and the process peak RSS
+after the entry ran. Everything runs inside a temporary working directory,
+so market_data.db of the real app is never touched.
+
+Usage (from backend/):
+  python -m benchmarks.run_benchmarks                       # default sizes
+  python -m benchmarks.run_benchmarks --sizes 1000,200000 --repeat 3 --out bench.json
+  python -m benchmarks.run_benchmarks --compare bench_old.json --out bench_new.json
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
+
+from benchmarks.synthetic import (  # noqa: E402
+    generate_ohlcv, generate_trades, latest_open_candle_ts, SyntheticExchange
+)
+
+STRATEGIES = [
+    "MOMENTUM", "MEAN_REVERSAL", "GRID", "MULTITIMEFRAME",
+    "MOMENTUM_PRO", "MEAN_REVERSAL_PRO", "GRID_PRO", "MULTITIMEFRAME_PRO",
+    "MIX_STRATEGY", "MIX_STRATEGY_PRO"
+]
+DIRECTIONS = ["LONG", "SHORT"]
+
+DEFAULT_SIZES = "1000,10000,50000,200000"
+
+
+# ============================================================
+# MEASUREMENT HELPERS
+# ============================================================
+def peak_rss_mb():
+    """Process peak resident set size in MB (None if not available on this OS)."""
+    try:
+        import resource
+        rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Linux reports KB, macOS reports bytes
+        return round(rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024, 1)
+    except ImportError:
+        pass
+    try:
+        import psutil
+        info = psutil.Process().memory_info()
+        return round(getattr(info, 'peak_wset', info.rss) / (1024 * 1024), 1)
+    except Exception:
+        return None
+
+
+def bench(name, fn, repeat, bars=None, params=None, setup=None, quiet=True):
+    """
+    Time fn() `repeat` times (after one untimed warmup). setup() runs before
+    every call and is not timed. Returns one result entry.
+    """
+    sink = io.StringIO()
+    latencies = []
+    for i in range(repeat + 1):
+        if setup is not None:
+            setup()
+        with contextlib.redirect_stdout(sink) if quiet else contextlib.nullcontext():
+            t0 = time.perf_counter()
+            fn()
+            elapsed = time.perf_counter() - t0
+        if i > 0:
+            latencies.append(elapsed)
+        sink.seek(0)
+        sink.truncate()
+
+    lat = np.array(latencies)
+    result = {
+        "name": name,
+        "bars": bars,
+        "params": params or {},
+        "repeat": repeat,
+        "p50_ms": round(float(np.percentile(lat, 50)) * 1000, 3),
+        "p95_ms": round(float(np.percentile(lat, 95)) * 1000, 3),
+        "mean_ms": round(float(lat.mean()) * 1000, 3),
+        "ops_per_sec": round(1.0 / float(lat.mean()), 3) if lat.mean() > 0 else None,
+        "peak_rss_mb": peak_rss_mb(),
+    }
+    label = f"{name} {json.dumps(params, sort_keys=True) if params else ''}".strip()
+    print(f"[BENCH] {label:<70} bars={str(bars):<7} p50={result['p50_ms']:>10.2f}ms "
+          f"p95={result['p95_ms']:>10.2f}ms ops/s={result['ops_per_sec']}")
+    return result
+
+
+def result_key(r):
+    return (r['name'], r['bars'], json.dumps(r['params'], sort_keys=True))
+
+
+def git_commit():
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR,
+                             capture_output=True, text=True, timeout=10)
+        return out.stdout.strip() or None
+    except Exception:
+        return None
+
+
+# ============================================================
+# SUITE
+# ============================================================
+def run_suite(args):
+    from strategy_core import TradingEngine
+    from indicator_store import IndicatorStore
+    from monte_carlo import MonteCarloEngine
+    from validation_engine import ValidationEngine
+    from anomaly_scanner import AnomalyScanner
+    from portfolio_backtest import MarketMatrix, PortfolioBacktester, make_book
+    from risk_manager import DEFAULT_RISK_CONFIG
+
+    sizes = [int(s) for s in args.sizes.split(",") if s.strip()]
+    strategies = args.strategies.split(",") if args.strategies else STRATEGIES
+    engines = args.engines.split(",")
+    results = []
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        engine = TradingEngine(initial_capital=1000)
+    scanner = AnomalyScanner(SyntheticExchange(seed=args.seed))
+
+    for n in sizes:
+        print(f"\n[BENCH] ===== {n} bars =====")
+        df = generate_ohlcv(n, seed=args.seed)
+
+        # --- Indicators ---
+        results.append(bench("prepare_indicators", lambda: engine._compute_indicators(df.copy()),
+                             args.repeat, bars=n))
+
+        store = IndicatorStore()
+        head = df.iloc[:-1].copy()
+
+        def _prime():
+            store.invalidate("SYN", "1h")
+            store.apply(("SYN", "1h"), head.copy(), engine._compute_indicators)
+
+        results.append(bench("prepare_indicators_incremental",
+                             lambda: store.apply(("SYN", "1h"), df.copy(), engine._compute_indicators),
+                             args.repeat, bars=n, params={"new_bars": 1}, setup=_prime))
+
+        # --- Backtests ---
+        for eng in engines:
+            if eng == "loop" and n > args.loop_max_bars:
+                print(f"[BENCH] skip run_backtest[loop] for {n} bars (> --loop-max-bars {args.loop_max_bars})")
+                continue
+            for strat in strategies:
+                for direction in DIRECTIONS:
+                    results.append(bench(
+                        f"run_backtest[{eng}]",
+                        lambda: engine.run_backtest(df, strat, requested_period="max", direction=direction,
+                                                    interval="1h", engine=eng),
+                        args.repeat, bars=n, params={"strategy": strat, "direction": direction}
+                    ))
+
+        # --- Best strategy finder (reads candles from the temp SQLite DB) ---
+        if n <= args.loop_max_bars:
+            symbol = f"SYN{n}-USDT"
+            now_ms = engine.exchange.milliseconds()
+            seeded = generate_ohlcv(n, seed=args.seed, end_ts=latest_open_candle_ts("1h", now_ms))
+            engine._save_to_db(symbol, "1h", seeded[['timestamp', 'open', 'high', 'low', 'close', 'volume']].values.tolist())
+            results.append(bench(
+                "find_best_strategy_for_symbol",
+                lambda: engine.find_best_strategy_for_symbol(symbol, timeframe="1h", period="max",
+                                                             allowed_modes=DIRECTIONS),
+                max(1, args.repeat // 2), bars=n
+            ))
+        else:
+            print(f"[BENCH] skip find_best_strategy_for_symbol for {n} bars (> --loop-max-bars {args.loop_max_bars})")
+
+        # --- Portfolio backtest: one book over many symbols ---
+        if n <= args.loop_max_bars:
+            frames = {f"SYN{k}": generate_ohlcv(n, seed=args.seed + k) for k in range(args.portfolio_symbols)}
+            matrix = MarketMatrix.from_frames(frames)
+            book = make_book([{"symbol": s, "strategy": STRATEGIES[k % len(STRATEGIES)]}
+                              for k, s in enumerate(frames)])
+            portfolio = PortfolioBacktester(initial_capital=10000, risk_config=DEFAULT_RISK_CONFIG)
+            results.append(bench("PortfolioBacktester.run", lambda: portfolio.run(matrix, book, interval="1h"),
+                                 args.repeat, bars=n, params={"symbols": args.portfolio_symbols}))
+
+        # --- Anomaly: volume spike works on the frame ---
+        results.append(bench("anomaly.detect_volume_spike", lambda: scanner.detect_volume_spike(df),
+                             args.repeat, bars=n))
+
+    # --- Size-independent engines ---
+    print("\n[BENCH] ===== trade-based engines =====")
+    validator = ValidationEngine.__new__(ValidationEngine)  # skip __init__: it creates the reports DB
+    for n_trades in [int(s) for s in args.trades.split(",") if s.strip()]:
+        trades = generate_trades(n_trades, seed=args.seed)
+        mc = MonteCarloEngine(initial_capital=1000.0, num_simulations=args.mc_simulations)
+        results.append(bench("MonteCarloEngine.run_simulation", lambda: mc.run_simulation(trades),
+                             args.repeat, params={"trades": n_trades, "simulations": args.mc_simulations}))
+        results.append(bench("ValidationEngine.monte_carlo_test", lambda: validator.monte_carlo_test(trades),
+                             args.repeat, params={"trades": n_trades}))
+
+    results.append(bench("anomaly.detect_order_book_imbalance",
+                         lambda: scanner.detect_order_book_imbalance("SYN-USDT"), args.repeat))
+    results.append(bench("anomaly.detect_whale_activity",
+                         lambda: scanner.detect_whale_activity("SYN-USDT"), args.repeat,
+                         params={"trades": 500}))
+    return results
+
+
+def compare(old_report, new_results):
+    """Print p50 speedup (old / new) for every entry present in both reports."""
+    old = {result_key(r): r for r in old_report.get('results', [])}
+    print(f"\n[BENCH] Compare vs {old_report.get('meta', {}).get('git_commit')} "
+          f"({old_report.get('meta', {}).get('created_at')})")
+    rows = []
+    for r in new_results:
+        o = old.get(result_key(r))
+        if not o or not r['p50_ms']:
+            continue
+        speedup = o['p50_ms'] / r['p50_ms']
+        rows.append({"key": list(result_key(r)), "old_p50_ms": o['p50_ms'], "new_p50_ms": r['p50_ms'],
+                     "speedup": round(speedup, 3)})
+        label = f"{r['name']} {json.dumps(r['params'], sort_keys=True) if r['params'] else ''}".strip()
+        print(f"[BENCH] {label:<70} bars={str(r['bars']):<7} {o['p50_ms']:>10.2f} -> {r['p50_ms']:>10.2f}ms  x{speedup:.2f}")
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Offline synthetic-market benchmarks for the backend engines")
+    parser.add_argument("--sizes", default=DEFAULT_SIZES, help="comma-separated bar counts (default: %(default)s)")
+    parser.add_argument("--repeat", type=int, default=3, help="timed runs per entry (default: %(default)s)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--engines", default="vector,loop", help="run_backtest engines to time (default: %(default)s)")
+    parser.add_argument("--strategies", default=None, help="comma-separated subset of strategies (default: all)")
+    parser.add_argument("--loop-max-bars", type=int, default=10000,
+                        help="largest size timed with the bar-by-bar loop engine / best-strategy finder")
+    parser.add_argument("--portfolio-symbols", type=int, default=100,
+                        help="symbols in the portfolio backtest book (default: %(default)s)")
+    parser.add_argument("--trades", default="100,1000", help="trade counts for Monte Carlo / validation")
+    parser.add_argument("--mc-simulations", type=int, default=5000)
+    parser.add_argument("--out", default=None, help="write JSON report to this file")
+    parser.add_argument("--compare", default=None, help="previous JSON report to compare against")
+    args = parser.parse_args(argv)
+
+    old_report = None
+    if args.compare:
+        with open(args.compare) as f:
+            old_report = json.load(f)
+    out_path = os.path.abspath(args.out) if args.out else None
+
+    started = time.time()
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory(prefix="quant_bench_") as tmp:
+        os.chdir(tmp)  # TradingEngine uses ./market_data.db
+        try:
+            results = run_suite(args)
+        finally:
+            os.chdir(cwd)
+
+    report = {
+        "meta": {
+            "created_at": datetime.now().isoformat(),
+            "git_commit": git_commit(),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "pandas": pd.__version__,
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "args": vars(args),
+            "total_seconds": round(time.time() - started, 2),
+        },
+        "results": results,
+    }
+    if old_report is not None:
+        report["comparison"] = compare(old_report, results)
+
+    if out_path:
+        with open(out_path, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"\n[BENCH] Report written to {out_path}")
+    else:
+        print(json.dumps(report["meta"], indent=2))
+    return report
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,252 @@
+# backend/benchmarks/storage_layout.py
+"""
+market_data storage layout benchmark: original vs compact (db_migrate).
+
+Builds (or copies) a populated database in a temporary directory, measures
+file size and the latency of the hot queries on the original layout,
+migrates the copy with db_migrate.compact() and measures again:
+
+  last_candle     SELECT MAX(timestamp) per series (_get_last_timestamp,
+                  _get_cached_result, _save_cache_result)
+  cache_lookup    MAX(timestamp) + strategy_cache row by primary key
+  cache_prefix    strategy_cache rows of one (symbol, timeframe), the
+                  access path of _clear_db_data
+  load_series     one year of 1h candles of one series (_load_from_db)
+  load_many       every symbol's 1d candles in one bulk read (market_loader)
+  save_candle     the next SAVE_BATCH candles of every symbol, one batch per
+                  series via db_migrate.insert_candles (the _save_to_db /
+                  bulk downloader write path)
+  save_view       the same batches through INSERT OR IGNORE INTO market_data
+                  (on the compact layout: the view's INSTEAD OF trigger)
+
+Both databases are VACUUMed before measuring, so the size comparison is not
+skewed by free pages. The candles read back after the migration are
+compared with the original ones.
+
+Usage (from backend/):
+  python -m benchmarks.storage_layout                          # synthetic, 50 symbols x 1h/4h/1d (3y)
+  python -m benchmarks.storage_layout --symbols 150 --out layout.json
+  python -m benchmarks.storage_layout --db market_data.db      # copy of a real database
+"""
+
+import argparse
+import json
+import os
+import random
+import shutil
+import sqlite3
+import sys
+import tempfile
+
+import numpy as np
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
+
+import db_migrate  # noqa: E402
+import market_loader  # noqa: E402
+from benchmarks.run_benchmarks import bench  # noqa: E402
+from benchmarks.synthetic import generate_ohlcv  # noqa: E402
+from db_utils import close_thread_connections, get_db_connection  # noqa: E402
+from strategy_core import CACHE_COLUMNS, strategy_params_hash  # noqa: E402
+
+TIMEFRAME_BARS = {"1h": 26280, "4h": 6570, "1d": 1095}   # 3 tahun, sama dengan seed fetch_data
+PERIODS = ["1mo", "3mo", "6mo", "1y", "2y"]
+STRATEGIES = ["MOMENTUM", "MEAN_REVERSAL", "GRID", "MULTITIMEFRAME", "MIX_STRATEGY"]
+DIRECTIONS = ["LONG", "SHORT"]
+LOOKUPS = 200
+SAVE_BATCH = 24   # satu hari candle 1h per series (update incremental)
+
+
+# ============================================================
+# DATABASE
+# ============================================================
+def populate(db_file, n_symbols):
+    """Original layout (TradingEngine._init_db) filled with synthetic candles + strategy_cache rows."""
+    from strategy_core import TradingEngine
+    engine = TradingEngine.__new__(TradingEngine)
+    engine.db_file = db_file
+    engine.params_hash = strategy_params_hash()
+    engine._init_db()
+    conn = sqlite3.connect(db_file)
+    symbols = [f"SYM{i:03d}-USDT" for i in range(n_symbols)]
+    for i, sym in enumerate(symbols):
+        for tf, bars in TIMEFRAME_BARS.items():
+            df = generate_ohlcv(bars, seed=1000 + i, timeframe=tf)
+            conn.executemany(
+                "INSERT INTO market_data (symbol, timeframe, timestamp, open, high, low, close, volume) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                [(sym, tf, *row) for row in df[['timestamp', 'open', 'high', 'low', 'close', 'volume']]
+                 .itertuples(index=False, name=None)])
+            conn.executemany(
+                "INSERT INTO strategy_cache VALUES (?, ?, ?, ?, 1.0, 50.0, 10, 5.0, 1.2, 1100.0, '{}', '1:2', ?, '', ?, ?, 1.5, 1)",
+                [(sym, tf, p, s, int(df['timestamp'].iloc[-1]), d, engine.params_hash)
+                 for p in PERIODS for s in STRATEGIES for d in DIRECTIONS])
+        conn.commit()
+    conn.close()
+    return symbols
+
+
+def stored_symbols(db_file):
+    conn = sqlite3.connect(db_file)
+    try:
+        return [r[0] for r in conn.execute("SELECT DISTINCT symbol FROM market_data WHERE timeframe='1d'")]
+    finally:
+        conn.close()
+
+
+def vacuum(db_file):
+    conn = sqlite3.connect(db_file, isolation_level=None)
+    conn.execute("VACUUM")
+    conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    conn.close()
+
+
+def snapshot(db_file, symbols):
+    """Every candle of every series (checksum input for the before/after comparison)."""
+    return {tf: market_loader.load_many(symbols, tf, "max", db_file=db_file) for tf in TIMEFRAME_BARS}
+
+
+def same_candles(a, b, symbols):
+    for tf in a:
+        for sym in symbols:
+            if (sym in a[tf]) != (sym in b[tf]):
+                return False
+            if sym in a[tf] and not all(np.array_equal(a[tf][sym][c], b[tf][sym][c]) for c in a[tf][sym]):
+                return False
+    return True
+
+
+# ============================================================
+# QUERIES
+# ============================================================
+def run_queries(db_file, symbols, repeat, label):
+    rnd = random.Random(7)
+    series = [(rnd.choice(symbols), rnd.choice(list(TIMEFRAME_BARS))) for _ in range(LOOKUPS)]
+    keys = [(sym, tf, rnd.choice(PERIODS), rnd.choice(STRATEGIES), rnd.choice(DIRECTIONS)) for sym, tf in series]
+    conn = get_db_connection(db_file, row_factory=None)
+    params_hash = strategy_params_hash()
+    columns = ", ".join(CACHE_COLUMNS)
+    last_1h = conn.execute("SELECT MAX(timestamp) FROM market_data WHERE timeframe='1h'").fetchone()[0]
+    next_ts = [last_1h]
+
+    def last_candle():
+        for sym, tf in series:
+            conn.execute("SELECT MAX(timestamp) FROM market_data WHERE symbol=? AND timeframe=?", (sym, tf)).fetchone()
+
+    def cache_lookup():
+        for sym, tf, period, strat, direction in keys:
+            conn.execute("SELECT MAX(timestamp) FROM market_data WHERE symbol=? AND timeframe=?", (sym, tf)).fetchone()
+            conn.execute(f"SELECT {columns} FROM strategy_cache WHERE symbol=? AND timeframe=? AND period=? "
+                         "AND strategy=? AND direction=? AND params_hash=?",
+                         (sym, tf, period, strat, direction, params_hash)).fetchone()
+
+    def cache_prefix():
+        for sym, tf in series:
+            conn.execute(f"SELECT {columns} FROM strategy_cache WHERE symbol=? AND timeframe=?", (sym, tf)).fetchall()
+
+    def load_series():
+        for sym, _ in series[:10]:
+            conn.execute("SELECT timestamp, open, high, low, close, volume FROM market_data "
+                         "WHERE symbol=? AND timeframe='1h' AND timestamp >= ? ORDER BY timestamp ASC",
+                         (sym, last_1h - 365 * 86400000)).fetchall()
+
+    def load_many():
+        market_loader.load_many(symbols, "1d", "max", db_file=db_file)
+
+    def next_batch():
+        ts = range(next_ts[0] + 3600000, next_ts[0] + (SAVE_BATCH + 1) * 3600000, 3600000)
+        next_ts[0] += SAVE_BATCH * 3600000
+        return [(t, 1, 1, 1, 1, 1) for t in ts]
+
+    def save_candle():
+        rows = next_batch()
+        for sym in symbols:
+            db_migrate.insert_candles(conn, sym, "1h", rows)
+        conn.commit()
+
+    def save_view():
+        rows = next_batch()
+        for sym in symbols:
+            conn.executemany(
+                "INSERT OR IGNORE INTO market_data (symbol, timeframe, timestamp, open, high, low, close, volume) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)", [(sym, "1h", *r) for r in rows])
+        conn.commit()
+
+    results = []
+    for name, fn, ops in (("last_candle", last_candle, LOOKUPS), ("cache_lookup", cache_lookup, LOOKUPS),
+                          ("cache_prefix", cache_prefix, LOOKUPS), ("load_series", load_series, 10),
+                          ("load_many", load_many, 1),
+                          ("save_candle", save_candle, len(symbols) * SAVE_BATCH),
+                          ("save_view", save_view, len(symbols) * SAVE_BATCH)):
+        r = bench(f"storage.{name}", fn, repeat, params={"layout": label, "ops": ops})
+        r["us_per_op"] = round(r["p50_ms"] * 1000 / ops, 2)
+        results.append(r)
+    conn.close()
+    close_thread_connections()
+    return results
+
+
+def run(args):
+    work = tempfile.mkdtemp(prefix="qw_layout_")
+    db_file = os.path.join(work, "market_data.db")
+    try:
+        if args.db:
+            shutil.copyfile(args.db, db_file)
+            symbols = stored_symbols(db_file)
+            print(f"[BENCH] Copied {args.db}: {len(symbols)} symbols")
+        else:
+            print(f"[BENCH] Populating {args.symbols} symbols x {list(TIMEFRAME_BARS)} ...")
+            symbols = populate(db_file, args.symbols)
+
+        vacuum(db_file)
+        before_status = db_migrate.status(db_file)
+        before = snapshot(db_file, symbols)
+        before_q = run_queries(db_file, symbols, args.repeat, "original")
+
+        # Candle tambahan dari save_candle ikut dimigrasi; snapshot hanya membandingkan histori awal
+        migrated = db_migrate.compact(db_file)
+        after_status = db_migrate.status(db_file)
+        after = snapshot(db_file, symbols)
+        for tf in after:  # buang candle save_candle (di atas histori awal)
+            for sym in symbols:
+                if sym in after[tf] and sym in before[tf]:
+                    n = len(before[tf][sym]['timestamp'])
+                    after[tf].series[sym] = {c: v[:n] for c, v in after[tf][sym].items()}
+        equal = same_candles(before, after, symbols)
+        after_q = run_queries(db_file, symbols, args.repeat, "compact")
+    finally:
+        close_thread_connections()
+        shutil.rmtree(work, ignore_errors=True)
+
+    print()
+    print(f"  size     {before_status['bytes'] / 1e6:>9.1f} MB -> {after_status['bytes'] / 1e6:>9.1f} MB "
+          f"({after_status['bytes'] / before_status['bytes']:.0%}), {before_status['candles']} candles, "
+          f"migration {migrated['elapsed_sec']}s, candles equal: {equal}")
+    for b, a in zip(before_q, after_q):
+        print(f"  {b['name']:<22} {b['us_per_op']:>10.1f} us/op -> {a['us_per_op']:>10.1f} us/op "
+              f"(x{b['us_per_op'] / a['us_per_op']:.2f})")
+
+    report = {"before": {"status": before_status, "queries": before_q},
+              "after": {"status": after_status, "queries": after_q, "migration": migrated},
+              "candles_equal": equal}
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=2)
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="market_data layout benchmark (original vs compact)")
+    parser.add_argument("--symbols", type=int, default=50, help="synthetic symbols (default: %(default)s)")
+    parser.add_argument("--db", default=None, help="benchmark a copy of this database instead")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--out", default=None)
+    args = parser.parse_args(argv)
+    report = run(args)
+    sys.exit(0 if report["candles_equal"] else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,212 @@
+# backend/benchmarks/synthetic.py
+"""
+Deterministic synthetic market data for offline benchmarks.
+
+generate_ohlcv() produces a geometric Brownian motion whose drift and
+volatility switch between BULL / BEAR / SIDEWAYS regimes (Markov chain),
+so every strategy sees trends, ranges and volatility clusters. Same seed
+-> same frame, bit for bit. No network access anywhere in this module.
+"""
+
+import numpy as np
+import pandas as pd
+
+TIMEFRAME_MS = {
+    "15m": 15 * 60 * 1000,
+    "1h": 60 * 60 * 1000,
+    "4h": 4 * 60 * 60 * 1000,
+    "1d": 24 * 60 * 60 * 1000,
+}
+
+# (drift per bar, volatility per bar) per regime
+REGIMES = {
+    "BULL":     (0.0006, 0.010),
+    "BEAR":     (-0.0007, 0.014),
+    "SIDEWAYS": (0.0, 0.006),
+}
+REGIME_NAMES = list(REGIMES)
+REGIME_STAY_PROB = 0.995  # rata-rata ~200 bar per regime
+
+
+def generate_ohlcv(n_bars, seed=42, timeframe="1h", start_price=100.0, end_ts=None):
+    """
+    Build an OHLCV frame in the fetch_data layout (timestamp ms, OHLCV, time).
+
+    Args:
+        n_bars: number of candles
+        seed: RNG seed (deterministic output)
+        timeframe: candle spacing, key of TIMEFRAME_MS
+        end_ts: timestamp (ms) of the last candle; default is a fixed epoch so
+                runs are reproducible. Use latest_open_candle_ts() to make the
+                data look current to fetch_data.
+    """
+    rng = np.random.default_rng(seed)
+    step = TIMEFRAME_MS[timeframe]
+    if end_ts is None:
+        end_ts = 1_700_000_000_000 - (1_700_000_000_000 % step)
+
+    # --- Regime path (Markov chain) ---
+    switches = rng.random(n_bars) > REGIME_STAY_PROB
+    picks = rng.integers(0, len(REGIME_NAMES), n_bars)
+    regime = np.empty(n_bars, dtype=np.int64)
+    current = 0
+    for i in range(n_bars):
+        if switches[i]:
+            current = picks[i]
+        regime[i] = current
+    drift = np.array([REGIMES[r][0] for r in REGIME_NAMES])[regime]
+    vol = np.array([REGIMES[r][1] for r in REGIME_NAMES])[regime]
+
+    # --- GBM close path ---
+    shocks = rng.standard_normal(n_bars)
+    log_ret = (drift - 0.5 * vol ** 2) + vol * shocks
+    close = start_price * np.exp(np.cumsum(log_ret))
+
+    # --- OHLC around the close path ---
+    open_ = np.concatenate(([start_price], close[:-1]))
+    wick = np.abs(rng.standard_normal((2, n_bars))) * vol * 0.5
+    high = np.maximum(open_, close) * (1 + wick[0])
+    low = np.minimum(open_, close) * (1 - wick[1])
+
+    # Volume: lognormal base + occasional spikes (for the volume anomaly detector)
+    volume = rng.lognormal(mean=10, sigma=0.4, size=n_bars)
+    spikes = rng.random(n_bars) < 0.01
+    volume[spikes] *= rng.uniform(3, 8, spikes.sum())
+
+    timestamp = end_ts - step * np.arange(n_bars - 1, -1, -1, dtype=np.int64)
+    df = pd.DataFrame({
+        'timestamp': timestamp,
+        'open': open_, 'high': high, 'low': low, 'close': close, 'volume': volume,
+    })
+    df['time'] = pd.to_datetime(df['timestamp'], unit='ms')
+    return df
+
+
+def latest_open_candle_ts(timeframe, now_ms):
+    """Start of the candle that is still open at now_ms (fetch_data will not refetch)."""
+    step = TIMEFRAME_MS[timeframe]
+    return now_ms - (now_ms % step)
+
+
+def generate_trades(n_trades, seed=42, win_rate=0.52, avg_win=0.03, avg_loss=0.02):
+    """
+    Trade list with both PnL conventions used in the backend:
+    'pnl_pct' (fraction, MonteCarloEngine) and 'pnl' (USD on 1000, ValidationEngine).
+    """
+    rng = np.random.default_rng(seed)
+    wins = rng.random(n_trades) < win_rate
+    pnl_pct = np.where(wins, rng.exponential(avg_win, n_trades), -rng.exponential(avg_loss, n_trades))
+    return [{'pnl_pct': float(p), 'pnl': float(p * 1000)} for p in pnl_pct]
+
+
+class SyntheticExchange:
+    """
+    Minimal offline stand-in for the ccxt exchange calls AnomalyScanner makes
+    (fetch_order_book, fetch_trades). Deterministic per seed.
+    """
+
+    def __init__(self, seed=42, price=100.0):
+        self.seed = seed
+        self.price = price
+
+    def milliseconds(self):
+        return 1_700_000_000_000
+
+    def fetch_order_book(self, symbol, limit=10):
+        rng = np.random.default_rng(self.seed)
+        ticks = np.arange(1, limit + 1) * self.price * 0.0005
+        bids = [[float(self.price - t), float(a)] for t, a in zip(ticks, rng.lognormal(1, 0.5, limit))]
+        asks = [[float(self.price + t), float(a)] for t, a in zip(ticks, rng.lognormal(1, 0.5, limit))]
+        return {'bids': bids, 'asks': asks}
+
+    def fetch_trades(self, symbol, limit=500):
+        rng = np.random.default_rng(self.seed + 1)
+        ts0 = self.milliseconds() - limit * 200
+        ts = ts0 + np.cumsum(rng.integers(1, 400, limit))
+        amounts = rng.lognormal(0, 1.2, limit)
+        whales = rng.random(limit) < 0.01
+        amounts[whales] *= 50
+        prices = self.price * (1 + rng.normal(0, 0.0005, limit))
+        sides = np.where(rng.random(limit) < 0.5, 'buy', 'sell')
+        return [{
+            'timestamp': int(t),
+            'datetime': pd.Timestamp(int(t), unit='ms', tz='UTC').isoformat(),
+            'side': str(s), 'price': float(p), 'amount': float(a), 'cost': float(p * a),
+        } for t, s, p, a in zip(ts, sides, prices, amounts)]
+
+
+class RateLimitExceeded(Exception):
+    """Same class name as ccxt's, so callers classify it the same way."""
+
+
+class AsyncSyntheticExchange:
+    """
+    Local fake of the ccxt.async_support calls the bulk downloader makes
+    (milliseconds, fetch_ohlcv, close). Serves generate_ohlcv candles with
+    Binance klines semantics: candles with timestamp >= since, up to limit,
+    the still-open candle included. Every request waits `latency` seconds
+    and costs `page_weight`; more than `weight_per_min` in a sliding minute
+    raises RateLimitExceeded. Used weight is reported the way Binance does
+    (last_response_headers['x-mbx-used-weight-1m']).
+
+    history_bars: {symbol: candles of history} (default: `default_bars`),
+    so recently listed symbols can be modelled.
+    """
+
+    def __init__(self, seed=42, now_ms=1_700_000_000_000, latency=0.05, weight_per_min=6000,
+                 page_weight=2, default_bars=30000, history_bars=None):
+        self.seed = seed
+        self.now_ms = now_ms
+        self.latency = latency
+        self.weight_per_min = weight_per_min
+        self.page_weight = page_weight
+        self.default_bars = default_bars
+        self.history_bars = history_bars or {}
+        self.requests = 0
+        self.max_inflight = 0
+        self.last_response_headers = {}
+        self._inflight = 0
+        self._weights = []
+        self._data = {}
+
+    def milliseconds(self):
+        return self.now_ms
+
+    def candles(self, symbol, timeframe):
+        """Full (timestamp, open, high, low, close, volume) array of a series."""
+        key = (symbol, timeframe)
+        if key not in self._data:
+            n = self.history_bars.get(symbol, self.default_bars)
+            seed = self.seed + sum(map(ord, f"{symbol}{timeframe}"))
+            df = generate_ohlcv(n, seed=seed, timeframe=timeframe,
+                                end_ts=latest_open_candle_ts(timeframe, self.now_ms))
+            self._data[key] = df[['timestamp', 'open', 'high', 'low', 'close', 'volume']].to_numpy(dtype=np.float64)
+        return self._data[key]
+
+    async def fetch_ohlcv(self, symbol, timeframe='1h', since=None, limit=500):
+        import asyncio
+        import time
+        now = time.monotonic()
+        self._weights = [(t, w) for t, w in self._weights if now - t < 60]
+        used = sum(w for _, w in self._weights) + self.page_weight
+        if used > self.weight_per_min:
+            raise RateLimitExceeded(f"weight {used} > {self.weight_per_min}/min")
+        self._weights.append((now, self.page_weight))
+        self.last_response_headers = {'x-mbx-used-weight-1m': str(int(used))}
+        self.requests += 1
+
+        self._inflight += 1
+        self.max_inflight = max(self.max_inflight, self._inflight)
+        try:
+            await asyncio.sleep(self.latency)
+        finally:
+            self._inflight -= 1
+
+        data = self.candles(symbol.replace('/', '-'), timeframe)
+        ts = data[:, 0]
+        lo = int(np.searchsorted(ts, since or 0, side='left'))
+        page = data[lo:lo + limit]
+        return [[int(r[0]), *map(float, r[1:])] for r in page]
+
+    async def close(self):
+        pass
@@ -0,0 +1,424 @@
+# backend/bulk_downloader.py
+"""
+Async bulk OHLCV downloader for market_data (cold start / catch-up).
+
+fetch_data paginates exchange.fetch_ohlcv one 1000-candle page at a time:
+seeding 3 years of 1h candles is ~27 sequential round-trips per symbol,
+and a cold start of ~150 symbols x 3 timeframes runs for a very long time.
+This downloader uses data_manager.DataManager (ccxt.async_support) and:
+
+  - Plans each (symbol, timeframe) once: the missing range after the last
+    stored candle (or the same 3-year seed as fetch_data) is cut into
+    page-aligned windows. A first "probe" page finds where the exchange's
+    history actually starts, so symbols listed recently do not burn
+    requests on empty windows. The remaining pages run in parallel.
+  - Schedules all pages of all series under one shared token bucket sized
+    from the exchange weight budget (Binance spot: 6000 request weight per
+    minute, klines = 2 per page), keeping a share of the budget free for
+    the live engine. The x-mbx-used-weight-1m header, when the exchange
+    reports it, pauses the bucket until the next minute if we get close.
+  - Retries pages on rate-limit (429/418) and network errors with backoff.
+  - Writes to SQLite in bulk: finished series are buffered and flushed in
+    one transaction (INSERT OR IGNORE, same as _save_to_db), then mirrored
+    into the mmap ohlcv_store. The fetched spans go into the candle_coverage
+    index in the same transaction.
+
+repair() uses the same machinery for holes inside the stored history: it
+asks candle_coverage for the uncovered ranges of every series and fetches
+only the pages that contain them (plan_pages), so a damaged database heals
+with the minimum number of requests.
+
+Config (env):
+  DOWNLOAD_WEIGHT_PER_MIN    exchange weight budget per minute (default 6000)
+  DOWNLOAD_PAGE_WEIGHT       weight of one 1000-candle klines page (default 2)
+  DOWNLOAD_BUDGET_FRACTION   share of the budget the downloader may use (default 0.6)
+  DOWNLOAD_CONCURRENCY       max requests in flight (default 16)
+
+Usage:
+  from bulk_downloader import run_bulk_download
+  report = run_bulk_download(["BTC-USDT", "ETH-USDT"], ["1h", "4h", "1d"])
+
+  python bulk_downloader.py BTC-USDT ETH-USDT --timeframes 1h,4h,1d
+
+  from bulk_downloader import run_gap_repair
+  report = run_gap_repair(None, ["1h"])      # every stored symbol
+
+Tests / benchmarks: pass exchange=benchmarks.synthetic.AsyncSyntheticExchange().
+"""
+
+import argparse
+import asyncio
+import os
+import time
+
+import candle_coverage
+import data_version
+import db_migrate
+import timeframe_derive
+from data_manager import DataManager
+from db_utils import get_db_connection
+from data_version import data_versions
+from frame_cache import frame_cache
+from ohlcv_store import ohlcv_store
+
+WEIGHT_PER_MIN = float(os.getenv("DOWNLOAD_WEIGHT_PER_MIN", "6000"))
+PAGE_WEIGHT = float(os.getenv("DOWNLOAD_PAGE_WEIGHT", "2"))
+BUDGET_FRACTION = float(os.getenv("DOWNLOAD_BUDGET_FRACTION", "0.6"))
+CONCURRENCY = int(os.getenv("DOWNLOAD_CONCURRENCY", "16"))
+
+PAGE_LIMIT = 1000
+SEED_DAYS = 1095          # sama dengan seed awal fetch_data (3 tahun)
+MAX_RETRIES = 4
+WRITE_BATCH_ROWS = 200000
+
+INTERVAL_MS = {
+    '1m': 60000, '15m': 900000, '1h': 3600000, '4h': 14400000,
+    '1d': 86400000, '1w': 604800000,
+}
+
+
+# ============================================================
+# 1. RATE LIMIT
+# ============================================================
+class TokenBucket:
+    """
+    Async token bucket in exchange weight units. `rate` tokens per second,
+    bursts up to `capacity`. acquire() waits in FIFO order.
+    """
+
+    def __init__(self, rate, capacity):
+        self.rate = float(rate)
+        self.capacity = float(capacity)
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+        self.waited_sec = 0.0
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self, cost=1.0):
+        async with self._lock:
+            self._refill()
+            while self.tokens < cost:
+                wait = (cost - self.tokens) / self.rate
+                self.waited_sec += wait
+                await asyncio.sleep(wait)
+                self._refill()
+            self.tokens -= cost
+
+    def pause(self, seconds):
+        """Stop handing out tokens for ~seconds (exchange said we are too fast)."""
+        self._refill()
+        self.tokens = min(self.tokens, 0.0) - seconds * self.rate
+
+    @classmethod
+    def from_weight_budget(cls, weight_per_min=WEIGHT_PER_MIN, fraction=BUDGET_FRACTION):
+        # Burst 2 detik: total per jendela 60 detik tetap < weight_per_min
+        rate = weight_per_min * fraction / 60.0
+        return cls(rate, max(PAGE_WEIGHT, rate * 2))
+
+
+def _is_rate_limit(err):
+    names = {c.__name__ for c in type(err).__mro__}
+    return bool(names & {'RateLimitExceeded', 'DDoSProtection'})
+
+
+def _is_network(err):
+    names = {c.__name__ for c in type(err).__mro__}
+    return bool(names & {'NetworkError', 'RequestTimeout', 'ExchangeNotAvailable', 'TimeoutError'})
+
+
+# ============================================================
+# 2. DOWNLOADER
+# ============================================================
+class BulkDownloader:
+    def __init__(self, db_file="market_data.db", exchange=None, exchange_id='binance',
+                 weight_per_min=WEIGHT_PER_MIN, page_weight=PAGE_WEIGHT,
+                 budget_fraction=BUDGET_FRACTION, concurrency=CONCURRENCY, store=ohlcv_store):
+        self.db_file = db_file
+        self.exchange = exchange
+        self.exchange_id = exchange_id
+        self.weight_per_min = weight_per_min
+        self.page_weight = page_weight
+        self.budget_fraction = budget_fraction
+        self.concurrency = concurrency
+        self.store = store
+
+    # --- database ---
+    def _ensure_table(self):
+        conn = get_db_connection(self.db_file, row_factory=None)
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS market_data (
+                symbol TEXT,
+                timeframe TEXT,
+                timestamp INTEGER,
+                open REAL,
+                high REAL,
+                low REAL,
+                close REAL,
+                volume REAL,
+                PRIMARY KEY (symbol, timeframe, timestamp)
+            );
+        """)
+        candle_coverage.ensure_table(conn)
+        data_version.ensure_table(conn)
+        conn.commit()
+        conn.close()
+
+    def _last_timestamps(self, series):
+        conn = get_db_connection(self.db_file, row_factory=None)
+        try:
+            return {
+                (sym, tf): conn.execute("SELECT MAX(timestamp) FROM market_data WHERE symbol=? AND timeframe=?",
+                                        (sym, tf)).fetchone()[0]
+                for sym, tf in series
+            }
+        finally:
+            conn.close()
+
+    def _write_batch(self, batch):
+        """One transaction for all buffered series (+ their coverage), then mirror to the column store."""
+        conn = get_db_connection(self.db_file, row_factory=None)
+        try:
+            for sym, tf, rows, spans in batch:
+                db_migrate.insert_candles(conn, sym, tf, rows)
+                candle_coverage.record_spans(conn, sym, tf, spans)
+            # Satu bump per series: candle tertua dari semua halamannya di batch ini
+            first_ts = {}
+            for sym, tf, rows, _ in batch:
+                if rows:
+                    first_ts[(sym, tf)] = min(first_ts.get((sym, tf), rows[0][0]), min(r[0] for r in rows))
+            versions = {(sym, tf): data_version.bump(conn, sym, tf, first_ts=ts) for (sym, tf), ts in first_ts.items()}
+            conn.commit()
+        finally:
+            conn.close()
+        for (sym, tf), version in versions.items():
+            data_versions.put(self.db_file, sym, tf, version)
+        for sym, tf, _, _ in batch:
+            frame_cache.invalidate(sym, tf)
+        if self.store is not None:
+            for sym, tf, rows, _ in batch:
+                if not rows:
+                    continue
+                try:
+                    self.store.append(sym, tf, rows)
+                except Exception as e:
+                    print(f"[WARN] [STORE] Append failed for {sym} {tf}: {e}")
+                    self.store.invalidate(sym, tf)
+
+    async def _flush(self, force=False):
+        async with self._write_lock:
+            if not self._pending or (not force and self._pending_rows < WRITE_BATCH_ROWS):
+                return
+            batch, self._pending, self._pending_rows = self._pending, [], 0
+            t0 = time.perf_counter()
+            await asyncio.to_thread(self._write_batch, batch)
+            self.report["write_sec"] += time.perf_counter() - t0
+            self.report["write_batches"] += 1
+
+    # --- exchange ---
+    async def _page(self, symbol, timeframe, since):
+        for attempt in range(MAX_RETRIES + 1):
+            await self.bucket.acquire(self.page_weight)
+            async with self._inflight:
+                try:
+                    self.report["requests"] += 1
+                    rows = await self.dm.fetch_ohlcv_page(symbol, timeframe, since, PAGE_LIMIT)
+                    self._check_used_weight()
+                    return rows or []
+                except Exception as e:
+                    if attempt == MAX_RETRIES or not (_is_rate_limit(e) or _is_network(e)):
+                        raise
+                    err = e
+            if _is_rate_limit(err):
+                self.report["rate_limited"] += 1
+                self.bucket.pause(5.0 * (attempt + 1))
+            else:
+                self.report["retries"] += 1
+                await asyncio.sleep(0.5 * 2 ** attempt)
+
+    def _check_used_weight(self):
+        headers = getattr(self.dm.exchange, 'last_response_headers', None) or {}
+        used = headers.get('x-mbx-used-weight-1m') or headers.get('X-MBX-USED-WEIGHT-1M')
+        if used is not None and float(used) >= self.weight_per_min * 0.9:
+            # Bobot sudah dipakai proses lain: tunggu sampai jendela menit berikutnya
+            self.bucket.pause(60 - time.time() % 60)
+
+    async def _series(self, symbol, timeframe, last_ts, now):
+        interval_ms = INTERVAL_MS.get(timeframe, 3600000)
+        result = {"symbol": symbol, "timeframe": timeframe, "new_candles": 0, "pages": 0, "error": None}
+        if last_ts is not None and now - last_ts < interval_ms:
+            return result  # sudah up to date (aturan yang sama dengan fetch_data)
+
+        since = last_ts + 1 if last_ts is not None else now - SEED_DAYS * 86400000
+        try:
+            # Probe: halaman pertama menunjukkan di mana histori exchange benar-benar mulai
+            rows = list(await self._page(symbol, timeframe, since))
+            result["pages"] = 1
+            if len(rows) >= PAGE_LIMIT:
+                span = PAGE_LIMIT * interval_ms
+                starts = list(range(rows[-1][0] + 1, now + 1, span))
+                pages = await asyncio.gather(*(self._page(symbol, timeframe, s) for s in starts))
+                result["pages"] += len(starts)
+                for s, page in zip(starts, pages):
+                    # Hanya candle di jendela halaman ini; sisanya milik halaman berikutnya
+                    rows.extend(r for r in page if s <= r[0] < s + span)
+                rows.sort(key=lambda r: r[0])
+        except Exception as e:
+            result["error"] = str(e)
+            print(f"[DOWNLOAD] {symbol} {timeframe} failed: {e}")
+            return result
+
+        if rows:
+            result["new_candles"] = len(rows)
+            await self._buffer(symbol, timeframe, rows, [(since, rows[-1][0])])
+        return result
+
+    async def _buffer(self, symbol, timeframe, rows, spans):
+        self._pending.append((symbol, timeframe, rows, spans))
+        self._pending_rows += len(rows)
+        await self._flush()
+
+    async def _repair_series(self, symbol, timeframe, gaps):
+        interval_ms = INTERVAL_MS.get(timeframe, 3600000)
+        result = {"symbol": symbol, "timeframe": timeframe, "gaps": len(gaps), "new_candles": 0, "pages": 0,
+                  "error": None}
+        if not gaps:
+            return result
+        span = PAGE_LIMIT * interval_ms
+        starts = candle_coverage.plan_pages(gaps, interval_ms, PAGE_LIMIT)
+        try:
+            pages = await asyncio.gather(*(self._page(symbol, timeframe, s) for s in starts))
+        except Exception as e:
+            result["error"] = str(e)
+            print(f"[DOWNLOAD] {symbol} {timeframe} repair failed: {e}")
+            return result
+        result["pages"] = len(starts)
+        # Candle di luar gap sudah tersimpan: hanya isi lubangnya
+        rows = sorted((r for s, page in zip(starts, pages) for r in page
+                       if s <= r[0] < s + span and candle_coverage.in_gaps(r[0], gaps)), key=lambda r: r[0])
+        result["new_candles"] = len(rows)
+        # Seluruh gap sudah ditanyakan ke exchange: bagian tanpa candle (maintenance, sebelum listing) juga tercatat
+        await self._buffer(symbol, timeframe, rows, gaps)
+        return result
+
+    def _start(self):
+        self.bucket = TokenBucket.from_weight_budget(self.weight_per_min, self.budget_fraction)
+        self._inflight = asyncio.Semaphore(self.concurrency)
+        self._write_lock = asyncio.Lock()
+        self._pending, self._pending_rows = [], 0
+        self.report = {"requests": 0, "retries": 0, "rate_limited": 0, "write_batches": 0, "write_sec": 0.0}
+
+    async def download(self, symbols, timeframes=("1h",)):
+        """
+        Bring market_data up to date for symbols x timeframes.
+        Returns a report: per-series new candles / pages / errors and totals.
+        """
+        t0 = time.time()
+        self._start()
+
+        series = [(sym, tf) for sym in symbols for tf in timeframes]
+        await asyncio.to_thread(self._ensure_table)
+        last = await asyncio.to_thread(self._last_timestamps, series)
+
+        self.dm = DataManager(self.exchange_id, exchange=self.exchange, enable_rate_limit=False)
+        try:
+            now = self.dm.exchange.milliseconds()
+            results = await asyncio.gather(*(self._series(sym, tf, last[(sym, tf)], now) for sym, tf in series))
+            await self._flush(force=True)
+        finally:
+            if self.exchange is None:
+                await self.dm.close_connection()
+
+        elapsed = time.time() - t0
+        report = {
+            "series": results,
+            "symbols": len(symbols),
+            "timeframes": list(timeframes),
+            "new_candles": sum(r["new_candles"] for r in results),
+            "failed": [f"{r['symbol']} {r['timeframe']}" for r in results if r["error"]],
+            **self.report,
+            "write_sec": round(self.report["write_sec"], 2),
+            "throttle_wait_sec": round(self.bucket.waited_sec, 2),
+            "elapsed_sec": round(elapsed, 2),
+        }
+        print(f"[DOWNLOAD] {len(series)} series, {report['new_candles']} candles, "
+              f"{report['requests']} requests in {report['elapsed_sec']}s "
+              f"(throttled {report['throttle_wait_sec']}s, {len(report['failed'])} failed)")
+        return report
+
+    async def repair(self, symbols=None, timeframes=("1h",), since_days=None):
+        """
+        Fill holes inside the stored history (candle_coverage gaps); with
+        since_days also the history before the first stored candle.
+        symbols=None: every symbol stored for the timeframe. Derived
+        timeframes (timeframe_derive) are skipped, repair their base instead.
+        Returns a report like download(): per-series gaps / new candles / pages.
+        """
+        t0 = time.time()
+        self._start()
+        await asyncio.to_thread(self._ensure_table)
+
+        timeframes = [tf for tf in timeframes if not timeframe_derive.is_derived(tf)]
+        self.dm = DataManager(self.exchange_id, exchange=self.exchange, enable_rate_limit=False)
+        try:
+            now = self.dm.exchange.milliseconds()
+            since = now - since_days * 86400000 if since_days is not None else None
+            plan = []
+            for tf in timeframes:
+                interval_ms = INTERVAL_MS.get(tf, 3600000)
+                tf_symbols = symbols or await asyncio.to_thread(candle_coverage.stored_symbols, tf, self.db_file)
+                for sym in tf_symbols:
+                    ranges = await asyncio.to_thread(candle_coverage.get_ranges, sym, tf, self.db_file)
+                    plan.append((sym, tf, candle_coverage.find_gaps(ranges, interval_ms, since)))
+            results = await asyncio.gather(*(self._repair_series(sym, tf, gaps) for sym, tf, gaps in plan))
+            await self._flush(force=True)
+        finally:
+            if self.exchange is None:
+                await self.dm.close_connection()
+
+        report = {
+            "series": results,
+            "timeframes": list(timeframes),
+            "gaps": sum(r["gaps"] for r in results),
+            "new_candles": sum(r["new_candles"] for r in results),
+            "failed": [f"{r['symbol']} {r['timeframe']}" for r in results if r["error"]],
+            **self.report,
+            "write_sec": round(self.report["write_sec"], 2),
+            "throttle_wait_sec": round(self.bucket.waited_sec, 2),
+            "elapsed_sec": round(time.time() - t0, 2),
+        }
+        print(f"[DOWNLOAD] Repair: {len(plan)} series, {report['gaps']} gaps, {report['new_candles']} candles, "
+              f"{report['requests']} requests in {report['elapsed_sec']}s ({len(report['failed'])} failed)")
+        return report
+
+
+def run_bulk_download(symbols, timeframes=("1h",), db_file="market_data.db", **kwargs):
+    """Synchronous wrapper (startup scripts, CLI). Must not be called from a running event loop."""
+    return asyncio.run(BulkDownloader(db_file=db_file, **kwargs).download(symbols, timeframes))
+
+
+def run_gap_repair(symbols=None, timeframes=("1h",), db_file="market_data.db", since_days=None, **kwargs):
+    """Synchronous wrapper of BulkDownloader.repair (CLI, /api/data-repair)."""
+    return asyncio.run(BulkDownloader(db_file=db_file, **kwargs).repair(symbols, timeframes, since_days))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Bulk OHLCV download into market_data")
+    parser.add_argument("symbols", nargs="+", help="e.g. BTC-USDT ETH-USDT")
+    parser.add_argument("--timeframes", default="1h", help="comma-separated (default: %(default)s)")
+    parser.add_argument("--db", default="market_data.db")
+    parser.add_argument("--concurrency", type=int, default=CONCURRENCY)
+    args = parser.parse_args(argv)
+    report = run_bulk_download(args.symbols, args.timeframes.split(","), db_file=args.db,
+                               concurrency=args.concurrency)
+    for r in report["series"]:
+        print(f"  {r['symbol']:<14} {r['timeframe']:<4} {r['new_candles']:>7} candles {r['pages']:>4} pages"
+              + (f"  ERROR {r['error']}" if r["error"] else ""))
+
+
+if __name__ == "__main__":
+    main()
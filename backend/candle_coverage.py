@@ -0,0 +1,254 @@
+# backend/candle_coverage.py
+"""
+Coverage index of market_data: which candle ranges have been fetched.
+
+fetch_data only looks at MAX(timestamp) and downloads forward from there,
+so holes in the middle of a series (a page that ran out of retries, a
+download cut short, a failed bulk series, old data copied in from
+elsewhere) were never noticed. The market_coverage table records, per
+(symbol, timeframe), the contiguous ranges [start_ts, end_ts] (candle open
+times, inclusive) that were fetched from the exchange:
+
+  - every successful download records the span it asked for, merged with
+    the neighbouring ranges (adjacent = next candle follows directly);
+  - a span the exchange had no candles for (before listing, maintenance
+    windows) is covered as well, so it is never requested again;
+  - a series without an index yet is bootstrapped from its stored
+    timestamps (runs without a missing candle) on first use.
+
+find_gaps() lists the uncovered ranges between (and optionally before)
+the covered ones; plan_pages() turns them into the fewest page windows
+(gaps that fit in one page share it). The repair job itself lives in
+bulk_downloader.BulkDownloader.repair (same token bucket / retries as the
+bulk download).
+
+Config (env): none. Uses the market_data database file.
+
+Usage:
+  python candle_coverage.py status BTC-USDT ETH-USDT --timeframes 1h,4h
+  python candle_coverage.py repair --timeframes 1h,4h,1d     # every stored symbol
+"""
+
+import argparse
+import bisect
+import time
+
+import numpy as np
+
+from db_utils import get_db_connection
+
+DB_FILE = "market_data.db"
+PAGE_LIMIT = 1000
+
+INTERVAL_MS = {
+    '1m': 60000, '15m': 900000, '1h': 3600000, '4h': 14400000,
+    '1d': 86400000, '1w': 604800000,
+}
+
+
+def ensure_table(conn):
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS market_coverage (
+            symbol TEXT,
+            timeframe TEXT,
+            start_ts INTEGER,
+            end_ts INTEGER,
+            PRIMARY KEY (symbol, timeframe, start_ts)
+        );
+    """)
+
+
+# ============================================================
+# 1. RANGE ARITHMETIC (pure)
+# ============================================================
+def runs(timestamps, interval_ms):
+    """Contiguous runs [(start, end)] of sorted candle timestamps (no missing candle inside)."""
+    ts = np.asarray(timestamps, dtype=np.int64)
+    if len(ts) == 0:
+        return []
+    breaks = np.flatnonzero(np.diff(ts) > interval_ms) + 1
+    starts = ts[np.concatenate(([0], breaks))]
+    ends = ts[np.concatenate((breaks - 1, [len(ts) - 1]))]
+    return list(zip(starts.tolist(), ends.tolist()))
+
+
+def merge(ranges, interval_ms):
+    """Union of ranges; ranges that overlap or touch (gap < one candle) are joined."""
+    out = []
+    for start, end in sorted(ranges):
+        if out and start <= out[-1][1] + interval_ms:
+            if end > out[-1][1]:
+                out[-1][1] = end
+        else:
+            out.append([start, end])
+    return [tuple(r) for r in out]
+
+
+def find_gaps(ranges, interval_ms, since=None):
+    """
+    Uncovered ranges [(start, end)] between merged covered ranges.
+    since: also report the head [since, first covered) (history seed).
+    """
+    gaps = []
+    if since is not None and ranges and since < ranges[0][0]:
+        start = ranges[0][0] - (ranges[0][0] - since) // interval_ms * interval_ms
+        if start < ranges[0][0]:
+            gaps.append((start, ranges[0][0] - interval_ms))
+    for (_, prev_end), (next_start, _) in zip(ranges, ranges[1:]):
+        if next_start - prev_end > interval_ms:
+            gaps.append((prev_end + interval_ms, next_start - interval_ms))
+    return gaps
+
+
+def plan_pages(gaps, interval_ms, limit=PAGE_LIMIT):
+    """
+    Page start times covering every gap. One page returns `limit` candles
+    from its start, so gaps that fall inside a window already planned
+    for an earlier gap do not get a request of their own.
+    """
+    span = limit * interval_ms
+    pages = []
+    for lo, hi in sorted(gaps):
+        s = lo if not pages else max(lo, pages[-1] + span)
+        while s <= hi:
+            pages.append(s)
+            s += span
+    return pages
+
+
+def in_gaps(ts, gaps):
+    """True if candle ts lies in one of the sorted gaps."""
+    i = bisect.bisect_right(gaps, (ts, float('inf'))) - 1
+    return i >= 0 and gaps[i][0] <= ts <= gaps[i][1]
+
+
+# ============================================================
+# 2. INDEX (market_coverage table)
+# ============================================================
+def _stored_timestamps(conn, symbol, timeframe):
+    rows = conn.execute("SELECT timestamp FROM market_data WHERE symbol=? AND timeframe=? ORDER BY timestamp",
+                        (symbol, timeframe)).fetchall()
+    return np.array([r[0] for r in rows], dtype=np.int64)
+
+
+def _load(conn, symbol, timeframe):
+    return [(s, e) for s, e in conn.execute(
+        "SELECT start_ts, end_ts FROM market_coverage WHERE symbol=? AND timeframe=? ORDER BY start_ts",
+        (symbol, timeframe)).fetchall()]
+
+
+def _write(conn, symbol, timeframe, ranges):
+    conn.execute("DELETE FROM market_coverage WHERE symbol=? AND timeframe=?", (symbol, timeframe))
+    conn.executemany("INSERT INTO market_coverage (symbol, timeframe, start_ts, end_ts) VALUES (?, ?, ?, ?)",
+                     [(symbol, timeframe, int(s), int(e)) for s, e in ranges])
+
+
+def _ranges(conn, symbol, timeframe, interval_ms):
+    """Covered ranges of a series; bootstraps the index from stored candles on first use."""
+    ranges = _load(conn, symbol, timeframe)
+    if not ranges:
+        ranges = runs(_stored_timestamps(conn, symbol, timeframe), interval_ms)
+        if ranges:
+            _write(conn, symbol, timeframe, ranges)
+    return ranges
+
+
+def get_ranges(symbol, timeframe, db_file=DB_FILE):
+    interval_ms = INTERVAL_MS.get(timeframe, 3600000)
+    conn = get_db_connection(db_file, row_factory=None)
+    try:
+        ensure_table(conn)
+        ranges = _ranges(conn, symbol, timeframe, interval_ms)
+        conn.commit()
+        return ranges
+    finally:
+        conn.close()
+
+
+def record_spans(conn, symbol, timeframe, spans):
+    """Mark fetched spans as covered (caller commits; same transaction as the candles)."""
+    interval_ms = INTERVAL_MS.get(timeframe, 3600000)
+    spans = [(int(s), int(e)) for s, e in spans if s is not None and e is not None and e >= s]
+    if not spans:
+        return
+    ensure_table(conn)
+    ranges = _ranges(conn, symbol, timeframe, interval_ms)
+    _write(conn, symbol, timeframe, merge(ranges + spans, interval_ms))
+
+
+def record_fetch(symbol, timeframe, start_ts, end_ts, db_file=DB_FILE):
+    """fetch_data: the exchange returned every candle of [start_ts, end_ts]."""
+    conn = get_db_connection(db_file, row_factory=None)
+    try:
+        record_spans(conn, symbol, timeframe, [(start_ts, end_ts)])
+        conn.commit()
+    except Exception as e:
+        print(f"[WARN] [COVERAGE] Record failed for {symbol} {timeframe}: {e}")
+    finally:
+        conn.close()
+
+
+def clear(conn, symbol, timeframe):
+    ensure_table(conn)
+    conn.execute("DELETE FROM market_coverage WHERE symbol=? AND timeframe=?", (symbol, timeframe))
+
+
+def stored_symbols(timeframe, db_file=DB_FILE):
+    conn = get_db_connection(db_file, row_factory=None)
+    try:
+        return [r[0] for r in conn.execute(
+            "SELECT DISTINCT symbol FROM market_data WHERE timeframe=? ORDER BY symbol", (timeframe,)).fetchall()]
+    finally:
+        conn.close()
+
+
+def coverage_report(symbols, timeframes=("1h",), since=None, db_file=DB_FILE):
+    """Per series: covered ranges, gaps (count / missing candles) for the status CLI and API."""
+    out = []
+    for tf in timeframes:
+        interval_ms = INTERVAL_MS.get(tf, 3600000)
+        for sym in (symbols or stored_symbols(tf, db_file)):
+            ranges = get_ranges(sym, tf, db_file)
+            gaps = find_gaps(ranges, interval_ms, since)
+            out.append({
+                "symbol": sym, "timeframe": tf,
+                "first_ts": ranges[0][0] if ranges else None,
+                "last_ts": ranges[-1][1] if ranges else None,
+                "ranges": len(ranges),
+                "gaps": [list(g) for g in gaps],
+                "missing_candles": sum((hi - lo) // interval_ms + 1 for lo, hi in gaps),
+                "pages_to_repair": len(plan_pages(gaps, interval_ms)),
+            })
+    return out
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="market_data coverage index / gap repair")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    for name, help_text in (("status", "list gaps per series"), ("repair", "download only the missing ranges")):
+        p = sub.add_parser(name, help=help_text)
+        p.add_argument("symbols", nargs="*", help="default: every stored symbol")
+        p.add_argument("--timeframes", default="1h")
+        p.add_argument("--since-days", type=int, default=None, help="also cover history back to N days ago")
+        p.add_argument("--db", default=DB_FILE)
+    args = parser.parse_args(argv)
+    timeframes = args.timeframes.split(",")
+
+    if args.cmd == "status":
+        since = None
+        if args.since_days is not None:
+            since = int(time.time() * 1000) - args.since_days * 86400000
+        for row in coverage_report(args.symbols, timeframes, since, args.db):
+            print(f"  {row['symbol']:<14} {row['timeframe']:<4} ranges={row['ranges']:<3} "
+                  f"gaps={len(row['gaps']):<3} missing={row['missing_candles']:<7} pages={row['pages_to_repair']}")
+    else:
+        from bulk_downloader import run_gap_repair
+        report = run_gap_repair(args.symbols or None, timeframes, db_file=args.db, since_days=args.since_days)
+        for r in report["series"]:
+            if r["gaps"] or r["error"]:
+                print(f"  {r['symbol']:<14} {r['timeframe']:<4} gaps={r['gaps']:<3} {r['new_candles']:>7} candles "
+                      f"{r['pages']:>4} pages" + (f"  ERROR {r['error']}" if r["error"] else ""))
+
+
+if __name__ == "__main__":
+    main()
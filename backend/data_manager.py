@@ -3,12 +3,39 @@ import pandas as pd
 import asyncio
 
 class DataManager:
-    def __init__(self, exchange_id='binance'):
+    def __init__(self, exchange_id='binance', exchange=None, enable_rate_limit=True):
+        """
+        Args:
+            exchange: ready async exchange object (e.g. a local fake for tests);
+                      default creates ccxt.async_support.<exchange_id>.
+            enable_rate_limit: ccxt's own per-request throttle. Callers that
+                      schedule requests under their own budget (bulk_downloader)
+                      turn it off.
+        """
         self.exchange_id = exchange_id
-        # Initialize exchange (using Binance as default, but scalable to others)
-        self.exchange = getattr(ccxt, exchange_id)({
-            'enableRateLimit': True,  # Prevent getting banned by API
-        })
+        if exchange is not None:
+            self.exchange = exchange
+        else:
+            # Initialize exchange (using Binance as default, but scalable to others)
+            self.exchange = getattr(ccxt, exchange_id)({
+                'enableRateLimit': enable_rate_limit,  # Prevent getting banned by API
+            })
+
+    @staticmethod
+    def ccxt_symbol(symbol: str) -> str:
+        """BTC-USDT / btc-usd -> BTC/USDT (same mapping as TradingEngine.fetch_data)."""
+        symbol = symbol.upper().replace('-', '/')
+        if symbol.endswith('/USD'):
+            symbol = symbol.replace('/USD', '/USDT')
+        return symbol
+
+    async def fetch_ohlcv_page(self, symbol: str, timeframe: str, since: int, limit: int = 1000):
+        """
+        One raw page of candles [timestamp, open, high, low, close, volume]
+        starting at `since` (ms). Errors are raised to the caller (retry policy
+        belongs to the scheduler).
+        """
+        return await self.exchange.fetch_ohlcv(self.ccxt_symbol(symbol), timeframe, since=since, limit=limit)
 
     async def fetch_data(self, symbol: str, timeframe: str = '1h', limit: int = 100):
         """
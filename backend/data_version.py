@@ -0,0 +1,183 @@
+# backend/data_version.py
+"""
+Per-series data version of market_data: (symbol, timeframe) -> last_ts,
+row_count, version, rewrites.
+
+strategy_cache entries are valid while the series they were computed on
+is unchanged. _get_cached_result used to find that out with
+`SELECT MAX(timestamp) FROM market_data` before every single lookup, so a
+scan of 10 strategies x 2 periods x 3 timeframes re-read the newest candle
+60 times per symbol, and writes that do not move the newest candle (gap
+repair, open derived bars rewritten with INSERT OR REPLACE) went unnoticed.
+Now each entry stores the series version it was computed on and is a hit
+only while that equals the current version:
+
+  - _save_to_db (and the bulk downloader) update the data_version row of
+    the series in the same transaction as the candles: last_ts and
+    row_count recomputed from market_data (exact under INSERT OR IGNORE /
+    OR REPLACE and on either storage layout), version + 1 per write.
+    rewrites + 1 when the write touched a candle at or before the previous
+    last_ts (gap repair, open derived bar replaced): appends leave it
+    alone, so backtest checkpoints stay valid across them.
+  - data_versions is the per-process copy read by cache validation. A
+    write in this process replaces its entry. fetch_data re-reads the row
+    after its sync step (_sync_from_exchange returns it) and hands it to
+    observe(): a different version / row_count / rewrites means another
+    process wrote the series (bulk download / repair CLI), even when its
+    last candle did not move, and fetch_data drops the frame_cache and
+    indicator_store state of that series.
+  - Databases from before this table get a row for every stored series
+    when the table is created (ensure_table, one GROUP BY pass in the
+    caller's init transaction). A series still without a row is read
+    from MAX / COUNT on lookup (version 0); lookups never write.
+
+Config (env): none.
+"""
+
+import os
+import threading
+
+DDL = """
+    CREATE TABLE IF NOT EXISTS data_version (
+        symbol TEXT,
+        timeframe TEXT,
+        last_ts INTEGER,
+        row_count INTEGER,
+        version INTEGER,
+        rewrites INTEGER DEFAULT 0,
+        PRIMARY KEY (symbol, timeframe)
+    ) WITHOUT ROWID;
+"""
+
+
+def ensure_table(conn):
+    """Create the table; on first creation backfill every stored series (caller commits)."""
+    if conn.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name='data_version'").fetchone():
+        if "rewrites" not in {r[1] for r in conn.execute("PRAGMA table_info(data_version)")}:
+            conn.execute("ALTER TABLE data_version ADD COLUMN rewrites INTEGER DEFAULT 0")
+        return
+    conn.execute(DDL)
+    conn.execute("""
+        INSERT OR IGNORE INTO data_version (symbol, timeframe, last_ts, row_count, version, rewrites)
+        SELECT symbol, timeframe, MAX(timestamp), COUNT(*), 1, 0 FROM market_data GROUP BY symbol, timeframe
+    """)
+
+
+def bump(conn, symbol, timeframe, first_ts=None):
+    """
+    Recompute last_ts / row_count of a series and increment its version.
+    first_ts: oldest candle timestamp of the write; at or before the
+    previous last_ts (or unknown) it also counts as a rewrite.
+    Runs inside the caller's transaction (same commit as the candles).
+    Returns (last_ts, row_count, version, rewrites).
+    """
+    conn.execute("""
+        INSERT INTO data_version (symbol, timeframe, last_ts, row_count, version, rewrites)
+        SELECT ?, ?, MAX(timestamp), COUNT(*), 1, 0 FROM market_data WHERE symbol=? AND timeframe=?
+        ON CONFLICT (symbol, timeframe) DO UPDATE SET
+            last_ts = excluded.last_ts, row_count = excluded.row_count, version = version + 1,
+            rewrites = COALESCE(rewrites, 0) + (CASE WHEN ? > last_ts THEN 0 ELSE 1 END)
+    """, (symbol, timeframe, symbol, timeframe, first_ts))
+    return read(conn, symbol, timeframe)
+
+
+def read(conn, symbol, timeframe):
+    row = conn.execute("SELECT last_ts, row_count, version, rewrites FROM data_version WHERE symbol=? AND timeframe=?",
+                       (symbol, timeframe)).fetchone()
+    return tuple(row) if row else None
+
+
+def current(conn, symbol, timeframe):
+    """
+    The series' row, or for a series without one (written before the table
+    existed) MAX / COUNT as version 0. None if it has no candles. Read-only.
+    """
+    row = read(conn, symbol, timeframe)
+    if row is None:
+        # Series tanpa baris versi: hitung dari market_data tanpa menulis (versi 0,
+        # bump() pertama menjadikannya 1 sehingga cache yang disimpan sekarang ikut basi)
+        last_ts, row_count = conn.execute(
+            "SELECT MAX(timestamp), COUNT(*) FROM market_data WHERE symbol=? AND timeframe=?",
+            (symbol, timeframe)).fetchone()
+        row = (last_ts, row_count, 0, 0)
+    return row if row[0] is not None else None
+
+
+def drop(conn, symbol, timeframe):
+    conn.execute("DELETE FROM data_version WHERE symbol=? AND timeframe=?", (symbol, timeframe))
+
+
+class DataVersions:
+    """Process-wide copy of data_version rows, keyed by (db path, symbol, timeframe). Thread-safe."""
+
+    def __init__(self):
+        self._entries = {}
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "loads": 0, "unversioned": 0, "updates": 0, "invalidations": 0}
+
+    def get(self, conn, db_file, symbol, timeframe):
+        """
+        (last_ts, row_count, version, rewrites) of a series, or None if it has no
+        candles. Read-only: the caller's transaction is left alone.
+        """
+        key = (os.path.abspath(db_file), symbol, timeframe)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self.stats["hits"] += 1
+                return entry
+        entry = current(conn, symbol, timeframe)
+        self.stats["loads"] += 1
+        if entry is None:
+            return None
+        if entry[2] == 0:
+            self.stats["unversioned"] += 1
+        with self._lock:
+            self._entries[key] = entry
+        return entry
+
+    def put(self, db_file, symbol, timeframe, entry):
+        """
+        Write in this process: entry = the row just committed (None drops it).
+        Returns the entry it replaced (None if there was none).
+        """
+        key = (os.path.abspath(db_file), symbol, timeframe)
+        with self._lock:
+            if entry is None or entry[0] is None:
+                prev = self._entries.pop(key, None)
+            else:
+                prev = self._entries.get(key)
+                self._entries[key] = tuple(entry)
+            self.stats["updates"] += 1
+            return prev
+
+    def observe(self, db_file, symbol, timeframe, row):
+        """
+        row: the series' data_version row just read from the database (None
+        = no candles). Replaces the entry; returns True if it differed from
+        the known one, i.e. another process changed the series since.
+        """
+        key = (os.path.abspath(db_file), symbol, timeframe)
+        row = tuple(row) if row is not None else None
+        with self._lock:
+            entry = self._entries.get(key)
+            if row is None:
+                self._entries.pop(key, None)
+            else:
+                self._entries[key] = row
+            if entry is not None and entry != row:
+                self.stats["invalidations"] += 1
+                return True
+            return False
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def get_stats(self):
+        with self._lock:
+            return {**self.stats, "entries": len(self._entries)}
+
+
+# Shared instance used by TradingEngine
+data_versions = DataVersions()
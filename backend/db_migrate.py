@@ -0,0 +1,379 @@
+# backend/db_migrate.py
+"""
+Compact storage layout for market_data and strategy_cache (SQLite).
+
+The original market_data is a rowid table with PRIMARY KEY (symbol,
+timeframe, timestamp): every candle row repeats the symbol and timeframe
+TEXT, and the primary key is a second B-tree next to the table, holding
+the same three columns again. Reads by (symbol, timeframe) walk the index
+and then jump to the table row for the OHLCV values.
+
+The compact layout:
+
+  - market_series: dictionary (series_id INTEGER PRIMARY KEY, symbol,
+    timeframe), UNIQUE (symbol, timeframe). That unique index also holds
+    series_id, so the id lookup never touches the table.
+  - market_candles: (series_id, timestamp, open, high, low, close, volume)
+    WITHOUT ROWID, clustered on PRIMARY KEY (series_id, timestamp). A
+    series is one contiguous key range: range reads, MAX(timestamp) and
+    the "newest candle" lookups are a single B-tree seek, no second index.
+  - market_data becomes a VIEW over both with the same columns, plus
+    INSTEAD OF INSERT / DELETE triggers, so every existing query and
+    writer (INSERT OR IGNORE / OR REPLACE, DELETE ... WHERE symbol=? AND
+    timeframe=?) keeps working unchanged. The statement's conflict clause
+    applies to the trigger's insert into market_candles. Reads through the
+    view resolve (symbol, timeframe) on the covering UNIQUE index of
+    market_series and then range-scan the clustered market_candles key.
+  - The hot write paths (_save_to_db, bulk downloader) use
+    insert_candles(): the series id is resolved once per batch and the
+    candles go straight into market_candles. The trigger runs a program
+    plus two market_series lookups per candle (about 1.8x the plain
+    table insert in benchmarks.storage_layout).
+  - strategy_cache is rebuilt WITHOUT ROWID on its primary key (symbol,
+    timeframe, period, strategy): lookups and the (symbol, timeframe)
+    prefix delete of _clear_db_data read the clustered key directly.
+    Lookups select their columns by name (strategy_core.CACHE_COLUMNS).
+
+backtest_checkpoint keeps its rowid layout (large equity BLOB rows do not
+belong in a clustered key B-tree).
+
+The migration runs in one transaction, then ANALYZE + VACUUM. Stop the
+API / scanner while it runs. `expand` converts back to the original layout.
+
+Config (env): none.
+
+Usage:
+  python db_migrate.py status  --db market_data.db
+  python db_migrate.py compact --db market_data.db
+  python db_migrate.py expand  --db market_data.db
+
+Before/after size and query latency: python -m benchmarks.storage_layout
+"""
+
+import argparse
+import os
+import re
+import sqlite3
+import time
+
+DB_FILE = "market_data.db"
+
+# Layout asli (sama dengan TradingEngine._init_db), dipakai oleh expand
+MARKET_DATA_TABLE = """
+    CREATE TABLE {name} (
+        symbol TEXT,
+        timeframe TEXT,
+        timestamp INTEGER,
+        open REAL,
+        high REAL,
+        low REAL,
+        close REAL,
+        volume REAL,
+        PRIMARY KEY (symbol, timeframe, timestamp)
+    )
+"""
+
+# strategy_cache dengan direction + params_hash di kunci (sama dengan TradingEngine._init_db)
+STRATEGY_CACHE_TABLE = """
+    CREATE TABLE {name} (
+        symbol TEXT,
+        timeframe TEXT,
+        period TEXT,
+        strategy TEXT,
+        net_profit REAL,
+        win_rate REAL,
+        total_trades INTEGER,
+        max_drawdown REAL,
+        sharpe_ratio REAL,
+        final_balance REAL,
+        signal_data TEXT,
+        rr_ratio TEXT,
+        cached_data_ts INTEGER,
+        updated_at TEXT,
+        direction TEXT NOT NULL DEFAULT 'LONG',
+        params_hash TEXT NOT NULL DEFAULT '',
+        profit_factor REAL,
+        data_version INTEGER,
+        PRIMARY KEY (symbol, timeframe, period, strategy, direction, params_hash)
+    )
+"""
+
+COMPACT_TABLES = """
+    CREATE TABLE market_series (
+        series_id INTEGER PRIMARY KEY,
+        symbol TEXT NOT NULL,
+        timeframe TEXT NOT NULL,
+        UNIQUE (symbol, timeframe)
+    );
+    CREATE TABLE market_candles (
+        series_id INTEGER NOT NULL,
+        timestamp INTEGER NOT NULL,
+        open REAL,
+        high REAL,
+        low REAL,
+        close REAL,
+        volume REAL,
+        PRIMARY KEY (series_id, timestamp)
+    ) WITHOUT ROWID;
+"""
+
+COMPACT_VIEW = """
+    CREATE VIEW market_data AS
+        SELECT s.symbol AS symbol, s.timeframe AS timeframe, c.timestamp AS timestamp,
+               c.open AS open, c.high AS high, c.low AS low, c.close AS close, c.volume AS volume
+        FROM market_candles c JOIN market_series s ON s.series_id = c.series_id;
+
+    CREATE TRIGGER market_data_insert INSTEAD OF INSERT ON market_data
+    BEGIN
+        -- Tanpa konflik (NOT EXISTS): OR REPLACE dari statement luar tidak boleh mengganti series_id
+        INSERT INTO market_series (symbol, timeframe)
+            SELECT NEW.symbol, NEW.timeframe
+            WHERE NOT EXISTS (SELECT 1 FROM market_series WHERE symbol = NEW.symbol AND timeframe = NEW.timeframe);
+        INSERT INTO market_candles (series_id, timestamp, open, high, low, close, volume)
+            VALUES ((SELECT series_id FROM market_series WHERE symbol = NEW.symbol AND timeframe = NEW.timeframe),
+                    NEW.timestamp, NEW.open, NEW.high, NEW.low, NEW.close, NEW.volume);
+    END;
+
+    CREATE TRIGGER market_data_delete INSTEAD OF DELETE ON market_data
+    BEGIN
+        DELETE FROM market_candles
+        WHERE series_id = (SELECT series_id FROM market_series WHERE symbol = OLD.symbol AND timeframe = OLD.timeframe)
+          AND timestamp = OLD.timestamp;
+    END;
+"""
+
+
+# ============================================================
+# WRITE PATH
+# ============================================================
+def insert_candles(conn, symbol, timeframe, rows, replace=False):
+    """
+    INSERT OR IGNORE (replace=True: OR REPLACE) candles [ts, o, h, l, c, v]
+    of one series on either layout. Runs in the caller's transaction.
+    """
+    if not rows:
+        return
+    verb = "REPLACE" if replace else "IGNORE"
+    if layout(conn) != "compact":
+        conn.executemany(
+            f"INSERT OR {verb} INTO market_data (symbol, timeframe, timestamp, open, high, low, close, volume) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?)", [(symbol, timeframe, *row[:6]) for row in rows])
+        return
+    # Layout compact: series_id sekali per batch, candle langsung ke market_candles (tanpa trigger)
+    conn.execute("INSERT OR IGNORE INTO market_series (symbol, timeframe) VALUES (?, ?)", (symbol, timeframe))
+    series_id = conn.execute("SELECT series_id FROM market_series WHERE symbol=? AND timeframe=?",
+                             (symbol, timeframe)).fetchone()[0]
+    conn.executemany(
+        f"INSERT OR {verb} INTO market_candles (series_id, timestamp, open, high, low, close, volume) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?)", [(series_id, *row[:6]) for row in rows])
+
+
+def _connect(db_file):
+    # Koneksi khusus (bukan pool): transaksi eksplisit + VACUUM
+    conn = sqlite3.connect(db_file, isolation_level=None)
+    conn.execute("PRAGMA busy_timeout=30000;")
+    return conn
+
+
+def _object(conn, name):
+    """(type, sql) of a schema object, or (None, None)."""
+    row = conn.execute("SELECT type, sql FROM sqlite_master WHERE name=?", (name,)).fetchone()
+    return row if row else (None, None)
+
+
+def layout(conn):
+    """'compact', 'legacy' or 'empty' (no market_data yet)."""
+    kind, _ = _object(conn, "market_data")
+    if kind == "view":
+        return "compact"
+    return "legacy" if kind == "table" else "empty"
+
+
+def _without_rowid(sql):
+    return "WITHOUT ROWID" in re.sub(r"\s+", " ", sql.upper())
+
+
+def _rebuild_table(conn, name, without_rowid):
+    """Recreate `name` with the same columns / keys, clustered (WITHOUT ROWID) or not."""
+    _, sql = _object(conn, name)
+    if sql is None or _without_rowid(sql) == without_rowid:
+        return False
+    body = re.sub(r"^\s*CREATE\s+TABLE\s+(IF\s+NOT\s+EXISTS\s+)?[\"'`\[]?\w+[\"'`\]]?", "", sql, flags=re.I)
+    body = re.sub(r"\s*WITHOUT\s+ROWID\s*;?\s*$", "", body.rstrip().rstrip(";"), flags=re.I)
+    tmp = f"{name}_rebuild"
+    conn.execute(f"CREATE TABLE {tmp} {body}{' WITHOUT ROWID' if without_rowid else ''}")
+    conn.execute(f"INSERT INTO {tmp} SELECT * FROM {name}")
+    conn.execute(f"DROP TABLE {name}")
+    conn.execute(f"ALTER TABLE {tmp} RENAME TO {name}")
+    return True
+
+
+def _columns(conn, table):
+    return [r[1] for r in conn.execute(f"PRAGMA table_info({table})").fetchall()]
+
+
+def upgrade_strategy_cache(conn):
+    """
+    Bring an old strategy_cache (key without direction / params_hash, or
+    entries without the data_version they were computed on) to the
+    current schema. Idempotent and called on every engine start, so the
+    up-to-date case is a plain PRAGMA read without any lock.
+
+    Old entries are dropped, not relabelled: they were computed with
+    whatever capital / settings the request had, which the old key did not
+    record, and the scanner rebuilds them on its next pass.
+    Keeps the clustered (WITHOUT ROWID) layout if the table had it.
+    Returns True if the table was migrated.
+    """
+    cols = _columns(conn, "strategy_cache")
+    if not cols or "data_version" in cols:
+        return False
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        # Cek ulang di dalam lock: engine lain mungkin baru saja migrasi
+        if "data_version" in _columns(conn, "strategy_cache"):
+            conn.commit()
+            return False
+        _, sql = _object(conn, "strategy_cache")
+        dropped = conn.execute("SELECT COUNT(*) FROM strategy_cache").fetchone()[0]
+        conn.execute("DROP TABLE strategy_cache")
+        conn.execute(STRATEGY_CACHE_TABLE.format(name="strategy_cache")
+                     + (" WITHOUT ROWID" if _without_rowid(sql) else ""))
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    print(f"[MIGRATE] strategy_cache: rebuilt with direction / params_hash key + data_version "
+          f"({dropped} old entries dropped)")
+    return True
+
+
+def _finish(conn, vacuum):
+    conn.execute("ANALYZE")
+    if vacuum:
+        conn.execute("VACUUM")
+    # Mode WAL: VACUUM menulis ulang seluruh file lewat WAL; kembalikan ke file utama
+    conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+
+
+def db_size(db_file):
+    """Bytes on disk: database + WAL."""
+    return sum(os.path.getsize(p) for p in (db_file, db_file + "-wal") if os.path.exists(p))
+
+
+def status(db_file=DB_FILE):
+    conn = _connect(db_file)
+    try:
+        current = layout(conn)
+        out = {"db": db_file, "layout": current, "bytes": db_size(db_file)}
+        if current != "empty":
+            out["candles"] = conn.execute(
+                "SELECT COUNT(*) FROM market_candles" if current == "compact" else "SELECT COUNT(*) FROM market_data"
+            ).fetchone()[0]
+            out["series"] = conn.execute(
+                "SELECT COUNT(*) FROM market_series" if current == "compact"
+                else "SELECT COUNT(*) FROM (SELECT DISTINCT symbol, timeframe FROM market_data)"
+            ).fetchone()[0]
+        _, sql = _object(conn, "strategy_cache")
+        out["strategy_cache"] = None if sql is None else ("clustered" if _without_rowid(sql) else "rowid")
+        return out
+    finally:
+        conn.close()
+
+
+def compact(db_file=DB_FILE, vacuum=True):
+    """Migrate to the compact layout. No-op if already compact. Returns size before/after."""
+    before = db_size(db_file)
+    t0 = time.time()
+    conn = _connect(db_file)
+    try:
+        if layout(conn) == "legacy":
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                for stmt in _statements(COMPACT_TABLES):
+                    conn.execute(stmt)
+                # series_id mengikuti urutan PK lama -> salinan candle berurutan tanpa sort
+                conn.execute("INSERT INTO market_series (symbol, timeframe) "
+                             "SELECT DISTINCT symbol, timeframe FROM market_data ORDER BY symbol, timeframe")
+                conn.execute("""
+                    INSERT INTO market_candles (series_id, timestamp, open, high, low, close, volume)
+                    SELECT s.series_id, m.timestamp, m.open, m.high, m.low, m.close, m.volume
+                    FROM market_data m JOIN market_series s ON s.symbol = m.symbol AND s.timeframe = m.timeframe
+                    ORDER BY s.series_id, m.timestamp
+                """)
+                conn.execute("DROP TABLE market_data")
+                for stmt in _statements(COMPACT_VIEW):
+                    conn.execute(stmt)
+                _rebuild_table(conn, "strategy_cache", without_rowid=True)
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+            _finish(conn, vacuum)
+            print(f"[MIGRATE] {db_file}: compact layout ({time.time() - t0:.1f}s)")
+        else:
+            print(f"[MIGRATE] {db_file}: already {layout(conn)}, nothing to do")
+    finally:
+        conn.close()
+    return {"db": db_file, "bytes_before": before, "bytes_after": db_size(db_file),
+            "elapsed_sec": round(time.time() - t0, 2)}
+
+
+def expand(db_file=DB_FILE, vacuum=True):
+    """Convert a compact database back to the original market_data / strategy_cache tables."""
+    before = db_size(db_file)
+    t0 = time.time()
+    conn = _connect(db_file)
+    try:
+        if layout(conn) == "compact":
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                conn.execute(MARKET_DATA_TABLE.format(name="market_data_rebuild"))
+                conn.execute("INSERT INTO market_data_rebuild SELECT symbol, timeframe, timestamp, open, high, low, "
+                             "close, volume FROM market_data ORDER BY symbol, timeframe, timestamp")
+                conn.execute("DROP VIEW market_data")  # trigger ikut terhapus
+                conn.execute("DROP TABLE market_candles")
+                conn.execute("DROP TABLE market_series")
+                conn.execute("ALTER TABLE market_data_rebuild RENAME TO market_data")
+                _rebuild_table(conn, "strategy_cache", without_rowid=False)
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+            _finish(conn, vacuum)
+            print(f"[MIGRATE] {db_file}: original layout ({time.time() - t0:.1f}s)")
+        else:
+            print(f"[MIGRATE] {db_file}: already {layout(conn)}, nothing to do")
+    finally:
+        conn.close()
+    return {"db": db_file, "bytes_before": before, "bytes_after": db_size(db_file),
+            "elapsed_sec": round(time.time() - t0, 2)}
+
+
+def _statements(script):
+    """Split a DDL script into statements (trigger bodies keep their inner ';')."""
+    out, buf = [], ""
+    for line in script.strip().splitlines():
+        buf += line + "\n"
+        if sqlite3.complete_statement(buf):
+            out.append(buf.strip())
+            buf = ""
+    return out
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="market_data storage layout migration")
+    parser.add_argument("cmd", choices=["status", "compact", "expand"])
+    parser.add_argument("--db", default=DB_FILE)
+    parser.add_argument("--no-vacuum", action="store_true", help="skip VACUUM (file keeps its size until the next one)")
+    args = parser.parse_args(argv)
+    if args.cmd == "status":
+        print(status(args.db))
+    else:
+        fn = compact if args.cmd == "compact" else expand
+        r = fn(args.db, vacuum=not args.no_vacuum)
+        print(f"  {r['bytes_before'] / 1e6:.1f} MB -> {r['bytes_after'] / 1e6:.1f} MB in {r['elapsed_sec']}s")
+
+
+if __name__ == "__main__":
+    main()
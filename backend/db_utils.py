@@ -1,29 +1,232 @@
 # backend/db_utils.py
 """
-Centralized SQLite connection utility.
+Centralized SQLite connection manager.
 Uses WAL mode + check_same_thread=False for concurrent FastAPI access.
+
+Callers used to sqlite3.connect() per call and re-issue their PRAGMAs each
+time (one fetch_data = 2-3 connects, a full scan = tens of thousands).
+Connections are now pooled per thread:
+
+  - One connection per (thread, database file, row factory), opened on
+    first use and reused afterwards. PRAGMAs run once at connect.
+  - sqlite3's prepared-statement cache (cached_statements) lives on the
+    connection, so repeated queries skip the SQL compile step.
+  - A transaction still open when the connection is handed out again was
+    leaked by a caller that never released it: it is rolled back and
+    logged on acquire, so it cannot keep the write lock from other threads.
+  - A helper that must join its caller's open transaction asks for it with
+    get_db_connection(..., nested=True): same connection, transaction left
+    alone. Holders are reference-counted.
+  - conn.close() on a pooled connection only hands it back. When the
+    outermost holder releases it, a transaction still open is rolled back
+    (exactly what a real close did) and logged; the connection itself
+    stays open for the next caller on that thread. Callers release in
+    `finally`.
+  - SQLITE_BUSY ("database is locked") is retried here instead of inside
+    SQLite's busy handler, so the time spent waiting on locks is measured.
+
+Config (env):
+  SQLITE_CACHE_KB       page cache per connection in KiB (default 32768)
+  SQLITE_MMAP_MB        mmap_size in MiB (default 0 = off)
+  SQLITE_BUSY_TIMEOUT   seconds to wait for a lock before raising (default 30)
+
+Metrics per database file: get_db_metrics().
 """
 
+import os
 import sqlite3
 import threading
+import time
+import weakref
 
 _local = threading.local()
 
+CACHE_KB = int(os.getenv("SQLITE_CACHE_KB", "32768"))
+MMAP_MB = int(os.getenv("SQLITE_MMAP_MB", "0"))
+BUSY_TIMEOUT = float(os.getenv("SQLITE_BUSY_TIMEOUT", "30"))
+STATEMENT_CACHE = 256
 
-def get_db_connection(db_path: str) -> sqlite3.Connection:
-    """
-    Get a new SQLite connection with WAL mode enabled.
-    WAL mode prevents 'database is locked' errors under concurrent load.
-    Since connections are cheap, we don't cache them to avoid 'closed db' errors.
-    """
-    conn = sqlite3.connect(db_path, check_same_thread=False, timeout=30.0)
-    # Enable Write-Ahead Logging for concurrency
+SQLITE_BUSY = 5
+SQLITE_BUSY_SNAPSHOT = 517  # snapshot WAL basi: retry tidak akan pernah berhasil
+
+_stats_lock = threading.Lock()
+_stats = {}
+_open = weakref.WeakSet()
+
+
+def _new_stats():
+    return {
+        "connects": 0, "acquires": 0, "nested_acquires": 0, "releases": 0, "rollbacks": 0,
+        "lock_waits": 0, "lock_wait_sec": 0.0, "lock_wait_max_sec": 0.0, "lock_timeouts": 0,
+    }
+
+
+def _count(path, key, value=1):
+    with _stats_lock:
+        s = _stats.setdefault(path, _new_stats())
+        s[key] += value
+
+
+def _is_busy(err):
+    code = getattr(err, 'sqlite_errorcode', None)
+    if code is not None:
+        return code & 0xff == SQLITE_BUSY and code != SQLITE_BUSY_SNAPSHOT
+    return "database is locked" in str(err)
+
+
+def _call_locked(path, fn, *args):
+    """Run fn(*args); on SQLITE_BUSY back off and retry until BUSY_TIMEOUT."""
+    try:
+        return fn(*args)
+    except sqlite3.OperationalError as e:
+        if not _is_busy(e):
+            raise
+    t0 = time.perf_counter()
+    delay = 0.001
+    try:
+        while True:
+            time.sleep(delay)
+            try:
+                return fn(*args)
+            except sqlite3.OperationalError as e:
+                if not _is_busy(e):
+                    raise
+                if time.perf_counter() - t0 >= BUSY_TIMEOUT:
+                    _count(path, "lock_timeouts")
+                    raise
+            delay = min(delay * 2, 0.05)
+    finally:
+        waited = time.perf_counter() - t0
+        with _stats_lock:
+            s = _stats.setdefault(path, _new_stats())
+            s["lock_waits"] += 1
+            s["lock_wait_sec"] += waited
+            s["lock_wait_max_sec"] = max(s["lock_wait_max_sec"], waited)
+
+
+class PooledCursor(sqlite3.Cursor):
+    def execute(self, sql, parameters=()):
+        return _call_locked(self.connection.path, super().execute, sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        if not isinstance(seq_of_parameters, (list, tuple)):
+            seq_of_parameters = list(seq_of_parameters)  # retry butuh urutan yang bisa diulang
+        return _call_locked(self.connection.path, super().executemany, sql, seq_of_parameters)
+
+    def executescript(self, sql_script):
+        return _call_locked(self.connection.path, super().executescript, sql_script)
+
+
+class PooledConnection(sqlite3.Connection):
+    """sqlite3.Connection whose close() returns it to the per-thread pool."""
+    path = None
+    holders = 0
+
+    def cursor(self, factory=PooledCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+    def executescript(self, sql_script):
+        return self.cursor().executescript(sql_script)
+
+    def commit(self):
+        return _call_locked(self.path, super().commit)
+
+    def close(self):
+        """
+        Hand back to the pool. The outermost holder discards uncommitted
+        work (logged); the connection itself stays open.
+        """
+        self.holders = max(0, self.holders - 1)
+        if self.holders == 0 and self.in_transaction:
+            print(f"[WARN] [DB] Uncommitted transaction on {os.path.basename(self.path)} rolled back at release")
+            self.rollback()
+            _count(self.path, "rollbacks")
+        _count(self.path, "releases")
+
+    def close_for_real(self):
+        super().close()
+
+
+def _connect(path):
+    conn = sqlite3.connect(path, check_same_thread=False, timeout=0,
+                           factory=PooledConnection, cached_statements=STATEMENT_CACHE)
+    conn.path = path
+    # Lock ditunggu oleh _call_locked (terukur), bukan oleh busy handler SQLite
+    conn.execute("PRAGMA busy_timeout=0;")
     conn.execute("PRAGMA journal_mode=WAL;")
-    # Set busy timeout to 5000ms (5 seconds)
-    conn.execute("PRAGMA busy_timeout=5000;")
-    # Optional performance pragmas
     conn.execute("PRAGMA synchronous=NORMAL;")
-    conn.execute("PRAGMA cache_size=-2000;")
-    
-    conn.row_factory = sqlite3.Row
+    conn.execute(f"PRAGMA cache_size=-{CACHE_KB};")
+    if MMAP_MB > 0:
+        conn.execute(f"PRAGMA mmap_size={MMAP_MB * 1024 * 1024};")
+    _count(path, "connects")
+    _open.add(conn)
+    return conn
+
+
+def get_db_connection(db_path: str, row_factory=sqlite3.Row, nested=False) -> sqlite3.Connection:
+    """
+    This thread's pooled connection to db_path (opened on first use).
+    row_factory: sqlite3.Row (default) or None for plain tuples; each
+    factory gets its own connection so callers never see the other shape.
+    Call conn.close() when done (in `finally`), as with a fresh connection.
+
+    A transaction left open on the connection is treated as leaked and
+    rolled back here. nested=True: the caller runs inside a holder's open
+    transaction on this thread and joins it; the work is committed or
+    rolled back by whoever commits / releases last.
+    """
+    path = os.path.abspath(db_path)
+    pool = getattr(_local, 'pool', None)
+    if pool is None or _local.pid != os.getpid():
+        # Thread baru, atau proses hasil fork: koneksi SQLite tidak boleh dipakai lintas fork
+        pool = _local.pool = {}
+        _local.pid = os.getpid()
+
+    key = (path, row_factory)
+    conn = pool.get(key)
+    if conn is None:
+        conn = pool[key] = _connect(path)
+    elif nested and conn.holders and conn.in_transaction:
+        # Acquire bersarang yang diminta eksplisit: ikut transaksi caller, jangan disentuh
+        _count(path, "nested_acquires")
+    else:
+        if conn.in_transaction:
+            # Transaksi bocor (caller lupa commit/close): lepas lock tulisnya
+            print(f"[WARN] [DB] Stale transaction on {os.path.basename(path)} rolled back at acquire")
+            conn.rollback()
+            _count(path, "rollbacks")
+        # Hold dari caller yang lupa close() tidak perlu dilindungi
+        conn.holders = 0
+    conn.holders += 1
+    conn.row_factory = row_factory
+    _count(path, "acquires")
     return conn
+
+
+def close_thread_connections():
+    """Really close this thread's pooled connections (shutdown / tests)."""
+    pool = getattr(_local, 'pool', None) or {}
+    for conn in pool.values():
+        conn.close_for_real()
+    pool.clear()
+
+
+def get_db_metrics():
+    """Per database file: connects, acquires (reuse), releases, rollbacks, lock waits."""
+    with _stats_lock:
+        stats = {path: dict(s) for path, s in _stats.items()}
+    open_conns = {}
+    for conn in list(_open):
+        open_conns[conn.path] = open_conns.get(conn.path, 0) + 1
+    for path, s in stats.items():
+        s["open_connections"] = open_conns.get(path, 0)
+        s["lock_wait_sec"] = round(s["lock_wait_sec"], 4)
+        s["lock_wait_max_sec"] = round(s["lock_wait_max_sec"], 4)
+        s["reuse_ratio"] = round(1 - s["connects"] / s["acquires"], 4) if s["acquires"] else 0.0
+    return stats
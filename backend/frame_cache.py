@@ -0,0 +1,123 @@
+# backend/frame_cache.py
+"""
+In-process LRU cache of fetch_data DataFrames.
+
+During one sector scan fetch_data(symbol, "max", tf) is called for the same
+symbols by find_best_strategy_for_symbol, check_market_signals, btc-radar,
+market-analytics and anomaly-scan; each call used to re-read the rows and
+rebuild the frame. Entries here are keyed by (symbol, timeframe,
+requested_period) and validated against:
+
+  - the watermark: timestamp of the latest stored candle. A new candle
+    (or a repair that changes the last one) makes the entry stale.
+  - the period cutoff: rolling presets (1mo..2y) drop their first candles
+    as time passes, so an entry whose first candle is older than the
+    current cutoff is a miss as well.
+
+Consumers get read-only views: a shallow copy that shares the cached column
+buffers under pandas Copy-on-Write (default from pandas 3). Adding columns
+(prepare_indicators) or writing values only touches the caller's frame, so
+callers no longer deep-copy to protect the cache. Without Copy-on-Write
+(pandas < 3, option off) get() falls back to a deep copy.
+
+Config (env):
+  FRAME_CACHE_MB   memory budget of all cached frames (default 512, 0 = off)
+
+Stats: frame_cache.get_stats() -> hits, misses, stale, evictions, entries, bytes.
+"""
+
+import os
+import threading
+from collections import OrderedDict
+
+import pandas as pd
+
+DEFAULT_MAX_MB = int(os.getenv("FRAME_CACHE_MB", "512"))
+
+
+def _copy_on_write():
+    if int(pd.__version__.split('.')[0]) >= 3:
+        return True
+    try:
+        return pd.options.mode.copy_on_write is True
+    except AttributeError:
+        return False
+
+
+class FrameCache:
+    """Process-wide LRU of fetch_data frames under a byte budget. Thread-safe."""
+
+    def __init__(self, max_mb=DEFAULT_MAX_MB):
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        self._entries = OrderedDict()  # key -> (watermark, first_ts, nbytes, df)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "stale": 0, "evictions": 0, "invalidations": 0}
+
+    def _view(self, df):
+        return df.copy(deep=False) if _copy_on_write() else df.copy()
+
+    def get(self, key, watermark, cutoff_ts=0):
+        """Read-only view of the cached frame, or None if absent / stale."""
+        if self.max_bytes <= 0:
+            return None
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.stats["misses"] += 1
+                return None
+            if entry[0] != watermark or entry[1] < cutoff_ts:
+                # Candle baru, atau cutoff periode sudah melewati candle pertama
+                self._drop(key)
+                self.stats["stale"] += 1
+                self.stats["misses"] += 1
+                return None
+            self._entries.move_to_end(key)
+            self.stats["hits"] += 1
+            df = entry[3]
+        return self._view(df)
+
+    def put(self, key, watermark, df):
+        """Cache df (caller must not modify it afterwards); returns a read-only view."""
+        if self.max_bytes <= 0 or df is None or df.empty:
+            return df
+        nbytes = int(df.memory_usage(index=True, deep=False).sum())
+        if nbytes > self.max_bytes:
+            return df
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = (watermark, int(df['timestamp'].iloc[0]), nbytes, df)
+            self._bytes += nbytes
+            while self._bytes > self.max_bytes and len(self._entries) > 1:
+                old = next(iter(self._entries))
+                self._drop(old)
+                self.stats["evictions"] += 1
+        return self._view(df)
+
+    def _drop(self, key):
+        entry = self._entries.pop(key)
+        self._bytes -= entry[2]
+
+    def invalidate(self, symbol, timeframe):
+        """Drop every period of a series (force_reload / data repair)."""
+        with self._lock:
+            for key in [k for k in self._entries if k[0] == symbol and k[1] == timeframe]:
+                self._drop(key)
+                self.stats["invalidations"] += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def get_stats(self):
+        with self._lock:
+            lookups = self.stats["hits"] + self.stats["misses"]
+            return {**self.stats, "entries": len(self._entries), "bytes": self._bytes,
+                    "max_bytes": self.max_bytes,
+                    "hit_ratio": round(self.stats["hits"] / lookups, 4) if lookups else 0.0}
+
+
+# Shared instance used by TradingEngine
+frame_cache = FrameCache()
@@ -9,16 +9,18 @@ Calculates:
 - Monthly Returns Heatmap
 - Total Return, CAGR (Projected)
 """
-import sqlite3
 import pandas as pd
 import numpy as np
 from datetime import datetime, timedelta
 
+from db_utils import get_db_connection
+from metrics_kernel import compute_metrics
+
 DB_FILE = "market_data.db"
 
 def _get_db_conn():
     try:
-        return sqlite3.connect(DB_FILE, check_same_thread=False)
+        return get_db_connection(DB_FILE, row_factory=None)
     except Exception as e:
         print(f"❌ FundAnalytics DB Error: {e}")
         return None
@@ -42,27 +44,25 @@ def get_fund_performance():
         "monthly_returns": {}
     }
 
+    conn = _get_db_conn()
+    if not conn: return metrics
     try:
-        conn = _get_db_conn()
-        if not conn: return metrics
 
         # 1. Trade Analysis (Win Rate, Profit Factor, etc.)
         trades_df = pd.read_sql_query("SELECT pnl, close_time FROM trade_log WHERE status='FILLED' OR status='CLOSED' ORDER BY id ASC", conn)
         
         if not trades_df.empty:
-            pnl = trades_df['pnl'].fillna(0)
-            wins = pnl[pnl > 0]
-            losses = pnl[pnl <= 0]
+            pnl = trades_df['pnl'].fillna(0).to_numpy(dtype=np.float64)
+            tm = compute_metrics(trade_pnl=pnl)
             
-            metrics['trades_count'] = len(pnl)
-            if len(pnl) > 0:
-                metrics['win_rate'] = (len(wins) / len(pnl)) * 100
-                metrics['avg_win'] = wins.mean() if not wins.empty else 0
-                metrics['avg_loss'] = losses.mean() if not losses.empty else 0
+            metrics['trades_count'] = tm['total_trades']
+            if tm['total_trades'] > 0:
+                metrics['win_rate'] = tm['win_rate'] * 100
+                metrics['avg_win'] = tm['avg_win']
+                metrics['avg_loss'] = -tm['avg_loss']  # signed (negative), as before
                 
-                gross_profit = wins.sum()
-                gross_loss = abs(losses.sum())
-                metrics['profit_factor'] = (gross_profit / gross_loss) if gross_loss > 0 else (gross_profit if gross_profit > 0 else 0)
+                gross_profit = tm['gross_profit']
+                metrics['profit_factor'] = tm['profit_factor'] if tm['gross_loss'] > 0 else (gross_profit if gross_profit > 0 else 0)
 
         # 2. Portfolio/Equity Analysis (Sharpe, Drawdown, Returns)
         # We need daily snapshots for these metrics to be accurate
@@ -83,30 +83,19 @@ def get_fund_performance():
                 # Total Return
                 start_eq = daily_equity.iloc[0]
                 end_eq = daily_equity.iloc[-1]
-                if start_eq > 0:
-                    metrics['total_return_pct'] = ((end_eq - start_eq) / start_eq) * 100
-
-                # Max Drawdown
-                rolling_max = daily_equity.cummax()
-                drawdown = (daily_equity - rolling_max) / rolling_max
-                metrics['max_drawdown_pct'] = abs(drawdown.min()) * 100
-
-                # Sharpe Ratio (assuming risk-free rate = 0 for simplicity, annualized)
-                if daily_returns.std() > 0:
-                    metrics['sharpe_ratio'] = (daily_returns.mean() / daily_returns.std()) * np.sqrt(365) # Crypto trades 24/7/365
-
-                # Sortino Ratio (downside deviation only)
-                negative_returns = daily_returns[daily_returns < 0]
-                if not negative_returns.empty and negative_returns.std() > 0:
-                     metrics['sortino_ratio'] = (daily_returns.mean() / negative_returns.std()) * np.sqrt(365)
+                total_return = ((end_eq - start_eq) / start_eq) if start_eq > 0 else 0.0
+                metrics['total_return_pct'] = total_return * 100
 
-                # Calmar Ratio
-                if metrics['max_drawdown_pct'] > 0:
-                    # Annualized Return approx
-                    days = (daily_equity.index[-1] - daily_equity.index[0]).days
-                    if days > 0:
-                        annual_ret = metrics['total_return_pct'] / (days / 365.0)
-                        metrics['calmar_ratio'] = annual_ret / metrics['max_drawdown_pct']
+                # Drawdown, Sharpe, Sortino, Calmar — one pass (metrics_kernel)
+                # Crypto trades 24/7/365; Calmar annualizes over calendar days
+                days = (daily_equity.index[-1] - daily_equity.index[0]).days
+                em = compute_metrics(daily_equity.to_numpy(dtype=np.float64), periods_per_year=365,
+                                     total_return=total_return, periods=days)
+                metrics['max_drawdown_pct'] = em['max_drawdown'] * 100
+                metrics['sharpe_ratio'] = em['sharpe']
+                metrics['sortino_ratio'] = em['sortino']
+                if days > 0:
+                    metrics['calmar_ratio'] = em['calmar']
 
                 # Monthly Returns Heatmap
                 # Group by Year-Month
@@ -127,8 +116,6 @@ def get_fund_performance():
                     monthly_data[year][month_name] = round(m_ret * 100, 2)
                 
                 metrics['monthly_returns'] = monthly_data
-
-        conn.close()
         
         # Rounding
         for k, v in metrics.items():
@@ -137,5 +124,7 @@ def get_fund_performance():
                 
     except Exception as e:
         print(f"⚠️ Fund Calc Error: {e}")
+    finally:
+        conn.close()
 
     return metrics
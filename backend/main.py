@@ -7,10 +7,24 @@ import portfolio_engine
 import risk_manager
 import fund_analytics
 from backtest_engine import BacktestEngine
+from backtest_pool import backtest_pool
+from param_sweep import ParameterSweep, table_to_records
+from walk_forward import WalkForwardEngine
+from portfolio_backtest import PortfolioBacktester
+from backtest_result import materialize, TradeLog
+import metrics_kernel
 from anomaly_scanner import AnomalyScanner
 from macro_intelligence import MacroIntelligence
 from global_market import GlobalMarketAnalyzer
-from db_utils import get_db_connection
+from db_utils import get_db_connection, get_db_metrics
+from frame_cache import frame_cache
+from indicator_store import indicator_store
+from ohlcv_store import ohlcv_store
+from single_flight import download_flight
+from data_version import data_versions
+import candle_coverage
+from bulk_downloader import run_gap_repair
+import scan_planner
 from alpha_data import AlphaDataProvider
 from alpha_features import AlphaFeatureEngine
 from ai_brain import AIBrain
@@ -45,8 +59,10 @@ BINANCE_SECRET_KEY = os.getenv("BINANCE_SECRET_KEY")
 WATCHLIST_FILE = "watchlist.json" # Legacy backup file (Secondary storage)
 
 # Thread pool for parallel scanning — shared across requests
+# (threads handle fetch/IO; the backtests themselves run in backtest_pool processes,
+#  so keep enough symbol threads in flight to feed every worker)
 _scan_executor = ThreadPoolExecutor(max_workers=4)
-_symbol_executor = ThreadPoolExecutor(max_workers=3)
+_symbol_executor = ThreadPoolExecutor(max_workers=max(3, backtest_pool.workers))
 
 # Global State for Streaming Scanner & Background Auto-Scan
 _scan_state = {
@@ -165,9 +181,8 @@ def _calculate_score(metrics):
     if profit_factor == 0:
         trades_list = metrics.get('trades_list', [])
         if trades_list:
-            gross_profit = sum(t['pnl_pct'] for t in trades_list if t['pnl_pct'] > 0)
-            gross_loss   = abs(sum(t['pnl_pct'] for t in trades_list if t['pnl_pct'] < 0))
-            profit_factor = (gross_profit / gross_loss) if gross_loss > 0 else 0.0
+            m = metrics_kernel.compute_metrics(trade_pnl=TradeLog.from_records(trades_list).pnl_pct)
+            profit_factor = m['profit_factor'] if m['gross_loss'] > 0 else 0.0
 
     # Gate 1: Max Drawdown > 30% → reject langsung
     if max_dd > 0.30:
@@ -189,11 +204,15 @@ def _calculate_score(metrics):
     return sharpe * profit_factor * (1 - max_dd)
 
 
-def find_best_strategy_for_symbol(engine, symbol, mode="AUTO", manual_strat=None, manual_tf=None, manual_per=None, direction="LONG"):
+# Timeframe yang dicoba scanner AUTO (juga di-prime per sektor lewat load_many)
+SCAN_TIMEFRAMES = ["1h", "4h", "1d"]
+
+def find_best_strategy_for_symbol(engine, symbol, mode="AUTO", manual_strat=None, manual_tf=None, manual_per=None, direction="LONG", pool=None):
     """
     Core Logic: Find the best strategy or run a manual strategy.
     Used by Scanner API and Bot Scheduler.
     Considers direction (LONG/SHORT).
+    pool: optional BacktestPool — AUTO batches then run in worker processes.
     """
     if mode == 'MANUAL':
         # --- MANUAL LOGIC ---
@@ -201,7 +220,8 @@ def find_best_strategy_for_symbol(engine, symbol, mode="AUTO", manual_strat=None
         df_raw = engine.fetch_data(symbol, requested_period="max", interval=manual_tf)
         
         if df_raw is not None and len(df_raw) > 30:
-            _, _, metrics, _ = engine.run_backtest(df_raw, manual_strat, requested_period=manual_per)
+            _, _, metrics, _ = engine.run_backtest(df_raw, manual_strat, requested_period=manual_per,
+                                                   checkpoint_key=(symbol, manual_tf))
             signal_info = engine.get_signal_advice(df_raw, manual_strat)
             rr_long = calculate_rr_string(signal_info['price'], signal_info['setup_long']['tp'], signal_info['setup_long']['sl'])
             
@@ -224,48 +244,55 @@ def find_best_strategy_for_symbol(engine, symbol, mode="AUTO", manual_strat=None
             "MIX_STRATEGY", "MIX_STRATEGY_PRO"
         ]
         
-        timeframes = ["1h", "4h", "1d"]
+        timeframes = SCAN_TIMEFRAMES
         periods = ["6mo", "1y"] 
         
         best_config = None
         best_score = -999999999
+        to_cache = []  # hasil baru semua timeframe -> satu transaksi upsert di akhir
         
         for tf in timeframes:
             # Fetch Max data sekali per timeframe untuk efisiensi
             df_raw = engine.fetch_data(symbol, requested_period="max", interval=tf) 
             if df_raw is None or len(df_raw) < 50: continue
 
+            # === CACHE-FIRST LOGIC ===
+            # Key cache termasuk direction: LONG dan SHORT sama-sama di-cache.
+            # Satu query untuk semua entry (symbol, tf, direction); validasi lewat data_version
+            valid = engine._get_cached_results(symbol, tf, direction=direction)
+            cached_results = {(per, strat): valid[(per, strat, direction)]
+                              for per in periods for strat in strategies if (per, strat, direction) in valid}
+
+            # Cache MISS — recalculate all missing combos in ONE batch
+            # (indicators computed once per timeframe, slices shared per period)
+            missing = [(per, strat) for per in periods for strat in strategies if (per, strat) not in cached_results]
+            batch_results = {}
+            if missing:
+                batch_strategies = [s for s in strategies if any(m[1] == s for m in missing)]
+                batch_periods = [p for p in periods if any(m[0] == p for m in missing)]
+                if pool is not None:
+                    batch_results = pool.run_batch(engine, df_raw, batch_strategies, batch_periods, [direction])
+                else:
+                    batch_results = engine.run_backtest_batch(
+                        df_raw, strategies=batch_strategies, periods=batch_periods, directions=[direction]
+                    )
+                signal_info = engine.get_signal_advice(df_raw, None)  # advice is strategy-independent
+                setup = signal_info.get('setup_short', {}) if direction == "SHORT" else signal_info.get('setup_long', {})
+                rr_fresh = calculate_rr_string(signal_info['price'], setup.get('tp', 0), setup.get('sl', 0))
+
             for per in periods:
                 for strat in strategies:
-                    # === CACHE-FIRST LOGIC ===
-                    # To prevent LONG/SHORT cache collision without altering table schema just yet, 
-                    # we only use DB cache for LONG. For SHORT, we force recalculate.
-                    cached = None
-                    if direction == "LONG":
-                        cached = engine._get_cached_result(symbol, tf, per, strat)
-                    
+                    cached = cached_results.get((per, strat))
                     if cached:
                         # Cache HIT — skip backtest entirely
                         metrics = cached  # cached is dict metrics
-                        signal_info = cached.get('signal_data', {})
+                        signal_info_row = cached.get('signal_data', {})
                         rr_long = cached.get('rr_ratio', 'N/A')
                     else:
-                        # Cache MISS — recalculate
-                        try:
-                            _, _, metrics, _ = engine.run_backtest(df_raw, strat, requested_period=per, direction=direction)
-                            signal_info = engine.get_signal_advice(df_raw, strat)
-                            # rr string computation (dummy for SHORT for now)
-                            tp = signal_info.get('setup_short', {}).get('tp', 0) if direction == "SHORT" else signal_info.get('setup_long', {}).get('tp', 0)
-                            sl = signal_info.get('setup_short', {}).get('sl', 0) if direction == "SHORT" else signal_info.get('setup_long', {}).get('sl', 0)
-                            rr_long = calculate_rr_string(signal_info['price'], tp, sl)
-                        except TypeError: # Backward compatibility if run_backtest doesn't take direction
-                            _, _, metrics, _ = engine.run_backtest(df_raw, strat, requested_period=per)
-                            signal_info = engine.get_signal_advice(df_raw, strat)
-                            rr_long = calculate_rr_string(signal_info['price'], signal_info.get('setup_long', {}).get('tp', 0), signal_info.get('setup_long', {}).get('sl', 0))
-                        
-                        # Save ke cache (but only LONG to not corrupt old schema, memory handles SHORT)
-                        if direction == "LONG":
-                            engine._save_cache_result(symbol, tf, per, strat, metrics, signal_info, rr_long)
+                        metrics = batch_results[(per, strat, direction)]
+                        signal_info_row = signal_info
+                        rr_long = rr_fresh
+                        to_cache.append((tf, per, strat, direction, metrics, signal_info_row, rr_long))
                     
                     if metrics.get('total_trades', 0) < 3: continue
 
@@ -277,12 +304,13 @@ def find_best_strategy_for_symbol(engine, symbol, mode="AUTO", manual_strat=None
                         best_config = {
                             "symbol": symbol, "strategy": strat, "timeframe": tf, "period": per,
                             "win_rate": metrics.get('win_rate', 0), "profit": metrics.get('net_profit', 0),
-                            "trades": metrics.get('total_trades', 0), "signal_data": signal_info,
+                            "trades": metrics.get('total_trades', 0), "signal_data": signal_info_row,
                             "rr_ratio": rr_long, "mode": "AUTO", "max_dd": metrics.get('max_drawdown', 0),
                             "score": round(score, 4),
                             "sharpe": round(metrics.get('sharpe_ratio', 0), 2),
                             "profit_factor": round(metrics.get('profit_factor', 0), 2)
                         }
+        engine._save_cache_results(symbol, to_cache)
         return best_config
 
 # =============================================================================
@@ -435,6 +463,7 @@ async def lifespan(app: FastAPI):
     print("System Shutdown: Sending Telegram Notification...")
     send_telegram_alert("SYSTEM INACTIVE\n\nBot QuantTrade has been stopped.")
     scheduler.shutdown()
+    backtest_pool.shutdown()
 
 app = FastAPI(lifespan=lifespan)
 
@@ -492,6 +521,47 @@ class SingleBacktestRequest(BaseModel):
     timeframe: str = "1d"
     period: str = "1y"
 
+class ParamSweepRequest(BaseModel):
+    symbol: str
+    strategies: Optional[List[str]] = None    # default: semua strategi
+    directions: List[str] = ["LONG"]
+    grids: Optional[dict] = None              # {strategy: {param: [values]}}, default param_sweep.DEFAULT_GRIDS
+    capital: float = 1000.0
+    timeframe: str = "1h"
+    period: str = "max"
+    start_date: Optional[str] = None
+    end_date: Optional[str] = None
+    min_trades: int = 3
+    top: int = 50
+
+class WalkForwardRequest(BaseModel):
+    symbol: str
+    timeframe: str = "1h"
+    train_bars: int = 2000
+    test_bars: int = 500
+    step: Optional[int] = None               # default = test_bars
+    mode: str = "rolling"                    # "rolling" | "anchored"
+    strategies: Optional[List[str]] = None   # default: semua strategi
+    directions: List[str] = ["LONG"]
+    grids: Optional[dict] = None
+    optimize_params: bool = True             # False = hanya parameter default
+    capital: float = 1000.0
+    min_trades: int = 3
+
+class PortfolioBacktestRequest(BaseModel):
+    symbols: Optional[List[str]] = None      # pakai strategy/direction di bawah
+    book: Optional[List[dict]] = None        # [{symbol, strategy, direction}] (mis. elite_signals)
+    use_elite: Optional[str] = None          # "LONG" / "SHORT": ambil elite_signals hasil scan terakhir
+    strategy: str = "MOMENTUM"
+    direction: str = "LONG"
+    timeframe: str = "1h"
+    period: str = "1y"
+    start_date: Optional[str] = None
+    end_date: Optional[str] = None
+    capital: float = 10000.0
+    allocation: str = "equal"                # "equal" | "risk"
+    risk: Optional[dict] = None              # override risk_manager config (max_open_positions, ...)
+
 # =============================================================================
 # 7. SECTORS CONFIGURATION
 # =============================================================================
@@ -815,7 +885,7 @@ def run_dual_backtest(req: StrategyRequest):
         "status": "success",
         "symbol": req.symbol,
         "strategy": req.strategy,
-        **result
+        **materialize(result)
     }
 
 
@@ -987,7 +1057,8 @@ def run_backtest(req: StrategyRequest):
 
     # Pass direction to run_backtest
     direction = req.direction.upper() if req.direction else "LONG"
-    df_res, markers, metrics, equity_data = engine.run_backtest(df_raw, req.strategy, requested_period=req.period, start_date=req.start_date, end_date=req.end_date, direction=direction)
+    df_res, markers, metrics, equity_data = engine.run_backtest(df_raw, req.strategy, requested_period=req.period, start_date=req.start_date, end_date=req.end_date, direction=direction,
+                                                                checkpoint_key=(req.symbol, req.timeframe))
     
     chart_data = []
     line1, line2, line3 = [], [], []
@@ -1008,7 +1079,8 @@ def run_backtest(req: StrategyRequest):
         elif base_strat == "MULTITIMEFRAME":
             line3.append({"time": t, "value": row['ema_200']}) 
 
-    return { "status": "success", "chart_data": chart_data, "equity_curve": equity_data, "indicators": {"line1": line1, "line2": line2, "line3": line3}, "markers": markers, "metrics": metrics, "direction": direction }
+    # Columnar result -> list-of-dicts hanya di sini (saat diserialisasi ke JSON)
+    return { "status": "success", "chart_data": chart_data, "equity_curve": materialize(equity_data), "indicators": {"line1": line1, "line2": line2, "line3": line3}, "markers": markers, "metrics": materialize(metrics), "direction": direction }
 
 @app.post("/api/compare-strategies")
 def compare_strategies(req: StrategyRequest):
@@ -1024,35 +1096,34 @@ def compare_strategies(req: StrategyRequest):
         "MIX_STRATEGY", "MIX_STRATEGY_PRO"
     ]
 
-    # --- PARALLEL EXECUTION for Speed ---
-    def _run_single(strat):
-        cache_key = f"{strat}_{direction}"
-        cached = engine._get_cached_result(req.symbol, req.timeframe, req.period, cache_key)
-        if cached:
-            return strat, cached
-        else:
-            _, _, metrics, _ = engine.run_backtest(df_raw.copy(), strat, requested_period=req.period, direction=direction)
-            engine._save_cache_result(req.symbol, req.timeframe, req.period, cache_key, metrics)
-            return strat, metrics
+    # --- CACHE-FIRST, then ONE batch for all misses (indicators computed once) ---
+    valid = engine._get_cached_results(req.symbol, req.timeframe, req.period, direction)
+    metrics_by_strat = {strat: valid[(req.period, strat, direction)] for strat in strategies
+                        if (req.period, strat, direction) in valid}
+
+    missing = [s for s in strategies if s not in metrics_by_strat]
+    if missing:
+        batch = engine.run_backtest_batch(df_raw, missing, [req.period], [direction])
+        metrics_by_strat.update({strat: batch[(req.period, strat, direction)] for strat in missing})
+        engine._save_cache_results(req.symbol, [(req.timeframe, req.period, strat, direction, metrics_by_strat[strat],
+                                                 None, "N/A") for strat in missing])
 
     results = []
     buy_hold_return = 0
 
-    with ThreadPoolExecutor(max_workers=4) as executor:
-        futures = {executor.submit(_run_single, strat): strat for strat in strategies}
-        for future in futures:
-            strat, metrics = future.result()
-            results.append({
-                "strategy": strat,
-                "direction": direction,
-                "net_profit": metrics.get('net_profit', 0),
-                "win_rate": metrics.get('win_rate', 0),
-                "trades": metrics.get('total_trades', 0),
-                "sharpe": metrics.get('sharpe_ratio', 0),
-                "max_dd": metrics.get('max_drawdown', 0),
-                "is_hold": False
-            })
-            buy_hold_return = metrics.get('buy_hold_return', 0)
+    for strat in strategies:
+        metrics = metrics_by_strat[strat]
+        results.append({
+            "strategy": strat,
+            "direction": direction,
+            "net_profit": metrics.get('net_profit', 0),
+            "win_rate": metrics.get('win_rate', 0),
+            "trades": metrics.get('total_trades', 0),
+            "sharpe": metrics.get('sharpe_ratio', 0),
+            "max_dd": metrics.get('max_drawdown', 0),
+            "is_hold": False
+        })
+        buy_hold_return = metrics.get('buy_hold_return', 0)
 
     hold_val = req.capital * (buy_hold_return / 100)
     results.append({ "strategy": "HOLD ONLY", "direction": direction, "net_profit": round(hold_val, 2), "win_rate": 100, "trades": 1, "sharpe": 0, "max_dd": 0, "is_hold": True })
@@ -1117,7 +1188,8 @@ def _scan_single_symbol(sym, capital, force_reload=False, direction="LONG"):
         engine = TradingEngine(initial_capital=capital)
         if force_reload:
             engine.fetch_data(sym, requested_period="1mo", interval="1d", force_reload=True)
-        best_config = find_best_strategy_for_symbol(engine, sym, mode="AUTO", direction=direction)
+        best_config = find_best_strategy_for_symbol(engine, sym, mode="AUTO", direction=direction, pool=backtest_pool)
+        backtest_pool.record_symbol()
         if best_config:
             best_config['reason'] = analyze_market_reason(best_config['strategy'], best_config['win_rate'])
             return best_config
@@ -1125,40 +1197,25 @@ def _scan_single_symbol(sym, capital, force_reload=False, direction="LONG"):
         print(f"[ERROR] Scanning {sym}: {e}")
     return None
 
-def _scan_sector_parallel(sector_id, capital, force_reload=False, direction="LONG"):
-    """Scan all symbols in a sector using parallel symbol processing."""
-    symbols = SECTORS.get(sector_id, [])
+def _prime_symbols(label, symbols, capital):
+    """
+    Histori simbol dibaca sekali (bulk query per timeframe); fetch_data per
+    simbol sesudahnya menjadi cache hit kecuali ada candle baru.
+    """
     if not symbols:
-        return sector_id, [], []
-    
-    print(f"\n[SCAN] {direction} PARALLEL SCAN: {sector_id} ({len(symbols)} symbols)")
+        return
     start = time.time()
-    
-    scan_results = []
-    elite_signals = []
-    
-    # Process symbols in parallel (max 3 concurrent)
-    futures = {}
-    for sym in symbols:
-        future = _symbol_executor.submit(_scan_single_symbol, sym, capital, force_reload, direction)
-        futures[future] = sym
-    
-    for future in as_completed(futures):
-        sym = futures[future]
-        try:
-            result = future.result(timeout=120)  # 2 min timeout per symbol
-            if result:
-                scan_results.append(result)
-                if result.get('win_rate', 0) >= 60 and result.get('trades', 0) >= 15:
-                    elite_signals.append(result)
-                print(f"  [OK] {sym} done (score={result.get('score', 'N/A')})")
-            else:
-                print(f"  [SKIP] {sym} no viable strategy")
-        except Exception as e:
-            print(f"  [ERROR] {sym} error: {e}")
-    
-    elapsed = time.time() - start
-    print(f"[OK] {sector_id} completed in {elapsed:.1f}s ({len(scan_results)} results)")
+    try:
+        primer = TradingEngine(initial_capital=capital)
+        primed = sum(primer.prime_frames(symbols, tf, "max") for tf in SCAN_TIMEFRAMES)
+        print(f"[SCAN] {label}: primed {primed} frames in {time.time() - start:.1f}s")
+    except Exception as e:
+        print(f"[WARN] [SCAN] Bulk prime failed for {label}: {e}")
+
+def _finish_sector(sector_id, direction, scan_results):
+    """Sector bucket complete: persist (LONG) and publish it to _scan_state."""
+    elite_signals = [r for r in scan_results if r.get('win_rate', 0) >= 60 and r.get('trades', 0) >= 15]
+    print(f"[OK] {direction} {sector_id} completed ({len(scan_results)} results)")
     
     # Save to cache (only DB cache LONG for backward compatibility, memory state handles both)
     if direction == "LONG":
@@ -1179,15 +1236,52 @@ def _scan_sector_parallel(sector_id, capital, force_reload=False, direction="LON
     # Update global scan state incrementally
     global _scan_state
     _scan_state[direction]["sectors"][sector_name] = scan_results
-    _scan_state[direction]["elite_signals"].extend(elite_signals)
+    # Simbol lintas sektor: satu hasil, jangan masuk elite list dua kali
+    listed = {e.get('symbol') for e in _scan_state[direction]["elite_signals"]}
+    _scan_state[direction]["elite_signals"].extend(e for e in elite_signals if e.get('symbol') not in listed)
     # Sort elites
     _scan_state[direction]["elite_signals"].sort(key=lambda x: x.get('score', 0), reverse=True)
     _scan_state[direction]["elite_signals"] = _scan_state[direction]["elite_signals"][:10]
     _scan_state[direction]["completed_sectors"] += 1
     _scan_state["progress"] = min(99, int((_scan_state[direction]["completed_sectors"] / len(SECTORS)) * 100))
     _scan_state["last_updated"] = datetime.now().isoformat()
+
+def _scan_planned(plan, capital, force_reload=False, direction="LONG"):
+    """
+    Scan every unique symbol of the plan once for one direction and fan the
+    results out to each sector that lists it (scan_planner.SectorBuckets).
+    Sectors are published as soon as their last symbol is done.
+    """
+    print(f"\n[SCAN] {direction} PLANNED SCAN: {len(plan['symbols'])} unique symbols, {len(plan['sectors'])} sectors")
+    start = time.time()
+    buckets = scan_planner.SectorBuckets(plan)
+    
+    # Submit per sector (urutan sektor sama seperti sebelumnya), simbol bersama hanya sekali
+    futures = {}
+    for sector_id, symbols in plan["batches"]:
+        if not force_reload:
+            _prime_symbols(sector_id, symbols, capital)
+        for sym in symbols:
+            future = _symbol_executor.submit(_scan_single_symbol, sym, capital, force_reload, direction)
+            futures[future] = sym
     
-    return sector_id, scan_results, elite_signals
+    for future in as_completed(futures):
+        sym = futures[future]
+        result = None
+        try:
+            result = future.result(timeout=120)  # 2 min timeout per symbol
+            if result:
+                print(f"  [OK] {sym} done (score={result.get('score', 'N/A')})")
+            else:
+                print(f"  [SKIP] {sym} no viable strategy")
+        except Exception as e:
+            print(f"  [ERROR] {sym} error: {e}")
+        for sector_id in buckets.add(sym, result):
+            _finish_sector(sector_id, direction, buckets.results[sector_id])
+    
+    elapsed = time.time() - start
+    print(f"[OK] {direction} scan completed in {elapsed:.1f}s")
+    return elapsed
 
 
 @app.post("/api/scan-market")
@@ -1199,9 +1293,7 @@ def scan_market(req: ScanRequest):
     if "-" in req.sector and req.sector not in SECTORS: 
         symbols = [req.sector]
     elif req.sector == "ALL":
-        symbols = []
-        for s in SECTORS.values(): symbols.extend(s)
-        symbols = list(set(symbols))[:20]
+        symbols = scan_planner.build_plan(SECTORS, ["LONG"])["symbols"][:20]
     else:
         symbols = SECTORS.get(req.sector, [])
     
@@ -1248,31 +1340,32 @@ def _run_background_scan(capital: float, force_reload: bool):
         _scan_state[d]["sectors"] = {}
         _scan_state[d]["elite_signals"] = []
         _scan_state[d]["completed_sectors"] = 0
+    backtest_pool.reset_stats()
 
-    sector_ids = list(SECTORS.keys())
-    
-    # Run LONG direction
-    futures = {}
-    for sector_id in sector_ids:
-        future = _scan_executor.submit(_scan_sector_parallel, sector_id, capital, force_reload, "LONG")
-        futures[future] = sector_id
-    for future in as_completed(futures):
-        try: future.result(timeout=600)
-        except Exception as e: print(f"[ERROR BACKGROUND LONG] {e}")
+    # Simbol yang ada di beberapa sektor hanya di-scan sekali per arah
+    plan = scan_planner.build_plan(SECTORS)
+    print(f"[SCAN] Plan: {scan_planner.describe(plan)}")
+    _scan_state["plan"] = dict(plan["stats"])
 
-    # Run SHORT direction
-    futures = {}
-    for sector_id in sector_ids:
-        future = _scan_executor.submit(_scan_sector_parallel, sector_id, capital, force_reload, "SHORT")
-        futures[future] = sector_id
-    for future in as_completed(futures):
-        try: future.result(timeout=600)
-        except Exception as e: print(f"[ERROR BACKGROUND SHORT] {e}")
+    elapsed = 0.0
+    for direction in scan_planner.DIRECTIONS:
+        try:
+            elapsed += _scan_planned(plan, capital, force_reload, direction)
+        except Exception as e:
+            print(f"[ERROR BACKGROUND {direction}] {e}")
+
+    # Perkiraan waktu yang dihemat: rata-rata durasi per job x job yang tidak dijalankan
+    stats = plan["stats"]
+    if stats["jobs_planned"]:
+        _scan_state["plan"]["elapsed_sec"] = round(elapsed, 1)
+        _scan_state["plan"]["est_saved_sec"] = round(elapsed / stats["jobs_planned"] * stats["jobs_saved"], 1)
 
     _scan_state["status"] = "idle"
     _scan_state["progress"] = 100
     _scan_state["last_updated"] = datetime.now().isoformat()
+    _scan_state["throughput"] = backtest_pool.report()
     print("\n[✔] COMPLETE BACKGROUND SCAN (LONG & SHORT)")
+    print(f"[POOL] Throughput: {_scan_state['throughput']}")
 
 
 @app.post("/api/scan-start")
@@ -1341,7 +1434,9 @@ def get_scan_status(direction: str = "LONG"):
         "elite_signals": _scan_state[direction]["elite_signals"][:10],
         "cached": True,
         "total_results": total_db_results,
-        "last_updated": _scan_state["last_updated"]
+        "last_updated": _scan_state["last_updated"],
+        "throughput": _scan_state.get("throughput"),
+        "plan": _scan_state.get("plan")
     }
 
 @app.post("/api/monte-carlo")
@@ -1380,6 +1475,94 @@ def run_monte_carlo(req: SingleBacktestRequest):
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/api/param-sweep")
+def run_param_sweep(req: ParamSweepRequest):
+    """
+    Parameter sweep per strategi (param_sweep.ParameterSweep).
+    Semua kombinasi grid dievaluasi di worker processes, hasil = tabel ranking.
+    """
+    engine = TradingEngine(initial_capital=req.capital)
+    df_raw = engine.fetch_data(req.symbol, requested_period="max", interval=req.timeframe)
+    if df_raw is None or len(df_raw) < 50:
+        raise HTTPException(status_code=404, detail=f"Data empty for {req.symbol}.")
+
+    sweep = ParameterSweep(initial_capital=req.capital, workers=backtest_pool.workers, engine=engine)
+    try:
+        table = sweep.run(df_raw, strategies=req.strategies, directions=[d.upper() for d in req.directions],
+                          grids=req.grids, period=req.period, start_date=req.start_date, end_date=req.end_date,
+                          interval=req.timeframe, min_trades=req.min_trades)
+        return {
+            "status": "success",
+            "symbol": req.symbol,
+            "timeframe": req.timeframe,
+            "combinations": table.attrs.get('combinations', 0),
+            "ranked": len(table),
+            "elapsed_sec": table.attrs.get('elapsed_sec', 0),
+            "results": table_to_records(table.head(req.top)),
+        }
+    except Exception as e:
+        print(f"[ERROR] Param sweep {req.symbol}: {e}")
+        traceback.print_exc()
+        raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        sweep.shutdown()
+
+@app.post("/api/walk-forward")
+def run_walk_forward(req: WalkForwardRequest):
+    """
+    Walk-forward optimization (walk_forward.WalkForwardEngine).
+    Seleksi strategi/parameter di train window, evaluasi di test window berikutnya;
+    fold berjalan paralel, hasil = metrik per fold + kurva OOS gabungan.
+    """
+    engine = TradingEngine(initial_capital=req.capital)
+    df_raw = engine.fetch_data(req.symbol, requested_period="max", interval=req.timeframe)
+    if df_raw is None or len(df_raw) < req.train_bars + req.test_bars:
+        raise HTTPException(status_code=404, detail=f"Not enough data for {req.symbol} "
+                                                    f"(need {req.train_bars + req.test_bars} candles).")
+
+    wf = WalkForwardEngine(initial_capital=req.capital, workers=backtest_pool.workers, engine=engine)
+    try:
+        report = wf.run(df_raw, train_bars=req.train_bars, test_bars=req.test_bars, step=req.step,
+                        mode=req.mode, strategies=req.strategies,
+                        directions=[d.upper() for d in req.directions], grids=req.grids,
+                        optimize_params=req.optimize_params, interval=req.timeframe,
+                        min_trades=req.min_trades)
+        return {"status": "success", "symbol": req.symbol, "timeframe": req.timeframe, **materialize(report)}
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        print(f"[ERROR] Walk-forward {req.symbol}: {e}")
+        traceback.print_exc()
+        raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        wf.shutdown()
+
+@app.post("/api/portfolio-backtest")
+def run_portfolio_backtest(req: PortfolioBacktestRequest):
+    """
+    Backtest banyak simbol sekaligus dengan satu modal (portfolio_backtest).
+    Limit risk_manager (max posisi, ukuran posisi, drawdown, daily loss) berlaku untuk seluruh book.
+    """
+    entries = list(req.book or []) + list(req.symbols or [])
+    if req.use_elite:
+        entries += _scan_state.get(req.use_elite.upper(), {}).get("elite_signals", [])
+    if not entries:
+        raise HTTPException(status_code=400, detail="Provide symbols, book or use_elite.")
+
+    try:
+        pb = PortfolioBacktester(initial_capital=req.capital, risk_config=req.risk, allocation=req.allocation)
+        report = pb.run_db(entries, strategy=req.strategy, direction=req.direction, timeframe=req.timeframe,
+                           period=req.period, start_date=req.start_date, end_date=req.end_date)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        print(f"[ERROR] Portfolio backtest: {e}")
+        traceback.print_exc()
+        raise HTTPException(status_code=500, detail=str(e))
+    if "error" in report:
+        raise HTTPException(status_code=404, detail=report["error"])
+    return {"status": "success", **materialize(report)}
+
 @app.post("/api/send-alert")
 def trigger_alert(item: dict):
     """Endpoint untuk testing manual Alert Telegram"""
@@ -1391,6 +1574,24 @@ def trigger_alert(item: dict):
 # 9. BTC MARKET RADAR — Macro Condition + Altcoin Correlation + Anomaly
 # =============================================================================
 
+def _regime_snapshot(engine, df):
+    """
+    Current condition/strength from the vectorized regime series,
+    plus how many bars the market has stayed in that condition.
+    """
+    regimes = engine.get_market_condition_series(df, detailed=True)
+    if regimes.empty:
+        return {"condition": "UNKNOWN", "strength": "WEAK", "bars_in_regime": 0}
+    labels = regimes['condition'].to_numpy()
+    current = labels[-1]
+    changes = np.flatnonzero(labels != current)
+    bars_in_regime = len(labels) - (int(changes[-1]) + 1) if len(changes) else len(labels)
+    return {
+        "condition": current,
+        "strength": regimes['strength'].iat[-1],
+        "bars_in_regime": bars_in_regime
+    }
+
 @app.post("/api/btc-radar")
 def btc_radar(req: ScanRequest):
     """
@@ -1401,8 +1602,18 @@ def btc_radar(req: ScanRequest):
     """
     engine = TradingEngine(initial_capital=req.capital)
     
+    # Kumpulkan sample koin dari semua sektor (top 5 per sector)
+    sample_coins = set()
+    for key, coins in SECTORS.items():
+        for coin in coins[:5]:
+            if coin != "BTC-USDT":
+                sample_coins.add(coin)
+    
+    # Satu bulk read untuk BTC + semua sample koin (market_loader)
+    data = engine.load_many(["BTC-USDT", *sorted(sample_coins)], timeframe="1d", period="6mo")
+    
     # === 1. BTC MACRO CONDITION ===
-    btc_df = engine.fetch_data("BTC-USDT", requested_period="6mo", interval="1d")
+    btc_df = data.frame("BTC-USDT")
     
     if btc_df is None or btc_df.empty:
         raise HTTPException(status_code=404, detail="BTC data not available")
@@ -1410,31 +1621,25 @@ def btc_radar(req: ScanRequest):
     # Prepare indicators untuk BTC
     btc_df = engine.prepare_indicators(btc_df)
     btc_macro = engine.get_market_condition(btc_df, detailed=True)
+    btc_regime = _regime_snapshot(engine, btc_df)
     
     # BTC 30-day returns untuk korelasi
     btc_returns = btc_df['close'].pct_change().tail(30).dropna().values
     btc_30d_return = float(((btc_df.iloc[-1]['close'] - btc_df.iloc[-30]['close']) / btc_df.iloc[-30]['close']) * 100) if len(btc_df) >= 30 else 0
     
     # === 2. ALTCOIN CORRELATION & ANOMALY SCAN ===
-    # Kumpulkan sample koin dari semua sektor (top 5 per sector)
-    sample_coins = set()
-    for key, coins in SECTORS.items():
-        for coin in coins[:5]:
-            if coin != "BTC-USDT":
-                sample_coins.add(coin)
-    
     correlations = []
     anomalies = []
     
     for coin in sample_coins:
         try:
-            coin_df = engine.fetch_data(coin, requested_period="6mo", interval="1d")
+            coin_df = data.frame(coin)
             if coin_df is None or len(coin_df) < 30:
                 continue
             
             # Prepare dan hitung kondisi coin
             coin_df = engine.prepare_indicators(coin_df)
-            coin_condition = engine.get_market_condition(coin_df, detailed=True)
+            coin_condition = _regime_snapshot(engine, coin_df)
             
             # Hitung returns 30 hari
             coin_returns = coin_df['close'].pct_change().tail(30).dropna().values
@@ -1450,8 +1655,9 @@ def btc_radar(req: ScanRequest):
                 "symbol": coin,
                 "correlation": round(corr, 3),
                 "return_30d": round(coin_30d_return, 2),
-                "condition": coin_condition.get("condition", "UNKNOWN") if isinstance(coin_condition, dict) else coin_condition,
-                "strength": coin_condition.get("strength", "WEAK") if isinstance(coin_condition, dict) else "UNKNOWN"
+                "condition": coin_condition["condition"],
+                "strength": coin_condition["strength"],
+                "bars_in_regime": coin_condition["bars_in_regime"]
             }
             
             correlations.append(coin_data)
@@ -1496,6 +1702,7 @@ def btc_radar(req: ScanRequest):
             "condition": btc_macro.get("condition", "UNKNOWN") if isinstance(btc_macro, dict) else btc_macro,
             "strength": btc_macro.get("strength", "UNKNOWN") if isinstance(btc_macro, dict) else "UNKNOWN",
             "details": btc_macro.get("details", {}) if isinstance(btc_macro, dict) else {},
+            "bars_in_regime": btc_regime["bars_in_regime"],
             "return_30d": round(btc_30d_return, 2)
         },
         "correlations": correlations[:20],  # Top 20 most interesting
@@ -1534,34 +1741,29 @@ def get_market_analytics(req: ScanRequest):
     
     daily_returns_all = []
 
-    for sym in symbols:
-        # Gunakan Fetch Data Pintar (DB + Cache)
-        df = engine.fetch_data(sym, requested_period=req.period, interval="1d")
-        
-        if df is None or df.empty: continue
+    # Satu bulk read untuk semua simbol (market_loader), lalu NumPy per simbol
+    data = engine.load_many(symbols, timeframe="1d", period=req.period)
+
+    for sym in data.loaded:
+        cols = data[sym]
+        close = cols['close']
         
         # A. Market Condition (Trending/Ranging) - Fitur Baru
-        condition = engine.get_market_condition(df)
+        condition = engine.get_market_condition(data.frame(sym))
         analytics_data["market_conditions"].append({
             "symbol": sym,
             "condition": condition
         })
         
         # B. Spaghetti (Normalized)
-        start_price = df.iloc[0]['close']
-        end_price = df.iloc[-1]['close']
+        start_price = close[0]
+        end_price = close[-1]
         
-        series_data = []
         # Sampling data agar tidak terlalu berat dikirim ke frontend
-        step = 5 if len(df) > 300 else 1
-        
-        for i in range(0, len(df), step):
-            row = df.iloc[i]
-            norm_val = ((row['close'] - start_price) / start_price) * 100
-            series_data.append({
-                "time": int(row['time'].timestamp()),
-                "value": round(norm_val, 2)
-            })
+        step = 5 if len(close) > 300 else 1
+        norm_vals = np.round(((close[::step] - start_price) / start_price) * 100, 2)
+        times = cols['timestamp'][::step] // 1000
+        series_data = [{"time": int(t), "value": float(v)} for t, v in zip(times, norm_vals)]
             
         analytics_data["spaghetti"].append({
             "symbol": sym,
@@ -1570,31 +1772,25 @@ def get_market_analytics(req: ScanRequest):
         
         # C. Performance & Volatility
         total_ret = ((end_price - start_price) / start_price) * 100
-        df['pct_change'] = df['close'].pct_change()
-        std_dev = df['pct_change'].std()
+        pct_change = close[1:] / close[:-1] - 1
+        pct_change = pct_change[~np.isnan(pct_change)]
+        std_dev = pct_change.std(ddof=1) if len(pct_change) > 1 else float('nan')
         ann_vol = std_dev * (365 ** 0.5) * 100 
         
-        analytics_data["performance"].append({ "symbol": sym, "return_pct": round(total_ret, 2) })
-        analytics_data["volatility"].append({ "symbol": sym, "volatility": round(ann_vol, 2) })
+        analytics_data["performance"].append({ "symbol": sym, "return_pct": round(float(total_ret), 2) })
+        analytics_data["volatility"].append({ "symbol": sym, "volatility": round(float(ann_vol), 2) })
         
-        clean_rets = df['pct_change'].dropna().tolist()
-        daily_returns_all.extend([r * 100 for r in clean_rets if abs(r) < 1.0])
+        daily_returns_all.append(pct_change[np.abs(pct_change) < 1.0] * 100)
 
     # D. Distribution Histogram
-    if daily_returns_all:
-        bins = [-10, -5, -2, 0, 2, 5, 10]
+    daily_returns_all = np.concatenate(daily_returns_all) if daily_returns_all else np.empty(0)
+    if len(daily_returns_all):
         labels = ["Crash", "Dump", "Red", "Green", "Pump", "Moon"]
-        counts = [0] * 6
-        for ret in daily_returns_all:
-            if ret < -5: counts[0] += 1
-            elif -5 <= ret < -2: counts[1] += 1
-            elif -2 <= ret < 0: counts[2] += 1
-            elif 0 <= ret < 2: counts[3] += 1
-            elif 2 <= ret < 5: counts[4] += 1
-            else: counts[5] += 1
+        # Bucket: <-5, [-5,-2), [-2,0), [0,2), [2,5), >=5
+        counts = np.bincount(np.searchsorted([-5, -2, 0, 2, 5], daily_returns_all, side='right'), minlength=6)
             
         for i, label in enumerate(labels):
-            analytics_data["distribution"].append({ "range": label, "count": counts[i] })
+            analytics_data["distribution"].append({ "range": label, "count": int(counts[i]) })
 
     # Sort Data untuk Tampilan Rapi
     analytics_data["performance"].sort(key=lambda x: x['return_pct'], reverse=True)
@@ -1606,6 +1802,51 @@ def get_market_analytics(req: ScanRequest):
 def health_check():
     return {"status": "staying_alive", "timestamp": datetime.now().isoformat()}
 
+@app.get("/api/db-stats")
+def db_stats():
+    """SQLite pool metrics per database file: connects vs reuse, rollbacks, lock waits."""
+    return {"databases": get_db_metrics(), "timestamp": datetime.now().isoformat()}
+
+@app.get("/api/cache-stats")
+def cache_stats():
+    """In-process data caches: fetch_data frames, incremental indicators, mmap OHLCV store, coalesced downloads, data versions."""
+    return {
+        "frame_cache": frame_cache.get_stats(),
+        "indicator_store": indicator_store.get_stats(),
+        "ohlcv_store": ohlcv_store.get_stats(),
+        "download_flight": download_flight.get_stats(),
+        "data_versions": data_versions.get_stats(),
+        "timestamp": datetime.now().isoformat(),
+    }
+
+@app.get("/api/data-coverage")
+def data_coverage(timeframe: str = "1h", symbol: Optional[str] = None):
+    """Gaps inside the stored history per series (candle_coverage index)."""
+    symbols = [symbol.upper()] if symbol else None
+    series = candle_coverage.coverage_report(symbols, [timeframe], db_file="market_data.db")
+    return {
+        "timeframe": timeframe,
+        "series": series,
+        "with_gaps": sum(1 for row in series if row["gaps"]),
+        "missing_candles": sum(row["missing_candles"] for row in series),
+        "timestamp": datetime.now().isoformat(),
+    }
+
+class DataRepairRequest(BaseModel):
+    symbols: Optional[List[str]] = None   # None = semua simbol yang tersimpan
+    timeframes: List[str] = ["1h", "4h", "1d"]
+    since_days: Optional[int] = None
+
+@app.post("/api/data-repair")
+def data_repair(req: DataRepairRequest):
+    """Download only the missing candle ranges (shared rate limiter of the bulk downloader)."""
+    symbols = [s.upper() for s in req.symbols] if req.symbols else None
+    try:
+        return run_gap_repair(symbols, req.timeframes, db_file="market_data.db", since_days=req.since_days)
+    except Exception as e:
+        traceback.print_exc()
+        raise HTTPException(status_code=500, detail=str(e))
+
 # =============================================================================
 # ALPHA DATA & AI PIPELINE (Gap Resolution)
 # =============================================================================
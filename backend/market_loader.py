@@ -0,0 +1,172 @@
+# backend/market_loader.py
+"""
+Bulk multi-symbol reads from market_data.
+
+Cross-sectional endpoints (btc-radar, market-analytics) and the sector
+scanner used to load dozens of symbols one at a time: one connection and
+one `WHERE symbol=? AND timeframe=?` query per symbol, then a DataFrame
+per symbol. load_many() reads all of them at once:
+
+  - one query per chunk of CHUNK_SIZE symbols (`symbol IN (...)`), rows in
+    primary-key order (symbol, timestamp) so SQLite walks the PK index
+    without a sort step;
+  - the symbol is mapped to its position in SQL (CASE), so the rows are
+    numeric only and convert to one float64 block in a single NumPy call;
+  - the block is split into per-symbol column arrays at the boundaries
+    where the symbol id changes (no per-row Python work).
+
+MultiSeries.wide() aligns a column of every symbol on the union of
+timestamps (NaN where a symbol has no candle), e.g. a close matrix for
+correlations.
+
+Usage:
+  from market_loader import load_many
+  ms = load_many(["BTC-USDT", "ETH-USDT"], timeframe="1d", period="6mo")
+  ms["BTC-USDT"]["close"]             # float64 array
+  ts, closes = ms.wide("close")       # [T], [T, n_symbols]
+  df = ms.frame("ETH-USDT")           # fetch_data layout
+
+TradingEngine.load_many() adds the incremental exchange download first.
+"""
+
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from db_utils import get_db_connection
+
+DB_FILE = "market_data.db"
+OHLCV_COLUMNS = ('open', 'high', 'low', 'close', 'volume')
+PERIOD_DAYS = {"1mo": 30, "3mo": 90, "6mo": 180, "1y": 365, "2y": 730}
+
+# Parameter per query = 2 per simbol (CASE + IN) + 3; aman di bawah batas SQLite lama (999)
+CHUNK_SIZE = 400
+
+
+def period_cutoff_ms(period, now_ms=None):
+    """First timestamp (ms) of a preset period, 0 for "max"/unknown (same rule as fetch_data)."""
+    days = PERIOD_DAYS.get(period)
+    if days is None:
+        return 0
+    if now_ms is None:
+        now_ms = int(datetime.now().timestamp() * 1000)
+    return now_ms - days * 86400000
+
+
+class MultiSeries:
+    """Per-symbol column arrays of one timeframe; symbols keep the requested order."""
+
+    def __init__(self, symbols, timeframe, series, columns):
+        self.symbols = list(symbols)
+        self.timeframe = timeframe
+        self.series = series
+        self.columns = tuple(columns)
+
+    @property
+    def loaded(self):
+        return [s for s in self.symbols if s in self.series]
+
+    @property
+    def missing(self):
+        return [s for s in self.symbols if s not in self.series]
+
+    def __contains__(self, symbol):
+        return symbol in self.series
+
+    def __getitem__(self, symbol):
+        return self.series[symbol]
+
+    def __len__(self):
+        return len(self.series)
+
+    def last_timestamp(self, symbol):
+        return int(self.series[symbol]['timestamp'][-1])
+
+    def frame(self, symbol):
+        """fetch_data layout (timestamp, OHLCV, time) for one symbol, or None."""
+        cols = self.series.get(symbol)
+        if cols is None:
+            return None
+        df = pd.DataFrame({name: cols[name] for name in ('timestamp', *self.columns)})
+        df['time'] = pd.to_datetime(df['timestamp'], unit='ms')
+        return df
+
+    def wide(self, column="close", symbols=None):
+        """
+        (timestamps [T], matrix [T, n]) for `column`, aligned on the union of
+        timestamps of the loaded symbols; NaN where a symbol has no candle.
+        Columns follow `symbols` (default: every requested symbol).
+        """
+        symbols = self.symbols if symbols is None else list(symbols)
+        present = [s for s in symbols if s in self.series]
+        if not present:
+            return np.empty(0, dtype=np.int64), np.empty((0, len(symbols)))
+        ts = np.unique(np.concatenate([self.series[s]['timestamp'] for s in present]))
+        mat = np.full((len(ts), len(symbols)), np.nan)
+        for j, s in enumerate(symbols):
+            cols = self.series.get(s)
+            if cols is not None:
+                mat[np.searchsorted(ts, cols['timestamp']), j] = cols[column]
+        return ts, mat
+
+
+def _query_chunk(conn, chunk, timeframe, columns, start_ts, end_ts):
+    case = " ".join(f"WHEN ? THEN {i}" for i in range(len(chunk)))
+    select = ", ".join(("timestamp", *columns))
+    query = (f"SELECT CASE symbol {case} END, {select} FROM market_data "
+             f"WHERE symbol IN ({','.join('?' * len(chunk))}) AND timeframe=? AND timestamp >= ?")
+    params = [*chunk, *chunk, timeframe, int(start_ts)]
+    if end_ts is not None:
+        query += " AND timestamp <= ?"
+        params.append(int(end_ts))
+    query += " ORDER BY symbol, timestamp"
+    rows = conn.execute(query, params).fetchall()
+    if not rows:
+        return {}
+
+    block = np.array(rows, dtype=np.float64)  # NULL -> NaN
+    sid = block[:, 0].astype(np.int64)
+    bounds = np.flatnonzero(np.diff(sid)) + 1
+    starts = np.concatenate(([0], bounds))
+    ends = np.concatenate((bounds, [len(block)]))
+
+    out = {}
+    ts_all = block[:, 1].astype(np.int64)  # ms < 2^53: exact dalam float64
+    for lo, hi in zip(starts, ends):
+        cols = {'timestamp': ts_all[lo:hi]}
+        for k, name in enumerate(columns):
+            cols[name] = np.ascontiguousarray(block[lo:hi, 2 + k])
+        out[chunk[sid[lo]]] = cols
+    return out
+
+
+def load_many(symbols, timeframe="1h", period="max", start_ts=None, end_ts=None,
+              db_file=DB_FILE, columns=OHLCV_COLUMNS, chunk_size=CHUNK_SIZE):
+    """
+    Read market_data for many symbols of one timeframe.
+
+    Args:
+        period: preset ("1mo".."2y", "max"); ignored when start_ts is given.
+        start_ts / end_ts: explicit window in ms (inclusive).
+        columns: subset of OHLCV_COLUMNS to load.
+
+    Returns MultiSeries (symbols without rows are listed in .missing).
+    """
+    symbols = list(dict.fromkeys(symbols))
+    columns = tuple(columns)
+    bad = [c for c in columns if c not in OHLCV_COLUMNS]
+    if bad:
+        raise ValueError(f"Unknown columns {bad}, expected a subset of {OHLCV_COLUMNS}")
+    if start_ts is None:
+        start_ts = period_cutoff_ms(period)
+
+    series = {}
+    if symbols:
+        conn = get_db_connection(db_file, row_factory=None)
+        try:
+            for i in range(0, len(symbols), chunk_size):
+                series.update(_query_chunk(conn, symbols[i:i + chunk_size], timeframe, columns, start_ts, end_ts))
+        finally:
+            conn.close()
+    return MultiSeries(symbols, timeframe, series, columns)
@@ -0,0 +1,161 @@
+# backend/metrics_kernel.py
+"""
+Shared performance-metrics kernel.
+
+One function, compute_metrics(equity, trade_pnl), used by every place that
+scores a strategy or a portfolio:
+
+  - TradingEngine.calculate_metrics / calculate_consistency_score (backtests)
+  - main._calculate_score (profit factor fallback)
+  - ValidationEngine._compute_metrics (walk-forward IS/OOS)
+  - fund_analytics.get_fund_performance (live portfolio)
+
+Everything is computed with NumPy array ops over the equity array and the
+trade-PnL array: running peak + drawdown, return-based Sharpe/Sortino,
+Calmar, profit factor, expectancy, max consecutive losses and the R^2 of
+the equity curve against a straight line. Values are returned raw
+(unrounded, fractions not percent); callers keep their own rounding and
+output conventions.
+"""
+
+import numpy as np
+
+
+def compute_metrics(equity=None, trade_pnl=None, periods_per_year=252, total_return=None, periods=None):
+    """
+    Args:
+        equity: equity values per period (any array-like), or None.
+        trade_pnl: PnL per closed trade (fraction or absolute), or None.
+        periods_per_year: annualization for Sharpe/Sortino/Calmar.
+        total_return: override for the Calmar numerator (fraction);
+            default equity[-1] / equity[0] - 1.
+        periods: override for the number of periods Calmar annualizes over;
+            default len(equity).
+
+    Returns dict:
+        trade side:  total_trades, win_count, loss_count, win_rate (0-1),
+                     gross_profit, gross_loss, profit_factor (inf if no losses),
+                     avg_win, avg_loss (positive), expectancy, total_pnl,
+                     best_trade, worst_trade, max_consecutive_losses
+        equity side: max_drawdown (0-1), total_return, sharpe, sortino,
+                     calmar, r_squared
+    """
+    out = {}
+
+    # ============================================================
+    # TRADE STATS
+    # ============================================================
+    pnl = np.asarray(trade_pnl if trade_pnl is not None else (), dtype=np.float64)
+    n_trades = len(pnl)
+    wins = pnl[pnl > 0]
+    losses = pnl[pnl < 0]
+
+    gross_profit = float(wins.sum())
+    gross_loss = abs(float(losses.sum()))
+    if gross_loss > 0:
+        profit_factor = gross_profit / gross_loss
+    else:
+        profit_factor = float('inf') if gross_profit > 0 else 0.0
+
+    win_rate = len(wins) / n_trades if n_trades else 0.0
+    loss_rate = len(losses) / n_trades if n_trades else 0.0
+    avg_win = float(wins.mean()) if len(wins) else 0.0
+    avg_loss = abs(float(losses.mean())) if len(losses) else 0.0
+
+    # Max consecutive losses: panjang run terpanjang dari pnl < 0
+    max_consec = 0
+    if len(losses):
+        edges = np.diff(np.concatenate(([0], (pnl < 0).astype(np.int8), [0])))
+        max_consec = int((np.flatnonzero(edges == -1) - np.flatnonzero(edges == 1)).max())
+
+    out.update({
+        "total_trades": n_trades,
+        "win_count": int(len(wins)),
+        "loss_count": int(len(losses)),
+        "win_rate": win_rate,
+        "gross_profit": gross_profit,
+        "gross_loss": gross_loss,
+        "profit_factor": profit_factor,
+        "avg_win": avg_win,
+        "avg_loss": avg_loss,
+        "expectancy": win_rate * avg_win - loss_rate * avg_loss,
+        "total_pnl": float(pnl.sum()),
+        "best_trade": float(pnl.max()) if n_trades else 0.0,
+        "worst_trade": float(pnl.min()) if n_trades else 0.0,
+        "max_consecutive_losses": max_consec,
+    })
+
+    # ============================================================
+    # EQUITY STATS
+    # ============================================================
+    vals = np.asarray(equity if equity is not None else (), dtype=np.float64)
+    n = len(vals)
+
+    # Max Drawdown: running peak (np.maximum.accumulate, NaN-skipping variant)
+    max_dd = 0.0
+    if n:
+        peaks = np.fmax.accumulate(vals)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            dds = np.where(peaks > 0, (peaks - vals) / np.where(peaks > 0, peaks, 1.0), 0.0)
+        max_dd = float(np.max(dds, initial=0.0, where=~np.isnan(dds)))
+
+    if total_return is None:
+        total_return = (vals[-1] / vals[0] - 1) if n > 1 and vals[0] != 0 else 0.0
+
+    sharpe = 0.0
+    sortino = 0.0
+    calmar = 0.0
+    r_squared = 0.0
+    if n > 1:
+        with np.errstate(invalid='ignore', divide='ignore'):
+            returns = vals[1:] / vals[:-1] - 1
+        returns = returns[~np.isnan(returns)]
+        if len(returns) > 1:
+            mean = returns.mean()
+            std = returns.std(ddof=1)
+            if std > 0:
+                sharpe = float(mean / std * np.sqrt(periods_per_year))
+            downside = returns[returns < 0]
+            if len(downside) > 1:
+                down_std = downside.std(ddof=1)
+                if down_std > 0:
+                    sortino = float(mean / down_std * np.sqrt(periods_per_year))
+
+        if max_dd > 0:
+            span = periods if periods is not None else n
+            annual_return = total_return * (periods_per_year / max(span, 1))
+            calmar = float(annual_return / max_dd)
+
+        r_squared = _r_squared(vals)
+
+    out.update({
+        "max_drawdown": max_dd,
+        "total_return": float(total_return),
+        "sharpe": sharpe,
+        "sortino": sortino,
+        "calmar": calmar,
+        "r_squared": r_squared,
+    })
+    return out
+
+
+def _r_squared(y):
+    """R^2 of y against its least-squares straight line (0 if undefined)."""
+    x = np.arange(len(y), dtype=np.float64)
+    n = len(x)
+    sum_x = np.sum(x)
+    sum_y = np.sum(y)
+    sum_xy = np.sum(x * y)
+    sum_xx = np.sum(x * x)
+
+    denominator = (n * sum_xx - sum_x * sum_x)
+    if denominator == 0: return 0.0
+
+    m = (n * sum_xy - sum_x * sum_y) / denominator
+    c = (sum_y - m * sum_x) / n
+
+    ss_tot = np.sum((y - np.mean(y)) ** 2)
+    ss_res = np.sum((y - (m * x + c)) ** 2)
+    if ss_tot == 0: return 0.0
+
+    return float(1 - (ss_res / ss_tot))
@@ -0,0 +1,353 @@
+# backend/ohlcv_store.py
+"""
+Memory-mapped columnar OHLCV store next to the SQLite market_data table.
+
+fetch_data used to read market_data with pd.read_sql_query on every call
+and then convert timestamps, apply(pd.to_numeric) and sort — for every
+symbol, every timeframe, every scan. This store keeps one file per
+(symbol, timeframe) holding contiguous columns:
+
+  header (64 B): magic, row count, capacity, data_version rewrites
+  timestamp int64[capacity] | open | high | low | close | volume float64[capacity]
+
+  - Append-only: fetch_data's incremental candles are written behind the
+    last row, then the row count in the header is bumped (readers never
+    see a half-written row). A full column block grows into a new file
+    generation (<key>.g<N>.col); old generations are removed once unused.
+  - Reads are zero-copy: read() returns NumPy views on the mapping, sliced
+    by period with a binary search on the timestamp column.
+  - SQLite stays the source of truth. A series is served only while it
+    matches the series' data_version row: same last candle, same row count
+    and the same rewrites counter it was built at (a mid-history repair or
+    a replaced candle, also by another process, bumps it). Otherwise, or
+    after candles older than its last row, it is rebuilt from SQLite.
+    Rebuild everything with:
+        python ohlcv_store.py rebuild [--symbol BTC-USDT] [--timeframe 1h]
+
+Config (env):
+  OHLCV_STORE_DIR   directory of the column files (default: ./ohlcv_store)
+  OHLCV_STORE       0 disables the store (fetch_data reads SQLite directly)
+
+Single writer process assumed (the API server); worker processes only read.
+"""
+
+import argparse
+import glob
+import os
+import re
+import threading
+
+import numpy as np
+
+COLUMNS = ('timestamp', 'open', 'high', 'low', 'close', 'volume')
+MAGIC = b"QWOHLCV1"
+HEADER_BYTES = 64
+MIN_CAPACITY = 4096
+
+ENABLED = os.getenv("OHLCV_STORE", "1") != "0"
+STORE_DIR = os.getenv("OHLCV_STORE_DIR", "ohlcv_store")
+
+
+# ============================================================
+# 1. ONE SERIES FILE
+# ============================================================
+class SeriesFile:
+    """One generation file of a (symbol, timeframe) series, mapped read/write."""
+
+    def __init__(self, path):
+        self.path = path
+        self.mm = np.memmap(path, dtype=np.uint8, mode='r+')
+        if bytes(self.mm[:8]) != MAGIC:
+            raise ValueError(f"{path}: not an OHLCV column file")
+        self.header = np.frombuffer(self.mm, dtype=np.int64, count=3, offset=8)  # count, capacity, rewrites
+        capacity = int(self.header[1])
+        self.cols = {}
+        for i, name in enumerate(COLUMNS):
+            dtype = np.int64 if name == 'timestamp' else np.float64
+            self.cols[name] = np.frombuffer(self.mm, dtype=dtype, count=capacity,
+                                            offset=HEADER_BYTES + i * capacity * 8)
+
+    @classmethod
+    def create(cls, path, timestamps, ohlcv, capacity, rewrites=0):
+        """Write a new file with the given rows (capacity >= rows)."""
+        n = len(timestamps)
+        size = HEADER_BYTES + len(COLUMNS) * capacity * 8
+        tmp = path + ".tmp"
+        with open(tmp, "wb") as f:
+            f.truncate(size)
+        mm = np.memmap(tmp, dtype=np.uint8, mode='r+')
+        mm[:8] = np.frombuffer(MAGIC, dtype=np.uint8)
+        header = np.frombuffer(mm, dtype=np.int64, count=3, offset=8)
+        header[:] = (n, capacity, rewrites)
+        np.frombuffer(mm, dtype=np.int64, count=n, offset=HEADER_BYTES)[:] = timestamps
+        for i in range(1, len(COLUMNS)):
+            np.frombuffer(mm, dtype=np.float64, count=n, offset=HEADER_BYTES + i * capacity * 8)[:] = ohlcv[:, i - 1]
+        mm.flush()
+        del header, mm
+        os.replace(tmp, path)
+        return cls(path)
+
+    @property
+    def count(self):
+        return int(self.header[0])
+
+    @property
+    def capacity(self):
+        return int(self.header[1])
+
+    @property
+    def rewrites(self):
+        """data_version rewrites of the series when this file was built from SQLite."""
+        return int(self.header[2])
+
+    def last_timestamp(self):
+        n = self.count
+        return int(self.cols['timestamp'][n - 1]) if n else None
+
+    def append(self, timestamps, ohlcv):
+        """Write rows behind the last one; returns False if capacity is too small."""
+        n, k = self.count, len(timestamps)
+        if n + k > self.capacity:
+            return False
+        self.cols['timestamp'][n:n + k] = timestamps
+        for i, name in enumerate(COLUMNS[1:]):
+            self.cols[name][n:n + k] = ohlcv[:, i]
+        self.header[0] = n + k  # publish setelah data lengkap ditulis
+        return True
+
+    def view(self, start_ts=None, end_ts=None):
+        """Zero-copy column views for start_ts <= timestamp <= end_ts (ms)."""
+        n = self.count
+        ts = self.cols['timestamp'][:n]
+        lo = int(np.searchsorted(ts, start_ts, side='left')) if start_ts else 0
+        hi = int(np.searchsorted(ts, end_ts, side='right')) if end_ts is not None else n
+        return {name: col[lo:hi] for name, col in self.cols.items()}
+
+
+# ============================================================
+# 2. STORE
+# ============================================================
+def _as_rows(ohlcv_rows):
+    """ccxt-style rows [ts, o, h, l, c, v] -> (int64 ts, float64 [n, 5]), sorted and de-duplicated."""
+    arr = np.asarray(ohlcv_rows, dtype=np.float64).reshape(-1, len(COLUMNS))
+    ts = arr[:, 0].astype(np.int64)
+    order = np.argsort(ts, kind='stable')
+    ts, arr = ts[order], arr[order]
+    # INSERT OR IGNORE: candle pertama per timestamp yang dipakai
+    keep = np.concatenate(([True], ts[1:] != ts[:-1])) if len(ts) else np.zeros(0, dtype=bool)
+    return ts[keep], np.ascontiguousarray(arr[keep, 1:])
+
+
+class OHLCVStore:
+    def __init__(self, root=None):
+        self.root = root or STORE_DIR
+        self._files = {}
+        self._locks = {}
+        self._guard = threading.Lock()
+        self.stats = {"reads": 0, "appends": 0, "rebuilds": 0, "invalidations": 0}
+
+    # --- paths ---
+    def _base(self, symbol, timeframe):
+        safe = re.sub(r'[^A-Za-z0-9._-]', '-', f"{symbol}_{timeframe}")
+        return os.path.join(os.path.abspath(self.root), safe)
+
+    def _generations(self, base):
+        gens = []
+        for p in glob.glob(glob.escape(base) + ".g*.col"):
+            m = re.search(r'\.g(\d+)\.col$', p)
+            if m:
+                gens.append((int(m.group(1)), p))
+        return sorted(gens)
+
+    def _lock(self, base):
+        with self._guard:
+            return self._locks.setdefault(base, threading.RLock())
+
+    def _open(self, base):
+        """Current generation of a series (cached mapping), or None."""
+        sf = self._files.get(base)
+        if sf is not None and os.path.exists(sf.path):
+            return sf
+        gens = self._generations(base)
+        if not gens:
+            self._files.pop(base, None)
+            return None
+        try:
+            sf = self._files[base] = SeriesFile(gens[-1][1])
+        except (ValueError, OSError) as e:
+            print(f"[WARN] [STORE] Unreadable {gens[-1][1]}: {e}")
+            return None
+        return sf
+
+    def _write_generation(self, base, timestamps, ohlcv, capacity, rewrites=0):
+        gens = self._generations(base)
+        gen = gens[-1][0] + 1 if gens else 1
+        os.makedirs(os.path.dirname(base), exist_ok=True)
+        self._files[base] = SeriesFile.create(f"{base}.g{gen}.col", timestamps, ohlcv, capacity, rewrites)
+        for _, old in gens:
+            try:
+                os.remove(old)  # Windows: gagal selama masih di-map, dibersihkan di generasi berikutnya
+            except OSError:
+                pass
+        return self._files[base]
+
+    # --- API ---
+    def last_timestamp(self, symbol, timeframe):
+        base = self._base(symbol, timeframe)
+        with self._lock(base):
+            sf = self._open(base)
+            return sf.last_timestamp() if sf is not None else None
+
+    def read(self, symbol, timeframe, start_ts=None, end_ts=None):
+        """Dict of zero-copy column views (timestamp int64, OHLCV float64), or None."""
+        base = self._base(symbol, timeframe)
+        with self._lock(base):
+            sf = self._open(base)
+            if sf is None or sf.count == 0:
+                return None
+            self.stats["reads"] += 1
+            return sf.view(start_ts, end_ts)
+
+    def append(self, symbol, timeframe, ohlcv_rows):
+        """
+        Mirror candles just saved to market_data. Rows newer than the last
+        stored candle are appended; if any row is older the series no longer
+        matches an append-only file and is dropped (rebuilt on next read).
+        A series that does not exist yet is left alone. The rewrites stamp
+        is kept: only a rebuild from SQLite vouches for the whole history.
+        """
+        if not len(ohlcv_rows):
+            return
+        base = self._base(symbol, timeframe)
+        with self._lock(base):
+            sf = self._open(base)
+            if sf is None:
+                return
+            ts, ohlcv = _as_rows(ohlcv_rows)
+            last = sf.last_timestamp()
+            if last is not None and ts[0] <= last:
+                if np.all(np.isin(ts[ts <= last], sf.cols['timestamp'][:sf.count])):
+                    # Candle lama yang sudah ada: INSERT OR IGNORE tidak mengubah apa pun
+                    ts, ohlcv = ts[ts > last], ohlcv[ts > last]
+                else:
+                    self._invalidate(base)
+                    return
+            if not len(ts):
+                return
+            if not sf.append(ts, ohlcv):
+                n = sf.count
+                head = sf.view()
+                all_ts = np.concatenate((head['timestamp'], ts))
+                all_ohlcv = np.concatenate((np.column_stack([head[c] for c in COLUMNS[1:]]), ohlcv))
+                self._write_generation(base, all_ts, all_ohlcv, max(2 * sf.capacity, n + len(ts)), sf.rewrites)
+            self.stats["appends"] += 1
+
+    def ensure(self, symbol, timeframe, version, load_full):
+        """
+        Make sure the series matches version, its data_version row
+        (last_ts, row_count, version, rewrites): same last candle, row count
+        and rewrites stamp. Otherwise rebuild it from load_full() ->
+        market_data frame. Runs under the series lock, so concurrent
+        readers trigger one rebuild. Returns False if there is nothing to serve.
+        """
+        last_ts, row_count, _, rewrites = version
+        base = self._base(symbol, timeframe)
+        with self._lock(base):
+            sf = self._open(base)
+            if (sf is not None and sf.last_timestamp() == last_ts and sf.count == row_count
+                    and sf.rewrites == rewrites):
+                return True
+            full = load_full()
+            if full is None or full.empty:
+                return False
+            self.rebuild(symbol, timeframe, full, rewrites)
+            print(f"[STORE] Rebuilt {symbol} {timeframe} from SQLite ({len(full)} candles)")
+            return True
+
+    def rebuild(self, symbol, timeframe, df, rewrites=0):
+        """
+        Replace a series with the rows of df (market_data layout, sorted by
+        timestamp); rewrites = the series' data_version rewrites they reflect.
+        """
+        base = self._base(symbol, timeframe)
+        ts = df['timestamp'].to_numpy(dtype=np.int64)
+        ohlcv = np.column_stack([df[c].to_numpy(dtype=np.float64) for c in COLUMNS[1:]])
+        with self._lock(base):
+            self._write_generation(base, ts, ohlcv, max(MIN_CAPACITY, int(len(ts) * 1.25)), rewrites)
+            self.stats["rebuilds"] += 1
+
+    def _invalidate(self, base):
+        self._files.pop(base, None)
+        for _, p in self._generations(base):
+            try:
+                os.remove(p)
+            except OSError:
+                # Masih di-map (Windows): kosongkan saja agar tidak dipakai lagi
+                try:
+                    SeriesFile(p).header[0] = 0
+                except (ValueError, OSError):
+                    pass
+        self.stats["invalidations"] += 1
+
+    def invalidate(self, symbol, timeframe):
+        """Drop a series (force_reload / data repair); rebuilt from SQLite on next read."""
+        base = self._base(symbol, timeframe)
+        with self._lock(base):
+            self._invalidate(base)
+
+    def get_stats(self):
+        return {**self.stats, "series_open": len(self._files), "root": os.path.abspath(self.root)}
+
+
+# Shared instance used by TradingEngine
+ohlcv_store = OHLCVStore()
+
+
+# ============================================================
+# 3. REBUILD COMMAND
+# ============================================================
+def rebuild_from_db(db_file="market_data.db", symbol=None, timeframe=None, store=None):
+    """Rebuild every (or one) series from market_data. Returns number of series written."""
+    import pandas as pd
+    import data_version
+    from db_utils import get_db_connection
+
+    store = store or ohlcv_store
+    conn = get_db_connection(db_file, row_factory=None)
+    try:
+        query = "SELECT DISTINCT symbol, timeframe FROM market_data"
+        where, params = [], []
+        if symbol:
+            where.append("symbol=?"); params.append(symbol)
+        if timeframe:
+            where.append("timeframe=?"); params.append(timeframe)
+        if where:
+            query += " WHERE " + " AND ".join(where)
+        keys = conn.execute(query, params).fetchall()
+        for sym, tf in keys:
+            version = data_version.current(conn, sym, tf)
+            df = pd.read_sql_query(
+                "SELECT timestamp, open, high, low, close, volume FROM market_data "
+                "WHERE symbol=? AND timeframe=? ORDER BY timestamp ASC", conn, params=(sym, tf))
+            store.rebuild(sym, tf, df, version[3] if version else 0)
+            print(f"[STORE] {sym} {tf}: {len(df)} candles")
+    finally:
+        conn.close()
+    return len(keys)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Columnar OHLCV store maintenance")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    rb = sub.add_parser("rebuild", help="rebuild column files from SQLite market_data")
+    rb.add_argument("--db", default="market_data.db")
+    rb.add_argument("--symbol", default=None)
+    rb.add_argument("--timeframe", default=None)
+    args = parser.parse_args(argv)
+    if args.cmd == "rebuild":
+        n = rebuild_from_db(args.db, args.symbol, args.timeframe)
+        print(f"[STORE] Rebuilt {n} series into {ohlcv_store.root}")
+
+
+if __name__ == "__main__":
+    main()
@@ -372,15 +372,19 @@ class PaperTrader:
             best_strat = "MULTITIMEFRAME_PRO"
             best_profit = -float('inf')
             
+            # Try cache first, then backtest all misses in one batch
+            valid = self.strategy_engine._get_cached_results(symbol, "1h", "1y", "LONG")
+            profits = {strat: valid[("1y", strat, "LONG")].get('net_profit', 0) for strat in strategies_to_test
+                       if ("1y", strat, "LONG") in valid}
+
+            missing = [s for s in strategies_to_test if s not in profits]
+            if missing:
+                batch = self.strategy_engine.run_backtest_batch(df_raw, missing, ["1y"], ["LONG"])
+                for strat in missing:
+                    profits[strat] = batch[("1y", strat, "LONG")].get('net_profit', 0)
+
             for strat in strategies_to_test:
-                # Try cache first to speed up
-                cached = self.strategy_engine._get_cached_result(symbol, "1h", "1y", strat)
-                if cached:
-                    profit = cached.get('net_profit', 0)
-                else:
-                    _, _, metrics, _ = self.strategy_engine.run_backtest(df_raw, strat, requested_period="1y")
-                    profit = metrics.get('net_profit', 0)
-                    
+                profit = profits[strat]
                 if profit > best_profit:
                     best_profit = profit
                     best_strat = strat
@@ -0,0 +1,514 @@
+# backend/param_sweep.py
+"""
+Parameter sweep for the TradingEngine strategies.
+
+run_backtest hard-codes SMA 20/50, BB 20/2σ, RSI 14 (30/70), EMA 200,
+a 50-bar grid with 20% zones and one max_porto_dd per _PRO variant. This
+module evaluates whole parameter grids per strategy on one symbol:
+
+  - Rolling families are built once per symbol from shared building blocks:
+    every SMA window (and the BB mid/std) from one cumulative-sum array of
+    close (and close^2), RSI for every period from shared gain/loss
+    cumulative sums, ATR from one true-range cumsum. Each window/period is
+    memoized, so 1000 combinations touch each distinct window once.
+  - Every combination runs through the same vector kernel as
+    run_backtest(engine="vector") (backtest_kernel.compute_signals with
+    threshold overrides + simulate) and is scored with metrics_kernel.
+  - Combinations are split into chunks and evaluated in worker processes
+    (OHLCV handed over via shared memory, see backtest_pool).
+
+With DEFAULT_PARAMS the sweep reproduces run_backtest for every strategy
+(rolling sums differ from pandas' rolling only at ~1e-12 relative).
+
+Config:
+  BACKTEST_WORKERS  worker processes (shared with backtest_pool; 0 = inline)
+
+Usage:
+  from param_sweep import ParameterSweep
+  sweep = ParameterSweep(initial_capital=1000)
+  table = sweep.run(df_raw, strategies=["MOMENTUM", "GRID_PRO"], directions=["LONG"], interval="1h")
+  table.head(20)      # ranked DataFrame (score, net_profit, sharpe, params...)
+"""
+
+import itertools
+import math
+import time
+import threading
+import multiprocessing as mp
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+
+import backtest_kernel
+import metrics_kernel
+from backtest_pool import default_workers, frame_to_shared, frame_from_shared
+
+# ============================================================
+# PARAMETERS
+# ============================================================
+# Nilai hard-coded di _compute_indicators / compute_signals
+DEFAULT_PARAMS = {
+    'sma_fast': 20, 'sma_slow': 50, 'ema_span': 200,
+    'bb_window': 20, 'bb_std': 2.0,
+    'rsi_period': 14, **backtest_kernel.DEFAULT_THRESHOLDS,
+    'grid_window': 50,
+}
+ATR_PERIOD = 14
+
+# Default grids per base strategy (_PRO variants add PRO_GRID)
+DEFAULT_GRIDS = {
+    "MOMENTUM": {
+        'sma_fast': list(range(5, 55, 5)),
+        'sma_slow': list(range(20, 210, 10)),
+    },
+    "MEAN_REVERSAL": {
+        'bb_window': [14, 20, 30],
+        'bb_std': [1.5, 2.0, 2.5],
+        'rsi_period': [7, 14, 21],
+        'rsi_low': [20, 25, 30, 35],
+        'rsi_high': [65, 70, 75, 80],
+    },
+    "GRID": {
+        'grid_window': [20, 30, 50, 75, 100, 150, 200],
+        'grid_zone': [0.1, 0.15, 0.2, 0.25, 0.3],
+    },
+    "MULTITIMEFRAME": {
+        'ema_span': [50, 100, 150, 200],
+        'rsi_period': [7, 14, 21],
+        'mtf_rsi_entry': [30, 35, 40, 45],
+        'mtf_rsi_exit': [65, 70, 75, 80],
+    },
+    "MIX_STRATEGY": {
+        'sma_fast': [10, 20, 30],
+        'sma_slow': [50, 100],
+        'rsi_period': [7, 14, 21],
+        'rsi_low': [25, 30, 35],
+        'rsi_high': [65, 70, 75],
+    },
+}
+PRO_GRID = {
+    'max_porto_dd': [0.15, 0.2, 0.25, 0.3, 0.4, 0.5],
+    'risk_per_trade': [0.01, 0.02, 0.03],
+}
+
+STRATEGIES = [
+    "MOMENTUM", "MEAN_REVERSAL", "GRID", "MULTITIMEFRAME",
+    "MOMENTUM_PRO", "MEAN_REVERSAL_PRO", "GRID_PRO", "MULTITIMEFRAME_PRO",
+    "MIX_STRATEGY", "MIX_STRATEGY_PRO"
+]
+
+# Chunk kecil = load balancing lebih baik, chunk besar = cache window lebih efektif
+CHUNK_SIZE = 256
+
+
+def expand_grid(strategy, grid=None, risk_config=None):
+    """
+    All parameter dicts for one strategy. grid=None uses DEFAULT_GRIDS of
+    the base strategy (+ PRO_GRID for _PRO). Invalid combinations
+    (sma_fast >= sma_slow, rsi_low >= rsi_high) are dropped.
+    risk_config: (use_risk_mm, max_porto_dd, risk_per_trade) defaults from
+    TradingEngine._get_risk_config.
+    """
+    base = strategy.replace("_PRO", "")
+    if grid is None:
+        grid = dict(DEFAULT_GRIDS.get(base, {}))
+        if "_PRO" in strategy:
+            grid.update(PRO_GRID)
+    elif "_PRO" not in strategy:
+        # Basic strategies tidak punya risk module
+        grid = {k: v for k, v in grid.items() if k not in PRO_GRID}
+
+    defaults = dict(DEFAULT_PARAMS)
+    if risk_config is not None:
+        _, defaults['max_porto_dd'], defaults['risk_per_trade'] = risk_config
+
+    keys = list(grid)
+    combos = []
+    for values in itertools.product(*(grid[k] for k in keys)):
+        params = dict(zip(keys, values))
+        merged = {**defaults, **params}
+        if merged['sma_fast'] >= merged['sma_slow'] or merged['rsi_low'] >= merged['rsi_high']:
+            continue
+        combos.append(params)
+    return combos
+
+
+# ============================================================
+# ROLLING FAMILIES
+# ============================================================
+class RollingFamilies:
+    """
+    Indicator columns for arbitrary windows, from shared cumulative sums.
+
+    Close is centered on its first value before the cumsum so the running
+    sums stay small (less cancellation in window differences). Windows with
+    no change in close (flat prices) get an exact 0 std / 0 RSI gain-loss,
+    as pandas' rolling does, instead of a ~1e-15 residue.
+    """
+
+    def __init__(self, df):
+        self.time = (df['timestamp'].to_numpy(dtype=np.int64) // 1000)  # == time_to_epoch_seconds
+        self.high = df['high'].to_numpy(dtype=np.float64)
+        self.low = df['low'].to_numpy(dtype=np.float64)
+        self.close = np.ascontiguousarray(df['close'].to_numpy(dtype=np.float64))
+        self.n = len(self.close)
+
+        close = self.close
+        self._base = close[0] if self.n else 0.0
+        centered = close - self._base
+        self._cs = np.concatenate(([0.0], np.cumsum(centered)))
+        self._cs2 = np.concatenate(([0.0], np.cumsum(centered * centered)))
+
+        prev = np.concatenate(([np.nan], close[:-1]))
+        with np.errstate(invalid='ignore'):
+            delta = close - prev
+            gain = np.where(delta > 0, delta, 0.0)   # delta.where(delta > 0, 0): NaN -> 0
+            loss = np.where(delta < 0, -delta, 0.0)
+            changed = delta != 0
+        self._gain_cs = np.concatenate(([0.0], np.cumsum(gain)))
+        self._loss_cs = np.concatenate(([0.0], np.cumsum(loss)))
+        self._gain_cnt = np.concatenate(([0], np.cumsum(gain > 0)))
+        self._loss_cnt = np.concatenate(([0], np.cumsum(loss > 0)))
+        # Jumlah perubahan harga (bar ke-0 dihitung berubah, sama seperti diff NaN)
+        changed[0] = True
+        self._chg_cnt = np.concatenate(([0], np.cumsum(changed)))
+
+        # True range: max(H-L, |H-C_prev|, |L-C_prev|), NaN-skipping like np.max over a frame
+        self._tr_cs = np.concatenate(([0.0], np.cumsum(
+            np.fmax(self.high - self.low, np.fmax(np.abs(self.high - prev), np.abs(self.low - prev)))
+        )))
+        self._cache = {}
+
+    def _window_sum(self, cs, w):
+        """Sum over the trailing window ending at each bar (NaN before the window is full)."""
+        out = np.full(self.n, np.nan)
+        if w <= self.n:
+            out[w - 1:] = cs[w:] - cs[:-w]
+        return out
+
+    def _window_count(self, cnt, w):
+        out = np.zeros(self.n, dtype=np.int64)
+        if w <= self.n:
+            out[w - 1:] = cnt[w:] - cnt[:-w]
+        return out
+
+    def _memo(self, key, fn):
+        value = self._cache.get(key)
+        if value is None:
+            value = self._cache[key] = fn()
+        return value
+
+    def sma(self, w):
+        return self._memo(('sma', w), lambda: self._window_sum(self._cs, w) / w + self._base)
+
+    def std(self, w):
+        """Rolling sample std (ddof=1) of close."""
+        def build():
+            s1 = self._window_sum(self._cs, w)
+            s2 = self._window_sum(self._cs2, w)
+            with np.errstate(invalid='ignore'):
+                var = (s2 - s1 * s1 / w) / (w - 1)
+            var = np.where(var < 0, 0.0, var)
+            # Window dengan close konstan: std persis 0 (changes hanya di bar pertama window)
+            flat = self._window_count(self._chg_cnt, w - 1) == 0 if w > 1 else np.zeros(self.n, dtype=bool)
+            var[flat & ~np.isnan(var)] = 0.0
+            return np.sqrt(var)
+        return self._memo(('std', w), build)
+
+    def bollinger(self, w, k):
+        def build():
+            mid, sd = self.sma(w), self.std(w)
+            return mid + k * sd, mid - k * sd
+        return self._memo(('bb', w, k), build)
+
+    def rsi(self, p):
+        def build():
+            gain = self._window_sum(self._gain_cs, p) / p
+            loss = self._window_sum(self._loss_cs, p) / p
+            gain[self._window_count(self._gain_cnt, p) == 0] = 0.0
+            loss[self._window_count(self._loss_cnt, p) == 0] = 0.0
+            gain[:p - 1] = np.nan
+            loss[:p - 1] = np.nan
+            with np.errstate(invalid='ignore', divide='ignore'):
+                rs = gain / loss
+                return 100 - (100 / (1 + rs))
+        return self._memo(('rsi', p), build)
+
+    def ema(self, span):
+        return self._memo(('ema', span), lambda: pd.Series(self.close).ewm(span=span, adjust=False).mean().to_numpy())
+
+    def grid(self, w):
+        def build():
+            top = np.full(self.n, np.nan)
+            bottom = np.full(self.n, np.nan)
+            if w <= self.n:
+                top[w - 1:] = sliding_window_view(self.high, w).max(axis=1)
+                bottom[w - 1:] = sliding_window_view(self.low, w).min(axis=1)
+            return top, bottom
+        return self._memo(('grid', w), build)
+
+    def atr(self):
+        return self._memo(('atr', ATR_PERIOD), lambda: self._window_sum(self._tr_cs, ATR_PERIOD) / ATR_PERIOD)
+
+    def arrays(self, params, lo=0, hi=None):
+        """
+        backtest_kernel arrays dict for one parameter set, sliced to [lo, hi)
+        (indicators are computed on the full history first, like run_backtest).
+        """
+        p = {**DEFAULT_PARAMS, **params}
+        sl = slice(lo, hi)
+        bb_upper, bb_lower = self.bollinger(p['bb_window'], p['bb_std'])
+        grid_top, grid_bottom = self.grid(p['grid_window'])
+        return {
+            'close': self.close[sl],
+            'sma_fast': self.sma(p['sma_fast'])[sl],
+            'sma_slow': self.sma(p['sma_slow'])[sl],
+            'ema_200': self.ema(p['ema_span'])[sl],
+            'bb_upper': bb_upper[sl],
+            'bb_lower': bb_lower[sl],
+            'rsi': self.rsi(p['rsi_period'])[sl],
+            'grid_top': grid_top[sl],
+            'grid_bottom': grid_bottom[sl],
+            'atr': self.atr()[sl],
+            'time': self.time[sl],
+            'has_trend_cols': True,
+            'has_ema': True,
+        }
+
+
+# ============================================================
+# EVALUATION
+# ============================================================
+def simulate_combo(families, lo, hi, combo, initial_capital, regime_cache=None):
+    """Kernel run of one (strategy, direction, params, risk) combo on families[lo:hi]; returns (arrays, sim)."""
+    strategy, direction, params, risk = combo
+    base = strategy.replace("_PRO", "")
+    use_risk_mm, max_porto_dd, risk_per_trade = risk
+    max_porto_dd = params.get('max_porto_dd', max_porto_dd)
+    risk_per_trade = params.get('risk_per_trade', risk_per_trade)
+
+    arrays = families.arrays(params, lo, hi)
+    regimes = None
+    if base == "MIX_STRATEGY":
+        p = {**DEFAULT_PARAMS, **params}
+        rkey = (lo, hi, p['sma_fast'], p['sma_slow'], p['ema_span'], p['rsi_period'])
+        if regime_cache is None or rkey not in regime_cache:
+            regimes = backtest_kernel.market_regimes(arrays)[0]
+            if regime_cache is not None:
+                regime_cache[rkey] = regimes
+        else:
+            regimes = regime_cache[rkey]
+
+    signals = backtest_kernel.compute_signals(arrays, base, direction, regimes=regimes, thresholds=params)
+    sim = backtest_kernel.simulate(
+        arrays, signals, backtest_kernel.tradable_mask(arrays), direction, initial_capital,
+        use_risk_mm=use_risk_mm, max_porto_dd=max_porto_dd, risk_per_trade=risk_per_trade
+    )
+    return arrays, sim
+
+
+def score_sim(combo, arrays, sim, initial_capital, periods_per_year):
+    """Result row of one simulated combo (metrics rounded like calculate_metrics)."""
+    strategy, direction, params, _ = combo
+    final = sim['capital'] + sim['position_size'] * arrays['close'][-1]
+    m = metrics_kernel.compute_metrics(sim['equity_value'], sim['trades'].pnl_pct,
+                                       periods_per_year=periods_per_year,
+                                       total_return=(final / initial_capital) - 1)
+    net_profit = final - initial_capital
+    # Skor sama dengan find_best_strategy_for_symbol
+    consistency = max(0.0, min(100.0, m['r_squared'] * 100)) if len(sim['equity_value']) >= 2 else 0.0
+    score = consistency * 0.6 + min(200, net_profit) * 0.4
+    gross_loss = m['gross_loss']
+
+    return {
+        "strategy": strategy,
+        "direction": direction,
+        "params": params,
+        "net_profit": round(net_profit, 2),
+        "final_balance": round(final, 2),
+        "total_trades": m['total_trades'],
+        "win_rate": round(m['win_rate'] * 100, 2),
+        "max_drawdown": round(m['max_drawdown'] * 100, 2),
+        "sharpe_ratio": round(m['sharpe'], 2),
+        "sortino_ratio": round(m['sortino'], 2),
+        "calmar_ratio": round(m['calmar'], 2),
+        "profit_factor": round(m['gross_profit'] / gross_loss, 2) if gross_loss > 0 else 0.0,
+        "consistency_score": round(consistency, 2),
+        "score": round(score, 2),
+    }
+
+
+def evaluate(families, lo, hi, combos, initial_capital, periods_per_year):
+    """
+    Run every (strategy, direction, params, risk) combo on families[lo:hi].
+    Returns a list of result rows (dicts).
+    """
+    rows = []
+    regime_cache = {}
+    for combo in combos:
+        arrays, sim = simulate_combo(families, lo, hi, combo, initial_capital, regime_cache)
+        rows.append(score_sim(combo, arrays, sim, initial_capital, periods_per_year))
+    return rows
+
+
+# ============================================================
+# WORKER SIDE
+# ============================================================
+_worker_families = (None, None)
+
+
+def worker_families(shm_name, n_rows):
+    """RollingFamilies of a shared OHLCV block, kept per worker for every task on the same block."""
+    global _worker_families
+    if _worker_families[0] != shm_name:
+        _worker_families = (shm_name, RollingFamilies(frame_from_shared(shm_name, n_rows)))
+    return _worker_families[1]
+
+
+def _worker_evaluate(shm_name, n_rows, lo, hi, combos, initial_capital, periods_per_year):
+    return evaluate(worker_families(shm_name, n_rows), lo, hi, combos, initial_capital, periods_per_year)
+
+
+# ============================================================
+# SWEEP
+# ============================================================
+class ParameterSweep:
+    def __init__(self, initial_capital=1000, workers=None, engine=None):
+        self.initial_capital = float(initial_capital)
+        self.workers = default_workers() if workers is None else max(0, int(workers))
+        self._engine = engine
+        self._executor = None
+        self._lock = threading.Lock()
+
+    @property
+    def engine(self):
+        # TradingEngine dipakai untuk fetch_data / slice_data_by_period / _get_risk_config
+        if self._engine is None:
+            from strategy_core import TradingEngine
+            self._engine = TradingEngine(initial_capital=self.initial_capital)
+        return self._engine
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(max_workers=self.workers,
+                                                     mp_context=mp.get_context("spawn"))
+                print(f"[SWEEP] Worker pool started with {self.workers} process(es)")
+            return self._executor
+
+    def submit(self, fn, *args):
+        """Run fn(*args) on the sweep's worker pool (used by walk_forward for whole folds)."""
+        return self._get_executor().submit(fn, *args)
+
+    def build_combos(self, strategies=None, directions=("LONG",), grids=None):
+        """[(strategy, direction, params, risk_config)] for every grid point."""
+        combos = []
+        for strategy in strategies or STRATEGIES:
+            base = strategy.replace("_PRO", "")
+            use_risk_mm, _, max_porto_dd, risk_per_trade = self.engine._get_risk_config(strategy)
+            risk = (use_risk_mm, max_porto_dd, risk_per_trade)
+            grid = None
+            if grids is not None and strategy in grids:
+                grid = grids[strategy]
+            elif grids is not None and base in grids:
+                grid = {**grids[base], **(PRO_GRID if use_risk_mm else {})}
+            for params in expand_grid(strategy, grid, risk):
+                for direction in directions:
+                    combos.append((strategy, direction, params, risk))
+        return combos
+
+    def run(self, df_raw, strategies=None, directions=("LONG",), grids=None, period="max",
+            start_date=None, end_date=None, interval="1d", min_trades=3, top=None):
+        """
+        Evaluate every grid point on one symbol's OHLCV (fetch_data layout).
+
+        Args:
+            grids: {strategy: {param: [values]}} used as-is, or {base strategy:
+                   grid} which _PRO variants extend with PRO_GRID. Missing
+                   strategies use DEFAULT_GRIDS (+ PRO_GRID for _PRO).
+            period/start_date/end_date: backtest window, as run_backtest.
+            min_trades: rows with fewer trades are dropped (finder uses 3).
+            top: keep only the best N rows.
+
+        Returns: DataFrame ranked by score (then net_profit), one row per
+        combination; attrs['combinations'] / attrs['elapsed_sec'] describe the run.
+        """
+        t0 = time.time()
+        if df_raw is None or len(df_raw) < 50:
+            return pd.DataFrame()
+        from strategy_core import BARS_PER_YEAR
+
+        df_raw = df_raw.reset_index(drop=True)
+        sliced = self.engine.slice_data_by_period(df_raw, period, start_date, end_date)
+        if sliced is None or len(sliced) < 5:
+            return pd.DataFrame()
+        lo, hi = int(sliced.index[0]), int(sliced.index[-1]) + 1
+        periods_per_year = BARS_PER_YEAR.get(interval, 252)
+
+        combos = self.build_combos(strategies, directions, grids)
+        rows = None
+        if self.workers > 0 and len(combos) > CHUNK_SIZE:
+            chunks = [combos[i:i + CHUNK_SIZE] for i in range(0, len(combos), CHUNK_SIZE)]
+            shm = frame_to_shared(df_raw)
+            try:
+                executor = self._get_executor()
+                futures = [executor.submit(_worker_evaluate, shm.name, len(df_raw), lo, hi, chunk,
+                                           self.initial_capital, periods_per_year) for chunk in chunks]
+                rows = [row for f in futures for row in f.result()]
+            except BrokenProcessPool as e:
+                print(f"[WARN] [SWEEP] Worker pool broken ({e}), running inline")
+                with self._lock:
+                    self._executor = None
+            finally:
+                shm.close()
+                shm.unlink()
+        if rows is None:
+            rows = evaluate(RollingFamilies(df_raw), lo, hi, combos, self.initial_capital, periods_per_year)
+
+        table = pd.DataFrame(rows)
+        if table.empty:
+            return table
+        table = table[table['total_trades'] >= min_trades]
+        table = table.sort_values(['score', 'net_profit'], ascending=False, kind='stable').reset_index(drop=True)
+        if top:
+            table = table.head(top)
+        table.insert(0, 'rank', range(1, len(table) + 1))
+
+        elapsed = time.time() - t0
+        table.attrs['combinations'] = len(combos)
+        table.attrs['elapsed_sec'] = round(elapsed, 2)
+        print(f"[SWEEP] {len(combos)} combinations on {hi - lo} bars in {elapsed:.1f}s "
+              f"({len(combos) / max(elapsed, 1e-9):.0f}/s, workers={self.workers})")
+        return table
+
+    def run_symbol(self, symbol, timeframe="1h", **kwargs):
+        """fetch_data(period="max") + run(); same data path as find_best_strategy_for_symbol."""
+        df_raw = self.engine.fetch_data(symbol, requested_period="max", interval=timeframe)
+        return self.run(df_raw, interval=timeframe, **kwargs)
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=True, cancel_futures=True)
+                self._executor = None
+
+
+def table_to_records(table):
+    """Ranked table -> JSON-friendly list of dicts (NaN/inf -> None)."""
+    records = table.to_dict('records')
+    for r in records:
+        for k, v in r.items():
+            if isinstance(v, float) and not math.isfinite(v):
+                r[k] = None
+    return records
+
+
+if __name__ == "__main__":
+    sweep = ParameterSweep(initial_capital=1000)
+    result = sweep.run_symbol("BTC-USDT", timeframe="1h", strategies=["MOMENTUM", "GRID_PRO"],
+                              directions=["LONG", "SHORT"])
+    print(result.head(20).to_string())
+    sweep.shutdown()
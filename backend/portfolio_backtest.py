@@ -0,0 +1,500 @@
+# backend/portfolio_backtest.py
+"""
+Multi-symbol portfolio backtest on one aligned time index.
+
+run_backtest simulates every symbol alone with its own capital, so the
+scanner's elite set is never tested as a book. This module runs N symbols
+against ONE capital pool:
+
+  - Candles of all symbols are read from market_data in one bulk read
+    (market_loader.load_many) and aligned into 2-D time x symbol matrices
+    (open/high/low/close). Bars a
+    symbol does not have (not listed yet, missing candle) are NaN.
+  - Indicators are the _compute_indicators formulas applied column-wise on
+    the matrix, and signals come from backtest_kernel.compute_signals on
+    the 2-D arrays (one call per strategy/direction group, not per symbol).
+  - One state machine walks the bars that carry a signal and applies the
+    risk_manager limits across the whole book: max_open_positions,
+    max_position_pct per entry, no new entries while the drawdown from peak
+    exceeds max_drawdown_pct or the day's PnL is below -daily_loss_limit_pct.
+    Exits are always allowed. When more symbols signal than there are free
+    slots, earlier legs of the book win (pass the book ranked).
+  - Cost model is the one of the single-symbol backtest (TAKER_FEE +
+    SLIPPAGE per side); _PRO strategies use their base signals, sizing and
+    stops come from the book-level limits instead.
+
+Output: portfolio metrics, equity curve, gross exposure curve, rejected
+entries per limit and per-leg contribution (realized + open PnL in USD).
+
+Usage:
+  from portfolio_backtest import PortfolioBacktester
+  pb = PortfolioBacktester(initial_capital=10000)
+  report = pb.run_db(["BTC-USDT", "ETH-USDT", "SOL-USDT"], strategy="MOMENTUM", timeframe="1h", period="1y")
+"""
+
+import time
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+import backtest_kernel
+import metrics_kernel
+from backtest_kernel import ROUND_TRIP_COST, SIGNAL_OPEN, SIGNAL_CLOSE
+from backtest_result import EquityCurve
+from market_loader import load_many
+
+DB_FILE = "market_data.db"
+
+# Sama dengan cutoff di TradingEngine._load_from_db / slice_data_by_period
+PERIOD_DAYS = {"1mo": 30, "3mo": 90, "6mo": 180, "1y": 365, "2y": 730}
+INTERVAL_MS = {"1m": 60000, "15m": 900000, "1h": 3600000, "4h": 14400000, "1d": 86400000, "1w": 604800000}
+
+# Candle ekstra sebelum periode agar EMA 200 / SMA 50 sudah "panas" saat periode mulai
+WARMUP_BARS = 1000
+
+ALLOCATION_MODES = ("equal", "risk")
+REJECT_REASONS = ("MAX_POSITIONS", "MAX_DRAWDOWN", "DAILY_LOSS", "NO_CAPITAL")
+
+
+# ============================================================
+# 1. BOOK & MARKET MATRIX
+# ============================================================
+def make_book(entries, strategy="MOMENTUM", direction="LONG"):
+    """
+    Normalize the book into legs [{symbol, strategy, direction}].
+    entries: symbols (str) and/or dicts with symbol [+ strategy, direction],
+    e.g. the scanner's elite_signals. Duplicate (symbol, direction) legs
+    keep the first occurrence.
+    """
+    legs, seen = [], set()
+    for e in entries:
+        if isinstance(e, str):
+            e = {"symbol": e}
+        leg = {
+            "symbol": e["symbol"],
+            "strategy": (e.get("strategy") or strategy).upper(),
+            "direction": (e.get("direction") or direction).upper(),
+        }
+        key = (leg["symbol"], leg["direction"])
+        if key in seen:
+            continue
+        seen.add(key)
+        legs.append(leg)
+    return legs
+
+
+class MarketMatrix:
+    """OHLC of many symbols on one sorted timestamp index (time x symbol float64)."""
+
+    def __init__(self, timestamp, symbols, open_, high, low, close):
+        self.timestamp = np.asarray(timestamp, dtype=np.int64)
+        self.time = self.timestamp // 1000  # epoch seconds, sama dengan marker/equity_curve
+        self.symbols = list(symbols)
+        self.open = open_
+        self.high = high
+        self.low = low
+        self.close = close
+
+    def __len__(self):
+        return len(self.timestamp)
+
+    @classmethod
+    def from_long(cls, df, symbols):
+        """Long rows (symbol, timestamp, open, high, low, close) -> matrices, columns ordered as symbols."""
+        if df.empty:
+            empty = np.empty((0, len(symbols)))
+            return cls([], symbols, empty, empty, empty, empty)
+        wide = df.pivot_table(index='timestamp', columns='symbol',
+                              values=['open', 'high', 'low', 'close'], aggfunc='last')
+        mats = [wide[col].reindex(columns=symbols).to_numpy(dtype=np.float64)
+                for col in ('open', 'high', 'low', 'close')]
+        return cls(wide.index.to_numpy(dtype=np.int64), symbols, *mats)
+
+    @classmethod
+    def from_frames(cls, frames):
+        """{symbol: fetch_data frame} -> MarketMatrix (outer join on timestamp)."""
+        parts = [f[['timestamp', 'open', 'high', 'low', 'close']].assign(symbol=s) for s, f in frames.items()]
+        df = pd.concat(parts, ignore_index=True) if parts else pd.DataFrame(
+            columns=['symbol', 'timestamp', 'open', 'high', 'low', 'close'])
+        return cls.from_long(df, list(frames))
+
+    @classmethod
+    def from_db(cls, symbols, timeframe="1h", start_ts=0, end_ts=None, db_file=DB_FILE):
+        """One bulk read over market_data for all symbols (timestamps in ms, inclusive)."""
+        symbols = list(dict.fromkeys(symbols))
+        data = load_many(symbols, timeframe, start_ts=start_ts, end_ts=end_ts, db_file=db_file,
+                         columns=('open', 'high', 'low', 'close'))
+        ts, open_ = data.wide('open')
+        mats = [data.wide(col)[1] for col in ('high', 'low', 'close')]
+        return cls(ts, symbols, open_, *mats)
+
+    def take(self, columns):
+        """Matrix with the given column indices (legs may repeat a symbol)."""
+        idx = np.asarray(columns, dtype=np.int64)
+        return MarketMatrix(self.timestamp, [self.symbols[i] for i in idx],
+                            self.open[:, idx], self.high[:, idx], self.low[:, idx], self.close[:, idx])
+
+
+def indicator_matrix(mm):
+    """
+    _compute_indicators, column-wise on the time x symbol matrices.
+    Returns the kernel arrays dict (2-D float64 per column name).
+    """
+    close = pd.DataFrame(mm.close)
+    high = pd.DataFrame(mm.high)
+    low = pd.DataFrame(mm.low)
+
+    bb_mid = close.rolling(20).mean()
+    std = close.rolling(20).std()
+
+    delta = close.diff()
+    gain = (delta.where(delta > 0, 0)).rolling(14).mean()
+    loss = (-delta.where(delta < 0, 0)).rolling(14).mean()
+    rsi = 100 - (100 / (1 + gain / loss))
+
+    # True range: NaN-skipping max seperti np.max(ranges, axis=1) di _compute_indicators
+    prev = mm.close[:-1]
+    prev = np.vstack((np.full((1, mm.close.shape[1]), np.nan), prev))
+    tr = np.fmax(mm.high - mm.low, np.fmax(np.abs(mm.high - prev), np.abs(mm.low - prev)))
+
+    arrays = {
+        'close': mm.close,
+        'sma_fast': bb_mid.to_numpy(),
+        'sma_slow': close.rolling(50).mean().to_numpy(),
+        'ema_200': close.ewm(span=200, adjust=False).mean().to_numpy(),
+        'bb_upper': (bb_mid + 2 * std).to_numpy(),
+        'bb_lower': (bb_mid - 2 * std).to_numpy(),
+        'rsi': rsi.to_numpy(),
+        'grid_top': high.rolling(50).max().to_numpy(),
+        'grid_bottom': low.rolling(50).min().to_numpy(),
+        'atr': pd.DataFrame(tr).rolling(14).mean().to_numpy(),
+        'time': mm.time,
+        'has_trend_cols': True,
+        'has_ema': True,
+    }
+    return arrays
+
+
+def book_signals(arrays, legs):
+    """
+    Signal matrix (time x leg) for a book with mixed strategies/directions.
+    compute_signals runs once per (base strategy, direction) group on the
+    group's columns.
+    """
+    n_bars, n_legs = arrays['close'].shape
+    signals = np.zeros((n_bars, n_legs), dtype=np.int8)
+    groups = {}
+    for k, leg in enumerate(legs):
+        groups.setdefault((leg['strategy'].replace("_PRO", ""), leg['direction']), []).append(k)
+
+    for (base, direction), cols in groups.items():
+        cols = np.asarray(cols)
+        sub = {k: (v[:, cols] if isinstance(v, np.ndarray) and v.ndim == 2 else v) for k, v in arrays.items()}
+        signals[:, cols] = backtest_kernel.compute_signals(sub, base, direction)
+    return signals
+
+
+# ============================================================
+# 2. BOOK STATE MACHINE
+# ============================================================
+def simulate_book(arrays, signals, sides, initial_capital, risk_config, allocation="equal", start=0):
+    """
+    One capital pool over all legs.
+
+    sides: +1 (LONG) / -1 (SHORT) per leg. Bars < start only warm up the
+    indicators. Only bars with an executable signal are visited one by one;
+    equity and exposure between them are filled as matrix-vector products.
+
+    Returns dict with equity_value / exposure (per bar from start), trade
+    pnl/reason/leg arrays, per-leg realized/open PnL, rejection counts.
+    """
+    close = arrays['close']
+    times = arrays['time']
+    atr = arrays['atr']
+    n_bars, n_legs = close.shape
+
+    # Harga terakhir yang diketahui untuk mark-to-market (candle hilang = harga sebelumnya)
+    px = pd.DataFrame(close).ffill().fillna(0.0).to_numpy()
+
+    tradable = backtest_kernel.tradable_mask(arrays)
+    tradable[:start] = False
+    open_ev = tradable & (signals == SIGNAL_OPEN)
+    close_ev = tradable & (signals == SIGNAL_CLOSE)
+    events = np.flatnonzero(open_ev.any(axis=1) | close_ev.any(axis=1))
+
+    enabled = risk_config.get("enabled", True)
+    max_positions = int(risk_config.get("max_open_positions", 5))
+    max_pos_frac = risk_config.get("max_position_pct", 10.0) / 100
+    max_dd_frac = risk_config.get("max_drawdown_pct", 15.0) / 100
+    daily_limit_frac = risk_config.get("daily_loss_limit_pct", 3.0) / 100
+    risk_frac = risk_config.get("risk_per_trade_pct", 1.0) / 100
+
+    # Indeks bar pertama pada hari (UTC) yang sama, untuk daily loss limit
+    day = times // 86400
+    day_first = np.searchsorted(times, day * 86400)
+
+    cash = float(initial_capital)
+    qty = np.zeros(n_legs)
+    entry_price = np.zeros(n_legs)
+    basis = np.zeros(n_legs)          # cash flow saat entry (long: -value, short: +proceeds)
+    realized = np.zeros(n_legs)
+    trades_per_leg = np.zeros(n_legs, dtype=np.int64)
+    wins_per_leg = np.zeros(n_legs, dtype=np.int64)
+    bars_held = np.zeros(n_legs, dtype=np.int64)
+    held = np.zeros(n_legs, dtype=bool)
+    peak = cash
+    rejected = dict.fromkeys(REJECT_REASONS, 0)
+
+    trade_pnl, trade_reason, trade_leg = [], [], []
+    equity = np.full(n_bars, np.nan)
+    gross = np.zeros(n_bars)
+    equity[:start + 1] = cash
+
+    def fill(a, b):
+        """equity/gross for bars [a, b) with the current book."""
+        nonlocal peak
+        if b <= a:
+            return
+        cols = np.flatnonzero(held)
+        if len(cols):
+            val = px[a:b, cols] * qty[cols]
+            equity[a:b] = cash + val.sum(axis=1)
+            gross[a:b] = np.abs(val).sum(axis=1)
+            bars_held[cols] += b - a
+        else:
+            equity[a:b] = cash
+            gross[a:b] = 0.0
+        peak = max(peak, float(equity[a:b].max()))
+
+    i = start
+    for j in events:
+        j = int(j)
+        fill(i, j)
+
+        # --- EXITS (selalu diizinkan) ---
+        for k in np.flatnonzero(close_ev[j] & held):
+            c = close[j, k]
+            flow = qty[k] * c - abs(qty[k]) * c * ROUND_TRIP_COST
+            cash += flow
+            pnl_usd = basis[k] + flow
+            realized[k] += pnl_usd
+            trades_per_leg[k] += 1
+            wins_per_leg[k] += pnl_usd > 0
+            trade_pnl.append(sides[k] * (c - entry_price[k]) / entry_price[k])
+            trade_reason.append('SIGNAL')
+            trade_leg.append(int(k))
+            qty[k] = 0.0
+            held[k] = False
+
+        # --- ENTRIES (dibatasi risk limits) ---
+        candidates = np.flatnonzero(open_ev[j] & ~held)
+        if len(candidates):
+            cols = np.flatnonzero(held)
+            book_val = px[j, cols] * qty[cols]
+            eq = cash + book_val.sum()
+            gross_now = np.abs(book_val).sum()
+            peak = max(peak, eq)
+
+            blocked = None
+            if enabled and peak > 0 and (peak - eq) / peak > max_dd_frac:
+                blocked = "MAX_DRAWDOWN"
+            elif enabled:
+                ref = equity[day_first[j] - 1] if day_first[j] - 1 >= start else initial_capital
+                if ref > 0 and (eq - ref) / ref < -daily_limit_frac:
+                    blocked = "DAILY_LOSS"
+            if blocked:
+                rejected[blocked] += len(candidates)
+                candidates = candidates[:0]
+
+            for k in candidates:
+                if held.sum() >= max_positions:
+                    rejected["MAX_POSITIONS"] += 1
+                    continue
+                c = close[j, k]
+                value = eq * max_pos_frac
+                if allocation == "risk":
+                    # Sizing ATR seperti _risk_position_value (stop 1.5 ATR), dibatasi max_position_pct
+                    sl_dist = atr[j, k] * 1.5
+                    if sl_dist > 0:
+                        value = min(eq * risk_frac / (sl_dist / c), value)
+                value = min(value, eq - gross_now)
+                if not value > 0:
+                    rejected["NO_CAPITAL"] += 1
+                    continue
+                if sides[k] > 0:
+                    qty[k] = value * (1 - ROUND_TRIP_COST) / c
+                    basis[k] = -value
+                else:
+                    qty[k] = -value / c
+                    basis[k] = value * (1 - ROUND_TRIP_COST)
+                cash += basis[k]
+                entry_price[k] = c
+                gross_now += value
+                held[k] = True
+
+        fill(j, j + 1)
+        i = j + 1
+    fill(i, n_bars)
+
+    open_pnl = np.where(held, basis + qty * px[-1], 0.0) if n_bars else np.zeros(n_legs)
+    return {
+        'equity_value': equity[start:],
+        'gross_exposure': gross[start:],
+        'trade_pnl': np.asarray(trade_pnl, dtype=np.float64),
+        'trade_reason': trade_reason,
+        'trade_leg': np.asarray(trade_leg, dtype=np.int64),
+        'realized': realized,
+        'open_pnl': open_pnl,
+        'trades_per_leg': trades_per_leg,
+        'wins_per_leg': wins_per_leg,
+        'bars_held': bars_held,
+        'open_positions': int(held.sum()),
+        'rejected': rejected,
+    }
+
+
+# ============================================================
+# 3. BACKTESTER
+# ============================================================
+class PortfolioBacktester:
+    def __init__(self, initial_capital=10000, risk_config=None, allocation="equal"):
+        """
+        risk_config: overrides of risk_manager.get_risk_config() (the live
+        book limits); missing keys fall back to that config.
+        allocation: "equal" = every entry gets max_position_pct of equity,
+        "risk" = ATR sizing with risk_per_trade_pct, capped by max_position_pct.
+        """
+        if allocation not in ALLOCATION_MODES:
+            raise ValueError(f"allocation must be one of {ALLOCATION_MODES}, got {allocation!r}")
+        self.initial_capital = float(initial_capital)
+        self.allocation = allocation
+        self._risk_overrides = dict(risk_config or {})
+
+    @property
+    def risk_config(self):
+        import risk_manager
+        config = risk_manager.get_risk_config()
+        config.update(self._risk_overrides)
+        return config
+
+    def run(self, mm, legs, interval="1h", start_ts=None, end_ts=None):
+        """
+        Backtest a book on a MarketMatrix whose columns are the leg symbols
+        (see run_db). start_ts / end_ts (ms) bound the traded range; earlier
+        bars only warm up the indicators.
+        """
+        from strategy_core import BARS_PER_YEAR
+        t0 = time.time()
+        if len(mm) == 0 or not legs:
+            return {"error": "No candles for the requested symbols"}
+        if end_ts is not None:
+            keep = mm.timestamp <= end_ts
+            mm = MarketMatrix(mm.timestamp[keep], mm.symbols, mm.open[keep], mm.high[keep], mm.low[keep], mm.close[keep])
+        start = int(np.searchsorted(mm.timestamp, start_ts)) if start_ts is not None else 0
+        if start >= len(mm):
+            return {"error": "No candles inside the requested period"}
+
+        arrays = indicator_matrix(mm)
+        signals = book_signals(arrays, legs)
+        sides = np.array([1 if leg['direction'] == "LONG" else -1 for leg in legs])
+        sim = simulate_book(arrays, signals, sides, self.initial_capital, self.risk_config,
+                            self.allocation, start)
+
+        report = self._report(mm, legs, sim, start, BARS_PER_YEAR.get(interval, 252))
+        report["elapsed_sec"] = round(time.time() - t0, 2)
+        print(f"[PORTFOLIO] {len(legs)} legs x {len(mm) - start} bars -> "
+              f"{report['metrics']['total_trades']} trades in {report['elapsed_sec']}s")
+        return report
+
+    def run_db(self, entries, strategy="MOMENTUM", direction="LONG", timeframe="1h", period="1y",
+               start_date=None, end_date=None, db_file=DB_FILE):
+        """
+        Load the book's candles from market_data and run it. entries: symbols
+        and/or scanner results ({symbol, strategy, direction}).
+        Symbols without candles in market_data are skipped and listed under "missing".
+        """
+        legs = make_book(entries, strategy, direction)
+        step = INTERVAL_MS.get(timeframe, 3600000)
+        if start_date:
+            start_ts = int(pd.Timestamp(start_date).timestamp() * 1000)
+        elif period in PERIOD_DAYS:
+            start_ts = int(datetime.now().timestamp() * 1000) - PERIOD_DAYS[period] * 86400000
+        else:
+            start_ts = 0  # "max"
+        end_ts = int(pd.Timestamp(end_date).timestamp() * 1000) if end_date else None
+
+        symbols = list(dict.fromkeys(leg["symbol"] for leg in legs))
+        mm = MarketMatrix.from_db(symbols, timeframe, max(0, start_ts - WARMUP_BARS * step), end_ts, db_file)
+        present = ~np.all(np.isnan(mm.close), axis=0) if len(mm) else np.zeros(len(symbols), dtype=bool)
+        missing = [s for s, ok in zip(symbols, present) if not ok]
+        legs = [leg for leg in legs if leg["symbol"] not in missing]
+        index = {s: i for i, s in enumerate(symbols)}
+        mm = mm.take([index[leg["symbol"]] for leg in legs])
+
+        report = self.run(mm, legs, interval=timeframe, start_ts=start_ts if start_ts > 0 else None)
+        report.update({"timeframe": timeframe, "period": period, "missing": missing})
+        return report
+
+    def _report(self, mm, legs, sim, start, periods_per_year):
+        capital = self.initial_capital
+        eq = sim['equity_value']
+        times = mm.time[start:]
+        final = float(eq[-1])
+        m = metrics_kernel.compute_metrics(eq, sim['trade_pnl'], periods_per_year=periods_per_year,
+                                           total_return=final / capital - 1)
+        gross_loss = m['gross_loss']
+        with np.errstate(invalid='ignore', divide='ignore'):
+            exposure = np.where(eq > 0, sim['gross_exposure'] / eq * 100, 0.0)
+
+        contributions = []
+        for k, leg in enumerate(legs):
+            pnl = float(sim['realized'][k] + sim['open_pnl'][k])
+            trades = int(sim['trades_per_leg'][k])
+            contributions.append({
+                **leg,
+                "pnl": round(pnl, 2),
+                "realized_pnl": round(float(sim['realized'][k]), 2),
+                "open_pnl": round(float(sim['open_pnl'][k]), 2),
+                "contribution_pct": round(pnl / capital * 100, 2),
+                "total_trades": trades,
+                "win_rate": round(float(sim['wins_per_leg'][k]) / trades * 100, 2) if trades else 0.0,
+                "time_in_market_pct": round(float(sim['bars_held'][k]) / len(eq) * 100, 2),
+            })
+        contributions.sort(key=lambda c: c["pnl"], reverse=True)
+
+        return {
+            "legs": len(legs),
+            "bars": len(eq),
+            "start": pd.Timestamp(int(times[0]), unit='s').isoformat(),
+            "end": pd.Timestamp(int(times[-1]), unit='s').isoformat(),
+            "allocation": self.allocation,
+            "metrics": {
+                "initial_balance": capital,
+                "final_balance": round(final, 2),
+                "net_profit": round(final - capital, 2),
+                "total_return": round((final / capital - 1) * 100, 2),
+                "total_trades": m['total_trades'],
+                "win_rate": round(m['win_rate'] * 100, 2),
+                "max_drawdown": round(m['max_drawdown'] * 100, 2),
+                "sharpe_ratio": round(m['sharpe'], 2),
+                "sortino_ratio": round(m['sortino'], 2),
+                "calmar_ratio": round(m['calmar'], 2),
+                "profit_factor": round(m['gross_profit'] / gross_loss, 2) if gross_loss > 0 else 0.0,
+                "avg_exposure_pct": round(float(exposure.mean()), 2),
+                "max_exposure_pct": round(float(exposure.max()), 2),
+                "open_positions": sim['open_positions'],
+            },
+            "rejected_entries": sim['rejected'],
+            "contributions": contributions,
+            "equity_curve": EquityCurve(times, eq),
+            "exposure_curve": EquityCurve(times, exposure),
+        }
+
+
+if __name__ == "__main__":
+    pb = PortfolioBacktester(initial_capital=10000)
+    out = pb.run_db(["BTC-USDT", "ETH-USDT", "SOL-USDT", "BNB-USDT"], strategy="MOMENTUM", timeframe="1h", period="1y")
+    print(out.get("metrics"), out.get("rejected_entries"), out.get("missing"))
+    for c in out.get("contributions", [])[:10]:
+        print(c)
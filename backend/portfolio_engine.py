@@ -7,12 +7,13 @@ Features:
 - Stores snapshots in portfolio_snapshots table (SQLite)
 - Computes equity curve, daily PnL, allocation breakdown
 """
-import sqlite3
 import json
 from datetime import datetime, timedelta
 import os
 from dotenv import load_dotenv
 
+from db_utils import get_db_connection
+
 load_dotenv()
 
 DB_FILE = "market_data.db"
@@ -20,7 +21,7 @@ DB_FILE = "market_data.db"
 
 def _get_db_conn():
     try:
-        return sqlite3.connect(DB_FILE, check_same_thread=False)
+        return get_db_connection(DB_FILE, row_factory=None)
     except Exception as e:
         print(f"[ERROR] Portfolio DB Error: {e}")
         return None
@@ -45,10 +46,11 @@ def init_portfolio_tables():
             );
         """)
         conn.commit()
-        conn.close()
         print("[INFO] Portfolio tables initialized")
     except Exception as e:
         print(f"[ERROR] Portfolio table init error: {e}")
+    finally:
+        conn.close()
 
 
 def take_snapshot(engine):
@@ -100,20 +102,22 @@ def take_snapshot(engine):
         conn = _get_db_conn()
         if not conn:
             return
-        cursor = conn.cursor()
-        cursor.execute("""
-            INSERT INTO portfolio_snapshots (total_equity, free_usdt, used_usdt, positions_json, snapshot_type, created_at)
-            VALUES (?, ?, ?, ?, ?, ?)
-        """, (
-            round(total_equity, 2),
-            round(float(free_usdt), 2),
-            round(float(used_usdt), 2),
-            json.dumps(positions),
-            'auto',
-            datetime.now().isoformat()
-        ))
-        conn.commit()
-        conn.close()
+        try:
+            cursor = conn.cursor()
+            cursor.execute("""
+                INSERT INTO portfolio_snapshots (total_equity, free_usdt, used_usdt, positions_json, snapshot_type, created_at)
+                VALUES (?, ?, ?, ?, ?, ?)
+            """, (
+                round(total_equity, 2),
+                round(float(free_usdt), 2),
+                round(float(used_usdt), 2),
+                json.dumps(positions),
+                'auto',
+                datetime.now().isoformat()
+            ))
+            conn.commit()
+        finally:
+            conn.close()
         print(f"[SNAPSHOT] Portfolio: ${total_equity:,.2f} ({len(positions)} positions)")
 
     except Exception as e:
@@ -184,9 +188,10 @@ def get_portfolio_summary(engine):
                 row = cursor.fetchone()
                 if row:
                     today_pnl = round(total_equity - row[0], 2)
-                conn.close()
             except Exception:
                 pass
+            finally:
+                conn.close()
 
         return {
             "mode": engine.auth_mode,
@@ -219,7 +224,6 @@ def get_equity_curve(days=30):
             (since,)
         )
         rows = cursor.fetchall()
-        conn.close()
 
         return [
             {
@@ -232,6 +236,8 @@ def get_equity_curve(days=30):
     except Exception as e:
         print(f"[WARN] Equity curve error: {e}")
         return []
+    finally:
+        conn.close()
 
 
 def get_daily_pnl(days=30):
@@ -251,7 +257,6 @@ def get_daily_pnl(days=30):
             (since,)
         )
         rows = cursor.fetchall()
-        conn.close()
 
         if not rows:
             return []
@@ -292,3 +297,5 @@ def get_daily_pnl(days=30):
     except Exception as e:
         print(f"[WARN] Daily PnL error: {e}")
         return []
+    finally:
+        conn.close()
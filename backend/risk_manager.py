@@ -10,12 +10,13 @@ Features:
 - Per-trade risk checks before execution
 - Risk alerts logged to DB
 """
-import sqlite3
 import json
 import numpy as np
 from datetime import datetime, timedelta
 from dotenv import load_dotenv
 
+from db_utils import get_db_connection
+
 load_dotenv()
 
 DB_FILE = "market_data.db"
@@ -33,10 +34,7 @@ DEFAULT_RISK_CONFIG = {
 
 def _get_db_conn():
     try:
-        conn = sqlite3.connect(DB_FILE, check_same_thread=False, timeout=30)
-        conn.execute("PRAGMA journal_mode=WAL")
-        conn.execute("PRAGMA busy_timeout=30000")
-        return conn
+        return get_db_connection(DB_FILE, row_factory=None)
     except Exception as e:
         print(f"[ERROR] Risk DB Error: {e}")
         return None
@@ -80,10 +78,11 @@ def init_risk_tables():
             )
 
         conn.commit()
-        conn.close()
         print("[INFO] Risk tables initialized")
     except Exception as e:
         print(f"[ERROR] Risk table init error: {e}")
+    finally:
+        conn.close()
 
 
 def get_risk_config():
@@ -95,12 +94,13 @@ def get_risk_config():
         cursor = conn.cursor()
         cursor.execute("SELECT config_json FROM risk_config WHERE id = 1")
         row = cursor.fetchone()
-        conn.close()
         if row:
             return json.loads(row[0])
         return DEFAULT_RISK_CONFIG.copy()
     except Exception:
         return DEFAULT_RISK_CONFIG.copy()
+    finally:
+        conn.close()
 
 
 def update_risk_config(new_config):
@@ -119,12 +119,13 @@ def update_risk_config(new_config):
             (json.dumps(config), datetime.now().isoformat())
         )
         conn.commit()
-        conn.close()
         print(f"[INFO] Risk config updated: {config}")
         return True
     except Exception as e:
         print(f"[ERROR] Risk config update error: {e}")
         return False
+    finally:
+        conn.close()
 
 
 def log_risk_alert(alert_type, message, severity="WARNING", details=None):
@@ -143,11 +144,12 @@ def log_risk_alert(alert_type, message, severity="WARNING", details=None):
             datetime.now().isoformat()
         ))
         conn.commit()
-        conn.close()
         icon = "[CRITICAL]" if severity == "CRITICAL" else "[WARNING]"
         print(f"{icon} RISK ALERT [{alert_type}]: {message}")
     except Exception as e:
         print(f"[WARN] Risk alert log error: {e}")
+    finally:
+        conn.close()
 
 
 def get_risk_alerts(limit=50):
@@ -162,7 +164,6 @@ def get_risk_alerts(limit=50):
             (limit,)
         )
         rows = cursor.fetchall()
-        conn.close()
         cols = ['id', 'alert_type', 'severity', 'message', 'details', 'created_at']
         result = []
         for row in rows:
@@ -176,6 +177,8 @@ def get_risk_alerts(limit=50):
         return result
     except Exception:
         return []
+    finally:
+        conn.close()
 
 
 def pre_trade_risk_check(engine, symbol, side, qty, price):
@@ -211,21 +214,23 @@ def pre_trade_risk_check(engine, symbol, side, qty, price):
         max_positions = config.get("max_open_positions", 5)
         conn = _get_db_conn()
         if conn:
-            cursor = conn.cursor()
-            # Count open positions using net quantity per symbol (buy qty - sell qty)
-            # COALESCE(qty, 1) for backward compat with rows that may not have qty set
-            cursor.execute("""
-                SELECT COUNT(*) FROM (
-                    SELECT symbol,
-                           SUM(CASE WHEN side = 'buy'  THEN COALESCE(qty, 1) ELSE 0 END) -
-                           SUM(CASE WHEN side = 'sell' THEN COALESCE(qty, 1) ELSE 0 END) AS net_qty
-                    FROM trade_log
-                    GROUP BY symbol
-                    HAVING net_qty > 0
-                )
-            """)
-            open_positions = cursor.fetchone()[0]
-            conn.close()
+            try:
+                cursor = conn.cursor()
+                # Count open positions using net quantity per symbol (buy qty - sell qty)
+                # COALESCE(qty, 1) for backward compat with rows that may not have qty set
+                cursor.execute("""
+                    SELECT COUNT(*) FROM (
+                        SELECT symbol,
+                               SUM(CASE WHEN side = 'buy'  THEN COALESCE(qty, 1) ELSE 0 END) -
+                               SUM(CASE WHEN side = 'sell' THEN COALESCE(qty, 1) ELSE 0 END) AS net_qty
+                        FROM trade_log
+                        GROUP BY symbol
+                        HAVING net_qty > 0
+                    )
+                """)
+                open_positions = cursor.fetchone()[0]
+            finally:
+                conn.close()
 
             if side == 'buy' and open_positions >= max_positions:
                 msg = f"Max positions reached: {open_positions}/{max_positions}"
@@ -236,11 +241,13 @@ def pre_trade_risk_check(engine, symbol, side, qty, price):
         max_dd_pct = config.get("max_drawdown_pct", 15.0)
         conn = _get_db_conn()
         if conn:
-            cursor = conn.cursor()
-            cursor.execute("SELECT MAX(total_equity) FROM portfolio_snapshots")
-            row = cursor.fetchone()
-            peak_equity = row[0] if row and row[0] else total_equity
-            conn.close()
+            try:
+                cursor = conn.cursor()
+                cursor.execute("SELECT MAX(total_equity) FROM portfolio_snapshots")
+                row = cursor.fetchone()
+                peak_equity = row[0] if row and row[0] else total_equity
+            finally:
+                conn.close()
 
             if peak_equity > 0:
                 current_dd = ((peak_equity - total_equity) / peak_equity) * 100
@@ -253,16 +260,18 @@ def pre_trade_risk_check(engine, symbol, side, qty, price):
         daily_limit_pct = config.get("daily_loss_limit_pct", 3.0)
         conn = _get_db_conn()
         if conn:
-            cursor = conn.cursor()
-            today_start = datetime.now().replace(hour=0, minute=0, second=0).isoformat()
-
-            # Get first snapshot of today or last snapshot from yesterday
-            cursor.execute(
-                "SELECT total_equity FROM portfolio_snapshots WHERE created_at < ? ORDER BY id DESC LIMIT 1",
-                (today_start,)
-            )
-            row = cursor.fetchone()
-            conn.close()
+            try:
+                cursor = conn.cursor()
+                today_start = datetime.now().replace(hour=0, minute=0, second=0).isoformat()
+
+                # Get first snapshot of today or last snapshot from yesterday
+                cursor.execute(
+                    "SELECT total_equity FROM portfolio_snapshots WHERE created_at < ? ORDER BY id DESC LIMIT 1",
+                    (today_start,)
+                )
+                row = cursor.fetchone()
+            finally:
+                conn.close()
 
             if row and row[0] and row[0] > 0:
                 day_start_equity = row[0]
@@ -293,6 +302,7 @@ def get_risk_dashboard(engine):
         "alerts": get_risk_alerts(20),
     }
 
+    conn = None
     try:
         # Fetch current balance
         bal = engine.exchange.fetch_balance()
@@ -345,8 +355,6 @@ def get_risk_dashboard(engine):
             )
             alerts_today = cursor.fetchone()[0]
 
-            conn.close()
-
         # Calculate drawdown
         current_dd = ((peak_equity - total_equity) / peak_equity * 100) if peak_equity > 0 else 0
 
@@ -400,8 +408,6 @@ def get_risk_dashboard(engine):
                         annualized_return = mean_ret * 365 # Crypto is 365 days
                         annualized_downside_std = downside_std * np.sqrt(365)
                         advanced_metrics["sortino_ratio"] = round(annualized_return / annualized_downside_std, 2)
-            
-            conn.close()
 
         # 5. Stress Tests (Estimated portfolio impact based on exposure)
         # Using linear beta approximation (Beta = 1.0 to BTC for simplicity in this demo)
@@ -437,5 +443,8 @@ def get_risk_dashboard(engine):
         import traceback
         traceback.print_exc()
         result["metrics"] = {"error": str(e)}
+    finally:
+        if conn:
+            conn.close()
 
     return result
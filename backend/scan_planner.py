@@ -0,0 +1,93 @@
+# backend/scan_planner.py
+"""
+Scan planner for the background market scan: every (symbol, direction) is
+scanned once and its result fanned out to every sector that lists it.
+
+SECTORS lists a number of symbols in more than one sector (PENDLE in DEFI,
+RWA and YIELD_STAKING; MKR, LINK, ZK, STRK, DUSK, W, ETHFI, ENA, LDO and
+BNB in two each). The scan used to run every sector on its own, so such a
+symbol was fetched and backtested once per sector, for LONG and for SHORT.
+build_plan() turns the sector map into:
+
+  - symbols:  the unique symbols, in sector order (first occurrence);
+  - batches:  per sector, the symbols it is the first to list. Scheduled in
+              this order a sector's own symbols start as early as before and
+              shared ones are not queued a second time;
+  - fanout:   symbol -> every sector that lists it;
+  - jobs:     (symbol, direction) pairs, each exactly once;
+  - stats:    how much work the dedup saves (jobs before / after,
+              duplicated symbols).
+
+SectorBuckets collects the results of one direction: a finished symbol is
+appended to each of its sectors, and a sector is reported complete as soon
+as its last symbol is in (incremental progress / elite signals as before).
+
+Config (env): none.
+"""
+
+DIRECTIONS = ("LONG", "SHORT")
+
+
+def build_plan(sectors, directions=DIRECTIONS):
+    """sectors: {sector_id: [symbol, ...]} (main.SECTORS). Returns the plan dict described above."""
+    sector_symbols = {sid: list(dict.fromkeys(syms)) for sid, syms in sectors.items()}
+    fanout = {}
+    batches = []
+    for sid, syms in sector_symbols.items():
+        new = [sym for sym in syms if sym not in fanout]
+        for sym in syms:
+            fanout.setdefault(sym, []).append(sid)
+        batches.append((sid, new))
+
+    symbols = list(fanout)
+    slots = sum(len(syms) for syms in sectors.values())
+    jobs_before = slots * len(directions)
+    jobs = [(sym, d) for d in directions for sym in symbols]
+    saved = jobs_before - len(jobs)
+    stats = {
+        "sectors": len(sector_symbols),
+        "directions": list(directions),
+        "symbol_slots": slots,
+        "unique_symbols": len(symbols),
+        "duplicated": {sym: sids for sym, sids in fanout.items() if len(sids) > 1},
+        "jobs_before": jobs_before,
+        "jobs_planned": len(jobs),
+        "jobs_saved": saved,
+        "saved_pct": round(100.0 * saved / jobs_before, 1) if jobs_before else 0.0,
+    }
+    return {"sectors": sector_symbols, "symbols": symbols, "batches": batches,
+            "fanout": fanout, "jobs": jobs, "stats": stats}
+
+
+def describe(plan):
+    """One-line summary for the scan log."""
+    s = plan["stats"]
+    return (f"{s['symbol_slots']} sector slots -> {s['unique_symbols']} unique symbols, "
+            f"{s['jobs_planned']}/{s['jobs_before']} jobs ({s['jobs_saved']} saved, {s['saved_pct']}%), "
+            f"{len(s['duplicated'])} symbols shared between sectors")
+
+
+class SectorBuckets:
+    """Results of one direction's unique-symbol jobs, fanned out into sector buckets."""
+
+    def __init__(self, plan):
+        self.fanout = plan["fanout"]
+        self.pending = {sid: set(syms) for sid, syms in plan["sectors"].items()}
+        self.results = {sid: [] for sid in plan["sectors"]}
+
+    def add(self, symbol, result):
+        """
+        Record a finished symbol (result None = no viable strategy / error).
+        Returns the sector ids this symbol completed, in plan order.
+        """
+        done = []
+        for sid in self.fanout.get(symbol, ()):
+            if symbol not in self.pending[sid]:
+                continue
+            self.pending[sid].discard(symbol)
+            if result:
+                self.results[sid].append(result)
+            if not self.pending[sid]:
+                done.append(sid)
+        return done
+
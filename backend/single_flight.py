@@ -0,0 +1,76 @@
+# backend/single_flight.py
+"""
+Single-flight call coalescing (per key, across threads).
+
+When the background scan starts, LONG and SHORT sector jobs and symbols
+listed in several sectors call fetch_data for the same (symbol, timeframe)
+at the same moment; each used to check _get_last_timestamp, hit the
+exchange and race INSERT OR IGNORE into market_data. With do(key, fn),
+the first caller for a key runs fn; callers arriving while it runs wait
+for it and get the same result (or the same exception). The next call
+after it finished runs fn again — nothing is cached here.
+
+Stats: download_flight.get_stats() -> calls, coalesced, errors, in_flight.
+"""
+
+import threading
+
+
+class _Call:
+    __slots__ = ("event", "result", "error", "waiters")
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+
+
+class SingleFlight:
+    def __init__(self, name):
+        self.name = name
+        self._calls = {}
+        self._lock = threading.Lock()
+        self.stats = {"calls": 0, "executed": 0, "coalesced": 0, "errors": 0, "max_waiters": 0}
+
+    def do(self, key, fn, *args, **kwargs):
+        """Run fn(*args, **kwargs) once for all concurrent callers of `key`."""
+        with self._lock:
+            self.stats["calls"] += 1
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+                self.stats["executed"] += 1
+            else:
+                call.waiters += 1
+                self.stats["coalesced"] += 1
+                self.stats["max_waiters"] = max(self.stats["max_waiters"], call.waiters)
+
+        if not leader:
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn(*args, **kwargs)
+        except BaseException as e:
+            call.error = e
+            with self._lock:
+                self.stats["errors"] += 1
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.event.set()
+        return call.result
+
+    def get_stats(self):
+        with self._lock:
+            return {**self.stats, "in_flight": len(self._calls),
+                    "coalesced_ratio": round(self.stats["coalesced"] / self.stats["calls"], 4) if self.stats["calls"] else 0.0}
+
+
+# Shared instance: TradingEngine.fetch_data downloads, keyed by (db file, symbol, timeframe)
+download_flight = SingleFlight("fetch_data")
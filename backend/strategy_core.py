@@ -3,9 +3,24 @@ import ccxt
 import pandas as pd
 import numpy as np
 from datetime import datetime, timedelta
+import hashlib
+import json
 import os
-import sqlite3 # Menggunakan SQLite sesuai request untuk kecepatan lokal
 from dotenv import load_dotenv
+import backtest_kernel
+import metrics_kernel
+from backtest_result import EquityCurve, TradeLog
+from indicator_store import indicator_store
+import ohlcv_store as _ohlcv
+from frame_cache import frame_cache
+from single_flight import download_flight
+import market_loader
+import timeframe_derive
+import candle_coverage
+import data_version
+import db_migrate
+from data_version import data_versions
+from db_utils import get_db_connection
 
 # ============================================================
 # ANNUALIZATION CONSTANTS (bars per year per timeframe)
@@ -23,6 +38,20 @@ TAKER_FEE      = 0.001    # 0.1% per side
 SLIPPAGE       = 0.0005   # 0.05% estimated market slippage
 ROUND_TRIP_COST = TAKER_FEE + SLIPPAGE  # applied per transaction side
 
+
+# Kolom strategy_cache yang dibaca lookup cache (per nama, bukan posisi SELECT *)
+CACHE_COLUMNS = (
+    "period", "strategy", "direction", "net_profit", "win_rate", "total_trades", "max_drawdown",
+    "sharpe_ratio", "final_balance", "profit_factor", "signal_data", "rr_ratio", "cached_data_ts", "data_version",
+)
+
+
+def strategy_params_hash(initial_capital=1000.0, leverage=1):
+    """Short hash of the settings a cached backtest result depends on (part of the strategy_cache key)."""
+    blob = json.dumps({"initial_capital": float(initial_capital), "leverage": leverage,
+                       "taker_fee": TAKER_FEE, "slippage": SLIPPAGE}, sort_keys=True)
+    return hashlib.sha1(blob.encode()).hexdigest()[:16]
+
 # Load environment variables
 load_dotenv()
 
@@ -34,9 +63,13 @@ class TradingEngine:
         """
         self.initial_capital = float(initial_capital)
         self.leverage = leverage
+        # Kunci strategy_cache: hasil dengan modal / leverage berbeda tidak saling menimpa
+        self.params_hash = strategy_params_hash(self.initial_capital, self.leverage)
         
         # Menggunakan File Database Lokal agar cepat dan tidak perlu upload ke Cloud
         self.db_file = "market_data.db" 
+        # Salinan kolom (mmap) dari market_data untuk load cepat; None = baca SQLite langsung
+        self.ohlcv_store = _ohlcv.ohlcv_store if _ohlcv.ENABLED else None
         
         # Konfigurasi Exchange CCXT
         exchange_config = {
@@ -77,14 +110,11 @@ class TradingEngine:
     
     def _get_db_conn(self):
         """
-        Membuat koneksi ke file database lokal.
-        WAL mode + busy_timeout untuk mendukung parallel scanning.
+        Koneksi ke file database lokal (pooled per thread, lihat db_utils).
+        WAL mode + lock retry untuk mendukung parallel scanning.
         """
         try:
-            conn = sqlite3.connect(self.db_file, check_same_thread=False, timeout=30)
-            conn.execute("PRAGMA journal_mode=WAL")
-            conn.execute("PRAGMA busy_timeout=30000")
-            return conn
+            return get_db_connection(self.db_file, row_factory=None)
         except Exception as e:
             print(f"[ERROR] DB Connection Error: {e}")
             return None
@@ -114,7 +144,7 @@ class TradingEngine:
                 );
             """)
             
-            # Tabel Cache untuk Strategy Results (Optimasi Scan)
+            # Tabel Cache untuk Strategy Results (Optimasi Scan), per arah & parameter engine
             cursor.execute("""
                 CREATE TABLE IF NOT EXISTS strategy_cache (
                     symbol TEXT,
@@ -131,7 +161,38 @@ class TradingEngine:
                     rr_ratio TEXT,
                     cached_data_ts INTEGER,
                     updated_at TEXT,
-                    PRIMARY KEY (symbol, timeframe, period, strategy)
+                    direction TEXT NOT NULL DEFAULT 'LONG',
+                    params_hash TEXT NOT NULL DEFAULT '',
+                    profit_factor REAL,
+                    data_version INTEGER,
+                    PRIMARY KEY (symbol, timeframe, period, strategy, direction, params_hash)
+                );
+            """)
+            # Database lama: kunci tanpa direction/params_hash atau tanpa data_version -> tabel baru
+            db_migrate.upgrade_strategy_cache(conn)
+            
+            # Tabel Checkpoint Backtest — state simulasi terakhir per window,
+            # supaya candle baru cukup disimulasikan dari bar terakhir (append-only).
+            # Checkpoint lama (blob equity, tanpa data_rewrites) tidak bisa divalidasi: dibuang
+            checkpoint_cols = {r[1] for r in cursor.execute("PRAGMA table_info(backtest_checkpoint)").fetchall()}
+            if checkpoint_cols and "data_rewrites" not in checkpoint_cols:
+                cursor.execute("DROP TABLE backtest_checkpoint")
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS backtest_checkpoint (
+                    symbol TEXT,
+                    timeframe TEXT,
+                    period TEXT,
+                    strategy TEXT,
+                    direction TEXT,
+                    data_ts INTEGER,
+                    start_ts INTEGER,
+                    bars INTEGER,
+                    last_close REAL,
+                    initial_capital REAL,
+                    state TEXT,
+                    data_rewrites INTEGER,
+                    updated_at TEXT,
+                    PRIMARY KEY (symbol, timeframe, period, strategy, direction, data_ts)
                 );
             """)
             
@@ -153,11 +214,18 @@ class TradingEngine:
                 );
             """)
             
+            # Tabel Coverage — range candle yang sudah di-fetch per series (deteksi & repair gap)
+            candle_coverage.ensure_table(conn)
+            
+            # Tabel Data Version — last_ts / row_count / versi per series (validasi strategy_cache O(1))
+            data_version.ensure_table(conn)
+            
             conn.commit()
-            conn.close()
             
         except Exception as e:
             print(f"DB Init Error: {e}")
+        finally:
+            conn.close()
 
     def _get_last_timestamp(self, symbol, timeframe):
         """
@@ -171,39 +239,71 @@ class TradingEngine:
             cursor = conn.cursor()
             cursor.execute("SELECT MAX(timestamp) FROM market_data WHERE symbol=? AND timeframe=?", (symbol, timeframe))
             res = cursor.fetchone()
-            conn.close()
             
             # Mengembalikan timestamp jika ada, atau None jika belum ada data
             return res[0] if res else None
             
         except: return None
+        finally:
+            conn.close()
+
+    def _read_data_version(self, symbol, timeframe):
+        """data_version row of the series read from the database (not the per-process copy)."""
+        conn = self._get_db_conn()
+        if not conn: return None
+        
+        try:
+            return data_version.current(conn, symbol, timeframe)
+        except Exception as e:
+            print(f"[WARN] Data Version Read Error: {e}")
+            return None
+        finally:
+            conn.close()
 
-    def _save_to_db(self, symbol, timeframe, ohlcv_data):
+    def _save_to_db(self, symbol, timeframe, ohlcv_data, replace=False):
         """
         Save new candle data to local database.
-        Uses 'INSERT OR IGNORE' to handle duplicates.
+        Uses 'INSERT OR IGNORE' to handle duplicates; replace=True overwrites
+        existing candles (derived bars that are still open).
         """
         conn = self._get_db_conn()
         if not conn: return
         
         try:
-            cursor = conn.cursor()
-            
-            # Format data according to table structure
             # ccxt ohlcv: [timestamp, open, high, low, close, volume]
-            records = [(symbol, timeframe, row[0], row[1], row[2], row[3], row[4], row[5]) for row in ohlcv_data]
-            
-            # Execute Batch Insert (Very fast in SQLite)
-            cursor.executemany("""
-                INSERT OR IGNORE INTO market_data (symbol, timeframe, timestamp, open, high, low, close, volume)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-            """, records)
+            # Batch insert; layout compact ditulis langsung ke market_candles (lihat db_migrate)
+            db_migrate.insert_candles(conn, symbol, timeframe, ohlcv_data, replace=replace)
+            # Versi series ikut di transaksi yang sama dengan candle
+            version = data_version.bump(conn, symbol, timeframe, first_ts=min(r[0] for r in ohlcv_data))
             
             conn.commit()
-            conn.close()
             
         except Exception as e:
             print(f"DB Save Error: {e}")
+            return
+        finally:
+            conn.close()
+
+        prev = data_versions.put(self.db_file, symbol, timeframe, version)
+
+        # Candle lama (repair) tidak menggeser watermark frame_cache: buang frame series ini
+        frame_cache.invalidate(symbol, timeframe)
+        if prev is None or prev[3] != version[3]:
+            # Candle di tengah history berubah: state indikator incremental tidak bisa diteruskan
+            indicator_store.invalidate(symbol, timeframe)
+
+        # Mirror ke column store (append di belakang candle terakhir)
+        if self.ohlcv_store is not None:
+            last = self.ohlcv_store.last_timestamp(symbol, timeframe) if replace else None
+            if last is not None and ohlcv_data[0][0] <= last:
+                # Candle yang sudah ada ditimpa: file append-only tidak bisa ikut, rebuild saat dibaca
+                self.ohlcv_store.invalidate(symbol, timeframe)
+                return
+            try:
+                self.ohlcv_store.append(symbol, timeframe, ohlcv_data)
+            except Exception as e:
+                print(f"[WARN] [STORE] Append failed for {symbol} {timeframe}: {e}")
+                self.ohlcv_store.invalidate(symbol, timeframe)
 
     def _load_from_db(self, symbol, timeframe, requested_period):
         """
@@ -213,26 +313,7 @@ class TradingEngine:
         if not conn: return None
         
         try:
-            # Hitung batas waktu (Cutoff) berdasarkan requested_period
-            now_ts = int(datetime.now().timestamp() * 1000)
-            cutoff_ts = 0
-            
-            ms_day = 86400000 # 24 jam dalam milidetik
-            
-            if requested_period == "1mo": 
-                cutoff_ts = now_ts - (30 * ms_day)
-            elif requested_period == "3mo": 
-                cutoff_ts = now_ts - (90 * ms_day)
-            elif requested_period == "6mo": 
-                cutoff_ts = now_ts - (180 * ms_day)
-            elif requested_period == "1y": 
-                cutoff_ts = now_ts - (365 * ms_day)
-            elif requested_period == "2y": 
-                cutoff_ts = now_ts - (730 * ms_day)
-            elif requested_period == "max": 
-                cutoff_ts = 0 # Ambil semua data dari awal
-            else:
-                cutoff_ts = 0 # Fallback: ambil semua data
+            cutoff_ts = self._period_cutoff_ms(requested_period)
             
             # Query Select Data
             query = "SELECT timestamp, open, high, low, close, volume FROM market_data WHERE symbol=? AND timeframe=? AND timestamp >= ? ORDER BY timestamp ASC"
@@ -244,6 +325,83 @@ class TradingEngine:
         except Exception as e:
             print(f"DB Load Error: {e}")
             return None
+        finally:
+            conn.close()
+
+    def _period_cutoff_ms(self, requested_period):
+        """Batas waktu (Cutoff, ms) berdasarkan requested_period; 0 = semua data ("max" / fallback)."""
+        return market_loader.period_cutoff_ms(requested_period)
+
+    def _load_from_store(self, symbol, timeframe, requested_period, db_version):
+        """
+        Same frame as _load_from_db, read from the mmap column store.
+        The store is rebuilt from SQLite when it no longer matches the
+        series' data_version row (first use, missed append, repairs and
+        edits outside fetch_data, also by other processes).
+        Returns None when the store cannot serve (caller falls back to SQLite).
+        """
+        store = self.ohlcv_store
+        if store is None or db_version is None:
+            return None
+        try:
+            if not store.ensure(symbol, timeframe, db_version,
+                                lambda: self._load_from_db(symbol, timeframe, "max")):
+                return None
+
+            cols = store.read(symbol, timeframe, start_ts=self._period_cutoff_ms(requested_period))
+            if cols is None:
+                return None
+            # Satu salinan dari mmap: pemanggil menambah kolom indikator ke frame ini
+            return pd.DataFrame({name: np.array(col) for name, col in cols.items()})
+        except Exception as e:
+            print(f"[WARN] [STORE] {symbol} {timeframe} read failed, using SQLite: {e}")
+            store.invalidate(symbol, timeframe)
+            return None
+
+    def load_many(self, symbols, timeframe="1h", period="max", sync=True):
+        """
+        Bulk read of many symbols (market_loader.load_many on this engine's DB).
+        sync=True first downloads new candles for series whose last candle is
+        older than one interval (same rule and single-flight as fetch_data);
+        series that are up to date cost no exchange request.
+        Returns market_loader.MultiSeries.
+        """
+        if timeframe == '1wk':
+            timeframe = '1w'
+        symbols = list(dict.fromkeys(symbols))
+        if sync and symbols:
+            interval_ms = self._get_interval_ms(timeframe)
+            now = self.exchange.milliseconds()
+            last = market_loader.load_many(symbols, timeframe, start_ts=now - interval_ms + 1,
+                                           db_file=self.db_file, columns=())
+            for sym in symbols:
+                if sym in last:
+                    continue  # ada candle dalam 1 interval terakhir -> fresh
+                symbol_ccxt = sym.upper().replace("-", "/")
+                if symbol_ccxt.endswith("/USD"):
+                    symbol_ccxt = symbol_ccxt.replace("/USD", "/USDT")
+                try:
+                    download_flight.do((os.path.abspath(self.db_file), sym, timeframe),
+                                       self._sync_from_exchange, sym, symbol_ccxt, timeframe)
+                except Exception as e:
+                    print(f"[WARN] [DATA] Sync failed for {sym} {timeframe}: {e}")
+        return market_loader.load_many(symbols, timeframe, period, db_file=self.db_file)
+
+    def prime_frames(self, symbols, timeframe="1h", period="max"):
+        """
+        Fill frame_cache for many symbols with one bulk read, so the
+        fetch_data calls that follow (scanner) are cache hits. Frames are
+        exactly what fetch_data would build; a series that gets new candles
+        before it is fetched simply misses the cache. Returns frames primed.
+        """
+        data = self.load_many(symbols, timeframe, period, sync=False)
+        db_path = os.path.abspath(self.db_file)
+        for sym in data.loaded:
+            df = data.frame(sym)
+            if period == "max":
+                df.attrs['series_key'] = (sym, timeframe)
+            frame_cache.put((sym, timeframe, period, db_path), data.last_timestamp(sym), df)
+        return len(data)
 
     def _clear_db_data(self, symbol, timeframe):
         """
@@ -255,105 +413,149 @@ class TradingEngine:
         try:
             cursor = conn.cursor()
             cursor.execute("DELETE FROM market_data WHERE symbol=? AND timeframe=?", (symbol, timeframe))
-            # Juga hapus cache strategi yang terkait
+            # Juga hapus cache strategi & checkpoint backtest yang terkait
             cursor.execute("DELETE FROM strategy_cache WHERE symbol=? AND timeframe=?", (symbol, timeframe))
+            cursor.execute("DELETE FROM backtest_checkpoint WHERE symbol=? AND timeframe=?", (symbol, timeframe))
+            candle_coverage.clear(conn, symbol, timeframe)
+            data_version.drop(conn, symbol, timeframe)
             conn.commit()
-            conn.close()
         except: pass
+        finally:
+            conn.close()
+        data_versions.put(self.db_file, symbol, timeframe, None)
+        if self.ohlcv_store is not None:
+            self.ohlcv_store.invalidate(symbol, timeframe)
 
-    def _get_cached_result(self, symbol, timeframe, period, strategy):
+    def _get_cached_result(self, symbol, timeframe, period, strategy, direction="LONG"):
         """
-        Mengambil hasil backtest dari cache.
+        Mengambil hasil backtest dari cache (per arah LONG/SHORT dan params_hash engine).
         Mengembalikan dict jika cache masih valid, atau None jika stale/tidak ada.
-        Cache dianggap stale jika ada candle baru sejak cache terakhir disimpan.
+        Cache dianggap stale jika data series berubah sejak cache disimpan: versi
+        data_version berbeda (candle baru, repair gap, bar derived yang ditimpa).
         """
         conn = self._get_db_conn()
         if not conn: return None
         
         try:
-            cursor = conn.cursor()
-            
-            # 1. Ambil timestamp candle terakhir dari market_data
-            cursor.execute(
-                "SELECT MAX(timestamp) FROM market_data WHERE symbol=? AND timeframe=?",
-                (symbol, timeframe)
-            )
-            row = cursor.fetchone()
-            latest_candle_ts = row[0] if row and row[0] else None
+            # 1. Versi data series dari data_version (salinan per proses)
+            version = self._get_data_version(conn, symbol, timeframe)
             
-            if latest_candle_ts is None:
-                conn.close()
+            if version is None:
                 return None  # Tidak ada data candle sama sekali
             
-            # 2. Ambil cache entry
-            cursor.execute(
-                "SELECT * FROM strategy_cache WHERE symbol=? AND timeframe=? AND period=? AND strategy=?",
-                (symbol, timeframe, period, strategy)
-            )
-            cache_row = cursor.fetchone()
-            conn.close()
+            # 2. Ambil cache entry (kolom per nama: tabel ini di-rebuild oleh db_migrate)
+            row = conn.execute(
+                f"SELECT {', '.join(CACHE_COLUMNS)} FROM strategy_cache WHERE symbol=? AND timeframe=? "
+                "AND period=? AND strategy=? AND direction=? AND params_hash=?",
+                (symbol, timeframe, period, strategy, direction, self.params_hash)
+            ).fetchone()
             
-            if cache_row is None:
+            if row is None:
                 return None  # Cache miss — belum pernah dihitung
+            cache_row = dict(zip(CACHE_COLUMNS, row))
             
-            # 3. Bandingkan timestamp: cache masih valid?
-            # cache_row index: 0=symbol, 1=tf, 2=period, 3=strat, 4=net_profit,
-            # 5=win_rate, 6=total_trades, 7=max_dd, 8=sharpe, 9=final_bal,
-            # 10=signal_data, 11=rr_ratio, 12=cached_data_ts, 13=updated_at
-            cached_data_ts = cache_row[12]
-            
-            if latest_candle_ts > cached_data_ts:
-                return None  # Cache stale — ada candle baru
+            # 3. Bandingkan versi: cache masih valid?
+            if cache_row['data_version'] != version[2]:
+                return None  # Cache stale — data series sudah berubah
             
             # 4. Cache hit! Return hasil
-            import json
-            signal_data = json.loads(cache_row[10]) if cache_row[10] else {}
-            
-            return {
-                "net_profit": cache_row[4],
-                "win_rate": cache_row[5],
-                "total_trades": cache_row[6],
-                "max_drawdown": cache_row[7],
-                "sharpe_ratio": cache_row[8],
-                "final_balance": cache_row[9],
-                "signal_data": signal_data,
-                "rr_ratio": cache_row[11],
-            }
+            return self._cache_row_to_result(cache_row)
             
         except Exception as e:
             print(f"[WARN] Cache Read Error: {e}")
             return None
+        finally:
+            conn.close()
+
+    def _get_cached_results(self, symbol, timeframe, period=None, direction=None):
+        """
+        Bulk version of _get_cached_result: every valid strategy_cache entry
+        of (symbol, timeframe[, period][, direction]) for this engine's
+        params_hash in one query.
+        Returns {(period, strategy, direction): result dict}.
+        """
+        conn = self._get_db_conn()
+        if not conn: return {}
+        
+        try:
+            version = self._get_data_version(conn, symbol, timeframe)
+            if version is None:
+                return {}
+            
+            query = (f"SELECT {', '.join(CACHE_COLUMNS)} FROM strategy_cache "
+                     "WHERE symbol=? AND timeframe=? AND params_hash=?")
+            params = [symbol, timeframe, self.params_hash]
+            if period is not None:
+                query += " AND period=?"
+                params.append(period)
+            if direction is not None:
+                query += " AND direction=?"
+                params.append(direction)
+            rows = [dict(zip(CACHE_COLUMNS, r)) for r in conn.execute(query, params).fetchall()]
+            
+            # Hanya entry dengan versi data yang sama (aturan yang sama dengan _get_cached_result)
+            return {(row['period'], row['strategy'], row['direction']): self._cache_row_to_result(row)
+                    for row in rows if row['data_version'] == version[2]}
+            
+        except Exception as e:
+            print(f"[WARN] Cache Read Error: {e}")
+            return {}
+        finally:
+            conn.close()
+
+    def _cache_row_to_result(self, cache_row):
+        """cache_row: {column: value} of CACHE_COLUMNS -> metrics dict as returned by the backtest."""
+        signal_data = json.loads(cache_row['signal_data']) if cache_row['signal_data'] else {}
+        
+        return {
+            "net_profit": cache_row['net_profit'],
+            "win_rate": cache_row['win_rate'],
+            "total_trades": cache_row['total_trades'],
+            "max_drawdown": cache_row['max_drawdown'],
+            "sharpe_ratio": cache_row['sharpe_ratio'],
+            "final_balance": cache_row['final_balance'],
+            "signal_data": signal_data,
+            "rr_ratio": cache_row['rr_ratio'],
+            # NULL = entry dari sebelum kolom ini ada
+            **({"profit_factor": cache_row['profit_factor']} if cache_row['profit_factor'] is not None else {}),
+        }
 
-    def _save_cache_result(self, symbol, timeframe, period, strategy, metrics, signal_data=None, rr_ratio="N/A"):
+    def _get_data_version(self, conn, symbol, timeframe):
+        """(last_ts, row_count, version) of the series via data_version (None = no candles)."""
+        return data_versions.get(conn, self.db_file, symbol, timeframe)
+
+    def _save_cache_result(self, symbol, timeframe, period, strategy, metrics, signal_data=None, rr_ratio="N/A",
+                           direction="LONG"):
         """
         Menyimpan hasil backtest ke cache.
         Menggunakan INSERT OR REPLACE agar otomatis update jika sudah ada.
         """
+        self._save_cache_results(symbol, [(timeframe, period, strategy, direction, metrics, signal_data, rr_ratio)])
+
+    def _save_cache_results(self, symbol, entries):
+        """
+        Bulk upsert of a symbol's results in one transaction.
+        entries: iterable of (timeframe, period, strategy, direction, metrics, signal_data, rr_ratio).
+        """
+        entries = list(entries)
+        if not entries: return
         conn = self._get_db_conn()
         if not conn: return
         
         try:
-            import json
-            cursor = conn.cursor()
-            
-            # Ambil timestamp candle terakhir sebagai 'snapshot'
-            cursor.execute(
-                "SELECT MAX(timestamp) FROM market_data WHERE symbol=? AND timeframe=?",
-                (symbol, timeframe)
-            )
-            row = cursor.fetchone()
-            latest_candle_ts = row[0] if row and row[0] else 0
-            
-            signal_json = json.dumps(signal_data) if signal_data else "{}"
+            # Snapshot versi data series (sekali per timeframe): entry valid selama versinya sama
+            versions = {}
+            for tf in dict.fromkeys(e[0] for e in entries):
+                versions[tf] = self._get_data_version(conn, symbol, tf) or (0, 0, None)
             now_str = datetime.now().isoformat()
             
-            cursor.execute("""
+            conn.executemany("""
                 INSERT OR REPLACE INTO strategy_cache 
                 (symbol, timeframe, period, strategy, net_profit, win_rate, total_trades,
                  max_drawdown, sharpe_ratio, final_balance, signal_data, rr_ratio,
-                 cached_data_ts, updated_at)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            """, (
+                 cached_data_ts, updated_at, direction, params_hash, profit_factor, data_version)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """, [(
                 symbol, timeframe, period, strategy,
                 metrics.get('net_profit', 0),
                 metrics.get('win_rate', 0),
@@ -361,15 +563,117 @@ class TradingEngine:
                 metrics.get('max_drawdown', 0),
                 metrics.get('sharpe_ratio', 0),
                 metrics.get('final_balance', 0),
-                signal_json, rr_ratio,
-                latest_candle_ts, now_str
-            ))
+                json.dumps(signal_data) if signal_data else "{}", rr_ratio,
+                versions[timeframe][0], now_str, direction, self.params_hash,
+                metrics.get('profit_factor'), versions[timeframe][2]
+            ) for timeframe, period, strategy, direction, metrics, signal_data, rr_ratio in entries])
             
             conn.commit()
-            conn.close()
             
         except Exception as e:
             print(f"[WARN] Cache Write Error: {e}")
+        finally:
+            conn.close()
+
+    def _load_checkpoint(self, symbol, timeframe, period, strategy, direction, arrays):
+        """
+        Mengambil state simulasi terakhir yang masih bisa dilanjutkan untuk window ini.
+        Valid hanya jika bar pertama sama, candle watermark masih ada di posisi yang sama
+        dengan harga yang sama, dan counter rewrites di data_version tidak berubah sejak
+        checkpoint disimpan (sejak itu hanya append; repair gap / bar derived yang ditimpa
+        membuatnya basi). Return resume dict atau None.
+        """
+        times = arrays['time']
+        if len(times) == 0: return None
+        conn = self._get_db_conn()
+        if not conn: return None
+        
+        try:
+            cursor = conn.cursor()
+            cursor.execute("""
+                SELECT data_ts, start_ts, bars, last_close, initial_capital, state, data_rewrites
+                FROM backtest_checkpoint
+                WHERE symbol=? AND timeframe=? AND period=? AND strategy=? AND direction=? AND data_ts <= ?
+                ORDER BY data_ts DESC LIMIT 1
+            """, (symbol, timeframe, period, strategy, direction, int(times[-1]) * 1000))
+            row = cursor.fetchone()
+            
+            if row is None:
+                return None
+            data_ts, start_ts, bars, last_close, initial_capital, state_json, data_rewrites = row
+            
+            # Candle sampai watermark tidak berubah sejak checkpoint disimpan
+            # (series yang tidak ada di DB, mis. frame golden harness: NULL di kedua sisi)
+            version = self._get_data_version(conn, symbol, timeframe)
+            if (version[3] if version else None) != data_rewrites:
+                return None
+            if version is not None and version[0] < data_ts:
+                return None
+            
+            # Window harus identik sampai bar watermark
+            if start_ts != int(times[0]) * 1000 or bars < 2 or bars > len(times):
+                return None
+            if int(times[bars - 1]) * 1000 != data_ts or arrays['close'][bars - 1] != last_close:
+                return None
+            if initial_capital != self.initial_capital:
+                return None
+            
+            resume = json.loads(state_json)
+            resume['bars'] = bars
+            if not resume['segments'] or resume['segments'][-1][0] >= bars:
+                return None
+            return resume
+            
+        except Exception as e:
+            print(f"[WARN] Checkpoint Read Error: {e}")
+            return None
+        finally:
+            conn.close()
+
+    def _save_checkpoint(self, symbol, timeframe, period, strategy, direction, arrays, sim):
+        """
+        Menyimpan state akhir simulasi (kernel vector) sebagai checkpoint.
+        Hanya checkpoint terbaru per window yang disimpan. Equity tidak disimpan:
+        segmen state (satu per eksekusi) cukup untuk membangunnya ulang saat resume.
+        """
+        conn = self._get_db_conn()
+        if not conn: return
+        
+        try:
+            state = backtest_kernel.resume_state(sim)
+            bars = state.pop('bars')
+            state['segments'] = [[int(b), float(c), float(p)] for b, c, p in state['segments']]
+            for k in ('capital', 'position_size', 'entry_price', 'peak_capital'):
+                state[k] = float(state[k])
+            state['is_blown_up'] = bool(state['is_blown_up'])
+            
+            times = arrays['time']
+            data_ts = int(times[bars - 1]) * 1000
+            version = self._get_data_version(conn, symbol, timeframe)
+            cursor = conn.cursor()
+            cursor.execute(
+                "DELETE FROM backtest_checkpoint WHERE symbol=? AND timeframe=? AND period=? AND strategy=? AND direction=?",
+                (symbol, timeframe, period, strategy, direction)
+            )
+            cursor.execute("""
+                INSERT OR REPLACE INTO backtest_checkpoint
+                (symbol, timeframe, period, strategy, direction, data_ts, start_ts, bars,
+                 last_close, initial_capital, state, data_rewrites, updated_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """, (
+                symbol, timeframe, period, strategy, direction,
+                data_ts, int(times[0]) * 1000, bars,
+                float(arrays['close'][bars - 1]), self.initial_capital,
+                json.dumps(state), version[3] if version else None,
+                datetime.now().isoformat()
+            ))
+            
+            conn.commit()
+            
+        except Exception as e:
+            print(f"[WARN] Checkpoint Write Error: {e}")
+        finally:
+            conn.close()
 
     # ============================================================
     # HELPER: TIME INTERVAL CONVERSION
@@ -413,113 +717,210 @@ class TradingEngine:
             if force_reload:
                 print(f"[DATA] Force Reloading {symbol}...")
                 self._clear_db_data(symbol, interval)
-
-            # Cek Timestamp Terakhir di DB
-            last_ts = self._get_last_timestamp(symbol, interval)
-            now = self.exchange.milliseconds()
-            since = None
-            
-            if last_ts:
-                # Jika ada data, set titik mulai download dari (Last TS + 1 ms)
-                since = last_ts + 1
-            else:
-                # Jika DB kosong, set titik mulai dari 3 tahun lalu (Seed Data)
-                # 3 tahun = cukup untuk 2y backtest + 200+ candle warmup indikator
-                since = now - (1095 * 24 * 60 * 60 * 1000) 
-                print(f"[DATA] Initial Download {symbol}...")
-
-            # --- SMART LOGIC: DYNAMIC FETCH INTERVAL ---
-            # Tentukan apakah perlu fetch ke API atau tidak
-            interval_ms = self._get_interval_ms(interval)
-            should_fetch = False
-            
-            if last_ts is None:
-                # Kondisi 1: Belum ada data sama sekali -> Harus Fetch
-                should_fetch = True
-            else:
-                # Kondisi 2: Cek selisih waktu sekarang dengan data terakhir
-                time_gap = now - last_ts
-                # Hanya fetch jika gap waktu > durasi candle (artinya candle baru sudah close)
-                # Ini mencegah spam request setiap detik
-                if time_gap >= interval_ms:
-                    should_fetch = True
-            
-            # Proses Fetch API (Hanya dijalankan jika should_fetch = True)
-            new_ohlcv = []
-            limit = 1000
+                indicator_store.invalidate(symbol, interval)
+                frame_cache.invalidate(symbol, interval)
+
+            # Satu download per (db, symbol, timeframe): pemanggil bersamaan menunggu
+            # download yang sedang berjalan dan memakai hasilnya (single-flight)
+            db_version = download_flight.do((os.path.abspath(self.db_file), symbol, interval),
+                                            self._sync_from_exchange, symbol, symbol_ccxt, interval)
+            db_last_ts = db_version[0] if db_version else None
+            # Tulisan proses lain (bulk download / repair CLI) terlihat di sini, juga yang tidak
+            # menggeser candle terakhir: frame & indikator series itu dibuang
+            if data_versions.observe(self.db_file, symbol, interval, db_version):
+                frame_cache.invalidate(symbol, interval)
+                indicator_store.invalidate(symbol, interval)
+
+            # Frame yang sama sudah dibangun & belum ada candle baru -> view read-only dari cache
+            cache_key = (symbol, interval, requested_period, os.path.abspath(self.db_file))
+            cached = frame_cache.get(cache_key, db_last_ts, self._period_cutoff_ms(requested_period))
+            if cached is not None:
+                return cached
+
+            # Load Data Lengkap untuk dikembalikan ke pemanggil:
+            # column store (sudah numerik & terurut), fallback ke SQLite
+            df = self._load_from_store(symbol, interval, requested_period, db_version)
             
-            if should_fetch:
-                print(f"[DATA] Fetching {symbol} {interval} from API (since={since})...")
-                retry_count = 0
-                max_retries = 3
-                while True:
-                    try:
-                        ohlcv = self.exchange.fetch_ohlcv(symbol_ccxt, timeframe=interval, since=since, limit=limit)
-                        
-                        if not ohlcv: break
-                        
-                        new_ohlcv.extend(ohlcv)
-                        retry_count = 0  # Reset retry on success
-                        
-                        # Update pointer 'since'
-                        last_fetched = ohlcv[-1][0]
-                        since = last_fetched + 1
-                        
-                        # Break condition
-                        if len(ohlcv) < limit: break 
-                        if len(new_ohlcv) > 50000: break # Safety limit
-                        
-                    except Exception as e:
-                        retry_count += 1
-                        if retry_count >= max_retries:
-                            print(f"[DATA] Max retries reached for {symbol}: {e}")
-                            break
-                        print(f"[DATA] API Retry {retry_count}/{max_retries} for {symbol}: {e}")
-                        import time as _time
-                        _time.sleep(1)  # Wait 1s before retry
-                print(f"[DATA] Downloaded {len(new_ohlcv)} new candles for {symbol} {interval}")
-            else:
-                pass
+            if df is None:
+                df = self._load_from_db(symbol, interval, requested_period)
+                
+                if df is None or df.empty:
+                    # print(f"[ERROR] No data found for {symbol}")
+                    return None
 
-            # Simpan Data Baru ke Database
-            if new_ohlcv:
-                self._save_to_db(symbol, interval, new_ohlcv)
-            
-            # Load Data Lengkap dari Database untuk dikembalikan ke pemanggil
-            df = self._load_from_db(symbol, interval, requested_period)
-            
-            if df is None or df.empty:
-                # print(f"[ERROR] No data found for {symbol}")
+                # Pastikan format angka float
+                cols = ['open', 'high', 'low', 'close', 'volume']
+                df[cols] = df[cols].apply(pd.to_numeric)
+                
+                # Sort dan Reset Index
+                df = df.sort_values('timestamp').reset_index(drop=True)
+            elif df.empty:
                 return None
 
             # Formatting DataFrame
             df['time'] = pd.to_datetime(df['timestamp'], unit='ms')
-            
-            # Pastikan format angka float
-            cols = ['open', 'high', 'low', 'close', 'volume']
-            df[cols] = df[cols].apply(pd.to_numeric)
-            
-            # Sort dan Reset Index
-            df = df.sort_values('time').reset_index(drop=True)
+
+            # Full-history frames are anchored on their first candle, so
+            # prepare_indicators can reuse rolling state across calls.
+            if requested_period == "max":
+                df.attrs['series_key'] = (symbol, interval)
             
             print(f"[DATA] {symbol} {interval}: Returning {len(df)} candles (period={requested_period}, range={df.iloc[0]['time']} to {df.iloc[-1]['time']})")
 
-            return df
+            return frame_cache.put(cache_key, db_last_ts, df)
 
         except Exception as e:
             print(f"[ERROR] Critical Data Error {symbol}: {e}")
             return None
 
+    def _sync_from_exchange(self, symbol, symbol_ccxt, interval):
+        """
+        Incremental download step of fetch_data: fetch candles newer than the
+        last stored one (if a candle has closed since) and save them.
+        Returns the series' data_version row afterwards (last_ts, row_count,
+        version, rewrites), read from the database; None if it has no candles.
+        """
+        if timeframe_derive.is_derived(interval):
+            return self._sync_derived(symbol, symbol_ccxt, interval)
+
+        # Cek Timestamp Terakhir di DB
+        last_ts = self._get_last_timestamp(symbol, interval)
+        now = self.exchange.milliseconds()
+        since = None
+
+        if last_ts:
+            # Jika ada data, set titik mulai download dari (Last TS + 1 ms)
+            since = last_ts + 1
+        else:
+            # Jika DB kosong, set titik mulai dari 3 tahun lalu (Seed Data)
+            # 3 tahun = cukup untuk 2y backtest + 200+ candle warmup indikator
+            since = now - (1095 * 24 * 60 * 60 * 1000) 
+            print(f"[DATA] Initial Download {symbol}...")
+
+        # --- SMART LOGIC: DYNAMIC FETCH INTERVAL ---
+        # Tentukan apakah perlu fetch ke API atau tidak
+        interval_ms = self._get_interval_ms(interval)
+        should_fetch = False
+
+        if last_ts is None:
+            # Kondisi 1: Belum ada data sama sekali -> Harus Fetch
+            should_fetch = True
+        else:
+            # Kondisi 2: Cek selisih waktu sekarang dengan data terakhir
+            time_gap = now - last_ts
+            # Hanya fetch jika gap waktu > durasi candle (artinya candle baru sudah close)
+            # Ini mencegah spam request setiap detik
+            if time_gap >= interval_ms:
+                should_fetch = True
+
+        # Proses Fetch API (Hanya dijalankan jika should_fetch = True)
+        new_ohlcv = []
+        limit = 1000
+
+        if should_fetch:
+            print(f"[DATA] Fetching {symbol} {interval} from API (since={since})...")
+            fetch_start = since
+            retry_count = 0
+            max_retries = 3
+            while True:
+                try:
+                    ohlcv = self.exchange.fetch_ohlcv(symbol_ccxt, timeframe=interval, since=since, limit=limit)
+
+                    if not ohlcv: break
+
+                    new_ohlcv.extend(ohlcv)
+                    retry_count = 0  # Reset retry on success
+
+                    # Update pointer 'since'
+                    last_fetched = ohlcv[-1][0]
+                    since = last_fetched + 1
+
+                    # Break condition
+                    if len(ohlcv) < limit: break 
+                    if len(new_ohlcv) > 50000: break # Safety limit
+
+                except Exception as e:
+                    retry_count += 1
+                    if retry_count >= max_retries:
+                        print(f"[DATA] Max retries reached for {symbol}: {e}")
+                        break
+                    print(f"[DATA] API Retry {retry_count}/{max_retries} for {symbol}: {e}")
+                    import time as _time
+                    _time.sleep(1)  # Wait 1s before retry
+            print(f"[DATA] Downloaded {len(new_ohlcv)} new candles for {symbol} {interval}")
+        else:
+            pass
+
+        # Simpan Data Baru ke Database
+        if new_ohlcv:
+            self._save_to_db(symbol, interval, new_ohlcv)
+            # Halaman berurutan: semua candle [fetch_start, candle terakhir] sudah diterima
+            candle_coverage.record_fetch(symbol, interval, fetch_start, new_ohlcv[-1][0], self.db_file)
+
+        return self._read_data_version(symbol, interval)
+
+    def _sync_derived(self, symbol, symbol_ccxt, interval):
+        """
+        Derived-timeframe mode (timeframe_derive): sync the base timeframe
+        from the exchange, then re-aggregate base candles from the last
+        stored derived bar on. Skipped while the base has no new candle;
+        a rewritten base history (data_version rewrites) re-derives the
+        whole series. Closed bars with base candles missing are not written.
+        """
+        base = timeframe_derive.BASE_TIMEFRAME
+        base_version = download_flight.do((os.path.abspath(self.db_file), symbol, base),
+                                          self._sync_from_exchange, symbol, symbol_ccxt, base)
+        if base_version is None:
+            return self._read_data_version(symbol, interval)
+        key = (os.path.abspath(self.db_file), symbol, interval)
+        mark = (base_version[0], base_version[3])
+        prev = timeframe_derive.derived_watermark.get(key)
+        last_ts = self._get_last_timestamp(symbol, interval)
+        if last_ts is not None and prev == mark:
+            return self._read_data_version(symbol, interval)
+
+        # Bar terakhir yang tersimpan mungkin masih open: hitung ulang mulai dari bar itu.
+        # History base ditulis ulang (repair gap / candle diganti): agregasi ulang dari awal
+        rederive = last_ts is None or (prev is not None and prev[1] != mark[1])
+        start_ts = 0 if rederive else last_ts
+        base_cols = market_loader.load_many([symbol], base, start_ts=start_ts, db_file=self.db_file)
+        if symbol in base_cols:
+            bars = timeframe_derive.resample(base_cols[symbol], interval, base, drop_partial_first=rederive)
+            n_all = len(bars['timestamp'])
+            bars = timeframe_derive.complete_bars(bars, interval, base)
+            if len(bars['timestamp']):
+                self._save_to_db(symbol, interval, timeframe_derive.to_rows(bars), replace=True)
+                print(f"[DERIVE] {symbol} {interval}: {len(bars['timestamp'])} bars from {base}"
+                      + (f", {n_all - len(bars['timestamp'])} skipped (base candles missing)"
+                         if n_all > len(bars['timestamp']) else ""))
+        timeframe_derive.derived_watermark[key] = mark
+        return self._read_data_version(symbol, interval)
+
     # ============================================================
     # 3. INDICATOR CALCULATION (LOGIC LAMA - TETAP DIPERTAHANKAN)
     # ============================================================
     def prepare_indicators(self, df):
         """
         Menghitung indikator teknikal: SMA, EMA, Bollinger, RSI, Grid, ATR.
-        Logika ini tidak diubah sama sekali dari versi sebelumnya.
+        Frame dari fetch_data(period="max") membawa df.attrs['series_key'];
+        untuk frame tersebut indikator di-update secara incremental lewat
+        indicator_store (hanya candle baru yang dihitung). Frame dari worker
+        backtest_pool dengan attrs['indicators_ready'] sudah membawa kolomnya.
         """
         if df is None or len(df) < 50: return df
+        if df.attrs.get('indicators_ready'):
+            return df  # sudah dihitung di proses parent (backtest_pool)
 
+        series_key = df.attrs.get('series_key')
+        if series_key is not None:
+            return indicator_store.apply(series_key, df, self._compute_indicators)
+        return self._compute_indicators(df)
+
+    def _compute_indicators(self, df):
+        """
+        Full pandas computation over the whole history.
+        Logika ini tidak diubah sama sekali dari versi sebelumnya.
+        """
         # Trend Indicators
         df['sma_fast'] = df['close'].rolling(20).mean() # SMA 20
         df['sma_slow'] = df['close'].rolling(50).mean() # SMA 50
@@ -654,6 +1055,45 @@ class TradingEngine:
         else:
             return condition  # Backward compatible
 
+    def get_market_condition_series(self, df, detailed=False):
+        """
+        Vectorized get_market_condition for EVERY bar in one pass.
+        Value at bar i equals get_market_condition(df.iloc[:i+1]) — including
+        UNKNOWN for the first 49 bars and while SMA20/50 are still NaN.
+
+        Args:
+            df: DataFrame with indicators (prepare_indicators() first)
+            detailed: If True, return DataFrame with condition, strength,
+                      bull_score, bear_score. If False, Series of condition labels.
+        """
+        if df is None or df.empty:
+            empty = pd.Series([], dtype=object)
+            return pd.DataFrame({"condition": empty, "strength": empty}) if detailed else empty
+
+        arrays = backtest_kernel.extract_arrays(df)
+        codes, bull_score, bear_score, rsi = backtest_kernel.market_regimes(arrays)
+        labels = np.array(["UNKNOWN", "UPTREND", "DOWNTREND", "RANGING"], dtype=object)
+        condition = pd.Series(labels[codes], index=df.index, name="condition")
+        if not detailed:
+            return condition
+
+        strength = np.full(len(df), "WEAK", dtype=object)
+        up = codes == backtest_kernel.REGIME_UPTREND
+        down = codes == backtest_kernel.REGIME_DOWNTREND
+        ranging = codes == backtest_kernel.REGIME_RANGING
+        strength[up] = np.where(bull_score[up] == 3, "STRONG", "MODERATE")
+        strength[up & (rsi > 70)] = "STRONG (OVERBOUGHT)"
+        strength[down] = np.where(bear_score[down] == 3, "STRONG", "MODERATE")
+        strength[down & (rsi < 30)] = "STRONG (OVERSOLD)"
+        strength[ranging & (np.abs(rsi - 50) < 10)] = "MODERATE"
+
+        return pd.DataFrame({
+            "condition": condition,
+            "strength": strength,
+            "bull_score": bull_score,
+            "bear_score": bear_score,
+        }, index=df.index)
+
     # ============================================================
     # 4. UTILITIES & SIGNAL ADVICE (LOGIC LAMA)
     # ============================================================
@@ -710,33 +1150,11 @@ class TradingEngine:
     # ============================================================
     # 5. BACKTESTING ENGINE (UPDATED: PORTO & RISK MM IMPLEMENTATION)
     # ============================================================
-    def run_backtest(self, raw_df, strategy_type, requested_period="1y", start_date=None, end_date=None, direction="LONG", interval="1d"):
+    def _get_risk_config(self, strategy_type):
         """
-        Menjalankan simulasi trading dengan opsi Risk Management (Kelompok B).
-        Args:
-            direction: "LONG" (Buy Low, Sell High) or "SHORT" (Sell High, Buy Low)
+        Konfigurasi Risk Management per strategi.
+        Returns: (use_risk_mm, base_strategy, max_porto_dd, risk_per_trade)
         """
-        # 1. Siapkan Indikator pada data mentah
-        full_df = self.prepare_indicators(raw_df.copy())
-        
-        # 2. Potong Data sesuai periode yang diminta
-        df = self.slice_data_by_period(full_df, requested_period, start_date, end_date)
-        
-        print(f"[BACKTEST] {strategy_type} | raw={len(raw_df)} candles | indicators={len(full_df)} | sliced({requested_period})={len(df)} candles | capital={self.initial_capital}")
-        
-        # --- ACCOUNT INITIALIZATION ---
-        capital = self.initial_capital        # Cash
-        initial_capital = self.initial_capital # Starting Capital (for reference)
-        peak_capital = capital                 # Peak Portfolio Value (for High Watermark)
-        
-        position_size = 0  # Number of Coins held
-        entry_price = 0    # Average buy price
-        
-        markers = []       # Chart Markers (Buy/Sell arrows)
-        trades = []        # Trade History
-        equity_curve = []  # Balance Growth Chart
-        
-        # --- RISK MANAGEMENT CONFIGURATION (PORTO & RISK MM) ---
         # Default: Disable Risk Module (For Basic Strategies / Group A)
         use_risk_mm = False
         max_porto_dd = 1.0  # 100% (Unlimited / Immune to Margin Call)
@@ -764,249 +1182,395 @@ class TradingEngine:
             elif base_strategy == "MIX_STRATEGY":
                 max_porto_dd = 0.25  # MIX_STRATEGY PRO moderate 25%
 
+        return use_risk_mm, base_strategy, max_porto_dd, risk_per_trade
+
+    def _finalize_metrics(self, df, start_price, trades, capital, position_size, equity_curve,
+                          interval, use_risk_mm, max_porto_dd):
+        """Hitung metrics akhir dari state simulasi (dipakai run_backtest & run_backtest_batch)."""
+        final_equity = capital + (position_size * df.iloc[-1]['close'])
+        
+        bh_return = 0
+        bh_final = self.initial_capital
+        if start_price > 0:
+            bh_return = ((df.iloc[-1]['close'] - start_price) / start_price) * 100
+            bh_final = self.initial_capital * (1 + (bh_return / 100))
+
+        metrics = self.calculate_metrics(trades, final_equity, bh_return, bh_final, equity_curve, timeframe=interval)
+        
+        # Tambahkan Info Drawdown Limit ke Metrics agar Frontend Tahu
+        metrics['max_porto_limit'] = f"{max_porto_dd*100}%" if use_risk_mm else "Unlimited"
+        metrics['strategy_mode'] = "PRO (Risk Managed)" if use_risk_mm else "BASIC (Aggressive)"
+        metrics['trades_list'] = trades
+        return metrics
+
+    def run_backtest(self, raw_df, strategy_type, requested_period="1y", start_date=None, end_date=None, direction="LONG", interval="1d", engine="vector",
+                     checkpoint_key=None):
+        """
+        Menjalankan simulasi trading dengan opsi Risk Management (Kelompok B).
+        Args:
+            direction: "LONG" (Buy Low, Sell High) or "SHORT" (Sell High, Buy Low)
+            engine: "vector" (default: NumPy signal masks + compact state machine,
+                    see backtest_kernel) or "loop" (bar-by-bar df.iloc simulation,
+                    kept as the reference for benchmarks.golden).
+                    Both produce identical markers, trades and metrics.
+            checkpoint_key: optional (symbol, timeframe). For windows with a fixed
+                    start ("max" or custom start/end) the simulation state is saved
+                    in backtest_checkpoint and the next call only simulates the
+                    candles appended since. Forces engine="vector". A checkpoint
+                    is dropped once data_version counts a rewrite of the series
+                    (gap repair, replaced derived bar) since it was saved.
+                    Rolling presets (1mo..2y) move their first bar with every new
+                    candle, so they are never checkpointed. Callers: the manual
+                    scanner mode and /api/run-backtest; the scanner batches,
+                    compare-strategies and check_market_signals run rolling
+                    windows and stay on strategy_cache / full runs. On resume
+                    only the simulation is skipped: indicators (indicator_store,
+                    incremental for fetch_data frames) and signals still cover
+                    the whole window.
+        """
+        # 1. Siapkan Indikator pada data mentah
+        # (shallow copy: kolom indikator ditambahkan ke frame baru, buffer OHLCV
+        # dibagi dengan frame_cache lewat Copy-on-Write)
+        full_df = self.prepare_indicators(raw_df.copy(deep=False))
+        
+        # 2. Potong Data sesuai periode yang diminta
+        df = self.slice_data_by_period(full_df, requested_period, start_date, end_date)
+        
+        print(f"[BACKTEST] {strategy_type} | raw={len(raw_df)} candles | indicators={len(full_df)} | sliced({requested_period})={len(df)} candles | capital={self.initial_capital}")
+        
+        # --- ACCOUNT INITIALIZATION ---
+        capital = self.initial_capital        # Cash
+        initial_capital = self.initial_capital # Starting Capital (for reference)
+        peak_capital = capital                 # Peak Portfolio Value (for High Watermark)
+        
+        position_size = 0  # Number of Coins held
+        entry_price = 0    # Average buy price
+        
+        markers = []       # Chart Markers (Buy/Sell arrows)
+        trades = []        # Trade History
+        equity_curve = []  # Balance Growth Chart
+        
+        # --- RISK MANAGEMENT CONFIGURATION (PORTO & RISK MM) ---
+        use_risk_mm, base_strategy, max_porto_dd, risk_per_trade = self._get_risk_config(strategy_type)
+
         # Data Validation
         if df.empty or len(df) < 5:
-            return df, [], self.calculate_metrics([], capital, 0, capital, []), []
+            return df, [], self.calculate_metrics([], capital, 0, capital, []), EquityCurve()
 
         start_price = df.iloc[0]['close']
         df = df.reset_index(drop=True)
         is_blown_up = False  # Status if account is "Blown Up" (Hit Drawdown Limit)
 
-        # --- PRE-COMPUTE MIX_STRATEGY MARKET CONDITIONS (O(n) not O(n²)) ---
-        # get_market_condition(df.iloc[:i+1]) is O(n) — calling it per bar = O(n²).
-        # Pre-compute once here, then use market_conditions[i] inside the loop.
-        base_strat_check = strategy_type.replace("_PRO", "")
-        if base_strat_check == "MIX_STRATEGY":
-            market_conditions = [
-                self.get_market_condition(df.iloc[:idx+1])
-                for idx in range(len(df))
-            ]
+        # --- CHECKPOINT (window dengan start tetap saja) ---
+        checkpoint_period = None
+        if checkpoint_key is not None:
+            if start_date and end_date:
+                checkpoint_period = f"{start_date}~{end_date}"
+            elif requested_period == "max":
+                checkpoint_period = "max"
+        if checkpoint_period is not None:
+            engine = "vector"
+
+        if engine == "vector":
+            # --- VECTOR KERNEL: signals as masks, state machine over arrays ---
+            arrays = backtest_kernel.extract_arrays(df)
+            resume = None
+            if checkpoint_period is not None:
+                resume = self._load_checkpoint(*checkpoint_key, checkpoint_period, strategy_type, direction, arrays)
+                if resume is not None:
+                    print(f"[BACKTEST] Resume {strategy_type} {direction} from checkpoint: {resume['bars']}/{len(df)} bars")
+            signals = backtest_kernel.compute_signals(arrays, base_strategy, direction)
+            sim = backtest_kernel.simulate(
+                arrays, signals, backtest_kernel.tradable_mask(arrays), direction, capital,
+                use_risk_mm=use_risk_mm, max_porto_dd=max_porto_dd, risk_per_trade=risk_per_trade,
+                resume=resume
+            )
+            if checkpoint_period is not None and (resume is None or resume['bars'] < sim['bars']):
+                self._save_checkpoint(*checkpoint_key, checkpoint_period, strategy_type, direction, arrays, sim)
+            markers, trades = sim['markers'], sim['trades']
+            equity_curve = backtest_kernel.equity_curve(sim)
+            capital, position_size = sim['capital'], sim['position_size']
         else:
-            market_conditions = None
+            # --- PRE-COMPUTE MIX_STRATEGY MARKET CONDITIONS (one vectorized pass) ---
+            # get_market_condition(df.iloc[:i+1]) per bar slices the frame every time;
+            # get_market_condition_series gives the same label for every bar at once.
+            base_strat_check = strategy_type.replace("_PRO", "")
+            if base_strat_check == "MIX_STRATEGY":
+                market_conditions = self.get_market_condition_series(df).tolist()
+            else:
+                market_conditions = None
 
-        # --- BAR-BY-BAR SIMULATION LOOP ---
-        for i in range(1, len(df)):
-            curr = df.iloc[i]
-            prev = df.iloc[i-1]
-            ts = int(curr['time'].timestamp())
+            # --- BAR-BY-BAR SIMULATION LOOP ---
+            for i in range(1, len(df)):
+                curr = df.iloc[i]
+                prev = df.iloc[i-1]
+                ts = int(curr['time'].timestamp())
             
-            # Hitung Nilai Aset Saat Ini (Mark to Market)
-            # Jika punya posisi, nilai = (Jumlah Koin * Harga Sekarang) + Sisa Cash
-            current_equity = capital if position_size == 0 else (position_size * curr['close']) + 0
-            # Catatan: Variabel 'capital' saat punya posisi dianggap 0 di logic All-In, 
-            # tapi di Logic RiskMM, 'capital' adalah sisa cash yang tidak dibelikan koin.
-            if use_risk_mm and position_size > 0:
-                current_equity = (position_size * curr['close']) + capital
-
-            # --- LOGIC 1: MAX DRAWDOWN GUARD (CIRCUIT BREAKER) ---
-            if current_equity > peak_capital: 
-                peak_capital = current_equity # Update High Watermark
+                # Hitung Nilai Aset Saat Ini (Mark to Market)
+                # Jika punya posisi, nilai = (Jumlah Koin * Harga Sekarang) + Sisa Cash
+                current_equity = capital if position_size == 0 else (position_size * curr['close']) + 0
+                # Catatan: Variabel 'capital' saat punya posisi dianggap 0 di logic All-In, 
+                # tapi di Logic RiskMM, 'capital' adalah sisa cash yang tidak dibelikan koin.
+                if use_risk_mm and position_size > 0:
+                    current_equity = (position_size * curr['close']) + capital
+
+                # --- LOGIC 1: MAX DRAWDOWN GUARD (CIRCUIT BREAKER) ---
+                if current_equity > peak_capital: 
+                    peak_capital = current_equity # Update High Watermark
             
-            # Hitung Drawdown saat ini (%)
-            current_dd = 0
-            if peak_capital > 0:
-                current_dd = (peak_capital - current_equity) / peak_capital
+                # Hitung Drawdown saat ini (%)
+                current_dd = 0
+                if peak_capital > 0:
+                    current_dd = (peak_capital - current_equity) / peak_capital
             
-            # Cek apakah melanggar batas Max Drawdown?
-            if use_risk_mm and current_dd >= max_porto_dd:
-                # CUT LOSS GLOBAL: Tutup semua posisi & Berhenti Trading Selamanya
-                if position_size > 0:
-                    liquidated_value = position_size * curr['close']
-                    capital += liquidated_value # Uang kembali ke cash
+                # Cek apakah melanggar batas Max Drawdown?
+                if use_risk_mm and current_dd >= max_porto_dd:
+                    # CUT LOSS GLOBAL: Tutup semua posisi & Berhenti Trading Selamanya
+                    if position_size > 0:
+                        liquidated_value = position_size * curr['close']
+                        capital += liquidated_value # Uang kembali ke cash
                     
-                    pnl = (curr['close'] - entry_price) / entry_price
-                    trades.append({'pnl_pct': pnl, 'reason': 'MAX_DD_HIT'})
+                        pnl = (curr['close'] - entry_price) / entry_price
+                        trades.append({'pnl_pct': pnl, 'reason': 'MAX_DD_HIT'})
                     
-                    position_size = 0
-                    markers.append({'time': ts, 'position': 'aboveBar', 'color': '#000000', 'shape': 'arrowDown', 'text': 'STOP (Risk)'})
+                        position_size = 0
+                        markers.append({'time': ts, 'position': 'aboveBar', 'color': '#000000', 'shape': 'arrowDown', 'text': 'STOP (Risk)'})
                 
-                is_blown_up = True # Tandai akun mati
+                    is_blown_up = True # Tandai akun mati
             
-            # Jika akun sudah mati, catat equity flat dan skip logic trading
-            if is_blown_up:
-                equity_curve.append({'time': ts, 'value': capital})
-                continue
-
-            # GUARD: Skip candle jika indikator utama belum valid (warmup period)
-            # SMA-50 butuh 50 candle, RSI butuh 14+1, ATR butuh 14+1 candle.
-            if pd.isna(curr.get('sma_fast')) or pd.isna(curr.get('sma_slow')) or \
-               pd.isna(curr.get('rsi')) or pd.isna(curr.get('bb_upper')) or \
-               pd.isna(curr.get('atr')):
-                equity_val = capital + (position_size * curr['close']) if position_size != 0 else capital
-                equity_curve.append({'time': ts, 'value': equity_val})
-                continue
-
-            # --- STRATEGY SIGNAL GENERATOR ---
-            signal = "HOLD"
-            base_strategy = strategy_type.replace("_PRO", "")
-
-            # --- LONG LOGIC ---
-            if direction == "LONG":
-                if base_strategy == "MOMENTUM":
-                    if prev['sma_fast'] < prev['sma_slow'] and curr['sma_fast'] > curr['sma_slow']: signal = "BUY"
-                    elif prev['sma_fast'] > prev['sma_slow'] and curr['sma_fast'] < curr['sma_slow']: signal = "SELL"
+                # Jika akun sudah mati, catat equity flat dan skip logic trading
+                if is_blown_up:
+                    equity_curve.append({'time': ts, 'value': capital})
+                    continue
+
+                # GUARD: Skip candle jika indikator utama belum valid (warmup period)
+                # SMA-50 butuh 50 candle, RSI butuh 14+1, ATR butuh 14+1 candle.
+                if pd.isna(curr.get('sma_fast')) or pd.isna(curr.get('sma_slow')) or \
+                   pd.isna(curr.get('rsi')) or pd.isna(curr.get('bb_upper')) or \
+                   pd.isna(curr.get('atr')):
+                    equity_val = capital + (position_size * curr['close']) if position_size != 0 else capital
+                    equity_curve.append({'time': ts, 'value': equity_val})
+                    continue
+
+                # --- STRATEGY SIGNAL GENERATOR ---
+                signal = "HOLD"
+                base_strategy = strategy_type.replace("_PRO", "")
+
+                # --- LONG LOGIC ---
+                if direction == "LONG":
+                    if base_strategy == "MOMENTUM":
+                        if prev['sma_fast'] < prev['sma_slow'] and curr['sma_fast'] > curr['sma_slow']: signal = "BUY"
+                        elif prev['sma_fast'] > prev['sma_slow'] and curr['sma_fast'] < curr['sma_slow']: signal = "SELL"
                 
-                elif base_strategy == "MEAN_REVERSAL":
-                    if curr['rsi'] < 30 and curr['close'] < curr['bb_lower']: signal = "BUY"
-                    elif curr['rsi'] > 70 and curr['close'] > curr['bb_upper']: signal = "SELL"
+                    elif base_strategy == "MEAN_REVERSAL":
+                        if curr['rsi'] < 30 and curr['close'] < curr['bb_lower']: signal = "BUY"
+                        elif curr['rsi'] > 70 and curr['close'] > curr['bb_upper']: signal = "SELL"
                 
-                elif base_strategy == "GRID":
-                    buy_zone = curr['grid_bottom'] + (curr['grid_top'] - curr['grid_bottom']) * 0.2
-                    sell_zone = curr['grid_top'] - (curr['grid_top'] - curr['grid_bottom']) * 0.2
-                    if curr['close'] <= buy_zone: signal = "BUY"
-                    elif curr['close'] >= sell_zone: signal = "SELL"
+                    elif base_strategy == "GRID":
+                        buy_zone = curr['grid_bottom'] + (curr['grid_top'] - curr['grid_bottom']) * 0.2
+                        sell_zone = curr['grid_top'] - (curr['grid_top'] - curr['grid_bottom']) * 0.2
+                        if curr['close'] <= buy_zone: signal = "BUY"
+                        elif curr['close'] >= sell_zone: signal = "SELL"
                 
-                elif base_strategy == "MULTITIMEFRAME":
-                    is_uptrend = curr['close'] > curr['ema_200']
-                    if is_uptrend and curr['rsi'] < 40: signal = "BUY"
-                    elif curr['rsi'] > 75: signal = "SELL"
+                    elif base_strategy == "MULTITIMEFRAME":
+                        is_uptrend = curr['close'] > curr['ema_200']
+                        if is_uptrend and curr['rsi'] < 40: signal = "BUY"
+                        elif curr['rsi'] > 75: signal = "SELL"
                 
-                elif base_strategy == "MIX_STRATEGY":
-                    cond = market_conditions[i] if market_conditions else "RANGING"
-                    if cond == "UPTREND": # Momentum Logic
-                        if prev['sma_fast'] < prev['sma_slow'] and curr['sma_fast'] > curr['sma_slow']: signal = "BUY"
-                        elif prev['sma_fast'] > prev['sma_slow'] and curr['sma_fast'] < curr['sma_slow']: signal = "SELL"
-                    elif cond == "RANGING": # Reversal Logic
-                        if curr['rsi'] < 30: signal = "BUY"
-                        elif curr['rsi'] > 70: signal = "SELL"
-                    else: signal = "SELL"
-
-            # --- SHORT LOGIC ---
-            elif direction == "SHORT":
-                if base_strategy == "MOMENTUM":
-                    # Short Signal: Fast Cross Below Slow
-                    if prev['sma_fast'] > prev['sma_slow'] and curr['sma_fast'] < curr['sma_slow']: signal = "ENTRY_SHORT"
-                    elif prev['sma_fast'] < prev['sma_slow'] and curr['sma_fast'] > curr['sma_slow']: signal = "EXIT_SHORT"
+                    elif base_strategy == "MIX_STRATEGY":
+                        cond = market_conditions[i] if market_conditions else "RANGING"
+                        if cond == "UPTREND": # Momentum Logic
+                            if prev['sma_fast'] < prev['sma_slow'] and curr['sma_fast'] > curr['sma_slow']: signal = "BUY"
+                            elif prev['sma_fast'] > prev['sma_slow'] and curr['sma_fast'] < curr['sma_slow']: signal = "SELL"
+                        elif cond == "RANGING": # Reversal Logic
+                            if curr['rsi'] < 30: signal = "BUY"
+                            elif curr['rsi'] > 70: signal = "SELL"
+                        else: signal = "SELL"
+
+                # --- SHORT LOGIC ---
+                elif direction == "SHORT":
+                    if base_strategy == "MOMENTUM":
+                        # Short Signal: Fast Cross Below Slow
+                        if prev['sma_fast'] > prev['sma_slow'] and curr['sma_fast'] < curr['sma_slow']: signal = "ENTRY_SHORT"
+                        elif prev['sma_fast'] < prev['sma_slow'] and curr['sma_fast'] > curr['sma_slow']: signal = "EXIT_SHORT"
                 
-                elif base_strategy == "MEAN_REVERSAL":
-                    # Short Signal: RSI > 70 (Overbought)
-                    if curr['rsi'] > 70 and curr['close'] > curr['bb_upper']: signal = "ENTRY_SHORT"
-                    elif curr['rsi'] < 30 and curr['close'] < curr['bb_lower']: signal = "EXIT_SHORT"
+                    elif base_strategy == "MEAN_REVERSAL":
+                        # Short Signal: RSI > 70 (Overbought)
+                        if curr['rsi'] > 70 and curr['close'] > curr['bb_upper']: signal = "ENTRY_SHORT"
+                        elif curr['rsi'] < 30 and curr['close'] < curr['bb_lower']: signal = "EXIT_SHORT"
                 
-                elif base_strategy == "GRID":
-                    # Short Signal: Sell at Top
-                    buy_zone = curr['grid_bottom'] + (curr['grid_top'] - curr['grid_bottom']) * 0.2
-                    sell_zone = curr['grid_top'] - (curr['grid_top'] - curr['grid_bottom']) * 0.2
-                    if curr['close'] >= sell_zone: signal = "ENTRY_SHORT"
-                    elif curr['close'] <= buy_zone: signal = "EXIT_SHORT"
+                    elif base_strategy == "GRID":
+                        # Short Signal: Sell at Top
+                        buy_zone = curr['grid_bottom'] + (curr['grid_top'] - curr['grid_bottom']) * 0.2
+                        sell_zone = curr['grid_top'] - (curr['grid_top'] - curr['grid_bottom']) * 0.2
+                        if curr['close'] >= sell_zone: signal = "ENTRY_SHORT"
+                        elif curr['close'] <= buy_zone: signal = "EXIT_SHORT"
                 
-                elif base_strategy == "MULTITIMEFRAME":
-                    # Short Signal: Downtrend + RSI > 60
-                    is_downtrend = curr['close'] < curr['ema_200']
-                    if is_downtrend and curr['rsi'] > 60: signal = "ENTRY_SHORT"
-                    elif curr['rsi'] < 25: signal = "EXIT_SHORT"
+                    elif base_strategy == "MULTITIMEFRAME":
+                        # Short Signal: Downtrend + RSI > 60
+                        is_downtrend = curr['close'] < curr['ema_200']
+                        if is_downtrend and curr['rsi'] > 60: signal = "ENTRY_SHORT"
+                        elif curr['rsi'] < 25: signal = "EXIT_SHORT"
                 
-                elif base_strategy == "MIX_STRATEGY":
-                    cond = market_conditions[i] if market_conditions else "RANGING"
-                    if cond == "DOWNTREND":
-                         # Momentum Short inside Downtrend
-                         if prev['sma_fast'] > prev['sma_slow'] and curr['sma_fast'] < curr['sma_slow']: signal = "ENTRY_SHORT"
-                         elif prev['sma_fast'] < prev['sma_slow'] and curr['sma_fast'] > curr['sma_slow']: signal = "EXIT_SHORT"
-                    elif cond == "RANGING":
-                         # Reversal Short inside Range/Sideways
-                         if curr['rsi'] > 70: signal = "ENTRY_SHORT"
-                         elif curr['rsi'] < 30: signal = "EXIT_SHORT"
-                    else: signal = "EXIT_SHORT"
-
-            # --- EXECUTION LOGIC ---
+                    elif base_strategy == "MIX_STRATEGY":
+                        cond = market_conditions[i] if market_conditions else "RANGING"
+                        if cond == "DOWNTREND":
+                             # Momentum Short inside Downtrend
+                             if prev['sma_fast'] > prev['sma_slow'] and curr['sma_fast'] < curr['sma_slow']: signal = "ENTRY_SHORT"
+                             elif prev['sma_fast'] < prev['sma_slow'] and curr['sma_fast'] > curr['sma_slow']: signal = "EXIT_SHORT"
+                        elif cond == "RANGING":
+                             # Reversal Short inside Range/Sideways
+                             if curr['rsi'] > 70: signal = "ENTRY_SHORT"
+                             elif curr['rsi'] < 30: signal = "EXIT_SHORT"
+                        else: signal = "EXIT_SHORT"
+
+                # --- EXECUTION LOGIC ---
             
-            # LONG EXECUTION (BUY / SELL)
-            if direction == "LONG":
-                # BUY logic
-                if signal == "BUY" and position_size == 0:
-                    if use_risk_mm:
-                        atr = curr.get('atr', curr['close']*0.02)
-                        sl_dist = atr * 1.5
-                        risk_amount = capital * risk_per_trade
-                        if sl_dist > 0:
-                            position_value = risk_amount / (sl_dist / curr['close'])
-                            position_value = min(position_value, capital)
-                        else: position_value = capital
-                    else:
-                        position_value = capital
-
-                    # Kurangi biaya entry (taker fee + slippage)
-                    entry_cost = position_value * ROUND_TRIP_COST
-                    actual_invest = position_value - entry_cost
-                    position_size = actual_invest / curr['close']
-                    capital -= position_value  # Deduct full amount including cost
-
-                    entry_price = curr['close']
-                    markers.append({'time': ts, 'position': 'belowBar', 'color': '#00ff41', 'shape': 'arrowUp', 'text': 'BUY'})
-
-                # SELL logic
-                elif signal == "SELL" and position_size > 0:
-                    sell_gross = position_size * curr['close']
-                    # Kurangi biaya exit (taker fee + slippage)
-                    exit_cost = sell_gross * ROUND_TRIP_COST
-                    sell_value = sell_gross - exit_cost
-                    capital += sell_value
-                    pnl = (curr['close'] - entry_price) / entry_price
-                    trades.append({'pnl_pct': pnl, 'reason': 'SIGNAL'})
-                    position_size = 0
-                    markers.append({'time': ts, 'position': 'aboveBar', 'color': '#ff0055', 'shape': 'arrowDown', 'text': 'SELL'})
-
-            # SHORT EXECUTION (ENTRY_SHORT / EXIT_SHORT)
-            elif direction == "SHORT":
-                # ENTRY SHORT (Sell to Open)
-                if signal == "ENTRY_SHORT" and position_size == 0:
-                    # Logic: We treat capital as collateral.
-                    if use_risk_mm:
-                         atr = curr.get('atr', curr['close']*0.02)
-                         sl_dist = atr * 1.5
-                         risk_amount = capital * risk_per_trade
-                         if sl_dist > 0:
-                            position_value = risk_amount / (sl_dist / curr['close'])
-                            position_value = min(position_value, capital)
-                         else: position_value = capital
-                         size_to_short = position_value / curr['close']
-                    else:
-                         size_to_short = capital / curr['close']
-
-                    position_size = -size_to_short
-                    # Proceed dari short sale dikurangi entry cost
-                    short_proceed = size_to_short * curr['close']
-                    entry_cost = short_proceed * ROUND_TRIP_COST
-                    capital += (short_proceed - entry_cost)
-                    entry_price = curr['close']
-                    markers.append({'time': ts, 'position': 'aboveBar', 'color': '#ff0055', 'shape': 'arrowDown', 'text': 'SHORT'})
-
-                # EXIT SHORT (Buy to Cover)
-                elif signal == "EXIT_SHORT" and position_size < 0:
-                     size_to_cover = abs(position_size)
-                     cost_to_cover = size_to_cover * curr['close']
-                     # Tambahkan exit cost (taker fee + slippage)
-                     exit_cost = cost_to_cover * ROUND_TRIP_COST
-                     capital -= (cost_to_cover + exit_cost)
-
-                     pnl = (entry_price - curr['close']) / entry_price
-                     trades.append({'pnl_pct': pnl, 'reason': 'SIGNAL'})
-
-                     position_size = 0
-                     markers.append({'time': ts, 'position': 'belowBar', 'color': '#00ff41', 'shape': 'arrowUp', 'text': 'COVER'})
+                # LONG EXECUTION (BUY / SELL)
+                if direction == "LONG":
+                    # BUY logic
+                    if signal == "BUY" and position_size == 0:
+                        if use_risk_mm:
+                            atr = curr.get('atr', curr['close']*0.02)
+                            sl_dist = atr * 1.5
+                            risk_amount = capital * risk_per_trade
+                            if sl_dist > 0:
+                                position_value = risk_amount / (sl_dist / curr['close'])
+                                position_value = min(position_value, capital)
+                            else: position_value = capital
+                        else:
+                            position_value = capital
+
+                        # Kurangi biaya entry (taker fee + slippage)
+                        entry_cost = position_value * ROUND_TRIP_COST
+                        actual_invest = position_value - entry_cost
+                        position_size = actual_invest / curr['close']
+                        capital -= position_value  # Deduct full amount including cost
+
+                        entry_price = curr['close']
+                        markers.append({'time': ts, 'position': 'belowBar', 'color': '#00ff41', 'shape': 'arrowUp', 'text': 'BUY'})
+
+                    # SELL logic
+                    elif signal == "SELL" and position_size > 0:
+                        sell_gross = position_size * curr['close']
+                        # Kurangi biaya exit (taker fee + slippage)
+                        exit_cost = sell_gross * ROUND_TRIP_COST
+                        sell_value = sell_gross - exit_cost
+                        capital += sell_value
+                        pnl = (curr['close'] - entry_price) / entry_price
+                        trades.append({'pnl_pct': pnl, 'reason': 'SIGNAL'})
+                        position_size = 0
+                        markers.append({'time': ts, 'position': 'aboveBar', 'color': '#ff0055', 'shape': 'arrowDown', 'text': 'SELL'})
+
+                # SHORT EXECUTION (ENTRY_SHORT / EXIT_SHORT)
+                elif direction == "SHORT":
+                    # ENTRY SHORT (Sell to Open)
+                    if signal == "ENTRY_SHORT" and position_size == 0:
+                        # Logic: We treat capital as collateral.
+                        if use_risk_mm:
+                             atr = curr.get('atr', curr['close']*0.02)
+                             sl_dist = atr * 1.5
+                             risk_amount = capital * risk_per_trade
+                             if sl_dist > 0:
+                                position_value = risk_amount / (sl_dist / curr['close'])
+                                position_value = min(position_value, capital)
+                             else: position_value = capital
+                             size_to_short = position_value / curr['close']
+                        else:
+                             size_to_short = capital / curr['close']
+
+                        position_size = -size_to_short
+                        # Proceed dari short sale dikurangi entry cost
+                        short_proceed = size_to_short * curr['close']
+                        entry_cost = short_proceed * ROUND_TRIP_COST
+                        capital += (short_proceed - entry_cost)
+                        entry_price = curr['close']
+                        markers.append({'time': ts, 'position': 'aboveBar', 'color': '#ff0055', 'shape': 'arrowDown', 'text': 'SHORT'})
+
+                    # EXIT SHORT (Buy to Cover)
+                    elif signal == "EXIT_SHORT" and position_size < 0:
+                         size_to_cover = abs(position_size)
+                         cost_to_cover = size_to_cover * curr['close']
+                         # Tambahkan exit cost (taker fee + slippage)
+                         exit_cost = cost_to_cover * ROUND_TRIP_COST
+                         capital -= (cost_to_cover + exit_cost)
+
+                         pnl = (entry_price - curr['close']) / entry_price
+                         trades.append({'pnl_pct': pnl, 'reason': 'SIGNAL'})
+
+                         position_size = 0
+                         markers.append({'time': ts, 'position': 'belowBar', 'color': '#00ff41', 'shape': 'arrowUp', 'text': 'COVER'})
             
-            # Record Equity Harian
-            final_daily_equity = capital + (position_size * curr['close'])
-            equity_curve.append({'time': ts, 'value': final_daily_equity})
+                # Record Equity Harian
+                final_daily_equity = capital + (position_size * curr['close'])
+                equity_curve.append({'time': ts, 'value': final_daily_equity})
 
-        # Hitung Final Result setelah Loop Selesai
-        final_equity = capital + (position_size * df.iloc[-1]['close'])
-        
-        bh_return = 0
-        bh_final = self.initial_capital
-        if start_price > 0:
-            bh_return = ((df.iloc[-1]['close'] - start_price) / start_price) * 100
-            bh_final = self.initial_capital * (1 + (bh_return / 100))
+            # Simpan dalam bentuk kolom (sama dengan output kernel vector)
+            trades = TradeLog.from_records(trades)
+            equity_curve = EquityCurve.from_records(equity_curve)
 
-        metrics = self.calculate_metrics(trades, final_equity, bh_return, bh_final, equity_curve, timeframe=interval)
-        
-        # Tambahkan Info Drawdown Limit ke Metrics agar Frontend Tahu
-        metrics['max_porto_limit'] = f"{max_porto_dd*100}%" if use_risk_mm else "Unlimited"
-        metrics['strategy_mode'] = "PRO (Risk Managed)" if use_risk_mm else "BASIC (Aggressive)"
-        metrics['trades_list'] = trades
+        # Hitung Final Result setelah Loop Selesai
+        metrics = self._finalize_metrics(df, start_price, trades, capital, position_size, equity_curve,
+                                         interval, use_risk_mm, max_porto_dd)
         
         return df, markers, metrics, equity_curve
 
+    def run_backtest_batch(self, raw_df, strategies, periods, directions=("LONG",), interval="1d",
+                           start_date=None, end_date=None):
+        """
+        Backtest banyak kombinasi sekaligus di atas satu DataFrame mentah.
+
+        Indikator dihitung SEKALI, slice per periode dibagi ke semua strategi,
+        dan kolom indikator diekstrak ke array NumPy sekali per periode
+        (vector kernel). Hasil identik dengan run_backtest per kombinasi.
+
+        Returns:
+            dict {(period, strategy, direction): metrics} — metrics sama
+            persis dengan output run_backtest (termasuk trades_list).
+        """
+        results = {}
+        if raw_df is None or raw_df.empty:
+            return results
+
+        full_df = self.prepare_indicators(raw_df.copy(deep=False))
+        print(f"[BACKTEST-BATCH] raw={len(raw_df)} candles | {len(strategies)} strategies x "
+              f"{len(periods)} periods x {len(directions)} directions | capital={self.initial_capital}")
+
+        for period in periods:
+            df = self.slice_data_by_period(full_df, period, start_date, end_date)
+
+            # Data Validation (same early-exit as run_backtest)
+            if df.empty or len(df) < 5:
+                empty = self.calculate_metrics([], self.initial_capital, 0, self.initial_capital, [])
+                for strat in strategies:
+                    for direction in directions:
+                        results[(period, strat, direction)] = dict(empty)
+                continue
+
+            start_price = df.iloc[0]['close']
+            df = df.reset_index(drop=True)
+            arrays = backtest_kernel.extract_arrays(df)
+            tradable = backtest_kernel.tradable_mask(arrays)
+            regimes = None
+
+            for strat in strategies:
+                use_risk_mm, base_strategy, max_porto_dd, risk_per_trade = self._get_risk_config(strat)
+                if base_strategy == "MIX_STRATEGY" and regimes is None:
+                    regimes = backtest_kernel.market_regimes(arrays)[0]
+
+                for direction in directions:
+                    signals = backtest_kernel.compute_signals(arrays, base_strategy, direction, regimes=regimes)
+                    sim = backtest_kernel.simulate(
+                        arrays, signals, tradable, direction, self.initial_capital,
+                        use_risk_mm=use_risk_mm, max_porto_dd=max_porto_dd, risk_per_trade=risk_per_trade
+                    )
+                    results[(period, strat, direction)] = self._finalize_metrics(
+                        df, start_price, sim['trades'], sim['capital'], sim['position_size'],
+                        backtest_kernel.equity_curve(sim), interval, use_risk_mm, max_porto_dd
+                    )
+
+        return results
+
     # ============================================================
     # 5B. DUAL BACKTEST (LONG + SHORT SIMULTANEOUS) — PnL Segmentation
     # ============================================================
@@ -1020,13 +1584,13 @@ class TradingEngine:
         """
         # Run LONG backtest
         df_long, markers_long, metrics_long, curve_long = self.run_backtest(
-            raw_df.copy(), strategy_type, requested_period=requested_period,
+            raw_df, strategy_type, requested_period=requested_period,
             start_date=start_date, end_date=end_date, direction="LONG"
         )
         
         # Run SHORT backtest
         df_short, markers_short, metrics_short, curve_short = self.run_backtest(
-            raw_df.copy(), strategy_type, requested_period=requested_period,
+            raw_df, strategy_type, requested_period=requested_period,
             start_date=start_date, end_date=end_date, direction="SHORT"
         )
         
@@ -1034,13 +1598,11 @@ class TradingEngine:
         combined_metrics = self._combine_metrics(metrics_long, metrics_short)
         
         # Merge equity curves (average of both)
-        curve_combined = []
         min_len = min(len(curve_long), len(curve_short))
-        for i in range(min_len):
-            curve_combined.append({
-                'time': curve_long[i]['time'],
-                'value': (curve_long[i]['value'] + curve_short[i]['value']) / 2
-            })
+        curve_combined = EquityCurve(
+            curve_long.time[:min_len],
+            (curve_long.value[:min_len] + curve_short.value[:min_len]) / 2
+        )
         
         return {
             "pnl_long": metrics_long,
@@ -1093,57 +1655,34 @@ class TradingEngine:
         }
 
     def calculate_metrics(self, trades, final, bh_ret, bh_fin, curve, timeframe="1d"):
-        """Menghitung performa trading (Win Rate, Drawdown, Sharpe, dll)"""
-        total_trades = len(trades)
-        wins = [t for t in trades if t['pnl_pct'] > 0]
-        losses = [t for t in trades if t['pnl_pct'] <= 0]
-        win_rate = (len(wins) / total_trades * 100) if total_trades > 0 else 0
+        """
+        Menghitung performa trading (Win Rate, Drawdown, Sharpe, dll).
+        trades/curve: TradeLog/EquityCurve (kolom NumPy) atau list of dicts lama.
+        """
+        pnl = TradeLog.from_records(trades).pnl_pct
+        vals = EquityCurve.from_records(curve).value
         net_profit = final - self.initial_capital
 
-        # Profit Factor
-        gross_profit = sum(t['pnl_pct'] for t in wins)
-        gross_loss   = abs(sum(t['pnl_pct'] for t in losses))
-        profit_factor = round(gross_profit / gross_loss, 2) if gross_loss > 0 else 0.0
-
-        # Max Drawdown
-        vals = [e['value'] for e in curve]
-        dd = 0
-        if vals:
-            peak = vals[0]
-            for v in vals:
-                if v > peak: peak = v
-                if peak > 0:
-                    d = (peak - v)/peak
-                    if d > dd: dd = d
-
-        # Sharpe Ratio — timeframe-aware annualization
-        sharpe = 0
-        if len(vals) > 1:
-            series = pd.Series(vals)
-            returns = series.pct_change().dropna()
-            if returns.std() != 0:
-                annualization = BARS_PER_YEAR.get(timeframe, 252)
-                sharpe = (returns.mean() / returns.std()) * np.sqrt(annualization)
-
-        # Calmar Ratio — also timeframe-aware
-        calmar = 0
-        if len(vals) > 1 and dd > 0:
-            total_return = (final / self.initial_capital) - 1
-            trading_bars = len(vals)
-            annualization = BARS_PER_YEAR.get(timeframe, 252)
-            annual_return = total_return * (annualization / max(trading_bars, 1))
-            calmar = annual_return / dd if dd > 0 else 0
+        # Satu pass vectorized (metrics_kernel) — Sharpe/Sortino/Calmar timeframe-aware
+        m = metrics_kernel.compute_metrics(
+            vals, pnl,
+            periods_per_year=BARS_PER_YEAR.get(timeframe, 252),
+            total_return=(final / self.initial_capital) - 1
+        )
+        gross_loss = m['gross_loss']
+        profit_factor = round(m['gross_profit'] / gross_loss, 2) if gross_loss > 0 else 0.0
 
         return {
             "initial_balance": self.initial_capital,
             "final_balance": round(final, 2),
             "net_profit": round(net_profit, 2),
-            "win_rate": round(win_rate, 2),
-            "total_trades": total_trades,
+            "win_rate": round(m['win_rate'] * 100, 2),
+            "total_trades": m['total_trades'],
             "buy_hold_return": round(bh_ret, 2),
-            "max_drawdown": round(dd*100, 2),
-            "sharpe_ratio": round(sharpe, 2),
-            "calmar_ratio": round(calmar, 2),
+            "max_drawdown": round(m['max_drawdown'] * 100, 2),
+            "sharpe_ratio": round(m['sharpe'], 2),
+            "sortino_ratio": round(m['sortino'], 2),
+            "calmar_ratio": round(m['calmar'], 2),
             "profit_factor": profit_factor,
         }
 
@@ -1184,8 +1723,9 @@ class TradingEngine:
         Mencatat trade ke database lokal untuk tracking & portfolio.
         """
         conn = self._get_db_conn()
-        cur = conn.cursor()
+        if not conn: return
         try:
+            cur = conn.cursor()
             cur.execute("""
                 INSERT INTO trade_log (timestamp, symbol, side, quantity, price, strategy, timeframe, order_id, status, pnl, notes)
                 VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
@@ -1207,33 +1747,7 @@ class TradingEngine:
         """
         if len(equity_curve) < 2: return 0.0
 
-        # Use float64 to avoid overflow during sum_xx calculations
-        y = np.array([p['value'] for p in equity_curve], dtype=np.float64)
-        x = np.arange(len(y), dtype=np.float64)
-        
-        # Fit Linear Regression (y = mx + c)
-        n = len(x)
-        sum_x = np.sum(x)
-        sum_y = np.sum(y)
-        sum_xy = np.sum(x * y)
-        sum_xx = np.sum(x * x)
-        
-        denominator = (n * sum_xx - sum_x * sum_x)
-        if denominator == 0: return 0.0
-        
-        m = (n * sum_xy - sum_x * sum_y) / denominator
-        c = (sum_y - m * sum_x) / n
-        
-        # Proper R^2 Calculation
-        y_mean = np.mean(y)
-        ss_tot = np.sum((y - y_mean) ** 2)
-        
-        y_pred = m * x + c
-        ss_res = np.sum((y - y_pred) ** 2)
-        
-        if ss_tot == 0: return 0.0
-        
-        r_squared = 1 - (ss_res / ss_tot)
+        r_squared = metrics_kernel.compute_metrics(EquityCurve.from_records(equity_curve).value)['r_squared']
         
         return max(0, min(100, r_squared * 100))
 
@@ -1311,12 +1825,13 @@ class TradingEngine:
             cursor = conn.cursor()
             cursor.execute("SELECT * FROM trade_log ORDER BY id DESC LIMIT ?", (limit,))
             rows = cursor.fetchall()
-            conn.close()
             columns = ['id', 'symbol', 'side', 'qty', 'price', 'strategy', 'timeframe', 'order_id', 'status', 'pnl', 'notes', 'created_at']
             return [dict(zip(columns, row)) for row in rows]
         except Exception as e:
             print(f"[WARN] Trade History Error: {e}")
             return []
+        finally:
+            conn.close()
 
     def _get_bot_status(self):
         """Hitung statistik bot dari trade_log."""
@@ -1352,8 +1867,6 @@ class TradingEngine:
             cursor.execute("SELECT COALESCE(SUM(qty * price), 0) FROM trade_log")
             total_volume = cursor.fetchone()[0]
             
-            conn.close()
-            
             return {
                 "total_trades": total_trades,
                 "total_pnl": round(total_pnl, 2),
@@ -1364,4 +1877,6 @@ class TradingEngine:
             }
         except Exception as e:
             print(f"[WARN] Bot Status Error: {e}")
-            return {}
\ No newline at end of file
+            return {}
+        finally:
+            conn.close()
\ No newline at end of file
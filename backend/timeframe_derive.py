@@ -0,0 +1,211 @@
+# backend/timeframe_derive.py
+"""
+Derived timeframes: 4h / 1d / 1w candles built locally from base candles.
+
+The scanner downloads and stores 1h, 4h and 1d separately for every symbol:
+three times the API calls, storage and incremental-update work. In derived
+mode only the base timeframe (1h, or 15m) is fetched from the exchange;
+higher timeframes are aggregated from the stored base candles:
+
+  - Buckets follow the exchange's candle boundaries (UTC): 4h at
+    00/04/08/..., 1d at 00:00, 1w starting Monday 00:00.
+  - Vectorized aggregation: open = first, high = max, low = min,
+    close = last, volume = sum (np.*.reduceat over bucket boundaries).
+  - A leading bucket that starts before the base history is dropped (its
+    open would be wrong). The last bucket is the still-open bar, exactly
+    like the exchange returns it, and is rewritten as base candles arrive.
+  - A closed bucket with base candles missing (gap in the base series) is
+    not written: its high / low / volume would be wrong. The derived series
+    has a gap there until the base gap is repaired.
+  - Incremental: only base candles from the last stored derived bar on are
+    aggregated again; derived bars are saved to market_data under their own
+    timeframe (INSERT OR REPLACE), so every read path (column store,
+    frame_cache, load_many) serves them unchanged. The watermark is the
+    base series' last candle and data_version rewrites: a rewritten base
+    history (gap repair, replaced candle) re-derives the whole series.
+
+Config (env):
+  DERIVED_TIMEFRAMES     comma-separated timeframes to derive (default: off),
+                         e.g. "4h,1d,1w"
+  DERIVE_BASE_TIMEFRAME  base timeframe fetched from the exchange (default 1h)
+
+Consistency check against exchange bars:
+  python timeframe_derive.py check BTC-USDT ETH-USDT --timeframe 4h
+"""
+
+import argparse
+import os
+
+import numpy as np
+
+TIMEFRAME_MS = {
+    '15m': 900000, '1h': 3600000, '4h': 14400000, '1d': 86400000, '1w': 604800000,
+}
+# 1970-01-01 adalah hari Kamis; candle mingguan exchange mulai Senin 00:00 UTC
+WEEK_OFFSET_MS = 4 * 86400000
+
+DERIVED_TIMEFRAMES = tuple(tf.strip() for tf in os.getenv("DERIVED_TIMEFRAMES", "").split(",") if tf.strip())
+BASE_TIMEFRAME = os.getenv("DERIVE_BASE_TIMEFRAME", "1h")
+
+# (db, symbol, timeframe) -> (candle base terakhir, rewrites base) yang sudah diagregasi
+# (lihat TradingEngine._sync_derived)
+derived_watermark = {}
+
+# Toleransi relatif check: harga identik, volume = jumlah float (urutan penjumlahan beda)
+PRICE_RTOL = 1e-9
+VOLUME_RTOL = 1e-6
+
+
+def is_derived(timeframe):
+    return timeframe in DERIVED_TIMEFRAMES and timeframe != BASE_TIMEFRAME
+
+
+def bucket_start(ts, timeframe):
+    """Open time (ms) of the `timeframe` candle containing each timestamp."""
+    step = TIMEFRAME_MS[timeframe]
+    offset = WEEK_OFFSET_MS if timeframe == '1w' else 0
+    ts = np.asarray(ts, dtype=np.int64)
+    return (ts - offset) // step * step + offset
+
+
+def resample(cols, timeframe, base_timeframe=BASE_TIMEFRAME, drop_partial_first=True):
+    """
+    Aggregate base candles into `timeframe` bars.
+
+    cols: {'timestamp', 'open', 'high', 'low', 'close', 'volume'} arrays sorted
+    by timestamp (market_loader / ohlcv_store layout).
+    Returns the same layout plus 'count' (base candles per bar).
+    """
+    if TIMEFRAME_MS[timeframe] % TIMEFRAME_MS[base_timeframe]:
+        raise ValueError(f"{timeframe} is not a multiple of {base_timeframe}")
+    ts = np.asarray(cols['timestamp'], dtype=np.int64)
+    empty = {name: np.empty(0) for name in ('open', 'high', 'low', 'close', 'volume')}
+    if len(ts) == 0:
+        return {'timestamp': np.empty(0, dtype=np.int64), 'count': np.empty(0, dtype=np.int64), **empty}
+
+    buckets = bucket_start(ts, timeframe)
+    starts = np.concatenate(([0], np.flatnonzero(np.diff(buckets)) + 1))
+    ends = np.concatenate((starts[1:], [len(ts)]))
+    out = {
+        'timestamp': buckets[starts],
+        'open': np.asarray(cols['open'], dtype=np.float64)[starts],
+        'high': np.maximum.reduceat(np.asarray(cols['high'], dtype=np.float64), starts),
+        'low': np.minimum.reduceat(np.asarray(cols['low'], dtype=np.float64), starts),
+        'close': np.asarray(cols['close'], dtype=np.float64)[ends - 1],
+        'volume': np.add.reduceat(np.asarray(cols['volume'], dtype=np.float64), starts),
+        'count': ends - starts,
+    }
+    if drop_partial_first and ts[0] != buckets[0]:
+        out = {name: arr[1:] for name, arr in out.items()}
+    return out
+
+
+def complete_bars(bars, timeframe, base_timeframe=BASE_TIMEFRAME):
+    """
+    Drop closed bars with base candles missing (count < base candles per
+    bar). The last bar is kept: it is the open bar and rewritten later.
+    """
+    per_bar = TIMEFRAME_MS[timeframe] // TIMEFRAME_MS[base_timeframe]
+    keep = bars['count'] >= per_bar
+    if len(keep):
+        keep[-1] = True
+    return {name: arr[keep] for name, arr in bars.items()}
+
+
+def to_rows(bars):
+    """Bars -> ccxt-style rows [ts, o, h, l, c, v] for _save_to_db."""
+    return np.column_stack([bars[c] for c in ('timestamp', 'open', 'high', 'low', 'close', 'volume')]).tolist()
+
+
+# ============================================================
+# CONSISTENCY CHECK
+# ============================================================
+def check_consistency(engine, symbols, timeframe="4h", base_timeframe=BASE_TIMEFRAME, bars=200):
+    """
+    Compare bars derived from the stored base candles with the exchange's
+    own bars for the last `bars` closed candles of each symbol.
+    Only bars whose base candles are all stored are compared; closed bars
+    with base candles missing are reported as incomplete (they are not
+    derived) and fail the check. The open bar is skipped.
+    Returns {"symbols": [...], "compared", "mismatched", "incomplete", "ok"}.
+    """
+    import market_loader
+
+    step = TIMEFRAME_MS[timeframe]
+    per_bar = step // TIMEFRAME_MS[base_timeframe]
+    now = engine.exchange.milliseconds()
+    since = int(bucket_start(now, timeframe)) - bars * step
+    data = market_loader.load_many(symbols, base_timeframe, start_ts=since, db_file=engine.db_file)
+
+    report = {"timeframe": timeframe, "base_timeframe": base_timeframe, "symbols": [],
+              "compared": 0, "mismatched": 0, "incomplete": 0}
+    for sym in symbols:
+        row = {"symbol": sym, "compared": 0, "mismatched": [], "incomplete": [], "error": None}
+        report["symbols"].append(row)
+        if sym not in data:
+            row["error"] = "no base candles stored"
+            continue
+        derived = resample(data[sym], timeframe, base_timeframe)
+        try:
+            symbol_ccxt = sym.upper().replace("-", "/")
+            if symbol_ccxt.endswith("/USD"):
+                symbol_ccxt = symbol_ccxt.replace("/USD", "/USDT")
+            exch = np.asarray(engine.exchange.fetch_ohlcv(symbol_ccxt, timeframe=timeframe, since=since, limit=bars + 1),
+                              dtype=np.float64).reshape(-1, 6)
+        except Exception as e:
+            row["error"] = str(e)
+            continue
+
+        exch = exch[exch[:, 0] + step <= now]  # hanya bar yang sudah close
+        idx = np.searchsorted(derived['timestamp'], exch[:, 0].astype(np.int64))
+        found = idx < len(derived['timestamp'])
+        found[found] &= derived['timestamp'][idx[found]] == exch[found, 0].astype(np.int64)
+        partial = found.copy()
+        partial[found] = derived['count'][idx[found]] < per_bar
+        # Bar tanpa candle base sama sekali (di dalam range yang tersimpan) juga tidak lengkap
+        base_ts = np.asarray(data[sym]['timestamp'])
+        partial |= ~found & (exch[:, 0] >= base_ts[0]) & (exch[:, 0] <= base_ts[-1])
+        row["incomplete"] = [int(t) for t in exch[partial, 0]]
+        found &= ~partial
+        for j in np.flatnonzero(found):
+            i = idx[j]
+            d = [derived[c][i] for c in ('open', 'high', 'low', 'close', 'volume')]
+            e = exch[j, 1:]
+            ok = np.allclose(d[:4], e[:4], rtol=PRICE_RTOL, atol=0) and np.isclose(d[4], e[4], rtol=VOLUME_RTOL, atol=1e-12)
+            if not ok:
+                row["mismatched"].append({"timestamp": int(exch[j, 0]), "derived": [float(x) for x in d],
+                                          "exchange": [float(x) for x in e]})
+        row["compared"] = int(found.sum())
+        report["compared"] += row["compared"]
+        report["mismatched"] += len(row["mismatched"])
+        report["incomplete"] += len(row["incomplete"])
+    report["ok"] = report["mismatched"] == 0 and report["incomplete"] == 0 and report["compared"] > 0
+    print(f"[DERIVE] {timeframe} from {base_timeframe}: {report['compared']} bars compared, "
+          f"{report['mismatched']} mismatched, {report['incomplete']} incomplete")
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Derived timeframe tools")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    ck = sub.add_parser("check", help="compare derived bars with exchange bars")
+    ck.add_argument("symbols", nargs="+")
+    ck.add_argument("--timeframe", default="4h")
+    ck.add_argument("--base", default=BASE_TIMEFRAME)
+    ck.add_argument("--bars", type=int, default=200)
+    args = parser.parse_args(argv)
+    if args.cmd == "check":
+        from strategy_core import TradingEngine
+        engine = TradingEngine()
+        for sym in args.symbols:
+            engine.fetch_data(sym, requested_period="1mo", interval=args.base)  # base up to date
+        report = check_consistency(engine, args.symbols, args.timeframe, args.base, args.bars)
+        for row in report["symbols"]:
+            print(f"  {row['symbol']:<14} compared={row['compared']:<4} mismatched={len(row['mismatched'])} "
+                  f"incomplete={len(row['incomplete'])}" + (f"  ERROR {row['error']}" if row["error"] else ""))
+            for m in row["mismatched"][:3]:
+                print(f"    {m}")
+
+
+if __name__ == "__main__":
+    main()
@@ -15,6 +15,8 @@ import sqlite3
 import numpy as np
 from datetime import datetime, timedelta
 
+from metrics_kernel import compute_metrics
+
 # =============================================================================
 # CONFIGURATION
 # =============================================================================
@@ -258,57 +260,26 @@ class ValidationEngine:
         if not trades:
             return {"label": label, "message": "No trades"}
 
-        pnls = [t.get('pnl', 0) for t in trades]
-        wins = [p for p in pnls if p > 0]
-        losses = [p for p in pnls if p < 0]
-
-        total_trades = len(pnls)
-        win_count = len(wins)
-        loss_count = len(losses)
-        win_rate = (win_count / total_trades * 100) if total_trades > 0 else 0
-
-        gross_profit = sum(wins) if wins else 0
-        gross_loss = abs(sum(losses)) if losses else 0
-        profit_factor = (gross_profit / gross_loss) if gross_loss > 0 else float('inf') if gross_profit > 0 else 0
-
-        avg_win = np.mean(wins) if wins else 0
-        avg_loss = abs(np.mean(losses)) if losses else 0
-        expectancy = (win_rate / 100 * avg_win) - ((1 - win_rate / 100) * avg_loss)
-
-        # Max consecutive losses
-        max_consec_loss = 0
-        current_streak = 0
-        for p in pnls:
-            if p < 0:
-                current_streak += 1
-                max_consec_loss = max(max_consec_loss, current_streak)
-            else:
-                current_streak = 0
-
-        # Max drawdown
-        equity = [10000]
-        for p in pnls:
-            equity.append(equity[-1] + p)
-        peak = equity[0]
-        max_dd = 0
-        for e in equity:
-            peak = max(peak, e)
-            dd = (peak - e) / peak * 100
-            max_dd = max(max_dd, dd)
+        pnls = np.array([t.get('pnl', 0) for t in trades], dtype=np.float64)
+
+        # Equity curve dari cumulative PnL (start 10000) -> satu pass metrics_kernel
+        equity = np.cumsum(np.concatenate(([10000.0], pnls)))
+        m = compute_metrics(equity, pnls)
+        profit_factor = m['profit_factor']
 
         return {
             "label": label,
-            "total_trades": total_trades,
-            "win_rate": round(win_rate, 1),
+            "total_trades": m['total_trades'],
+            "win_rate": round(m['win_rate'] * 100, 1),
             "profit_factor": round(profit_factor, 2) if profit_factor != float('inf') else 999,
-            "total_pnl": round(sum(pnls), 2),
-            "avg_win": round(avg_win, 2),
-            "avg_loss": round(avg_loss, 2),
-            "expectancy": round(expectancy, 2),
-            "max_consecutive_losses": max_consec_loss,
-            "max_drawdown_pct": round(max_dd, 2),
-            "best_trade": round(max(pnls), 2) if pnls else 0,
-            "worst_trade": round(min(pnls), 2) if pnls else 0
+            "total_pnl": round(m['total_pnl'], 2),
+            "avg_win": round(m['avg_win'], 2),
+            "avg_loss": round(m['avg_loss'], 2),
+            "expectancy": round(m['expectancy'], 2),
+            "max_consecutive_losses": m['max_consecutive_losses'],
+            "max_drawdown_pct": round(m['max_drawdown'] * 100, 2),
+            "best_trade": round(m['best_trade'], 2),
+            "worst_trade": round(m['worst_trade'], 2)
         }
 
     # =========================================================================
@@ -0,0 +1,271 @@
+# backend/walk_forward.py
+"""
+Walk-forward optimization over the strategy_core backtests.
+
+ValidationEngine.walk_forward_test only splits an existing trade list
+70/30. This engine re-optimizes over price history instead:
+
+  - The OHLCV is cut into folds of train/test windows, either "rolling"
+    (fixed-length train window that moves with the test window) or
+    "anchored" (train always starts at the first candle).
+  - On every train window the same selection as
+    find_best_strategy_for_symbol runs (>= min_trades, net profit > 0,
+    highest consistency/profit score) over strategies x directions x the
+    param_sweep grids (or default parameters only).
+  - The winner is traded on the following test window; test windows are
+    stitched (compounded) into one out-of-sample equity curve.
+
+Indicators are computed once on the full history (param_sweep
+RollingFamilies) and every window reads them as array views, so a test
+window starts with warm indicators and nothing is re-sliced or copied.
+Folds are independent and run in parallel on the param_sweep worker pool.
+Position sizing scales linearly with capital, so each fold is simulated
+from the same initial capital and rescaled when stitching.
+
+Usage:
+  from walk_forward import WalkForwardEngine
+  wf = WalkForwardEngine(initial_capital=1000)
+  report = wf.run_symbol("BTC-USDT", timeframe="1h", train_bars=2000, test_bars=500)
+"""
+
+import time
+
+import numpy as np
+import pandas as pd
+
+import metrics_kernel
+from backtest_result import EquityCurve
+from param_sweep import (
+    ParameterSweep, RollingFamilies, STRATEGIES, evaluate, simulate_combo, score_sim, worker_families
+)
+
+WINDOW_MODES = ("rolling", "anchored")
+
+
+# ============================================================
+# FOLDS
+# ============================================================
+def make_folds(n_bars, train_bars, test_bars, step=None, mode="rolling"):
+    """
+    [(fold, (train_lo, train_hi), (test_lo, test_hi))] over bar indices.
+    step: bars between consecutive test windows (default test_bars). Must be
+    >= test_bars so the test windows can be stitched without overlap.
+    Only full test windows are used.
+    """
+    if mode not in WINDOW_MODES:
+        raise ValueError(f"mode must be one of {WINDOW_MODES}, got {mode!r}")
+    step = step or test_bars
+    if step < test_bars:
+        raise ValueError(f"step ({step}) must be >= test_bars ({test_bars})")
+    folds = []
+    test_lo = train_bars
+    while test_lo + test_bars <= n_bars:
+        train_lo = 0 if mode == "anchored" else test_lo - train_bars
+        folds.append((len(folds), (train_lo, test_lo), (test_lo, test_lo + test_bars)))
+        test_lo += step
+    return folds
+
+
+def run_fold(families, fold, combos, initial_capital, periods_per_year, min_trades=3):
+    """Select on the train window, trade the winner on the test window."""
+    k, (train_lo, train_hi), (test_lo, test_hi) = fold
+    rows = evaluate(families, train_lo, train_hi, combos, initial_capital, periods_per_year)
+
+    # Seleksi sama dengan find_best_strategy_for_symbol (skor tertinggi pertama menang)
+    best = None
+    for i, row in enumerate(rows):
+        if row['total_trades'] < min_trades or row['net_profit'] <= 0:
+            continue
+        if best is None or row['score'] > rows[best]['score']:
+            best = i
+
+    result = {"fold": k, "train": (train_lo, train_hi), "test": (test_lo, test_hi),
+              "candidates": len(rows), "selected": None, "in_sample": None, "out_of_sample": None}
+    if best is None:
+        # Tidak ada kandidat layak: tetap flat (cash) selama test window
+        result["equity_value"] = np.full(test_hi - test_lo, float(initial_capital))
+        result["trade_pnl"] = np.array([])
+        result["final"] = float(initial_capital)
+        return result
+
+    combo = combos[best]
+    arrays, sim = simulate_combo(families, test_lo, test_hi, combo, initial_capital)
+    oos = score_sim(combo, arrays, sim, initial_capital, periods_per_year)
+    result.update({
+        "selected": {"strategy": combo[0], "direction": combo[1], "params": combo[2]},
+        "in_sample": rows[best],
+        "out_of_sample": oos,
+        # equity_value covers bars 1..n-1 of the window; bar 0 = modal awal
+        "equity_value": np.concatenate(([float(initial_capital)], sim['equity_value'])),
+        "trade_pnl": sim['trades'].pnl_pct,
+        "final": float(sim['capital'] + sim['position_size'] * arrays['close'][-1]),
+    })
+    return result
+
+
+def _worker_fold(shm_name, n_rows, fold, combos, initial_capital, periods_per_year, min_trades):
+    return run_fold(worker_families(shm_name, n_rows), fold, combos, initial_capital, periods_per_year, min_trades)
+
+
+# ============================================================
+# ENGINE
+# ============================================================
+class WalkForwardEngine:
+    def __init__(self, initial_capital=1000, workers=None, engine=None):
+        self.initial_capital = float(initial_capital)
+        self.sweep = ParameterSweep(initial_capital=initial_capital, workers=workers, engine=engine)
+
+    @property
+    def engine(self):
+        return self.sweep.engine
+
+    def run(self, df_raw, train_bars=2000, test_bars=500, step=None, mode="rolling", strategies=None,
+            directions=("LONG",), grids=None, optimize_params=True, interval="1h", min_trades=3):
+        """
+        Walk-forward over one symbol's OHLCV (fetch_data layout).
+
+        Args:
+            train_bars / test_bars / step: window lengths in candles.
+            mode: "rolling" or "anchored".
+            optimize_params: False = only the default parameters of each
+                strategy (pure strategy/direction selection, like the scanner).
+            grids: param_sweep grids (see ParameterSweep.run).
+
+        Returns dict: folds (window times, selection, IS + OOS metrics),
+        out_of_sample (metrics of the stitched OOS curve), walk-forward
+        efficiency, selection counts and the stitched EquityCurve.
+        """
+        from strategy_core import BARS_PER_YEAR
+        t0 = time.time()
+        if df_raw is None or len(df_raw) < train_bars + test_bars:
+            return {"error": f"Need at least {train_bars + test_bars} candles, have {0 if df_raw is None else len(df_raw)}"}
+
+        df_raw = df_raw.reset_index(drop=True)
+        periods_per_year = BARS_PER_YEAR.get(interval, 252)
+        folds = make_folds(len(df_raw), train_bars, test_bars, step, mode)
+        if not optimize_params:
+            grids = {s: {} for s in (strategies or STRATEGIES)}
+        combos = self.sweep.build_combos(strategies, directions, grids)
+
+        sweep = self.sweep
+        results = None
+        if sweep.workers > 0 and len(folds) > 1:
+            from backtest_pool import frame_to_shared
+            shm = frame_to_shared(df_raw)
+            try:
+                futures = [sweep.submit(_worker_fold, shm.name, len(df_raw), fold, combos,
+                                        self.initial_capital, periods_per_year, min_trades) for fold in folds]
+                results = [f.result() for f in futures]
+            except Exception as e:
+                print(f"[WARN] [WF] Worker pool failed ({e}), running folds inline")
+            finally:
+                shm.close()
+                shm.unlink()
+        if results is None:
+            families = RollingFamilies(df_raw)
+            results = [run_fold(families, fold, combos, self.initial_capital, periods_per_year, min_trades)
+                       for fold in folds]
+
+        report = self._stitch(df_raw, results, periods_per_year)
+        report.update({
+            "mode": mode,
+            "train_bars": train_bars,
+            "test_bars": test_bars,
+            "step": step or test_bars,
+            "combinations_per_fold": len(combos),
+            "elapsed_sec": round(time.time() - t0, 2),
+        })
+        print(f"[WF] {len(folds)} folds x {len(combos)} combinations ({mode}) in {report['elapsed_sec']}s")
+        return report
+
+    def _stitch(self, df_raw, results, periods_per_year):
+        """Compound the test windows into one OOS curve and summarize every fold."""
+        times = df_raw['timestamp'].to_numpy(dtype=np.int64) // 1000
+        capital = self.initial_capital
+        eq_time, eq_value, pnl = [], [], []
+        folds, counts = [], {}
+        is_ann, oos_ann = [], []
+
+        def iso(idx):
+            return pd.Timestamp(int(times[idx]), unit='s').isoformat()
+
+        for r in results:
+            (train_lo, train_hi), (test_lo, test_hi) = r["train"], r["test"]
+            scale = capital / self.initial_capital
+            eq_time.append(times[test_lo:test_hi])
+            eq_value.append(r["equity_value"] * scale)
+            pnl.append(np.asarray(r["trade_pnl"], dtype=np.float64))
+            capital *= r["final"] / self.initial_capital
+
+            if r["selected"] is not None:
+                key = f"{r['selected']['strategy']}/{r['selected']['direction']}"
+                counts[key] = counts.get(key, 0) + 1
+                is_ann.append(r["in_sample"]["net_profit"] / self.initial_capital * periods_per_year / (train_hi - train_lo))
+                oos_ann.append(r["out_of_sample"]["net_profit"] / self.initial_capital * periods_per_year / (test_hi - test_lo))
+
+            folds.append({
+                "fold": r["fold"],
+                "train_start": iso(train_lo), "train_end": iso(train_hi - 1),
+                "test_start": iso(test_lo), "test_end": iso(test_hi - 1),
+                "candidates": r["candidates"],
+                "selected": r["selected"],
+                "in_sample": r["in_sample"],
+                "out_of_sample": r["out_of_sample"],
+                "equity_start": round(scale * self.initial_capital, 2),
+                "equity_end": round(capital, 2),
+            })
+
+        curve = EquityCurve(np.concatenate(eq_time) if eq_time else [], np.concatenate(eq_value) if eq_value else [])
+        trade_pnl = np.concatenate(pnl) if pnl else np.array([])
+        m = metrics_kernel.compute_metrics(curve.value, trade_pnl, periods_per_year=periods_per_year,
+                                           total_return=capital / self.initial_capital - 1)
+        gross_loss = m['gross_loss']
+        consistency = max(0.0, min(100.0, m['r_squared'] * 100)) if len(curve) >= 2 else 0.0
+
+        # Walk-forward efficiency: return OOS tahunan / return IS tahunan (rata-rata fold)
+        wfe = None
+        if is_ann and np.mean(is_ann) > 0:
+            wfe = round(float(np.mean(oos_ann) / np.mean(is_ann)), 3)
+
+        return {
+            "folds": folds,
+            "out_of_sample": {
+                "initial_balance": self.initial_capital,
+                "final_balance": round(capital, 2),
+                "net_profit": round(capital - self.initial_capital, 2),
+                "total_return": round((capital / self.initial_capital - 1) * 100, 2),
+                "total_trades": m['total_trades'],
+                "win_rate": round(m['win_rate'] * 100, 2),
+                "max_drawdown": round(m['max_drawdown'] * 100, 2),
+                "sharpe_ratio": round(m['sharpe'], 2),
+                "sortino_ratio": round(m['sortino'], 2),
+                "calmar_ratio": round(m['calmar'], 2),
+                "profit_factor": round(m['gross_profit'] / gross_loss, 2) if gross_loss > 0 else 0.0,
+                "consistency_score": round(consistency, 2),
+            },
+            "walk_forward_efficiency": wfe,
+            "profitable_folds": sum(1 for r in results if r["final"] > self.initial_capital),
+            "selection_counts": counts,
+            "equity_curve": curve,
+        }
+
+    def run_symbol(self, symbol, timeframe="1h", **kwargs):
+        """fetch_data(period="max") + run(); same data path as find_best_strategy_for_symbol."""
+        df_raw = self.engine.fetch_data(symbol, requested_period="max", interval=timeframe)
+        report = self.run(df_raw, interval=timeframe, **kwargs)
+        report["symbol"] = symbol
+        report["timeframe"] = timeframe
+        return report
+
+    def shutdown(self):
+        self.sweep.shutdown()
+
+
+if __name__ == "__main__":
+    wf = WalkForwardEngine(initial_capital=1000)
+    out = wf.run_symbol("BTC-USDT", timeframe="1h", train_bars=2000, test_bars=500,
+                        strategies=["MOMENTUM", "MEAN_REVERSAL", "GRID"], directions=["LONG", "SHORT"])
+    for f in out.get("folds", []):
+        print(f["fold"], f["test_start"], f["selected"], (f["out_of_sample"] or {}).get("net_profit"))
+    print(out.get("out_of_sample"), out.get("walk_forward_efficiency"))
+    wf.shutdown()